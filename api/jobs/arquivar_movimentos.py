@@ -0,0 +1,44 @@
+"""
+Arquiva as movimentações anteriores a um mês: copia cada mês para um segmento
+Parquet imutável (com índice por carteira) em ARQUIVO_MOVIMENTOS_DIR e remove
+as linhas de DEPOSITO_SAQUE, CONVERSAO e TRANSFERENCIA em lotes pequenos.
+
+O extrato continua completo: antes do corte as linhas vêm do arquivo. Depois
+de arquivar, as partições mensais vazias podem ser descartadas com
+api.jobs.manter_particoes. Rodar de novo após uma interrupção retoma o trabalho.
+Com vários shards, cada um é arquivado no seu subdiretório (shard_N).
+
+Uso:
+    python -m api.jobs.arquivar_movimentos --anteriores-a 2024-01
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from api.persistence.arquivo_movimentos import arquivo_do_shard
+from api.persistence.db import total_shards
+from api.persistence.repositories.arquivo_repository import ArquivoRepository
+from api.services.arquivamento_service import ArquivamentoService, TAMANHO_LOTE_REMOCAO
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arquivamento de movimentações antigas.")
+    parser.add_argument("--anteriores-a", required=True, type=lambda v: datetime.strptime(v, "%Y-%m").date(),
+                        help="Arquiva os meses anteriores a este (AAAA-MM)")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE_REMOCAO,
+                        help="Linhas removidas por transação")
+    args = parser.parse_args(argv)
+
+    segmentos = []
+    for shard in range(total_shards()):
+        service = ArquivamentoService(ArquivoRepository(shard), arquivo_do_shard(shard))
+        try:
+            segmentos += service.arquivar(args.anteriores_a, tamanho_lote=args.lote, ao_progredir=print)
+        except ValueError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    print(f"{len(segmentos)} mês(es) arquivado(s).")
+
+if __name__ == "__main__":
+    main()
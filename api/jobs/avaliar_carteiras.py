@@ -0,0 +1,52 @@
+"""
+Job em lote: avalia todas as carteiras numa moeda e grava o total de cada uma.
+
+Uso:
+    python -m api.jobs.avaliar_carteiras --moeda USD --saida avaliacao.csv
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+
+from api.persistence.repositories.relatorio_repository import RelatorioRepository, TAMANHO_LOTE_PADRAO
+from api.services.avaliacao_service import AvaliacaoService, TOP_N_PADRAO
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Avaliação de todas as carteiras numa moeda.")
+    parser.add_argument("--moeda", default="USD", help="Moeda de avaliação (padrão: USD)")
+    parser.add_argument("--top", type=int, default=TOP_N_PADRAO, help="Quantidade de maiores carteiras no resumo")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE_PADRAO, help="Linhas de saldo por lote")
+    parser.add_argument("--saida", help="Arquivo CSV com o total por carteira (opcional)")
+    args = parser.parse_args(argv)
+
+    moeda = args.moeda.upper()
+    service = AvaliacaoService(RelatorioRepository())
+    moedas, cotacoes = asyncio.run(service.cotacoes_snapshot(moeda))
+
+    inicio = time.perf_counter()
+    arquivo = open(args.saida, "w", newline="", encoding="utf-8") if args.saida else None
+    try:
+        ao_avaliar_lote = None
+        if arquivo:
+            escritor = csv.writer(arquivo)
+            escritor.writerow(["endereco_carteira", f"valor_total_{moeda.lower()}"])
+
+            def ao_avaliar_lote(enderecos, totais):
+                escritor.writerows(zip(enderecos, (f"{t:.8f}" for t in totais)))
+
+        resultado = service.avaliar(moeda, moedas, cotacoes, args.top, args.lote, ao_avaliar_lote)
+    finally:
+        if arquivo:
+            arquivo.close()
+
+    resultado["duracao_segundos"] = round(time.perf_counter() - inicio, 3)
+    json.dump(resultado, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Executa os agendamentos vencidos (transferências e conversões agendadas).
+
+Alternativa ao agendador dentro da API (AGENDADOR_ATIVO=1): pode rodar em
+quantos processos quiser ao mesmo tempo, os agendamentos são reivindicados
+com SKIP LOCKED. Sem --continuo, executa um ciclo (ex.: a partir do cron);
+agendamentos atrasados por uma parada são recuperados conforme a política de
+cada um (execucoes_atrasadas).
+
+Uso:
+    python -m api.jobs.executar_agendamentos
+    python -m api.jobs.executar_agendamentos --continuo --intervalo 30 --paralelas 8
+"""
+import argparse
+import asyncio
+import signal
+
+from api.persistence.db import encerrar_banco
+from api.persistence.repositories.agendamento_repository import AgendamentoRepository
+from api.persistence.repositories.carteira_repository import CarteiraRepository
+from api.services.agendador_service import CARTEIRAS_PARALELAS, INTERVALO_AGENDADOR_SEGUNDOS, AgendadorService
+from api.services.provedores_cotacao import obter_fonte
+
+
+def imprimir(metricas):
+    print(f"{metricas['inicio']:%Y-%m-%d %H:%M:%S}  vencidos={metricas['vencidos']} "
+          f"carteiras={metricas['carteiras']} executados={metricas['executados']} "
+          f"falhas={metricas['falhas']} adiados={metricas['adiados']} "
+          f"atraso_max={metricas['atraso_maximo_segundos']}s duracao={metricas['duracao_ms']}ms")
+
+
+async def executar(args):
+    agendador = AgendadorService(AgendamentoRepository(), CarteiraRepository(), carteiras_paralelas=args.paralelas)
+    await obter_fonte().iniciar()
+    try:
+        if not args.continuo:
+            imprimir(await agendador.executar_ciclo())
+            return
+
+        parar = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sinal, parar.set)
+
+        await agendador.executar_continuamente(parar, args.intervalo, ao_concluir=imprimir)
+    finally:
+        await obter_fonte().encerrar()
+        encerrar_banco()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Executa as transferências e conversões agendadas.")
+    parser.add_argument("--continuo", action="store_true", help="Repete os ciclos até SIGINT/SIGTERM")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_AGENDADOR_SEGUNDOS, help="Segundos entre ciclos")
+    parser.add_argument("--paralelas", type=int, default=CARTEIRAS_PARALELAS, help="Carteiras executadas em paralelo")
+    args = parser.parse_args(argv)
+    asyncio.run(executar(args))
+
+
+if __name__ == "__main__":
+    main()
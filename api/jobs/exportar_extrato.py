@@ -0,0 +1,88 @@
+"""
+Exporta o extrato de uma carteira (ou de todas, num período) para arquivos.
+
+A saída é dividida em partes de --linhas-por-parte linhas. Cada parte é um
+arquivo completo (CSV, CSV.gz, CSV.zst ou Parquet). Depois que uma parte é
+fechada, o cursor é gravado em <saida>.estado.json. Se o processo for
+interrompido, rodar de novo o mesmo comando retoma da última parte concluída.
+
+Uso:
+    python -m api.jobs.exportar_extrato --endereco <carteira> --saida extrato --compressao gzip
+    python -m api.jobs.exportar_extrato --inicio 2024-01-01 --fim 2024-02-01 --formato parquet --saida jan
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+from api.persistence.repositories.relatorio_repository import RelatorioRepository
+from api.persistence.repositories.arquivo_repository import ArquivoRepository
+from api.services.extrato_service import ExtratoService, COMPRESSOES, FORMATOS
+
+
+def _ler_estado(caminho: str) -> dict:
+    if not os.path.exists(caminho):
+        return {"cursor": None, "parte": 1, "linhas": 0}
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _gravar_estado(caminho: str, estado: dict):
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportação do extrato de movimentações.")
+    parser.add_argument("--endereco", help="Endereço da carteira (omita para todas as carteiras do período)")
+    parser.add_argument("--inicio", type=datetime.fromisoformat)
+    parser.add_argument("--fim", type=datetime.fromisoformat)
+    parser.add_argument("--formato", choices=FORMATOS, default="csv")
+    parser.add_argument("--compressao", choices=COMPRESSOES, default="gzip")
+    parser.add_argument("--linhas-por-parte", type=int, default=1_000_000)
+    parser.add_argument("--saida", required=True, help="Prefixo dos arquivos de saída")
+    args = parser.parse_args(argv)
+
+    if not args.endereco and not (args.inicio and args.fim):
+        parser.error("Informe --endereco ou o período (--inicio e --fim).")
+
+    service = ExtratoService(RelatorioRepository(), ArquivoRepository())
+    _, extensao = service.tipo_conteudo(args.formato, args.compressao)
+    caminho_estado = f"{args.saida}.estado.json"
+    estado = _ler_estado(caminho_estado)
+
+    while True:
+        exportacao = service.exportar(
+            args.endereco, args.formato, args.compressao, args.inicio, args.fim,
+            cursor=estado["cursor"], maximo_linhas=args.linhas_por_parte,
+        )
+        nome_parte = f"{args.saida}.parte{estado['parte']:04d}.{extensao}"
+
+        with open(nome_parte, "wb") as arquivo:
+            for bloco in exportacao:
+                arquivo.write(bloco)
+
+        if exportacao.linhas == 0:
+            os.remove(nome_parte)
+            break
+
+        estado = {
+            "cursor": exportacao.ultimo_cursor,
+            "parte": estado["parte"] + 1,
+            "linhas": estado["linhas"] + exportacao.linhas,
+        }
+        _gravar_estado(caminho_estado, estado)
+        print(f"{nome_parte}: {exportacao.linhas} linhas (total {estado['linhas']})")
+
+        if exportacao.linhas < args.linhas_por_parte:
+            break
+
+    print(f"Exportação concluída: {estado['linhas']} linhas.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Invalida entradas do cache compartilhado de todos os workers deste host, por
+exemplo depois de alterar a tabela MOEDA ou o status de uma carteira direto no
+banco. A invalidação vale na hora para todos os processos que usam o arquivo.
+
+Uso:
+    python -m api.jobs.invalidar_cache moedas
+    python -m api.jobs.invalidar_cache carteiras --chave <endereco_carteira>
+"""
+import argparse
+import sys
+
+from api.persistence.cache_compartilhado import NAMESPACES, obter_cache
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Invalida entradas do cache compartilhado do host.")
+    parser.add_argument("namespace", choices=sorted(NAMESPACES))
+    parser.add_argument("--chave", help="Remove só esta entrada (ex.: endereço da carteira)")
+    args = parser.parse_args(argv)
+
+    cache = obter_cache()
+    if not cache.compartilhado:
+        print("Cache compartilhado indisponível neste host: nada a invalidar.", file=sys.stderr)
+        sys.exit(1)
+
+    namespace = NAMESPACES[args.namespace]
+    if args.chave:
+        removida = cache.remover(namespace, args.chave)
+        print(f"{args.namespace}/{args.chave}: {'removida' if removida else 'não estava no cache'}")
+    else:
+        print(f"{args.namespace}: geração {cache.invalidar_namespace(namespace)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Limites de uso das carteiras (ver api.services.limites_service).
+
+'nivel' troca a política de limites de uma carteira (PADRAO, PREMIUM ou os
+níveis de LIMITES_POLITICAS_ARQUIVO).
+
+'limpar' apaga, em todos os shards, os intervalos de USO_LIMITE mais antigos
+que --horas (padrão: a maior janela das políticas), em lotes de transações
+curtas. Pode rodar com a API no ar; agende, por exemplo, uma vez por dia.
+
+Uso:
+    python -m api.jobs.limites_carteiras nivel --carteira <endereco> --nivel PREMIUM
+    python -m api.jobs.limites_carteiras limpar [--horas 48] [--lote 5000]
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from api.models.limites import TAMANHO_BUCKET
+from api.persistence.repositories.carteira_repository import CarteiraRepository
+from api.persistence.shards import em_cada_shard
+from api.services.limites_service import LimitesService, obter_politicas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Limites de uso das carteiras.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    nivel = comandos.add_parser("nivel", help="Troca o nível de limites de uma carteira")
+    nivel.add_argument("--carteira", required=True, help="Endereço da carteira")
+    nivel.add_argument("--nivel", required=True, help="Ex.: PADRAO, PREMIUM")
+    limpar = comandos.add_parser("limpar", help="Apaga intervalos de uso fora das janelas")
+    limpar.add_argument("--horas", type=float, default=None, help="Idade mínima dos intervalos apagados")
+    limpar.add_argument("--lote", type=int, default=5000, help="Linhas apagadas por transação")
+    args = parser.parse_args(argv)
+
+    carteira_repo = CarteiraRepository()
+
+    if args.comando == "nivel":
+        try:
+            carteira = LimitesService(carteira_repo).definir_nivel(args.carteira, args.nivel)
+        except ValueError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Carteira {carteira['endereco_carteira']} agora no nível {carteira['nivel_limite']}.")
+        return
+
+    if args.horas is not None:
+        idade = timedelta(hours=args.horas)
+    else:
+        idade = max(p.janela for p in obter_politicas().values())
+    # Um intervalo a mais: o mais antigo da janela ainda conta
+    antes_de = datetime.now().replace(microsecond=0) - idade - TAMANHO_BUCKET
+
+    def limpar_shard(shard: int) -> int:
+        total = 0
+        while True:
+            apagados = carteira_repo.limpar_uso_limites(shard, antes_de, args.lote)
+            total += apagados
+            if apagados < args.lote:
+                return total
+
+    print(f"{sum(em_cada_shard(limpar_shard))} intervalos de uso anteriores a {antes_de} apagados.")
+
+
+if __name__ == "__main__":
+    main()
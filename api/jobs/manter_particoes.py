@@ -0,0 +1,49 @@
+"""
+Manutenção das partições mensais de DEPOSITO_SAQUE, CONVERSAO e TRANSFERENCIA.
+
+Rode periodicamente (ex.: diariamente) para manter sempre alguns meses criados
+à frente, de modo que a partição pmax continue vazia e a divisão seja barata.
+--descartar-anteriores-a remove meses inteiros com DROP PARTITION: os dados
+desses meses são apagados de verdade. Com vários shards, vale para cada um.
+
+Uso:
+    python -m api.jobs.manter_particoes --meses-a-frente 3
+    python -m api.jobs.manter_particoes --descartar-anteriores-a 2023-01 --confirmar
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from api.persistence.db import total_shards
+from api.persistence.migracoes import MESES_A_FRENTE_PADRAO, ManutencaoParticoes, criar_engine_migracao
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cria e descarta partições mensais do histórico.")
+    parser.add_argument("--meses-a-frente", type=int, default=MESES_A_FRENTE_PADRAO,
+                        help="Quantos meses após o atual devem existir")
+    parser.add_argument("--descartar-anteriores-a", type=lambda v: datetime.strptime(v, "%Y-%m").date(),
+                        help="Mês (AAAA-MM) a partir do qual o histórico é mantido")
+    parser.add_argument("--confirmar", action="store_true", help="Necessário para descartar partições")
+    args = parser.parse_args(argv)
+
+    if args.descartar_anteriores_a and not args.confirmar:
+        print("Use --confirmar para descartar partições (os dados são apagados).", file=sys.stderr)
+        sys.exit(2)
+
+    for shard in range(total_shards()):
+        manutencao = ManutencaoParticoes(criar_engine_migracao(shard))
+        prefixo = f"[shard {shard}] " if total_shards() > 1 else ""
+        try:
+            for tabela, nomes in manutencao.criar_meses(args.meses_a_frente).items():
+                print(f"{prefixo}{tabela}: {len(nomes)} partição(ões) criada(s) {', '.join(nomes)}")
+
+            if args.descartar_anteriores_a:
+                for tabela, nomes in manutencao.descartar_anteriores(args.descartar_anteriores_a).items():
+                    print(f"{prefixo}{tabela}: descartadas {', '.join(nomes) or 'nenhuma'}")
+        except ValueError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Aplica as migrações versionadas de sql/migracoes na base.
+
+Usa o usuário de migração (DB_MIGRACAO_USER/DB_MIGRACAO_PASSWORD), que precisa
+de permissão de DDL; o usuário da API tem só DML.
+
+Com vários shards (DB_SHARDS), aplica em cada um, na ordem; --shard limita a
+um só.
+
+Uso:
+    python -m api.jobs.migrar             # aplica todas as pendentes
+    python -m api.jobs.migrar --ate 2     # aplica até a versão 2
+    python -m api.jobs.migrar --status
+    python -m api.jobs.migrar --shard 1
+"""
+import argparse
+import sys
+
+from api.persistence.db import total_shards
+from api.persistence.migracoes import Migrador, criar_engine_migracao
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aplica as migrações do esquema.")
+    parser.add_argument("--ate", type=int, help="Última versão a aplicar")
+    parser.add_argument("--status", action="store_true", help="Só lista as migrações e se já foram aplicadas")
+    parser.add_argument("--shard", type=int, help="Só este shard (padrão: todos)")
+    args = parser.parse_args(argv)
+
+    shards = [args.shard] if args.shard is not None else range(total_shards())
+    for shard in shards:
+        if total_shards() > 1:
+            print(f"== shard {shard}")
+        migrar_shard(Migrador(criar_engine_migracao(shard)), args)
+
+
+def migrar_shard(migrador: Migrador, args):
+    if args.status:
+        for m in migrador.status():
+            situacao = f"aplicada em {m['aplicada_em']}" if m["aplicada_em"] else "pendente"
+            if m["alterada"]:
+                situacao += " (ARQUIVO ALTERADO)"
+            print(f"V{m['versao']:03d}  {m['descricao']:<35} {situacao}")
+        return
+
+    try:
+        executadas = migrador.migrar(args.ate)
+    except ValueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    for m in executadas:
+        print(f"Aplicada V{m.versao:03d} - {m.descricao}")
+    if not executadas:
+        print("Nenhuma migração pendente.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Mapa de shards e rebalanceamento de carteiras entre shards (DB_SHARDS).
+
+Cada carteira pertence a um bucket (CRC32(endereco) % 1024) e cada bucket a
+um shard, pelo mapa em MAPA_SHARDS (shard 0). 'inicializar' preenche o mapa
+distribuindo os buckets em rodízio entre os shards configurados; rode uma
+vez, depois de aplicar as migrações em todos os shards e antes de subir a
+API com mais de um shard.
+
+'mover' copia os buckets para outro shard com a API no ar: durante a cópia,
+escritas das carteiras desses buckets recebem 503 (ver RebalanceamentoService).
+
+Uso:
+    python -m api.jobs.rebalancear_shards mapa
+    python -m api.jobs.rebalancear_shards inicializar
+    python -m api.jobs.rebalancear_shards mover --buckets 0-63,100 --para 2
+"""
+import argparse
+import sys
+from typing import List
+
+from api.persistence.repositories.shard_repository import ShardRepository
+from api.services.rebalanceamento_service import TAMANHO_LOTE_REBALANCEAMENTO, RebalanceamentoService
+
+
+def lista_de_buckets(texto: str) -> List[int]:
+    """'0-3,10' -> [0, 1, 2, 3, 10]"""
+    buckets = []
+    try:
+        for parte in texto.split(","):
+            inicio, _, fim = parte.strip().partition("-")
+            buckets.extend(range(int(inicio), int(fim or inicio) + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Lista de buckets inválida: {texto}")
+    return buckets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mapa de shards e rebalanceamento de carteiras.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    comandos.add_parser("mapa", help="Mostra quantos buckets cada shard tem")
+    comandos.add_parser("inicializar", help="Preenche o mapa (só os buckets que faltam)")
+    mover = comandos.add_parser("mover", help="Move buckets para outro shard")
+    mover.add_argument("--buckets", type=lista_de_buckets, required=True, help="Ex.: 0-63,100")
+    mover.add_argument("--para", type=int, required=True, help="Shard de destino")
+    mover.add_argument("--lote", type=int, default=TAMANHO_LOTE_REBALANCEAMENTO, help="Carteiras por transação")
+    args = parser.parse_args(argv)
+
+    service = RebalanceamentoService(ShardRepository())
+
+    if args.comando == "inicializar":
+        print(f"{service.inicializar_mapa()} buckets adicionados ao mapa.")
+    elif args.comando == "mover":
+        try:
+            resultado = service.mover(args.buckets, args.para, args.lote, ao_progredir=print)
+        except ValueError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"{len(resultado['buckets'])} buckets movidos do shard {resultado['origem']} para o "
+              f"{resultado['destino']}: {resultado['carteiras']} carteiras, soma dos saldos {resultado['soma_saldos']}.")
+        return
+
+    for shard, contagem in sorted(service.distribuicao().items()):
+        print(f"shard {shard}: {contagem['ativos']} buckets ativos, {contagem['migrando']} migrando")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Reconciliação de saldos: confere se saldo_carteira.saldo é igual à soma das
+movimentações (depósitos, saques e taxas, conversões e transferências).
+
+As carteiras são divididas por prefixo de endereço e cada faixa é calculada
+com consultas agregadas num pool de processos. O progresso fica no arquivo de
+checkpoint: se o job for interrompido, a próxima execução continua das faixas
+que faltam; depois de concluído, a próxima execução só confere carteiras cujos
+saldos mudaram desde a marca anterior (use --completa para conferir tudo).
+
+Uso:
+    python -m api.jobs.reconciliar_saldos --processos 8 --relatorio divergencias.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+from api.services.reconciliacao_service import (
+    CheckpointReconciliacao,
+    ReconciliacaoService,
+    LIMITE_MOVIMENTOS_PADRAO,
+    TOLERANCIA_PADRAO,
+)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Reconciliação paralela de saldos.")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--digitos-prefixo", type=int, choices=(1, 2, 3), default=1,
+                        help="Dígitos do prefixo de endereço por partição (16, 256 ou 4096 partições)")
+    parser.add_argument("--completa", action="store_true", help="Ignora a marca e confere todas as carteiras")
+    parser.add_argument("--tolerancia", type=Decimal, default=TOLERANCIA_PADRAO)
+    parser.add_argument("--limite-movimentos", type=int, default=LIMITE_MOVIMENTOS_PADRAO,
+                        help="Movimentações listadas por divergência")
+    parser.add_argument("--checkpoint", default="reconciliacao.checkpoint.json")
+    parser.add_argument("--relatorio", help="Arquivo JSON com as divergências encontradas")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    service = ReconciliacaoService(CheckpointReconciliacao(args.checkpoint))
+    execucao = service.executar(
+        processos=args.processos,
+        digitos_prefixo=args.digitos_prefixo,
+        completa=args.completa,
+        tolerancia=args.tolerancia,
+        limite_movimentos=args.limite_movimentos,
+    )
+
+    if args.relatorio:
+        with open(args.relatorio, "w", encoding="utf-8") as f:
+            json.dump(execucao, f, ensure_ascii=False, indent=2)
+
+    modo = "completa" if execucao["desde"] is None else f"incremental desde {execucao['desde']}"
+    print(f"Reconciliação {modo} concluída em {time.perf_counter() - inicio:.1f}s")
+    if execucao["desde"] is not None:
+        print(f"Carteiras verificadas: {execucao['carteiras_verificadas']}")
+    print(f"Divergências: {len(execucao['divergencias'])}")
+    for d in execucao["divergencias"][:20]:
+        print(f"  {d['endereco_carteira']} {d['codigo_moeda']}: saldo {d['saldo']} esperado {d['esperado']}")
+
+    return 1 if execucao["divergencias"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
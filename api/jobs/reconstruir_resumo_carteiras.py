@@ -0,0 +1,40 @@
+"""
+Reconstrói a projeção RESUMO_CARTEIRA a partir das tabelas de origem.
+
+A migração V005 já faz a carga inicial; use para corrigir a projeção (ex.:
+movimentos feitos pela versão anterior da API entre a migração e o deploy). Cada lote de carteiras é recalculado numa transação curta, então
+pode rodar com a API no ar. Não rode com um arquivamento em andamento
+(segmentos COPIADO): as linhas ainda não removidas seriam contadas duas vezes.
+
+Uso:
+    python -m api.jobs.reconstruir_resumo_carteiras --lote 500
+"""
+import argparse
+import sys
+
+from api.persistence.db import total_shards
+from api.persistence.repositories.arquivo_repository import ArquivoRepository
+from api.persistence.repositories.resumo_carteira_repository import ResumoCarteiraRepository
+from api.services.resumo_carteira_service import TAMANHO_LOTE_RECONSTRUCAO, ResumoCarteiraService
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstrói o resumo por carteira (projeção de leitura).")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE_RECONSTRUCAO, help="Carteiras por transação")
+    args = parser.parse_args(argv)
+
+    pendentes = [
+        s for shard in range(total_shards())
+        for s in ArquivoRepository(shard).listar_segmentos() if s["status"] != "CONCLUIDO"
+    ]
+    if pendentes:
+        print("Erro: há arquivamento em andamento; rode python -m api.jobs.arquivar_movimentos antes.", file=sys.stderr)
+        sys.exit(1)
+
+    service = ResumoCarteiraService(ResumoCarteiraRepository())
+    total = service.reconstruir(args.lote, ao_progredir=lambda n: print(f"{n} carteiras reconstruídas"))
+    print(f"Resumo reconstruído para {total} carteiras.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Recalcula o rollup RESUMO_TAXAS a partir das tabelas de histórico.
+
+Serve para a carga inicial de períodos anteriores ao rollup. Cada lote de dias
+é apagado e recalculado numa transação; o intervalo não deve incluir o período
+em que a API já está gravando no rollup, nem meses já arquivados (as
+movimentações deles não estão mais nas tabelas quentes). Use datas em hora cheia.
+Com vários shards, cada um recalcula o seu rollup (o relatório soma os shards).
+
+Uso:
+    python -m api.jobs.reconstruir_resumo_taxas --inicio 2024-01-01 --fim 2025-01-01
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from api.persistence.db import total_shards
+from api.persistence.repositories.arquivo_repository import ArquivoRepository
+from api.persistence.repositories.relatorio_repository import RelatorioRepository
+from api.services.arquivamento_service import corte_arquivado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstrói o resumo de taxas por hora.")
+    parser.add_argument("--inicio", required=True, type=datetime.fromisoformat, help="Data/hora inicial (inclusiva)")
+    parser.add_argument("--fim", required=True, type=datetime.fromisoformat, help="Data/hora final (exclusiva)")
+    parser.add_argument("--dias-por-lote", type=int, default=7, help="Tamanho de cada transação, em dias")
+    args = parser.parse_args(argv)
+
+    corte = corte_arquivado([s for shard in range(total_shards()) for s in ArquivoRepository(shard).listar_segmentos()])
+    if corte is not None and args.inicio < corte:
+        print(f"Erro: movimentações anteriores a {corte} estão arquivadas; comece a partir dessa data.", file=sys.stderr)
+        sys.exit(1)
+
+    repo = RelatorioRepository()
+    atual = args.inicio
+    while atual < args.fim:
+        proximo = min(atual + timedelta(days=args.dias_por_lote), args.fim)
+        repo.reconstruir_resumo_taxas(atual, proximo)
+        print(f"Resumo reconstruído: {atual.isoformat()} -> {proximo.isoformat()}")
+        atual = proximo
+
+
+if __name__ == "__main__":
+    main()
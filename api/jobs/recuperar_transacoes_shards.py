@@ -0,0 +1,32 @@
+"""
+Conclui as transações XA entre shards que ficaram preparadas (PREPARE feito,
+sem COMMIT/ROLLBACK) porque a API caiu no meio de uma transferência entre
+carteiras de shards diferentes. Cada uma é confirmada ou desfeita conforme o
+log em TRANSACAO_DISTRIBUIDA (shard 0); ver api.persistence.shards.
+
+Transações preparadas seguram os locks das linhas: rode periodicamente (cron)
+e depois de qualquer queda da API.
+
+Uso:
+    python -m api.jobs.recuperar_transacoes_shards --idade-minima-minutos 5
+"""
+import argparse
+from datetime import timedelta
+
+from api.persistence.shards import recuperar_transacoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recupera transações XA pendentes entre shards.")
+    parser.add_argument("--idade-minima-minutos", type=float, default=5,
+                        help="Ignora transações mais novas (o coordenador pode ainda estar nelas)")
+    args = parser.parse_args(argv)
+
+    tratadas = recuperar_transacoes(timedelta(minutes=args.idade_minima_minutos))
+    for t in tratadas:
+        print(f"{t['acao']:<8} {t['xid']} (shard {t['shard']})")
+    print(f"{len(tratadas)} transações preparadas tratadas.")
+
+
+if __name__ == "__main__":
+    main()
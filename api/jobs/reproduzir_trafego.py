@@ -0,0 +1,119 @@
+"""
+Reprodução de tráfego capturado em produção (CAPTURA_TRAFEGO_ATIVA=1, ver
+api.services.captura_service) para comparar o desempenho de duas versões.
+
+Para cada versão, num banco novo (DB_* apontando para ele):
+    1. python -m api.jobs.migrar
+    2. preparar: recria as carteiras da captura e grava as chaves novas e as
+       cotações da captura em --estado;
+    3. reproduzir: envia o tráfego e grava latências e vazão em --saida.
+Depois, 'comparar' mostra a diferença entre os dois resultados (código de
+saída 1 se houver regressão acima de --tolerancia).
+
+Sem --url, a reprodução roda a API deste checkout no próprio processo, com o
+provedor de cotações trocado por um ProvedorFixo com as cotações da captura.
+Com --url, o servidor precisa ter sido iniciado com COTACAO_PROVEDOR=fixo e o
+COTACAO_FIXAS que o 'preparar' imprime. Em ambos os casos a captura e o
+agendador devem estar desligados. Acelerando (--velocidade), ajuste a taxa
+de requisições por carteira (LIMITES_POLITICAS_ARQUIVO) ou os 429 aparecem
+como divergências.
+
+Uso:
+    python -m api.jobs.reproduzir_trafego preparar --captura capturas --estado replay.json
+    python -m api.jobs.reproduzir_trafego reproduzir --captura capturas --estado replay.json --saida base.json
+    python -m api.jobs.reproduzir_trafego reproduzir ... --velocidade 4 --url http://localhost:8000
+    python -m api.jobs.reproduzir_trafego comparar base.json nova.json --tolerancia 10
+"""
+import argparse
+import asyncio
+import json
+import sys
+from decimal import Decimal
+
+import httpx
+
+from api.persistence.repositories.carteira_repository import CarteiraRepository
+from api.services.agendador_service import AGENDADOR_ATIVO
+from api.services.captura_service import CAPTURA_ATIVA, ler_captura
+from api.services.provedores_cotacao import ProvedorFixo, definir_provedor
+from api.services.replay_service import MAXIMO_SIMULTANEAS, ReplayService, ReproducaoTrafego, comparar
+
+
+def _ler_json(caminho: str):
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def reproduzir(registros, estado, args):
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=30.0) as cliente:
+            return await ReproducaoTrafego(registros, estado, cliente, args.velocidade, args.simultaneas).executar()
+
+    definir_provedor(ProvedorFixo({par: Decimal(v) for par, v in estado["cotacoes"].items()}))
+    from api.main import app
+
+    async with app.router.lifespan_context(app):
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://reproducao", timeout=30.0) as cliente:
+            return await ReproducaoTrafego(registros, estado, cliente, args.velocidade, args.simultaneas).executar()
+
+
+def imprimir_resultado(resultado):
+    print(f"{resultado['requisicoes']} requisições em {resultado['duracao_s']}s "
+          f"({resultado['vazao_rps']} req/s), atraso p95 {resultado['atraso_p95_ms']}ms, "
+          f"{resultado['divergencias']} divergências, {resultado['erros']} erros")
+    for nome, r in resultado["rotas"].items():
+        print(f"  {nome:<50} n={r['requisicoes']:<7} p50={r['p50_ms']:<9} p95={r['p95_ms']:<9} "
+              f"p99={r['p99_ms']:<9} (produção p50={r['p50_original_ms']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reprodução de tráfego capturado.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    preparar = comandos.add_parser("preparar", help="Recria as carteiras da captura num banco novo")
+    preparar.add_argument("--captura", required=True, help="Diretório com os arquivos .jsonl.gz")
+    preparar.add_argument("--estado", required=True, help="Arquivo gerado com chaves e cotações")
+    executar = comandos.add_parser("reproduzir", help="Envia o tráfego e mede")
+    executar.add_argument("--captura", required=True)
+    executar.add_argument("--estado", required=True)
+    executar.add_argument("--saida", required=True, help="Arquivo JSON com o resultado")
+    executar.add_argument("--velocidade", type=float, default=1.0, help="1 = ritmo original; 0 = sem pausas")
+    executar.add_argument("--url", help="API já no ar (padrão: este checkout, no processo)")
+    executar.add_argument("--simultaneas", type=int, default=MAXIMO_SIMULTANEAS, help="Requisições em andamento")
+    diferenca = comandos.add_parser("comparar", help="Compara dois resultados")
+    diferenca.add_argument("base")
+    diferenca.add_argument("nova")
+    diferenca.add_argument("--tolerancia", type=float, default=10.0, help="Variação aceita, em %%")
+    args = parser.parse_args(argv)
+
+    if args.comando == "comparar":
+        linhas = comparar(_ler_json(args.base), _ler_json(args.nova), args.tolerancia)
+        for linha in linhas:
+            variacao = f"{linha['variacao_percentual']:+.1f}%" if linha["variacao_percentual"] is not None else ""
+            marca = "  << REGRESSÃO" if linha["regressao"] else ""
+            print(f"{linha['rota']:<50} {linha['metrica']:<13} {linha['base']:>10} -> {linha['nova']:<10} "
+                  f"{variacao:>8}{marca}")
+        sys.exit(1 if any(linha["regressao"] for linha in linhas) else 0)
+
+    if CAPTURA_ATIVA or AGENDADOR_ATIVO:
+        print("Erro: desligue CAPTURA_TRAFEGO_ATIVA e AGENDADOR_ATIVO para reproduzir.", file=sys.stderr)
+        sys.exit(1)
+
+    registros = ler_captura(args.captura)
+
+    if args.comando == "preparar":
+        estado = ReplayService(CarteiraRepository()).preparar(registros, ao_progredir=print)
+        with open(args.estado, "w", encoding="utf-8") as f:
+            json.dump(estado, f)
+        print(f"{len(estado['chaves'])} carteiras preparadas.")
+        print("COTACAO_FIXAS=" + ",".join(f"{par}={v}" for par, v in estado["cotacoes"].items()))
+        return
+
+    resultado = asyncio.run(reproduzir(registros, _ler_json(args.estado), args))
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2)
+    imprimir_resultado(resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,31 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from api.routers.carteira_router import router as carteiras_router
+from api.routers.relatorio_router import router as relatorios_router
+from api.routers.cotacao_router import router as cotacoes_router
+from api.routers.saude_router import router as saude_router
+from api.services.saude_service import EstadoAplicacao, encerrar_recursos, iniciar_recursos
+from api.services.agendador_service import encerrar_agendador, iniciar_agendador
+from api.services.captura_service import CAPTURA_ATIVA, encerrar_captura, iniciar_captura
+from api.routers.captura import MiddlewareCaptura
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Engine, pool, catálogo e clientes HTTP nascem aqui, e não no import:
+    # importar api.main continua barato (testes, fork de workers).
+    app.state.estado = EstadoAplicacao()
+    await iniciar_recursos(app.state.estado)
+    iniciar_agendador()
+    iniciar_captura()
+    try:
+        yield
+    finally:
+        await encerrar_agendador()
+        await asyncio.to_thread(encerrar_captura)
+        await encerrar_recursos()
 
 
 def create_app() -> FastAPI:
@@ -7,9 +33,16 @@ def create_app() -> FastAPI:
         title="Carteira Digital API",
         version="1.0.0",
         description="API educacional de carteira digital com SQL puro e FastAPI.",
+        lifespan=lifespan,
     )
 
     app.include_router(carteiras_router)
+    app.include_router(relatorios_router)
+    app.include_router(cotacoes_router)
+    app.include_router(saude_router)
+
+    if CAPTURA_ATIVA:
+        app.add_middleware(MiddlewareCaptura)
 
     return app
 
@@ -19,5 +52,3 @@ app = create_app()
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Digital Wallet API!"}
-
-
@@ -3,6 +3,12 @@ from datetime import  datetime
 from pydantic import BaseModel, field_validator
 from decimal import Decimal
 
+from api.models.dinheiro import Dinheiro
+
+# Moedas com saldo criado junto com a carteira. A projeção RESUMO_CARTEIRA tem
+# colunas fixas para cada uma (ver sql/migracoes/V005__resumo_carteira.sql).
+MOEDAS_OBRIGATORIAS = ("BTC", "ETH", "SOL", "USD", "BRL")
+
 class CarteiraCriada(BaseModel):
     endereco_carteira: str
     chave_privada: str
@@ -18,16 +24,22 @@ class SaldoItem(BaseModel):
     id_moeda: Optional[int] = None
     codigo_moeda: str
     nome_moeda: Optional[str] = None
-    saldo: Decimal
+    saldo: Dinheiro
     data_atualizacao: Optional[datetime] = None
 
 class CarteiraSaldoResponse(BaseModel):
     endereco_carteira: str
     saldos: list[SaldoItem]
     
+class SaldosLoteInput(BaseModel):
+    """Consulta de saldos de várias carteiras de uma vez."""
+    enderecos: list[str]
+    incluir_status: bool = False
+    moeda_avaliacao: Optional[str] = None
+
 class MovimentoInput(BaseModel):
     codigo_moeda: str 
-    valor: Decimal
+    valor: Dinheiro
     chave_privada: Optional[str] = None
     
     @field_validator('chave_privada')
@@ -42,16 +54,36 @@ class MovimentoHistorico(BaseModel):
     endereco_carteira: str
     codigo_moeda: str
     tipo: Literal["DEPOSITO", "SAQUE"]
-    valor: Decimal
-    taxa_valor: Decimal
+    valor: Dinheiro
+    taxa_valor: Dinheiro
     data_hora: datetime
 
+class CotacaoInput(BaseModel):
+    """Modelo para a requisição de cotação firme."""
+    codigo_origem: str
+    codigo_destino: str
+    valor_origem: Optional[Dinheiro] = None
+
+class CotacaoFirme(BaseModel):
+    """Cotação congelada por um curto período, usada depois em /conversoes."""
+    id_cotacao: str
+    codigo_origem: str
+    codigo_destino: str
+    cotacao: Decimal
+    taxa_percentual: Decimal
+    valor_origem: Optional[Dinheiro] = None
+    valor_destino_estimado: Optional[Dinheiro] = None
+    fonte_cotacao: Literal["provedor", "ultima_conhecida"] = "provedor"
+    cotacao_obtida_em: Optional[datetime] = None
+    expira_em: datetime
+
 class ConversaoInput(BaseModel):
     """Modelo para a requisição de conversão."""
     codigo_origem: str
     codigo_destino: str
-    valor_origem: Decimal 
+    valor_origem: Dinheiro
     chave_privada: str
+    id_cotacao: Optional[str] = None
     
     @field_validator('chave_privada')
     @classmethod
@@ -64,7 +96,7 @@ class TransferenciaInput(BaseModel):
     """Modelo para a requisição de transferência."""
     endereco_destino: str
     codigo_moeda: str
-    valor: Decimal
+    valor: Dinheiro
     chave_privada_origem: str
     
     @field_validator('chave_privada_origem')
@@ -72,4 +104,45 @@ class TransferenciaInput(BaseModel):
     def limpar_chave_privada(cls, v):
         if v is not None:
             return v.strip() if isinstance(v, str) else v
-        return v
\ No newline at end of file
+        return v
+class AgendamentoInput(BaseModel):
+    """
+    Ordem permanente da carteira: transferência (endereco_destino) ou
+    conversão (codigo_destino), única ou recorrente a partir de 'inicio'.
+    """
+    tipo: Literal["TRANSFERENCIA", "CONVERSAO"]
+    codigo_moeda: str
+    valor: Dinheiro
+    endereco_destino: Optional[str] = None
+    codigo_destino: Optional[str] = None
+    periodicidade: Literal["UNICA", "DIARIA", "SEMANAL", "MENSAL"] = "UNICA"
+    execucoes_atrasadas: Literal["UMA", "TODAS"] = "UMA"
+    inicio: datetime
+    fim: Optional[datetime] = None
+    chave_privada: str
+
+    @field_validator('chave_privada')
+    @classmethod
+    def limpar_chave_privada(cls, v):
+        if v is not None:
+            return v.strip() if isinstance(v, str) else v
+        return v
+
+class Agendamento(BaseModel):
+    id_agendamento: str
+    endereco_carteira: str
+    tipo: str
+    codigo_moeda: str
+    valor: Dinheiro
+    endereco_destino: Optional[str] = None
+    codigo_destino: Optional[str] = None
+    periodicidade: str
+    execucoes_atrasadas: str
+    inicio: datetime
+    fim: Optional[datetime] = None
+    proxima_execucao: datetime
+    status: str
+    execucoes: int
+    falhas_consecutivas: int
+    ultima_execucao: Optional[datetime] = None
+    ultimo_erro: Optional[str] = None
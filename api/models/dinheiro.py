@@ -0,0 +1,288 @@
+"""
+Valores monetários em ponto fixo: inteiro de 64 bits escalado por 10^8.
+
+Um Dinheiro guarda a quantidade de unidades de 0.00000001 (a menor fração
+das colunas DECIMAL(18,8)), então soma, subtração e comparação são
+aritmética de inteiros, sem contexto nem arredondamento do Decimal.
+
+Regras de arredondamento:
+
+- Entrada (API, banco, Decimal/str/int): deve caber em 8 casas decimais.
+  Valores com mais casas são rejeitados, nunca arredondados em silêncio.
+- Taxas (valor x percentual): ARREDONDAMENTO_TAXA, meio para o par
+  (ROUND_HALF_EVEN), na 8ª casa.
+- Conversões (valor x cotação): ARREDONDAMENTO_CONVERSAO, truncado
+  (ROUND_DOWN): a carteira nunca recebe fração que não foi paga.
+- Avaliações (valor x cotação, só para exibição): ROUND_HALF_EVEN.
+
+Depois de arredondada a taxa, líquido = bruto - taxa fecha exatamente, e
+para_decimal() devolve o mesmo valor que a coluna armazena (ida e volta
+exata com o banco).
+"""
+from decimal import (
+    MAX_EMAX,
+    MAX_PREC,
+    MIN_EMIN,
+    ROUND_CEILING,
+    ROUND_DOWN,
+    ROUND_FLOOR,
+    ROUND_HALF_EVEN,
+    ROUND_HALF_UP,
+    ROUND_UP,
+    Context,
+    Decimal,
+)
+from functools import lru_cache
+from typing import Any, Tuple
+
+from pydantic_core import SchemaSerializer, core_schema
+
+CASAS_DECIMAIS = 8
+FATOR = 10 ** CASAS_DECIMAIS
+
+# Limites de um inteiro de 64 bits com sinal (cabe em np.int64 / BIGINT)
+MINIMO_UNIDADES = -(2 ** 63)
+MAXIMO_UNIDADES = 2 ** 63 - 1
+
+# Maior expoente ajustado de um valor que ainda pode caber em 64 bits
+# (MAXIMO_UNIDADES / FATOR ~ 9.2 x 10^10): acima disso nem vale converter
+_MAIOR_AJUSTADO = 10
+
+# Precisão ilimitada: o scaleb do de_decimal nunca arredonda o coeficiente
+_CONTEXTO_EXATO = Context(prec=MAX_PREC, Emax=MAX_EMAX, Emin=MIN_EMIN)
+
+ARREDONDAMENTO_TAXA = ROUND_HALF_EVEN
+ARREDONDAMENTO_CONVERSAO = ROUND_DOWN
+ARREDONDAMENTO_AVALIACAO = ROUND_HALF_EVEN
+
+
+@lru_cache(maxsize=1024)
+def _razao(fator: Decimal) -> Tuple[int, int]:
+    """
+    Fração exata (numerador, denominador) de um fator. Só para taxas e
+    cotações, que se repetem muito; saldos e valores não passam por aqui.
+    """
+    if not fator.is_finite():
+        raise ValueError(f"Fator inválido: {fator}")
+    return fator.as_integer_ratio()
+
+
+def _dividir(numerador: int, denominador: int, arredondamento: str) -> int:
+    """Divisão inteira (denominador > 0) com o modo de arredondamento do módulo decimal."""
+    negativo = numerador < 0
+    quociente, resto = divmod(-numerador if negativo else numerador, denominador)
+    if resto:
+        if arredondamento == ROUND_HALF_EVEN:
+            dobro = 2 * resto
+            if dobro > denominador or (dobro == denominador and quociente & 1):
+                quociente += 1
+        elif arredondamento == ROUND_HALF_UP:
+            if 2 * resto >= denominador:
+                quociente += 1
+        elif arredondamento == ROUND_UP:
+            quociente += 1
+        elif arredondamento == ROUND_CEILING:
+            if not negativo:
+                quociente += 1
+        elif arredondamento == ROUND_FLOOR:
+            if negativo:
+                quociente += 1
+        elif arredondamento != ROUND_DOWN:
+            raise ValueError(f"Modo de arredondamento não suportado: {arredondamento}")
+    return -quociente if negativo else quociente
+
+
+def formatar_unidades(unidades: int) -> str:
+    """
+    Notação fixa com 8 casas de uma quantidade de unidades de 10^-8, sem o
+    limite de 64 bits (ex.: somas de muitas carteiras).
+    """
+    # str(Decimal) daria "0E-8" para zero
+    if unidades < 0:
+        return f"-{-unidades // FATOR}.{-unidades % FATOR:08d}"
+    return f"{unidades // FATOR}.{unidades % FATOR:08d}"
+
+
+class Dinheiro:
+    """
+    Valor monetário com 8 casas decimais. Tratado como imutável: as operações
+    sempre devolvem um novo Dinheiro (não altere 'unidades').
+    """
+
+    __slots__ = ("unidades",)
+
+    def __init__(self, unidades: int = 0):
+        if not MINIMO_UNIDADES <= unidades <= MAXIMO_UNIDADES:
+            raise ValueError("Valor monetário fora do intervalo suportado.")
+        self.unidades = unidades
+
+    # --- conversões -------------------------------------------------------
+
+    @classmethod
+    def de_decimal(cls, valor: Decimal, arredondamento: str = None) -> "Dinheiro":
+        """
+        Sem arredondamento, exige que o valor caiba em 8 casas (ValueError
+        caso contrário); com ele, arredonda na 8ª casa pelo modo informado.
+        """
+        if not valor.is_finite():
+            raise ValueError("Valor monetário inválido.")
+        if valor and valor.adjusted() > _MAIOR_AJUSTADO:
+            raise ValueError("Valor monetário fora do intervalo suportado.")
+
+        # Só desloca a vírgula (exato) e confere, ou arredonda, o que sobrou de fração
+        escalado = valor.scaleb(CASAS_DECIMAIS, _CONTEXTO_EXATO)
+        if arredondamento is None:
+            unidades = int(escalado)
+            if unidades != escalado:
+                raise ValueError(f"O valor {valor} tem mais de {CASAS_DECIMAIS} casas decimais.")
+            return cls(unidades)
+        try:
+            return cls(int(escalado.to_integral_value(arredondamento, _CONTEXTO_EXATO)))
+        except TypeError:
+            raise ValueError(f"Modo de arredondamento não suportado: {arredondamento}")
+
+    @classmethod
+    def de_valor(cls, valor: Any) -> "Dinheiro":
+        """Converte a entrada da API ou do banco (Dinheiro, Decimal, int, str ou float)."""
+        if isinstance(valor, Dinheiro):
+            return valor
+        if isinstance(valor, bool):
+            raise ValueError("Valor monetário inválido.")
+        if isinstance(valor, int):
+            return cls(valor * FATOR)
+        if isinstance(valor, float):
+            # repr dá o decimal mais curto que representa o float (0.1 -> "0.1")
+            valor = repr(valor)
+        if isinstance(valor, str):
+            try:
+                valor = Decimal(valor.strip())
+            except ArithmeticError:
+                raise ValueError("Valor monetário inválido.")
+        if isinstance(valor, Decimal):
+            return cls.de_decimal(valor)
+        raise ValueError("Valor monetário inválido.")
+
+    def para_decimal(self) -> Decimal:
+        """Decimal com exatamente 8 casas, igual ao que a coluna DECIMAL(18,8) guarda."""
+        return Decimal(self.unidades).scaleb(-CASAS_DECIMAIS)
+
+    def __str__(self) -> str:
+        return formatar_unidades(self.unidades)
+
+    def __repr__(self) -> str:
+        return f"Dinheiro('{self}')"
+
+    def __float__(self) -> float:
+        return self.unidades / FATOR
+
+    # --- aritmética -------------------------------------------------------
+
+    def __add__(self, outro):
+        if isinstance(outro, Dinheiro):
+            return Dinheiro(self.unidades + outro.unidades)
+        return NotImplemented
+
+    def __radd__(self, outro):
+        # sum() começa em 0
+        if outro == 0 and not isinstance(outro, bool):
+            return self
+        return NotImplemented
+
+    def __sub__(self, outro):
+        if isinstance(outro, Dinheiro):
+            return Dinheiro(self.unidades - outro.unidades)
+        return NotImplemented
+
+    def __neg__(self):
+        return Dinheiro(-self.unidades)
+
+    def __abs__(self):
+        return Dinheiro(abs(self.unidades))
+
+    def __mul__(self, outro):
+        # Só por inteiro (exato); por Decimal, use multiplicar() e escolha o arredondamento
+        if isinstance(outro, int) and not isinstance(outro, bool):
+            return Dinheiro(self.unidades * outro)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def multiplicar(self, fator: Decimal, arredondamento: str) -> "Dinheiro":
+        """Valor x fator (percentual, cotação), arredondado na 8ª casa."""
+        numerador, denominador = _razao(fator)
+        return Dinheiro(_dividir(self.unidades * numerador, denominador, arredondamento))
+
+    def percentual(self, taxa_percentual: Decimal) -> "Dinheiro":
+        """Taxa sobre o valor, com a regra de arredondamento das taxas (meio para o par)."""
+        numerador, denominador = _razao(taxa_percentual)
+        quociente, resto = divmod(self.unidades * numerador, denominador)
+        # divmod arredonda para baixo; corrige para meio-para-o-par (vale para negativos também)
+        dobro = 2 * resto
+        if dobro > denominador or (dobro == denominador and quociente & 1):
+            quociente += 1
+        return Dinheiro(quociente)
+
+    # --- comparação -------------------------------------------------------
+
+    def __eq__(self, outro):
+        if isinstance(outro, Dinheiro):
+            return self.unidades == outro.unidades
+        return NotImplemented
+
+    def __lt__(self, outro):
+        if isinstance(outro, Dinheiro):
+            return self.unidades < outro.unidades
+        return NotImplemented
+
+    def __le__(self, outro):
+        if isinstance(outro, Dinheiro):
+            return self.unidades <= outro.unidades
+        return NotImplemented
+
+    def __gt__(self, outro):
+        if isinstance(outro, Dinheiro):
+            return self.unidades > outro.unidades
+        return NotImplemented
+
+    def __ge__(self, outro):
+        if isinstance(outro, Dinheiro):
+            return self.unidades >= outro.unidades
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.unidades)
+
+    def __bool__(self):
+        return self.unidades != 0
+
+    def __reduce__(self):
+        return (Dinheiro, (self.unidades,))
+
+    # --- Pydantic ---------------------------------------------------------
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, origem, handler):
+        # Aceita número ou string na entrada; no JSON sai como string com 8 casas
+        return core_schema.no_info_plain_validator_function(
+            cls.de_valor,
+            serialization=core_schema.plain_serializer_function_ser_schema(str, when_used="json"),
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        return {
+            "anyOf": [
+                {"type": "string", "pattern": r"^-?\d+(\.\d{1,8})?$"},
+                {"type": "number"},
+            ],
+            "examples": ["10.50000000"],
+        }
+
+
+# Permite serializar Dinheiro dentro de dicts sem tipo (response_model=dict,
+# Dict[str, Any]): o Pydantic procura __pydantic_serializer__ em objetos desconhecidos.
+Dinheiro.__pydantic_serializer__ = SchemaSerializer(core_schema.any_schema(
+    serialization=core_schema.plain_serializer_function_ser_schema(str, when_used="json"),
+))
+
+ZERO = Dinheiro(0)
@@ -0,0 +1,50 @@
+"""
+Limites de uso por carteira: valor e quantidade de saques/transferências numa
+janela móvel (ex.: 24 h), por moeda.
+
+O uso é guardado em intervalos fixos de USO_LIMITE_BUCKET_MINUTOS (tabela
+USO_LIMITE). A janela é aproximada pelos intervalos que a cobrem: o atual
+(parcial) e os anteriores até completar a janela, então uma movimentação deixa
+de contar entre (janela - intervalo) e a janela depois de feita. A verificação
+soma no máximo janela / intervalo linhas (96 para 24 h em intervalos de 15 min).
+"""
+import os
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from api.models.dinheiro import Dinheiro
+
+TAMANHO_BUCKET_MINUTOS = int(os.getenv("USO_LIMITE_BUCKET_MINUTOS", "15"))
+if TAMANHO_BUCKET_MINUTOS <= 0 or 60 % TAMANHO_BUCKET_MINUTOS:
+    raise RuntimeError("USO_LIMITE_BUCKET_MINUTOS deve dividir 60 (ex.: 5, 10, 15, 30, 60).")
+TAMANHO_BUCKET = timedelta(minutes=TAMANHO_BUCKET_MINUTOS)
+
+OPERACOES_LIMITADAS = ("SAQUE", "TRANSFERENCIA")
+
+
+class LimiteExcedidoError(ValueError):
+    """
+    Limite de uso da carteira atingido (janela de valor/quantidade ou taxa de
+    requisições). 'tentar_em_segundos', quando informado, vai no Retry-After.
+    """
+
+    def __init__(self, mensagem: str, tentar_em_segundos: Optional[int] = None):
+        super().__init__(mensagem)
+        self.tentar_em_segundos = tentar_em_segundos
+
+
+class LimiteJanela(NamedTuple):
+    """Limite de uma operação numa moeda; None = sem limite naquela dimensão."""
+    janela: timedelta
+    valor_maximo: Optional[Dinheiro] = None
+    operacoes_maximas: Optional[int] = None
+
+
+def inicio_do_bucket(data_hora: datetime) -> datetime:
+    return data_hora.replace(minute=data_hora.minute - data_hora.minute % TAMANHO_BUCKET_MINUTOS,
+                             second=0, microsecond=0)
+
+
+def inicio_da_janela(data_hora: datetime, janela: timedelta) -> datetime:
+    """Primeiro intervalo que conta na janela terminada em data_hora."""
+    return inicio_do_bucket(data_hora) - janela + TAMANHO_BUCKET
@@ -0,0 +1,345 @@
+import hashlib
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.persistence.db import BASE_DIR
+
+# pyarrow (em requirements.txt; necessário quando há movimentações arquivadas) é
+# pesado: é importado sob demanda para o import da API continuar barato. O
+# numpy, usado só nos índices dos segmentos, também é importado nesses pontos.
+PYARROW_DISPONIVEL = importlib.util.find_spec("pyarrow") is not None
+
+DIRETORIO_ARQUIVO = Path(os.getenv("ARQUIVO_MOVIMENTOS_DIR", str(BASE_DIR / "arquivo")))
+
+# Grupos de linhas pequenos: a leitura por carteira só descomprime os grupos
+# que contêm as linhas dela.
+LINHAS_POR_GRUPO = 16_384
+SEGMENTOS_EM_CACHE = 32
+
+COLUNAS_ARQUIVO = [
+    "data_hora",
+    "ordem",
+    "id_movimento",
+    "tipo",
+    "endereco_carteira",
+    "endereco_contraparte",
+    "id_moeda",
+    "codigo_moeda",
+    "valor",
+    "id_moeda_destino",
+    "codigo_moeda_destino",
+    "valor_destino",
+    "taxa_percentual",
+    "taxa_valor",
+    "cotacao_utilizada",
+]
+
+# Colunas devolvidas nas leituras (as mesmas do extrato)
+COLUNAS_LEITURA = [
+    "data_hora",
+    "ordem",
+    "id_movimento",
+    "tipo",
+    "endereco_carteira",
+    "endereco_contraparte",
+    "codigo_moeda",
+    "valor",
+    "codigo_moeda_destino",
+    "valor_destino",
+    "taxa_valor",
+    "cotacao_utilizada",
+]
+
+
+def exigir_pyarrow():
+    """Importa e retorna o pyarrow; ValueError se não estiver instalado."""
+    if not PYARROW_DISPONIVEL:
+        raise ValueError("O arquivo de movimentações requer o pacote pyarrow.")
+    import pyarrow
+    import pyarrow.parquet
+    return pyarrow
+
+
+def _esquema():
+    pyarrow = exigir_pyarrow()
+    decimal = pyarrow.decimal128(18, 8)
+    return pyarrow.schema([
+        ("data_hora", pyarrow.timestamp("s")),
+        ("ordem", pyarrow.int8()),
+        ("id_movimento", pyarrow.int64()),
+        ("tipo", pyarrow.string()),
+        ("endereco_carteira", pyarrow.string()),
+        ("endereco_contraparte", pyarrow.string()),
+        ("id_moeda", pyarrow.int16()),
+        ("codigo_moeda", pyarrow.string()),
+        ("valor", decimal),
+        ("id_moeda_destino", pyarrow.int16()),
+        ("codigo_moeda_destino", pyarrow.string()),
+        ("valor_destino", decimal),
+        ("taxa_percentual", decimal),
+        ("taxa_valor", decimal),
+        ("cotacao_utilizada", decimal),
+    ])
+
+
+def _sha256(caminho: Path) -> str:
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _publicar(temporario: Path, final: Path):
+    """fsync + rename atômico; o arquivo final fica somente leitura."""
+    with open(temporario, "rb") as f:
+        os.fsync(f.fileno())
+    os.chmod(temporario, 0o444)
+    os.replace(temporario, final)
+
+
+class EscritorSegmento:
+    """
+    Grava um segmento: as movimentações em ordem de (data_hora, ordem, id) num
+    Parquet comprimido (zstd) e, ao lado, o índice por carteira
+    (endereco_carteira, linha), ordenado por carteira. Cada transferência entra
+    no índice das duas carteiras.
+    """
+
+    def __init__(self, nome: str, diretorio: Path = DIRETORIO_ARQUIVO, substituir_orfao: bool = False):
+        pyarrow = exigir_pyarrow()
+        diretorio.mkdir(parents=True, exist_ok=True)
+        self.arquivo = diretorio / f"{nome}.parquet"
+        self.indice = diretorio / f"{nome}.indice.parquet"
+        if self.arquivo.exists():
+            if not substituir_orfao:
+                raise ValueError(f"Segmento já existe: {self.arquivo}")
+            # Publicado por uma execução interrompida antes de registrar o segmento
+            self.arquivo.unlink()
+            if self.indice.exists():
+                self.indice.unlink()
+
+        self._esquema = _esquema()
+        self._temporario = self.arquivo.with_suffix(".parquet.tmp")
+        self._escritor = pyarrow.parquet.ParquetWriter(self._temporario, self._esquema, compression="zstd")
+        self._indice_enderecos: List[str] = []
+        self._indice_linhas: List[int] = []
+        self.linhas = 0
+
+    def adicionar(self, movimentos: List[Dict[str, Any]]):
+        if not movimentos:
+            return
+        pyarrow = exigir_pyarrow()
+
+        for i, m in enumerate(movimentos, start=self.linhas):
+            self._indice_enderecos.append(m["endereco_carteira"])
+            self._indice_linhas.append(i)
+            contraparte = m["endereco_contraparte"]
+            if contraparte and contraparte != m["endereco_carteira"]:
+                self._indice_enderecos.append(contraparte)
+                self._indice_linhas.append(i)
+
+        colunas = {c: [m[c] for m in movimentos] for c in COLUNAS_ARQUIVO}
+        self._escritor.write_table(pyarrow.table(colunas, schema=self._esquema), row_group_size=LINHAS_POR_GRUPO)
+        self.linhas += len(movimentos)
+
+    def finalizar(self) -> Dict[str, Any]:
+        pyarrow = exigir_pyarrow()
+        import numpy as np
+        self._escritor.close()
+
+        enderecos = np.array(self._indice_enderecos, dtype=object)
+        linhas = np.array(self._indice_linhas, dtype=np.int64)
+        ordem = np.lexsort((linhas, enderecos))
+        temporario_indice = self.indice.with_suffix(".parquet.tmp")
+        pyarrow.parquet.write_table(
+            pyarrow.table({"endereco_carteira": enderecos[ordem].tolist(), "linha": linhas[ordem]}),
+            temporario_indice,
+            compression="zstd",
+        )
+
+        _publicar(temporario_indice, self.indice)
+        _publicar(self._temporario, self.arquivo)
+
+        return {
+            "arquivo": self.arquivo.name,
+            "indice": self.indice.name,
+            "linhas": self.linhas,
+            "checksum": _sha256(self.arquivo),
+        }
+
+    def descartar(self):
+        self._escritor.close()
+        for caminho in (self._temporario, self.indice.with_suffix(".parquet.tmp")):
+            if caminho.exists():
+                caminho.unlink()
+
+
+class LeitorSegmento:
+    """Leitura de um segmento (imutável), por período ou por carteira."""
+
+    def __init__(self, arquivo: Path, indice: Path):
+        pyarrow = exigir_pyarrow()
+        import numpy as np
+        self._parquet = pyarrow.parquet.ParquetFile(arquivo)
+        self._indice = indice
+        self._enderecos: Optional["np.ndarray"] = None
+        self._linhas_indice: Optional["np.ndarray"] = None
+        self._lock = threading.Lock()
+
+        metadados = self._parquet.metadata
+        tamanhos = [metadados.row_group(i).num_rows for i in range(metadados.num_row_groups)]
+        self._fim_grupos = np.cumsum(tamanhos, dtype=np.int64)
+        coluna = self._parquet.schema_arrow.get_field_index("data_hora")
+        self._intervalos_grupos = [
+            (metadados.row_group(i).column(coluna).statistics.min,
+             metadados.row_group(i).column(coluna).statistics.max)
+            for i in range(metadados.num_row_groups)
+        ]
+
+    def _carregar_indice(self):
+        with self._lock:
+            if self._enderecos is None:
+                import numpy as np
+                tabela = exigir_pyarrow().parquet.read_table(self._indice)
+                self._linhas_indice = tabela.column("linha").to_numpy()
+                self._enderecos = np.array(tabela.column("endereco_carteira").to_pylist(), dtype=object)
+
+    @staticmethod
+    def _filtrar(linhas: List[Dict[str, Any]], inicio: datetime, fim: datetime,
+                 cursor: Tuple[datetime, int, int], limite: int) -> List[Dict[str, Any]]:
+        resultado = []
+        for l in linhas:
+            if l["data_hora"] < inicio or l["data_hora"] >= fim:
+                continue
+            if (l["data_hora"], l["ordem"], l["id_movimento"]) <= cursor:
+                continue
+            resultado.append(l)
+            if len(resultado) >= limite:
+                break
+        return resultado
+
+    def ler_periodo(self, inicio: datetime, fim: datetime, cursor: Tuple[datetime, int, int],
+                    limite: int) -> List[Dict[str, Any]]:
+        """Linhas em [inicio, fim) após o cursor, pulando grupos pelas estatísticas de data_hora."""
+        piso = max(inicio, cursor[0])
+        resultado: List[Dict[str, Any]] = []
+
+        for grupo, (minimo, maximo) in enumerate(self._intervalos_grupos):
+            if maximo < piso:
+                continue
+            if minimo >= fim:
+                break
+            linhas = self._parquet.read_row_group(grupo, columns=COLUNAS_LEITURA).to_pylist()
+            resultado.extend(self._filtrar(linhas, inicio, fim, cursor, limite - len(resultado)))
+            if len(resultado) >= limite:
+                break
+
+        return resultado
+
+    def ler_carteira(self, endereco_carteira: str, inicio: datetime, fim: datetime,
+                     cursor: Tuple[datetime, int, int], limite: int) -> List[Dict[str, Any]]:
+        """Linhas da carteira via índice: lê só os grupos que contêm as linhas dela."""
+        import numpy as np
+        self._carregar_indice()
+        de = np.searchsorted(self._enderecos, endereco_carteira, side="left")
+        ate = np.searchsorted(self._enderecos, endereco_carteira, side="right")
+        posicoes = self._linhas_indice[de:ate]
+        if len(posicoes) == 0:
+            return []
+
+        grupos = np.searchsorted(self._fim_grupos, posicoes, side="right")
+        piso = max(inicio, cursor[0])
+        resultado: List[Dict[str, Any]] = []
+
+        for grupo in np.unique(grupos):
+            minimo, maximo = self._intervalos_grupos[grupo]
+            if maximo < piso:
+                continue
+            if minimo >= fim:
+                break
+            inicio_grupo = self._fim_grupos[grupo - 1] if grupo > 0 else 0
+            locais = (posicoes[grupos == grupo] - inicio_grupo).tolist()
+            linhas = self._parquet.read_row_group(int(grupo), columns=COLUNAS_LEITURA).take(locais).to_pylist()
+            resultado.extend(self._filtrar(linhas, inicio, fim, cursor, limite - len(resultado)))
+            if len(resultado) >= limite:
+                break
+
+        return resultado
+
+
+class ArquivoMovimentos:
+    """
+    Acesso aos segmentos arquivados, com cache (LRU) dos leitores abertos:
+    os arquivos nunca mudam depois de publicados.
+    """
+
+    def __init__(self, diretorio: Path = DIRETORIO_ARQUIVO, tamanho_cache: int = SEGMENTOS_EM_CACHE):
+        self.diretorio = diretorio
+        self.tamanho_cache = tamanho_cache
+        self._leitores: "OrderedDict[str, LeitorSegmento]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def leitor(self, segmento: Dict[str, Any]) -> LeitorSegmento:
+        chave = segmento["arquivo"]
+        with self._lock:
+            leitor = self._leitores.get(chave)
+            if leitor is not None:
+                self._leitores.move_to_end(chave)
+                return leitor
+
+        leitor = LeitorSegmento(self.diretorio / segmento["arquivo"], self.diretorio / segmento["indice"])
+        with self._lock:
+            self._leitores[chave] = leitor
+            while len(self._leitores) > self.tamanho_cache:
+                self._leitores.popitem(last=False)
+        return leitor
+
+    def buscar_pagina(self, segmentos: List[Dict[str, Any]], endereco_carteira: Optional[str],
+                      inicio: datetime, fim: datetime, cursor: Tuple[datetime, int, int],
+                      limite: int) -> List[Dict[str, Any]]:
+        """
+        Página do extrato arquivado, em ordem de (data_hora, ordem, id_movimento).
+        Os segmentos cobrem meses disjuntos, então basta percorrê-los em ordem.
+        """
+        resultado: List[Dict[str, Any]] = []
+        for segmento in segmentos:
+            if segmento["fim"] <= max(inicio, cursor[0]) or segmento["inicio"] >= fim:
+                continue
+            leitor = self.leitor(segmento)
+            restante = limite - len(resultado)
+            if endereco_carteira:
+                resultado.extend(leitor.ler_carteira(endereco_carteira, inicio, fim, cursor, restante))
+            else:
+                resultado.extend(leitor.ler_periodo(inicio, fim, cursor, restante))
+            if len(resultado) >= limite:
+                break
+        return resultado
+
+    def linhas_para_remover(self, segmento: Dict[str, Any]) -> Dict[int, List[int]]:
+        """Ids arquivados no segmento, por ordem (tabela de origem)."""
+        import numpy as np
+        tabela = exigir_pyarrow().parquet.read_table(self.diretorio / segmento["arquivo"], columns=["ordem", "id_movimento"])
+        ordens = tabela.column("ordem").to_numpy()
+        ids = tabela.column("id_movimento").to_numpy()
+        return {int(o): ids[ordens == o].tolist() for o in np.unique(ordens)}
+
+
+arquivo_movimentos = ArquivoMovimentos()
+
+# Cada shard arquiva no seu subdiretório (o shard 0 continua na raiz)
+_arquivos_por_shard: Dict[int, ArquivoMovimentos] = {0: arquivo_movimentos}
+_arquivos_lock = threading.Lock()
+
+
+def arquivo_do_shard(shard: int) -> ArquivoMovimentos:
+    with _arquivos_lock:
+        arquivo = _arquivos_por_shard.get(shard)
+        if arquivo is None:
+            arquivo = _arquivos_por_shard[shard] = ArquivoMovimentos(DIRETORIO_ARQUIVO / f"shard_{shard}")
+        return arquivo
@@ -0,0 +1,430 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, cada processo fica com o cache local
+    fcntl = None
+
+from dotenv import load_dotenv
+
+from api.persistence.db import ENV_PATH
+from api.models.dinheiro import Dinheiro
+
+# Namespaces do cache. Cada um tem um contador de geração no cabeçalho:
+# incrementá-lo invalida de uma vez todas as entradas do namespace em todos
+# os processos que mapeiam o mesmo arquivo.
+NS_MOEDAS = 1
+NS_COTACOES = 2
+NS_COTACOES_FIRMES = 3
+NS_CARTEIRAS = 4
+MAX_NAMESPACES = 64
+
+NAMESPACES = {
+    "moedas": NS_MOEDAS,
+    "cotacoes": NS_COTACOES,
+    "cotacoes_firmes": NS_COTACOES_FIRMES,
+    "carteiras": NS_CARTEIRAS,
+}
+
+CACHE_HABILITADO = os.getenv("CACHE_COMPARTILHADO", "1") != "0"
+SLOTS_PADRAO = int(os.getenv("CACHE_COMPARTILHADO_SLOTS", "16384"))
+TAMANHO_SLOT_PADRAO = int(os.getenv("CACHE_COMPARTILHADO_TAMANHO_SLOT", "512"))
+
+# Quantos slots consecutivos uma chave pode ocupar (sondagem linear limitada).
+# Com todos ocupados, a gravação substitui a entrada mais antiga: é um cache.
+SONDAGENS = 8
+TENTATIVAS_LEITURA = 16
+
+MAGICO = b"CDCACHE1"
+TAMANHO_CABECALHO = 4096
+_CABECALHO = struct.Struct("<8sIIQ")          # mágico, slots, tamanho do slot, última versão
+_OFFSET_VERSAO = 16
+_OFFSET_GERACOES = 64
+_U64 = struct.Struct("<Q")
+# Slot: seq (Q) + hash, versão, expira_em (epoch), geração, namespace, tamanho da chave e do valor
+_SLOT = struct.Struct("<QQQdIHHI")
+_INICIO_DADOS = 48
+
+
+def _codificar(valor: Any) -> bytes:
+    def padrao(obj):
+        if isinstance(obj, Dinheiro):
+            return {"$m": obj.unidades}
+        if isinstance(obj, Decimal):
+            return {"$d": str(obj)}
+        if isinstance(obj, datetime):
+            return {"$t": obj.isoformat()}
+        raise TypeError(f"Tipo não suportado no cache compartilhado: {type(obj).__name__}")
+
+    return json.dumps(valor, default=padrao, separators=(",", ":")).encode("utf-8")
+
+
+def _decodificar(dados: bytes) -> Any:
+    def gancho(obj):
+        if len(obj) == 1:
+            if "$m" in obj:
+                return Dinheiro(obj["$m"])
+            if "$d" in obj:
+                return Decimal(obj["$d"])
+            if "$t" in obj:
+                return datetime.fromisoformat(obj["$t"])
+        return obj
+
+    return json.loads(dados, object_hook=gancho)
+
+
+def _hash_chave(namespace: int, chave: bytes) -> int:
+    digest = hashlib.blake2b(chave, digest_size=8, person=namespace.to_bytes(2, "little")).digest()
+    # 0 marca slot vazio
+    return int.from_bytes(digest, "little") or 1
+
+
+class CacheLocal:
+    """
+    Mesma interface do CacheCompartilhado, em memória do processo. Usado quando
+    o cache compartilhado está desabilitado ou não pode ser aberto.
+    """
+
+    compartilhado = False
+
+    def __init__(self):
+        self._entradas: Dict[Tuple[int, str], Tuple[int, int, float, Any]] = {}
+        self._geracoes: Dict[int, int] = {}
+        self._versao = 0
+        self._lock = threading.Lock()
+
+    def obter(self, namespace: int, chave: str) -> Optional[Tuple[Any, int]]:
+        with self._lock:
+            return self._valida(namespace, chave)
+
+    def _valida(self, namespace: int, chave: str) -> Optional[Tuple[Any, int]]:
+        item = self._entradas.get((namespace, chave))
+        if item is None:
+            return None
+        versao, geracao, expira_em, valor = item
+        if geracao != self._geracoes.get(namespace, 0) or (expira_em and expira_em <= time.time()):
+            del self._entradas[(namespace, chave)]
+            return None
+        return _decodificar(valor), versao
+
+    def gravar(self, namespace: int, chave: str, valor: Any, ttl: Optional[float] = None,
+               se_ausente: bool = False) -> Optional[int]:
+        dados = _codificar(valor)
+        with self._lock:
+            if se_ausente and self._valida(namespace, chave) is not None:
+                return None
+            self._versao += 1
+            expira_em = time.time() + ttl if ttl else 0.0
+            self._entradas[(namespace, chave)] = (self._versao, self._geracoes.get(namespace, 0), expira_em, dados)
+            return self._versao
+
+    def tomar(self, namespace: int, chave: str) -> Optional[Any]:
+        with self._lock:
+            item = self._valida(namespace, chave)
+            self._entradas.pop((namespace, chave), None)
+        return item[0] if item else None
+
+    def remover(self, namespace: int, chave: str) -> bool:
+        with self._lock:
+            return self._entradas.pop((namespace, chave), None) is not None
+
+    def invalidar_namespace(self, namespace: int) -> int:
+        with self._lock:
+            self._geracoes[namespace] = self._geracoes.get(namespace, 0) + 1
+            return self._geracoes[namespace]
+
+    def geracao(self, namespace: int) -> int:
+        return self._geracoes.get(namespace, 0)
+
+
+class CacheCompartilhado:
+    """
+    Tabela hash de tamanho fixo num arquivo mapeado em memória (por padrão em
+    /dev/shm), lida e escrita por todos os workers do mesmo host.
+
+    - Cada slot tem um contador de sequência (seqlock): o escritor o deixa
+      ímpar durante a escrita e par ao terminar; o leitor copia o slot sem
+      lock e repete a leitura se o contador mudou no meio. Leituras não
+      bloqueiam e nunca veem uma entrada pela metade.
+    - Escritas são serializadas entre processos por flock no próprio arquivo
+      (e por um lock entre threads do mesmo processo).
+    - Toda gravação recebe uma versão crescente do cabeçalho; entradas têm TTL
+      opcional e pertencem a uma geração do namespace. Invalidar um namespace
+      incrementa a geração, o que vale imediatamente para todos os processos.
+
+    Os valores são serializados em JSON (com Decimal, Dinheiro e datetime); valores que
+    não cabem no slot simplesmente não são guardados.
+    """
+
+    compartilhado = True
+
+    def __init__(self, caminho: str, slots: int = SLOTS_PADRAO, tamanho_slot: int = TAMANHO_SLOT_PADRAO):
+        if fcntl is None:
+            raise OSError("Cache compartilhado requer fcntl (POSIX).")
+        if tamanho_slot <= _INICIO_DADOS or tamanho_slot % 8:
+            raise ValueError("Tamanho de slot inválido para o cache compartilhado.")
+
+        self.caminho = caminho
+        self.slots = slots
+        self.tamanho_slot = tamanho_slot
+        self._lock = threading.Lock()
+        self._fd_trava: Optional[int] = None
+        self._pid_trava: Optional[int] = None
+        self._mm = self._mapear()
+
+    def _mapear(self) -> mmap.mmap:
+        tamanho = TAMANHO_CABECALHO + self.slots * self.tamanho_slot
+        fd = os.open(self.caminho, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            info = os.fstat(fd)
+            # O arquivo guarda hashes de chaves e cotações: só serve se for
+            # nosso e inacessível a outros usuários
+            if info.st_uid != os.getuid() or info.st_mode & 0o077:
+                raise PermissionError(f"Arquivo de cache {self.caminho} com dono ou permissões inesperados.")
+
+            if info.st_size == 0:
+                os.ftruncate(fd, tamanho)
+                mm = mmap.mmap(fd, tamanho)
+                _CABECALHO.pack_into(mm, 0, MAGICO, self.slots, self.tamanho_slot, 0)
+            else:
+                mm = mmap.mmap(fd, info.st_size)
+                magico, slots, tamanho_slot, _ = _CABECALHO.unpack_from(mm, 0)
+                if magico != MAGICO or (slots, tamanho_slot) != (self.slots, self.tamanho_slot):
+                    mm.close()
+                    raise ValueError(
+                        f"Arquivo de cache {self.caminho} com layout diferente "
+                        f"({slots} slots de {tamanho_slot} bytes); remova-o com a API parada."
+                    )
+            return mm
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    # ---------------------------------------------------------
+    #  Travas
+    # ---------------------------------------------------------
+
+    def _travar(self):
+        self._lock.acquire()
+        # flock vale por descritor aberto, que o fork compartilha com o pai:
+        # cada processo abre o seu
+        if self._pid_trava != os.getpid():
+            self._fd_trava = os.open(self.caminho, os.O_RDWR)
+            self._pid_trava = os.getpid()
+        fcntl.flock(self._fd_trava, fcntl.LOCK_EX)
+
+    def _destravar(self):
+        fcntl.flock(self._fd_trava, fcntl.LOCK_UN)
+        self._lock.release()
+
+    # ---------------------------------------------------------
+    #  Slots
+    # ---------------------------------------------------------
+
+    def _offset(self, indice: int) -> int:
+        return TAMANHO_CABECALHO + indice * self.tamanho_slot
+
+    def _sondagem(self, hash_chave: int):
+        inicio = hash_chave % self.slots
+        for i in range(min(SONDAGENS, self.slots)):
+            yield self._offset((inicio + i) % self.slots)
+
+    def _ler_slot(self, offset: int) -> Optional[tuple]:
+        """Cópia consistente do slot (seqlock). None se não conseguiu ler."""
+        mm = self._mm
+        for _ in range(TENTATIVAS_LEITURA):
+            seq = _U64.unpack_from(mm, offset)[0]
+            if seq & 1:
+                continue
+            bruto = mm[offset:offset + self.tamanho_slot]
+            if _U64.unpack_from(mm, offset)[0] == seq:
+                return _SLOT.unpack_from(bruto, 0) + (bruto,)
+        return None
+
+    def _escrever_slot(self, offset: int, campos: tuple, dados: bytes):
+        """Escreve o slot com o seqlock (deve ser chamado com a trava)."""
+        mm = self._mm
+        seq = _U64.unpack_from(mm, offset)[0]
+        _U64.pack_into(mm, offset, seq + 1)
+        _SLOT.pack_into(mm, offset, seq + 1, *campos)
+        mm[offset + _INICIO_DADOS:offset + _INICIO_DADOS + len(dados)] = dados
+        _U64.pack_into(mm, offset, seq + 2)
+
+    def _localizar(self, namespace: int, chave: bytes, hash_chave: int):
+        """Offset e cópia do slot com a chave, ou (None, None)."""
+        for offset in self._sondagem(hash_chave):
+            slot = self._ler_slot(offset)
+            if slot is None:
+                continue
+            _, h, _, _, _, ns, tam_chave, _, bruto = slot
+            if h == hash_chave and ns == namespace and bruto[_INICIO_DADOS:_INICIO_DADOS + tam_chave] == chave:
+                return offset, slot
+        return None, None
+
+    def _valor_vigente(self, namespace: int, slot: tuple) -> Optional[Tuple[Any, int]]:
+        _, _, versao, expira_em, geracao, _, tam_chave, tam_valor, bruto = slot
+        if geracao != self.geracao(namespace) or (expira_em and expira_em <= time.time()):
+            return None
+        inicio = _INICIO_DADOS + tam_chave
+        try:
+            return _decodificar(bruto[inicio:inicio + tam_valor]), versao
+        except ValueError:
+            return None
+
+    # ---------------------------------------------------------
+    #  Interface
+    # ---------------------------------------------------------
+
+    def geracao(self, namespace: int) -> int:
+        return _U64.unpack_from(self._mm, _OFFSET_GERACOES + namespace * 8)[0]
+
+    def obter(self, namespace: int, chave: str) -> Optional[Tuple[Any, int]]:
+        """(valor, versão) da entrada vigente, ou None. Não usa trava."""
+        chave_bytes = chave.encode("utf-8")
+        _, slot = self._localizar(namespace, chave_bytes, _hash_chave(namespace, chave_bytes))
+        return self._valor_vigente(namespace, slot) if slot else None
+
+    def gravar(self, namespace: int, chave: str, valor: Any, ttl: Optional[float] = None,
+               se_ausente: bool = False) -> Optional[int]:
+        """
+        Grava (ou substitui) a entrada e retorna a versão atribuída. Retorna
+        None se chave + valor não couberem no slot ou, com se_ausente, se já
+        houver entrada vigente para a chave (a verificação e a gravação são
+        atômicas entre os processos).
+        """
+        chave_bytes = chave.encode("utf-8")
+        dados = _codificar(valor)
+        if _INICIO_DADOS + len(chave_bytes) + len(dados) > self.tamanho_slot:
+            return None
+
+        hash_chave = _hash_chave(namespace, chave_bytes)
+        agora = time.time()
+
+        self._travar()
+        try:
+            offset, slot = self._localizar(namespace, chave_bytes, hash_chave)
+            if se_ausente and slot is not None and self._valor_vigente(namespace, slot) is not None:
+                return None
+            if offset is None:
+                offset = self._escolher_slot(hash_chave, agora)
+
+            versao = _U64.unpack_from(self._mm, _OFFSET_VERSAO)[0] + 1
+            _U64.pack_into(self._mm, _OFFSET_VERSAO, versao)
+
+            campos = (hash_chave, versao, agora + ttl if ttl else 0.0, self.geracao(namespace),
+                      namespace, len(chave_bytes), len(dados))
+            self._escrever_slot(offset, campos, chave_bytes + dados)
+            return versao
+        finally:
+            self._destravar()
+
+    def _escolher_slot(self, hash_chave: int, agora: float) -> int:
+        """Slot livre (vazio, expirado ou de geração antiga) ou, na falta, o mais antigo."""
+        mais_antigo, menor_versao = None, None
+        for offset in self._sondagem(hash_chave):
+            _, h, versao, expira_em, geracao, ns, *_ = _SLOT.unpack_from(self._mm, offset)
+            if h == 0 or (expira_em and expira_em <= agora) or geracao != self.geracao(ns):
+                return offset
+            if menor_versao is None or versao < menor_versao:
+                mais_antigo, menor_versao = offset, versao
+        return mais_antigo
+
+    def _limpar_slot(self, offset: int):
+        self._escrever_slot(offset, (0, 0, 0.0, 0, 0, 0, 0), b"")
+
+    def tomar(self, namespace: int, chave: str) -> Optional[Any]:
+        """Lê e remove a entrada atomicamente (uso único entre todos os processos)."""
+        chave_bytes = chave.encode("utf-8")
+        hash_chave = _hash_chave(namespace, chave_bytes)
+
+        self._travar()
+        try:
+            offset, slot = self._localizar(namespace, chave_bytes, hash_chave)
+            if offset is None:
+                return None
+            item = self._valor_vigente(namespace, slot)
+            self._limpar_slot(offset)
+        finally:
+            self._destravar()
+        return item[0] if item else None
+
+    def remover(self, namespace: int, chave: str) -> bool:
+        chave_bytes = chave.encode("utf-8")
+        hash_chave = _hash_chave(namespace, chave_bytes)
+
+        self._travar()
+        try:
+            offset, _ = self._localizar(namespace, chave_bytes, hash_chave)
+            if offset is None:
+                return False
+            self._limpar_slot(offset)
+            return True
+        finally:
+            self._destravar()
+
+    def invalidar_namespace(self, namespace: int) -> int:
+        """Invalida todas as entradas do namespace em todos os processos."""
+        self._travar()
+        try:
+            geracao = self.geracao(namespace) + 1
+            _U64.pack_into(self._mm, _OFFSET_GERACOES + namespace * 8, geracao)
+            return geracao
+        finally:
+            self._destravar()
+
+
+def caminho_padrao() -> str:
+    """
+    Um arquivo por banco (host, porta e nome), para APIs de bancos diferentes
+    no mesmo host não compartilharem entradas.
+    """
+    caminho = os.getenv("CACHE_COMPARTILHADO_ARQUIVO")
+    if caminho:
+        return caminho
+
+    load_dotenv(ENV_PATH)
+    banco = f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', '')}"
+    sufixo = hashlib.sha256(banco.encode("utf-8")).hexdigest()[:12]
+    diretorio = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(diretorio, f"carteira_digital_{sufixo}.cache")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_erro_cache: Optional[str] = None
+
+
+def obter_cache():
+    """
+    Cache do processo, aberto no primeiro uso. Se o arquivo compartilhado não
+    puder ser usado, cai para um CacheLocal (o motivo fica em erro_cache()).
+    """
+    global _cache, _erro_cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if not CACHE_HABILITADO:
+                    _cache = CacheLocal()
+                else:
+                    try:
+                        _cache = CacheCompartilhado(caminho_padrao())
+                    except (OSError, ValueError) as e:
+                        print(f"Aviso: cache compartilhado indisponível ({e}). Usando cache local.")
+                        _erro_cache = str(e)
+                        _cache = CacheLocal()
+    return _cache
+
+
+def erro_cache() -> Optional[str]:
+    return _erro_cache
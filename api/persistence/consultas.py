@@ -0,0 +1,1120 @@
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection, CursorResult
+from sqlalchemy.sql.elements import TextClause
+
+from api.models.carteira_models import MOEDAS_OBRIGATORIAS
+from api.models.dinheiro import FATOR
+
+
+class RegistroConsultas:
+    """
+    Registro central de todas as instruções SQL usadas pelos repositórios.
+
+    Cada instrução é compilada uma única vez (objeto ``text`` com parâmetros
+    nomeados) e reutilizada em todas as chamadas, o que mantém o texto SQL
+    estável para o cache de compilação do SQLAlchemy. O registro também conta
+    quantas vezes cada instrução foi executada.
+    """
+
+    def __init__(self):
+        self._consultas: Dict[str, TextClause] = {}
+        self._contadores: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def registrar(self, nome: str, sql: str, *parametros) -> TextClause:
+        if nome in self._consultas:
+            raise ValueError(f"Consulta já registrada: {nome}")
+
+        consulta = text(sql)
+        if parametros:
+            consulta = consulta.bindparams(*parametros)
+
+        self._consultas[nome] = consulta
+        return consulta
+
+    def obter(self, nome: str) -> TextClause:
+        try:
+            return self._consultas[nome]
+        except KeyError:
+            raise KeyError(f"Consulta não registrada: {nome}")
+
+    def executar(self, conn: Connection, nome: str, parametros: Optional[Any] = None) -> CursorResult:
+        consulta = self.obter(nome)
+
+        with self._lock:
+            self._contadores[nome] += 1
+
+        if parametros is None:
+            return conn.execute(consulta)
+        return conn.execute(consulta, parametros)
+
+    def contadores(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._contadores)
+
+    def __len__(self) -> int:
+        return len(self._consultas)
+
+
+SQL = RegistroConsultas()
+
+
+# ---------------------------------------------------------
+#  Moeda
+# ---------------------------------------------------------
+
+SQL.registrar("moeda.listar", """
+    SELECT id_moeda, codigo, nome
+      FROM moeda
+""")
+
+# ---------------------------------------------------------
+#  Carteira
+# ---------------------------------------------------------
+
+SQL.registrar("carteira.inserir", """
+    INSERT INTO carteira (endereco_carteira, hash_chave_privada, data_criacao, status_ativo)
+    VALUES (:endereco, :hash_privada, :data_criacao, :status)
+""")
+
+SQL.registrar("carteira.bloquear", """
+    SELECT endereco_carteira,
+           hash_chave_privada,
+           data_criacao,
+           status_ativo AS status,
+           nivel_limite
+      FROM carteira
+     WHERE endereco_carteira = :endereco
+       FOR UPDATE
+""")
+
+# Compartilhado: depósitos e transferências na mesma carteira não se bloqueiam,
+# mas esperam (e são esperados por) uma mudança de status
+SQL.registrar("carteira.bloquear_compartilhado", """
+    SELECT status_ativo AS status
+      FROM carteira
+     WHERE endereco_carteira = :endereco
+       FOR SHARE
+""")
+
+SQL.registrar("carteira.buscar_por_endereco", """
+    SELECT endereco_carteira,
+           hash_chave_privada,
+           data_criacao,
+           status_ativo AS status,
+           nivel_limite
+      FROM carteira
+     WHERE endereco_carteira = :endereco
+""")
+
+SQL.registrar("carteira.atualizar_status", """
+    UPDATE carteira
+       SET status_ativo = :status
+     WHERE endereco_carteira = :endereco
+""")
+
+SQL.registrar("carteira.atualizar_nivel_limite", """
+    UPDATE carteira
+       SET nivel_limite = :nivel
+     WHERE endereco_carteira = :endereco
+""")
+
+# ---------------------------------------------------------
+#  Uso dos limites (intervalos fixos por carteira, moeda e
+#  operação; ver api.models.limites)
+# ---------------------------------------------------------
+
+# Varredura pelo prefixo da chave primária: no máximo um intervalo por linha da janela
+SQL.registrar("uso_limite.somar", """
+    SELECT COALESCE(SUM(valor), 0) AS valor,
+           COALESCE(SUM(quantidade), 0) AS quantidade
+      FROM uso_limite
+     WHERE endereco_carteira = :endereco
+       AND id_moeda = :id_moeda
+       AND operacao = :operacao
+       AND bucket_inicio >= :desde
+""")
+
+SQL.registrar("uso_limite.acumular", """
+    INSERT INTO uso_limite (endereco_carteira, id_moeda, operacao, bucket_inicio, valor, quantidade)
+    VALUES (:endereco, :id_moeda, :operacao, :bucket_inicio, :valor, 1)
+    ON DUPLICATE KEY UPDATE valor = valor + :valor,
+                            quantidade = quantidade + 1
+""")
+
+SQL.registrar("uso_limite.por_carteira", """
+    SELECT m.codigo AS codigo_moeda,
+           u.operacao,
+           SUM(u.valor) AS valor,
+           SUM(u.quantidade) AS quantidade
+      FROM uso_limite u
+      JOIN moeda m ON m.id_moeda = u.id_moeda
+     WHERE u.endereco_carteira = :endereco
+       AND u.bucket_inicio >= :desde
+     GROUP BY m.codigo, u.operacao
+""")
+
+SQL.registrar("uso_limite.apagar_antigos", """
+    DELETE FROM uso_limite
+     WHERE bucket_inicio < :antes_de
+     LIMIT :limite
+""")
+
+# ---------------------------------------------------------
+#  Saldo
+# ---------------------------------------------------------
+
+SQL.registrar("saldo.listar_por_carteira", """
+    SELECT sc.id_moeda,
+           m.codigo AS codigo_moeda,
+           m.nome AS nome_moeda,
+           sc.saldo,
+           sc.data_atualizacao
+      FROM saldo_carteira sc
+      JOIN moeda m ON sc.id_moeda = m.id_moeda
+     WHERE sc.endereco_carteira = :endereco
+     ORDER BY m.codigo
+""")
+
+SQL.registrar("saldo.listar_por_carteiras", """
+    SELECT c.endereco_carteira,
+           c.status_ativo AS status,
+           sc.id_moeda,
+           m.codigo AS codigo_moeda,
+           m.nome AS nome_moeda,
+           sc.saldo,
+           sc.data_atualizacao
+      FROM carteira c
+      LEFT JOIN saldo_carteira sc ON sc.endereco_carteira = c.endereco_carteira
+      LEFT JOIN moeda m ON sc.id_moeda = m.id_moeda
+     WHERE c.endereco_carteira IN :enderecos
+     ORDER BY c.endereco_carteira, m.codigo
+""", bindparam("enderecos", expanding=True))
+
+SQL.registrar("saldo.versao_por_carteira", """
+    SELECT c.status_ativo AS status,
+           COUNT(sc.id_moeda) AS total_moedas,
+           MAX(sc.data_atualizacao) AS ultima_atualizacao,
+           BIT_XOR(CRC32(CONCAT(sc.id_moeda, ':', sc.saldo))) AS checksum
+      FROM carteira c
+      LEFT JOIN saldo_carteira sc ON sc.endereco_carteira = c.endereco_carteira
+     WHERE c.endereco_carteira = :endereco
+     GROUP BY c.status_ativo
+""")
+
+SQL.registrar("saldo.buscar_por_codigo", """
+    SELECT sc.saldo
+      FROM saldo_carteira sc
+      JOIN moeda m ON sc.id_moeda = m.id_moeda
+     WHERE sc.endereco_carteira = :endereco
+       AND m.codigo = :codigo_moeda
+""")
+
+SQL.registrar("saldo.bloquear", """
+    SELECT saldo FROM saldo_carteira
+    WHERE endereco_carteira = :endereco AND id_moeda = :id_moeda
+    FOR UPDATE
+""")
+
+SQL.registrar("saldo.inserir", """
+    INSERT INTO saldo_carteira (endereco_carteira, id_moeda, saldo)
+    VALUES (:endereco_carteira, :id_moeda, :saldo)
+""")
+
+SQL.registrar("saldo.creditar", """
+    INSERT INTO saldo_carteira (endereco_carteira, id_moeda, saldo)
+    VALUES (:endereco, :id_moeda, :valor)
+    ON DUPLICATE KEY UPDATE saldo = saldo + :valor, data_atualizacao = :data_atualizacao
+""")
+
+SQL.registrar("saldo.debitar", """
+    UPDATE saldo_carteira
+       SET saldo = saldo - :valor, data_atualizacao = :data_atualizacao
+     WHERE endereco_carteira = :endereco AND id_moeda = :id_moeda
+""")
+
+# ---------------------------------------------------------
+#  Resumo de carteiras (projeção de leitura, ver V005)
+# ---------------------------------------------------------
+
+def _por_moeda(modelo: str, recuo: int = 11, separador: str = ",") -> str:
+    """Repete o trecho para cada moeda de MOEDAS_OBRIGATORIAS (colunas fixas da projeção), uma por linha."""
+    return (separador + "\n" + " " * recuo).join(modelo.format(codigo=c, m=c.lower()) for c in MOEDAS_OBRIGATORIAS)
+
+
+_COLUNAS_RESUMO = f"""endereco_carteira,
+           data_criacao,
+           status,
+           {_por_moeda("saldo_{m}")},
+           {_por_moeda("taxa_{m}")},
+           total_movimentacoes,
+           ultima_atividade,
+           versao"""
+
+SQL.registrar("resumo_carteira.inserir", """
+    INSERT INTO resumo_carteira (endereco_carteira, data_criacao, status, ultima_atividade)
+    VALUES (:endereco, :data_criacao, :status, :data_criacao)
+""")
+
+SQL.registrar("resumo_carteira.aplicar_movimento", f"""
+    UPDATE resumo_carteira
+       SET {_por_moeda("saldo_{m} = saldo_{m} + CASE WHEN :codigo_moeda = '{codigo}' THEN :variacao ELSE 0 END")},
+           {_por_moeda("taxa_{m} = taxa_{m} + CASE WHEN :codigo_moeda = '{codigo}' THEN :taxa ELSE 0 END")},
+           total_movimentacoes = total_movimentacoes + :movimentacoes,
+           ultima_atividade = GREATEST(ultima_atividade, :data_hora),
+           versao = versao + 1
+     WHERE endereco_carteira = :endereco
+""")
+
+SQL.registrar("resumo_carteira.atualizar_status", """
+    UPDATE resumo_carteira
+       SET status = :status, versao = versao + 1
+     WHERE endereco_carteira = :endereco
+""")
+
+# Saldos absolutos e versão da carteira (eventos de saldo, ver eventos_service)
+SQL.registrar("resumo_carteira.saldos", f"""
+    SELECT {_por_moeda("saldo_{m}")},
+           versao
+      FROM resumo_carteira
+     WHERE endereco_carteira = :endereco
+""")
+
+SQL.registrar("resumo_carteira.listar", """
+    SELECT endereco_carteira,
+           data_criacao,
+           status
+      FROM resumo_carteira
+     ORDER BY data_criacao DESC
+""")
+
+# Busca paginada por chave, mais recentes primeiro. Filtros opcionais (NULL =
+# sem filtro); o saldo mínimo vale para a moeda informada em :codigo_moeda.
+_FILTROS_BUSCA_RESUMO = f"""(:status IS NULL OR status = :status)
+       AND (:codigo_moeda IS NULL
+            OR CASE :codigo_moeda
+               {_por_moeda("WHEN '{codigo}' THEN saldo_{m}", 15, "")}
+               END >= :saldo_minimo)
+       AND (:ativa_desde IS NULL OR ultima_atividade >= :ativa_desde)"""
+
+for _ordem in ("data_criacao", "ultima_atividade"):
+    SQL.registrar(f"resumo_carteira.buscar_por_{_ordem}", f"""
+    SELECT {_COLUNAS_RESUMO}
+      FROM resumo_carteira
+     WHERE {_FILTROS_BUSCA_RESUMO}
+       AND (:cursor_valor IS NULL OR ({_ordem}, endereco_carteira) < (:cursor_valor, :cursor_endereco))
+     ORDER BY {_ordem} DESC, endereco_carteira DESC
+     LIMIT :limite
+""")
+
+SQL.registrar("resumo_carteira.enderecos_pagina", """
+    SELECT endereco_carteira
+      FROM carteira
+     WHERE endereco_carteira > :ultimo_endereco
+     ORDER BY endereco_carteira
+     LIMIT :limite
+""")
+
+# Recalcula as linhas das carteiras informadas a partir das fontes: status
+# (CARTEIRA), saldos (SALDO_CARTEIRA, que já inclui o arquivado) e taxas,
+# movimentações e última atividade (histórico quente + SALDO_ARQUIVADO).
+# INSERT ... SELECT lê com bloqueio compartilhado, então as operações dessas
+# carteiras esperam a transação (curta, um lote) terminar.
+SQL.registrar("resumo_carteira.reconstruir", f"""
+    INSERT INTO resumo_carteira (
+           endereco_carteira, data_criacao, status,
+           {_por_moeda("saldo_{m}")},
+           {_por_moeda("taxa_{m}")},
+           total_movimentacoes, ultima_atividade, versao)
+    SELECT * FROM (
+        SELECT c.endereco_carteira,
+               c.data_criacao,
+               c.status_ativo AS status,
+               {_por_moeda("COALESCE(s.saldo_{m}, 0) AS saldo_{m}", 15)},
+               {_por_moeda("COALESCE(h.taxa_{m}, 0) AS taxa_{m}", 15)},
+               COALESCE(h.movimentacoes, 0) AS total_movimentacoes,
+               GREATEST(c.data_criacao, COALESCE(h.ultima_data_hora, c.data_criacao)) AS ultima_atividade,
+               0 AS versao
+          FROM carteira c
+          LEFT JOIN (
+                SELECT sc.endereco_carteira,
+                       {_por_moeda("SUM(CASE WHEN m.codigo = '{codigo}' THEN sc.saldo ELSE 0 END) AS saldo_{m}", 23)}
+                  FROM saldo_carteira sc
+                  JOIN moeda m ON m.id_moeda = sc.id_moeda
+                 WHERE sc.endereco_carteira IN :enderecos
+                 GROUP BY sc.endereco_carteira
+               ) s ON s.endereco_carteira = c.endereco_carteira
+          LEFT JOIN (
+                SELECT hist.endereco_carteira,
+                       {_por_moeda("SUM(CASE WHEN m.codigo = '{codigo}' THEN hist.taxa ELSE 0 END) AS taxa_{m}", 23)},
+                       SUM(hist.movimentacoes) AS movimentacoes,
+                       MAX(hist.data_hora) AS ultima_data_hora
+                  FROM (
+                        SELECT endereco_carteira, id_moeda, taxa_valor AS taxa, 1 AS movimentacoes, data_hora
+                          FROM deposito_saque
+                         WHERE endereco_carteira IN :enderecos
+                        UNION ALL
+                        SELECT endereco_carteira, id_moeda_destino, taxa_valor, 1, data_hora
+                          FROM conversao
+                         WHERE endereco_carteira IN :enderecos
+                        UNION ALL
+                        SELECT endereco_origem, id_moeda, taxa_valor, 1, data_hora
+                          FROM transferencia
+                         WHERE endereco_origem IN :enderecos
+                        UNION ALL
+                        SELECT endereco_destino, id_moeda, 0, 1, data_hora
+                          FROM transferencia
+                         WHERE endereco_destino IN :enderecos
+                        UNION ALL
+                        SELECT endereco_carteira, id_moeda, taxas, movimentacoes, ultima_data_hora
+                          FROM saldo_arquivado
+                         WHERE endereco_carteira IN :enderecos
+                       ) hist
+                  JOIN moeda m ON m.id_moeda = hist.id_moeda
+                 GROUP BY hist.endereco_carteira
+               ) h ON h.endereco_carteira = c.endereco_carteira
+         WHERE c.endereco_carteira IN :enderecos
+    ) novo
+    ON DUPLICATE KEY UPDATE status = novo.status,
+           {_por_moeda("saldo_{m} = novo.saldo_{m}")},
+           {_por_moeda("taxa_{m} = novo.taxa_{m}")},
+           total_movimentacoes = novo.total_movimentacoes,
+           ultima_atividade = novo.ultima_atividade,
+           versao = resumo_carteira.versao + 1
+""", bindparam("enderecos", expanding=True))
+
+# ---------------------------------------------------------
+#  Movimentações
+# ---------------------------------------------------------
+
+SQL.registrar("deposito_saque.inserir", """
+    INSERT INTO deposito_saque (endereco_carteira, id_moeda, tipo, valor, taxa_valor, data_hora)
+    VALUES (:endereco, :id_moeda, :tipo, :valor, :taxa, :data_hora)
+""")
+
+SQL.registrar("conversao.inserir", """
+    INSERT INTO conversao (endereco_carteira, id_moeda_origem, id_moeda_destino, valor_origem,
+                           valor_destino, taxa_percentual, taxa_valor, cotacao_utilizada, data_hora)
+    VALUES (:endereco, :id_origem, :id_destino, :v_origem, :v_destino, :t_perc, :t_valor, :cotacao, :data_hora)
+""")
+
+SQL.registrar("transferencia.inserir", """
+    INSERT INTO transferencia (referencia, endereco_origem, endereco_destino, id_moeda, valor, taxa_valor, data_hora)
+    VALUES (:referencia, :origem, :destino, :id_moeda, :valor_liquido, :taxa_valor, :data_hora)
+""")
+
+# ---------------------------------------------------------
+#  Relatórios
+# ---------------------------------------------------------
+
+SQL.registrar("relatorio.saldos_pagina", f"""
+    SELECT endereco_carteira,
+           id_moeda,
+           CAST(saldo * {FATOR} AS SIGNED) AS saldo_unidades
+      FROM saldo_carteira
+     WHERE saldo <> 0
+       AND (endereco_carteira, id_moeda) > (:ultimo_endereco, :ultimo_id_moeda)
+     ORDER BY endereco_carteira, id_moeda
+     LIMIT :limite
+""")
+
+SQL.registrar("relatorio.taxas_por_hora", """
+    SELECT rt.bucket_hora AS periodo,
+           m.codigo AS codigo_moeda,
+           rt.tipo_operacao,
+           SUM(rt.quantidade) AS quantidade,
+           SUM(rt.volume) AS volume,
+           SUM(rt.taxa_total) AS taxa_total
+      FROM resumo_taxas rt
+      JOIN moeda m ON rt.id_moeda = m.id_moeda
+     WHERE rt.bucket_hora >= :inicio AND rt.bucket_hora < :fim
+     GROUP BY rt.bucket_hora, m.codigo, rt.tipo_operacao
+     ORDER BY periodo, codigo_moeda, rt.tipo_operacao
+""")
+
+SQL.registrar("relatorio.taxas_por_dia", """
+    SELECT DATE(rt.bucket_hora) AS periodo,
+           m.codigo AS codigo_moeda,
+           rt.tipo_operacao,
+           SUM(rt.quantidade) AS quantidade,
+           SUM(rt.volume) AS volume,
+           SUM(rt.taxa_total) AS taxa_total
+      FROM resumo_taxas rt
+      JOIN moeda m ON rt.id_moeda = m.id_moeda
+     WHERE rt.bucket_hora >= :inicio AND rt.bucket_hora < :fim
+     GROUP BY DATE(rt.bucket_hora), m.codigo, rt.tipo_operacao
+     ORDER BY periodo, codigo_moeda, rt.tipo_operacao
+""")
+
+# ---------------------------------------------------------
+#  Resumo de taxas (rollup por hora)
+# ---------------------------------------------------------
+
+SQL.registrar("resumo_taxas.acumular", """
+    INSERT INTO resumo_taxas (bucket_hora, id_moeda, tipo_operacao, particao, quantidade, volume, taxa_total)
+    VALUES (:bucket_hora, :id_moeda, :tipo_operacao, :particao, 1, :volume, :taxa)
+    ON DUPLICATE KEY UPDATE quantidade = quantidade + 1,
+                            volume = volume + :volume,
+                            taxa_total = taxa_total + :taxa
+""")
+
+SQL.registrar("resumo_taxas.limpar_periodo", """
+    DELETE FROM resumo_taxas
+     WHERE bucket_hora >= :inicio AND bucket_hora < :fim
+""")
+
+SQL.registrar("resumo_taxas.reconstruir_deposito_saque", """
+    INSERT INTO resumo_taxas (bucket_hora, id_moeda, tipo_operacao, particao, quantidade, volume, taxa_total)
+    SELECT DATE_ADD(DATE(data_hora), INTERVAL HOUR(data_hora) HOUR), id_moeda, tipo, 0, COUNT(*), SUM(valor), SUM(taxa_valor)
+      FROM deposito_saque
+     WHERE data_hora >= :inicio AND data_hora < :fim
+     GROUP BY DATE_ADD(DATE(data_hora), INTERVAL HOUR(data_hora) HOUR), id_moeda, tipo
+""")
+
+SQL.registrar("resumo_taxas.reconstruir_conversao", """
+    INSERT INTO resumo_taxas (bucket_hora, id_moeda, tipo_operacao, particao, quantidade, volume, taxa_total)
+    SELECT DATE_ADD(DATE(data_hora), INTERVAL HOUR(data_hora) HOUR), id_moeda_destino, 'CONVERSAO', 0,
+           COUNT(*), SUM(valor_destino), SUM(taxa_valor)
+      FROM conversao
+     WHERE data_hora >= :inicio AND data_hora < :fim
+     GROUP BY DATE_ADD(DATE(data_hora), INTERVAL HOUR(data_hora) HOUR), id_moeda_destino
+""")
+
+# Transferências entre shards existem nos dois: contam só no shard da origem
+SQL.registrar("resumo_taxas.reconstruir_transferencia", """
+    INSERT INTO resumo_taxas (bucket_hora, id_moeda, tipo_operacao, particao, quantidade, volume, taxa_total)
+    SELECT DATE_ADD(DATE(data_hora), INTERVAL HOUR(data_hora) HOUR), id_moeda, 'TRANSFERENCIA', 0,
+           COUNT(*), SUM(valor), SUM(taxa_valor)
+      FROM transferencia tr
+     WHERE data_hora >= :inicio AND data_hora < :fim
+       AND EXISTS (SELECT 1 FROM carteira c WHERE c.endereco_carteira = tr.endereco_origem)
+     GROUP BY DATE_ADD(DATE(data_hora), INTERVAL HOUR(data_hora) HOUR), id_moeda
+""")
+
+# ---------------------------------------------------------
+#  Extrato (união das três tabelas de histórico)
+#  Paginação por chave (data_hora, ordem, id_movimento); cada
+#  ramo já vem filtrado, ordenado e limitado.
+# ---------------------------------------------------------
+
+SQL.registrar("extrato.pagina_carteira", """
+    (SELECT ds.data_hora, 1 AS ordem, ds.id_movimento AS id_movimento, ds.tipo,
+            ds.endereco_carteira, CAST(NULL AS CHAR(32)) AS endereco_contraparte,
+            m.codigo AS codigo_moeda, ds.valor,
+            CAST(NULL AS CHAR(5)) AS codigo_moeda_destino, CAST(NULL AS DECIMAL(18,8)) AS valor_destino,
+            ds.taxa_valor, CAST(NULL AS DECIMAL(18,8)) AS cotacao_utilizada
+       FROM deposito_saque ds
+       JOIN moeda m ON m.id_moeda = ds.id_moeda
+      WHERE ds.endereco_carteira = :endereco
+        AND ds.data_hora >= :inicio AND ds.data_hora < :fim
+        AND ds.data_hora >= :cursor_data_hora
+        AND (ds.data_hora, 1, ds.id_movimento) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY ds.data_hora, ds.id_movimento
+      LIMIT :limite)
+    UNION ALL
+    (SELECT cv.data_hora, 2, cv.id_conversao, 'CONVERSAO',
+            cv.endereco_carteira, NULL,
+            mo.codigo, cv.valor_origem,
+            md.codigo, cv.valor_destino,
+            cv.taxa_valor, cv.cotacao_utilizada
+       FROM conversao cv
+       JOIN moeda mo ON mo.id_moeda = cv.id_moeda_origem
+       JOIN moeda md ON md.id_moeda = cv.id_moeda_destino
+      WHERE cv.endereco_carteira = :endereco
+        AND cv.data_hora >= :inicio AND cv.data_hora < :fim
+        AND cv.data_hora >= :cursor_data_hora
+        AND (cv.data_hora, 2, cv.id_conversao) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY cv.data_hora, cv.id_conversao
+      LIMIT :limite)
+    UNION ALL
+    (SELECT tr.data_hora, 3, tr.id_transferencia, 'TRANSFERENCIA',
+            tr.endereco_origem, tr.endereco_destino,
+            m.codigo, tr.valor,
+            NULL, NULL,
+            tr.taxa_valor, NULL
+       FROM transferencia tr
+       JOIN moeda m ON m.id_moeda = tr.id_moeda
+      WHERE tr.endereco_origem = :endereco
+        AND tr.data_hora >= :inicio AND tr.data_hora < :fim
+        AND tr.data_hora >= :cursor_data_hora
+        AND (tr.data_hora, 3, tr.id_transferencia) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY tr.data_hora, tr.id_transferencia
+      LIMIT :limite)
+    UNION ALL
+    (SELECT tr.data_hora, 3, tr.id_transferencia, 'TRANSFERENCIA',
+            tr.endereco_origem, tr.endereco_destino,
+            m.codigo, tr.valor,
+            NULL, NULL,
+            tr.taxa_valor, NULL
+       FROM transferencia tr
+       JOIN moeda m ON m.id_moeda = tr.id_moeda
+      WHERE tr.endereco_destino = :endereco AND tr.endereco_origem <> :endereco
+        AND tr.data_hora >= :inicio AND tr.data_hora < :fim
+        AND tr.data_hora >= :cursor_data_hora
+        AND (tr.data_hora, 3, tr.id_transferencia) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY tr.data_hora, tr.id_transferencia
+      LIMIT :limite)
+     ORDER BY data_hora, ordem, id_movimento
+     LIMIT :limite
+""")
+
+SQL.registrar("extrato.pagina_periodo", """
+    (SELECT ds.data_hora, 1 AS ordem, ds.id_movimento AS id_movimento, ds.tipo,
+            ds.endereco_carteira, CAST(NULL AS CHAR(32)) AS endereco_contraparte,
+            m.codigo AS codigo_moeda, ds.valor,
+            CAST(NULL AS CHAR(5)) AS codigo_moeda_destino, CAST(NULL AS DECIMAL(18,8)) AS valor_destino,
+            ds.taxa_valor, CAST(NULL AS DECIMAL(18,8)) AS cotacao_utilizada
+       FROM deposito_saque ds
+       JOIN moeda m ON m.id_moeda = ds.id_moeda
+      WHERE ds.data_hora >= :inicio AND ds.data_hora < :fim
+        AND ds.data_hora >= :cursor_data_hora
+        AND (ds.data_hora, 1, ds.id_movimento) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY ds.data_hora, ds.id_movimento
+      LIMIT :limite)
+    UNION ALL
+    (SELECT cv.data_hora, 2, cv.id_conversao, 'CONVERSAO',
+            cv.endereco_carteira, NULL,
+            mo.codigo, cv.valor_origem,
+            md.codigo, cv.valor_destino,
+            cv.taxa_valor, cv.cotacao_utilizada
+       FROM conversao cv
+       JOIN moeda mo ON mo.id_moeda = cv.id_moeda_origem
+       JOIN moeda md ON md.id_moeda = cv.id_moeda_destino
+      WHERE cv.data_hora >= :inicio AND cv.data_hora < :fim
+        AND cv.data_hora >= :cursor_data_hora
+        AND (cv.data_hora, 2, cv.id_conversao) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY cv.data_hora, cv.id_conversao
+      LIMIT :limite)
+    UNION ALL
+    (SELECT tr.data_hora, 3, tr.id_transferencia, 'TRANSFERENCIA',
+            tr.endereco_origem, tr.endereco_destino,
+            m.codigo, tr.valor,
+            NULL, NULL,
+            tr.taxa_valor, NULL
+       FROM transferencia tr
+       JOIN moeda m ON m.id_moeda = tr.id_moeda
+      WHERE tr.data_hora >= :inicio AND tr.data_hora < :fim
+        AND tr.data_hora >= :cursor_data_hora
+        AND (tr.data_hora, 3, tr.id_transferencia) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY tr.data_hora, tr.id_transferencia
+      LIMIT :limite)
+     ORDER BY data_hora, ordem, id_movimento
+     LIMIT :limite
+""")
+
+# ---------------------------------------------------------
+#  Reconciliação de saldos
+#  Saldo esperado = saldo arquivado + depósitos - (saques + taxas)
+#  - origem de conversões + destino de conversões
+#  - (transferências enviadas + taxas) + transferências recebidas.
+# ---------------------------------------------------------
+
+SQL.registrar("reconciliacao.divergencias_faixa", """
+    SELECT sc.endereco_carteira,
+           sc.id_moeda,
+           m.codigo AS codigo_moeda,
+           sc.saldo,
+           COALESCE(mv.esperado, 0) AS esperado
+      FROM saldo_carteira sc
+      JOIN moeda m ON m.id_moeda = sc.id_moeda
+      LEFT JOIN (
+            SELECT endereco_carteira, id_moeda, SUM(variacao) AS esperado
+              FROM (
+                    SELECT endereco_carteira, id_moeda,
+                           CASE WHEN tipo = 'DEPOSITO' THEN valor ELSE -(valor + taxa_valor) END AS variacao
+                      FROM deposito_saque
+                     WHERE endereco_carteira >= :de AND endereco_carteira < :ate
+                    UNION ALL
+                    SELECT endereco_carteira, id_moeda_origem, -valor_origem
+                      FROM conversao
+                     WHERE endereco_carteira >= :de AND endereco_carteira < :ate
+                    UNION ALL
+                    SELECT endereco_carteira, id_moeda_destino, valor_destino
+                      FROM conversao
+                     WHERE endereco_carteira >= :de AND endereco_carteira < :ate
+                    UNION ALL
+                    SELECT endereco_origem, id_moeda, -(valor + taxa_valor)
+                      FROM transferencia
+                     WHERE endereco_origem >= :de AND endereco_origem < :ate
+                    UNION ALL
+                    SELECT endereco_destino, id_moeda, valor
+                      FROM transferencia
+                     WHERE endereco_destino >= :de AND endereco_destino < :ate
+                    UNION ALL
+                    SELECT endereco_carteira, id_moeda, saldo
+                      FROM saldo_arquivado
+                     WHERE endereco_carteira >= :de AND endereco_carteira < :ate
+                   ) movimentos
+             GROUP BY endereco_carteira, id_moeda
+           ) mv ON mv.endereco_carteira = sc.endereco_carteira AND mv.id_moeda = sc.id_moeda
+     WHERE sc.endereco_carteira >= :de AND sc.endereco_carteira < :ate
+       AND ABS(sc.saldo - COALESCE(mv.esperado, 0)) > :tolerancia
+""")
+
+SQL.registrar("reconciliacao.divergencias_carteiras", """
+    SELECT sc.endereco_carteira,
+           sc.id_moeda,
+           m.codigo AS codigo_moeda,
+           sc.saldo,
+           COALESCE(mv.esperado, 0) AS esperado
+      FROM saldo_carteira sc
+      JOIN moeda m ON m.id_moeda = sc.id_moeda
+      LEFT JOIN (
+            SELECT endereco_carteira, id_moeda, SUM(variacao) AS esperado
+              FROM (
+                    SELECT endereco_carteira, id_moeda,
+                           CASE WHEN tipo = 'DEPOSITO' THEN valor ELSE -(valor + taxa_valor) END AS variacao
+                      FROM deposito_saque
+                     WHERE endereco_carteira IN :enderecos
+                    UNION ALL
+                    SELECT endereco_carteira, id_moeda_origem, -valor_origem
+                      FROM conversao
+                     WHERE endereco_carteira IN :enderecos
+                    UNION ALL
+                    SELECT endereco_carteira, id_moeda_destino, valor_destino
+                      FROM conversao
+                     WHERE endereco_carteira IN :enderecos
+                    UNION ALL
+                    SELECT endereco_origem, id_moeda, -(valor + taxa_valor)
+                      FROM transferencia
+                     WHERE endereco_origem IN :enderecos
+                    UNION ALL
+                    SELECT endereco_destino, id_moeda, valor
+                      FROM transferencia
+                     WHERE endereco_destino IN :enderecos
+                    UNION ALL
+                    SELECT endereco_carteira, id_moeda, saldo
+                      FROM saldo_arquivado
+                     WHERE endereco_carteira IN :enderecos
+                   ) movimentos
+             GROUP BY endereco_carteira, id_moeda
+           ) mv ON mv.endereco_carteira = sc.endereco_carteira AND mv.id_moeda = sc.id_moeda
+     WHERE sc.endereco_carteira IN :enderecos
+       AND ABS(sc.saldo - COALESCE(mv.esperado, 0)) > :tolerancia
+""", bindparam("enderecos", expanding=True))
+
+SQL.registrar("reconciliacao.carteiras_alteradas", """
+    SELECT DISTINCT endereco_carteira
+      FROM saldo_carteira
+     WHERE endereco_carteira >= :de AND endereco_carteira < :ate
+       AND data_atualizacao >= :desde
+""")
+
+SQL.registrar("reconciliacao.movimentos", """
+    SELECT data_hora, tipo, id_movimento,
+           CASE WHEN tipo = 'DEPOSITO' THEN valor ELSE -(valor + taxa_valor) END AS variacao,
+           valor, taxa_valor
+      FROM deposito_saque
+     WHERE endereco_carteira = :endereco AND id_moeda = :id_moeda
+    UNION ALL
+    SELECT data_hora, 'CONVERSAO_SAIDA', id_conversao, -valor_origem, valor_origem, taxa_valor
+      FROM conversao
+     WHERE endereco_carteira = :endereco AND id_moeda_origem = :id_moeda
+    UNION ALL
+    SELECT data_hora, 'CONVERSAO_ENTRADA', id_conversao, valor_destino, valor_destino, taxa_valor
+      FROM conversao
+     WHERE endereco_carteira = :endereco AND id_moeda_destino = :id_moeda
+    UNION ALL
+    SELECT data_hora, 'TRANSFERENCIA_ENVIADA', id_transferencia, -(valor + taxa_valor), valor, taxa_valor
+      FROM transferencia
+     WHERE endereco_origem = :endereco AND id_moeda = :id_moeda
+    UNION ALL
+    SELECT data_hora, 'TRANSFERENCIA_RECEBIDA', id_transferencia, valor, valor, taxa_valor
+      FROM transferencia
+     WHERE endereco_destino = :endereco AND id_moeda = :id_moeda
+     ORDER BY data_hora DESC, id_movimento DESC
+     LIMIT :limite
+""")
+
+
+# ---------------------------------------------------------
+#  Arquivamento de movimentações antigas
+# ---------------------------------------------------------
+
+SQL.registrar("arquivo.segmentos", """
+    SELECT id_segmento, inicio, fim, arquivo, indice, linhas, checksum, status
+      FROM arquivo_segmento
+     ORDER BY inicio
+""")
+
+SQL.registrar("arquivo.registrar_segmento", """
+    INSERT INTO arquivo_segmento (inicio, fim, arquivo, indice, linhas, checksum, status, criado_em)
+    VALUES (:inicio, :fim, :arquivo, :indice, :linhas, :checksum, 'COPIADO', :criado_em)
+""")
+
+SQL.registrar("arquivo.concluir_segmento", """
+    UPDATE arquivo_segmento
+       SET status = 'CONCLUIDO', concluido_em = :concluido_em
+     WHERE id_segmento = :id_segmento
+""")
+
+SQL.registrar("arquivo.movimento_mais_antigo", """
+    SELECT MIN(data_hora) FROM (
+        SELECT MIN(data_hora) AS data_hora FROM deposito_saque
+        UNION ALL
+        SELECT MIN(data_hora) FROM conversao
+        UNION ALL
+        SELECT MIN(data_hora) FROM transferencia
+    ) minimos
+""")
+
+# Mesmas colunas do extrato, mais o que falta para o arquivo ser uma cópia
+# sem perdas (ids de moeda e taxa_percentual).
+SQL.registrar("arquivo.movimentos_pagina", """
+    (SELECT ds.data_hora, 1 AS ordem, ds.id_movimento AS id_movimento, ds.tipo,
+            ds.endereco_carteira, CAST(NULL AS CHAR(32)) AS endereco_contraparte,
+            ds.id_moeda, m.codigo AS codigo_moeda, ds.valor,
+            CAST(NULL AS SIGNED) AS id_moeda_destino, CAST(NULL AS CHAR(5)) AS codigo_moeda_destino,
+            CAST(NULL AS DECIMAL(18,8)) AS valor_destino,
+            CAST(NULL AS DECIMAL(18,8)) AS taxa_percentual, ds.taxa_valor,
+            CAST(NULL AS DECIMAL(18,8)) AS cotacao_utilizada
+       FROM deposito_saque ds
+       JOIN moeda m ON m.id_moeda = ds.id_moeda
+      WHERE ds.data_hora >= :inicio AND ds.data_hora < :fim
+        AND ds.data_hora >= :cursor_data_hora
+        AND (ds.data_hora, 1, ds.id_movimento) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY ds.data_hora, ds.id_movimento
+      LIMIT :limite)
+    UNION ALL
+    (SELECT cv.data_hora, 2, cv.id_conversao, 'CONVERSAO',
+            cv.endereco_carteira, NULL,
+            cv.id_moeda_origem, mo.codigo, cv.valor_origem,
+            cv.id_moeda_destino, md.codigo, cv.valor_destino,
+            cv.taxa_percentual, cv.taxa_valor, cv.cotacao_utilizada
+       FROM conversao cv
+       JOIN moeda mo ON mo.id_moeda = cv.id_moeda_origem
+       JOIN moeda md ON md.id_moeda = cv.id_moeda_destino
+      WHERE cv.data_hora >= :inicio AND cv.data_hora < :fim
+        AND cv.data_hora >= :cursor_data_hora
+        AND (cv.data_hora, 2, cv.id_conversao) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY cv.data_hora, cv.id_conversao
+      LIMIT :limite)
+    UNION ALL
+    (SELECT tr.data_hora, 3, tr.id_transferencia, 'TRANSFERENCIA',
+            tr.endereco_origem, tr.endereco_destino,
+            tr.id_moeda, m.codigo, tr.valor,
+            NULL, NULL, NULL,
+            NULL, tr.taxa_valor, NULL
+       FROM transferencia tr
+       JOIN moeda m ON m.id_moeda = tr.id_moeda
+      WHERE tr.data_hora >= :inicio AND tr.data_hora < :fim
+        AND tr.data_hora >= :cursor_data_hora
+        AND (tr.data_hora, 3, tr.id_transferencia) > (:cursor_data_hora, :cursor_ordem, :cursor_id)
+      ORDER BY tr.data_hora, tr.id_transferencia
+      LIMIT :limite)
+     ORDER BY data_hora, ordem, id_movimento
+     LIMIT :limite
+""")
+
+# Consolidação + remoção de um lote, na mesma transação: o saldo arquivado
+# cresce exatamente do que sai das tabelas quentes.
+
+# Numa transferência entre shards, cada shard consolida só o lado da carteira
+# que é dele (a outra ponta é consolidada no shard dela).
+
+# Junto com o saldo vão as taxas, a quantidade de movimentações e a última
+# data, usadas na reconstrução do RESUMO_CARTEIRA. A conversão conta uma
+# movimentação só no lado de destino (onde a taxa é cobrada).
+
+_ACUMULAR_ARQUIVADO = """
+    ON DUPLICATE KEY UPDATE saldo = saldo_arquivado.saldo + novo.variacao,
+                            taxas = saldo_arquivado.taxas + novo.taxas,
+                            movimentacoes = saldo_arquivado.movimentacoes + novo.movimentacoes,
+                            ultima_data_hora = GREATEST(COALESCE(saldo_arquivado.ultima_data_hora, novo.ultima_data_hora),
+                                                        novo.ultima_data_hora)
+"""
+
+SQL.registrar("arquivo.consolidar_deposito_saque", """
+    INSERT INTO saldo_arquivado (endereco_carteira, id_moeda, saldo, taxas, movimentacoes, ultima_data_hora)
+    SELECT * FROM (
+        SELECT endereco_carteira, id_moeda,
+               SUM(CASE WHEN tipo = 'DEPOSITO' THEN valor ELSE -(valor + taxa_valor) END) AS variacao,
+               SUM(taxa_valor) AS taxas,
+               COUNT(*) AS movimentacoes,
+               MAX(data_hora) AS ultima_data_hora
+          FROM deposito_saque
+         WHERE id_movimento IN :ids AND data_hora >= :inicio AND data_hora < :fim
+         GROUP BY endereco_carteira, id_moeda
+    ) novo
+""" + _ACUMULAR_ARQUIVADO, bindparam("ids", expanding=True))
+
+SQL.registrar("arquivo.consolidar_conversao", """
+    INSERT INTO saldo_arquivado (endereco_carteira, id_moeda, saldo, taxas, movimentacoes, ultima_data_hora)
+    SELECT * FROM (
+        SELECT endereco_carteira, id_moeda, SUM(variacao) AS variacao, SUM(taxa) AS taxas,
+               SUM(movimentacoes) AS movimentacoes, MAX(data_hora) AS ultima_data_hora
+          FROM (
+                SELECT endereco_carteira, id_moeda_origem AS id_moeda, -valor_origem AS variacao,
+                       0 AS taxa, 0 AS movimentacoes, data_hora
+                  FROM conversao
+                 WHERE id_conversao IN :ids AND data_hora >= :inicio AND data_hora < :fim
+                UNION ALL
+                SELECT endereco_carteira, id_moeda_destino, valor_destino, taxa_valor, 1, data_hora
+                  FROM conversao
+                 WHERE id_conversao IN :ids AND data_hora >= :inicio AND data_hora < :fim
+               ) lados
+         GROUP BY endereco_carteira, id_moeda
+    ) novo
+""" + _ACUMULAR_ARQUIVADO, bindparam("ids", expanding=True))
+
+SQL.registrar("arquivo.consolidar_transferencia", """
+    INSERT INTO saldo_arquivado (endereco_carteira, id_moeda, saldo, taxas, movimentacoes, ultima_data_hora)
+    SELECT * FROM (
+        SELECT endereco_carteira, id_moeda, SUM(variacao) AS variacao, SUM(taxa) AS taxas,
+               SUM(movimentacoes) AS movimentacoes, MAX(data_hora) AS ultima_data_hora
+          FROM (
+                SELECT endereco_origem AS endereco_carteira, id_moeda, -(valor + taxa_valor) AS variacao,
+                       taxa_valor AS taxa, 1 AS movimentacoes, data_hora
+                  FROM transferencia tr
+                 WHERE id_transferencia IN :ids AND data_hora >= :inicio AND data_hora < :fim
+                   AND EXISTS (SELECT 1 FROM carteira c WHERE c.endereco_carteira = tr.endereco_origem)
+                UNION ALL
+                SELECT endereco_destino, id_moeda, valor, 0, 1, data_hora
+                  FROM transferencia tr
+                 WHERE id_transferencia IN :ids AND data_hora >= :inicio AND data_hora < :fim
+                   AND EXISTS (SELECT 1 FROM carteira c WHERE c.endereco_carteira = tr.endereco_destino)
+               ) lados
+         GROUP BY endereco_carteira, id_moeda
+    ) novo
+""" + _ACUMULAR_ARQUIVADO, bindparam("ids", expanding=True))
+
+SQL.registrar("arquivo.apagar_deposito_saque", """
+    DELETE FROM deposito_saque
+     WHERE id_movimento IN :ids AND data_hora >= :inicio AND data_hora < :fim
+""", bindparam("ids", expanding=True))
+
+SQL.registrar("arquivo.apagar_conversao", """
+    DELETE FROM conversao
+     WHERE id_conversao IN :ids AND data_hora >= :inicio AND data_hora < :fim
+""", bindparam("ids", expanding=True))
+
+SQL.registrar("arquivo.apagar_transferencia", """
+    DELETE FROM transferencia
+     WHERE id_transferencia IN :ids AND data_hora >= :inicio AND data_hora < :fim
+""", bindparam("ids", expanding=True))
+
+
+# ---------------------------------------------------------
+#  Shards (ver api.persistence.shards)
+#  MAPA_SHARDS e TRANSACAO_DISTRIBUIDA ficam no shard 0.
+# ---------------------------------------------------------
+
+SQL.registrar("mapa_shards.listar", """
+    SELECT bucket, shard, estado, versao
+      FROM mapa_shards
+     ORDER BY bucket
+""")
+
+SQL.registrar("mapa_shards.inserir", """
+    INSERT INTO mapa_shards (bucket, shard, estado, versao, atualizado_em)
+    VALUES (:bucket, :shard, 'ATIVO', 0, :agora)
+""")
+
+SQL.registrar("mapa_shards.marcar_migrando", """
+    UPDATE mapa_shards
+       SET estado = 'MIGRANDO', versao = versao + 1, atualizado_em = :agora
+     WHERE bucket IN :buckets AND shard = :origem AND estado = 'ATIVO'
+""", bindparam("buckets", expanding=True))
+
+SQL.registrar("mapa_shards.concluir_migracao", """
+    UPDATE mapa_shards
+       SET shard = :destino, estado = 'ATIVO', versao = versao + 1, atualizado_em = :agora
+     WHERE bucket IN :buckets AND shard = :origem AND estado = 'MIGRANDO'
+""", bindparam("buckets", expanding=True))
+
+SQL.registrar("mapa_shards.cancelar_migracao", """
+    UPDATE mapa_shards
+       SET estado = 'ATIVO', versao = versao + 1, atualizado_em = :agora
+     WHERE bucket IN :buckets AND shard = :origem AND estado = 'MIGRANDO'
+""", bindparam("buckets", expanding=True))
+
+SQL.registrar("transacao_distribuida.iniciar", """
+    INSERT INTO transacao_distribuida (xid, shards, estado, criada_em, atualizada_em)
+    VALUES (:xid, :shards, 'INICIADA', :agora, :agora)
+""")
+
+# Transição condicional: quem muda INICIADA primeiro (coordenador confirmando
+# ou recuperação abortando) decide o destino da transação.
+SQL.registrar("transacao_distribuida.decidir", """
+    UPDATE transacao_distribuida
+       SET estado = :estado, atualizada_em = :agora
+     WHERE xid = :xid AND estado = 'INICIADA'
+""")
+
+SQL.registrar("transacao_distribuida.concluir", """
+    UPDATE transacao_distribuida
+       SET estado = 'CONCLUIDA', atualizada_em = :agora
+     WHERE xid = :xid AND estado = 'CONFIRMADA'
+""")
+
+SQL.registrar("transacao_distribuida.buscar", """
+    SELECT xid, shards, estado, criada_em, atualizada_em
+      FROM transacao_distribuida
+     WHERE xid IN :xids
+""", bindparam("xids", expanding=True))
+
+SQL.registrar("transacao_distribuida.confirmadas_antes_de", """
+    SELECT xid
+      FROM transacao_distribuida
+     WHERE estado = 'CONFIRMADA' AND criada_em < :antes_de
+""")
+
+# ---------------------------------------------------------
+#  Agendamentos (ver api.services.agendador_service)
+#  AGENDAMENTO fica no shard da carteira de origem;
+#  EXECUCAO_AGENDADOR, no shard 0.
+# ---------------------------------------------------------
+
+_COLUNAS_AGENDAMENTO = ("id_agendamento, endereco_carteira, tipo, codigo_moeda, endereco_destino, codigo_destino, "
+                        "valor, periodicidade, execucoes_atrasadas, inicio, fim, ocorrencia, proxima_execucao, "
+                        "status, execucoes, falhas_consecutivas, ultima_execucao, ultimo_erro, criado_em")
+
+SQL.registrar("agendamento.inserir", """
+    INSERT INTO agendamento (id_agendamento, endereco_carteira, tipo, codigo_moeda, endereco_destino,
+                             codigo_destino, valor, periodicidade, execucoes_atrasadas, inicio, fim,
+                             ocorrencia, proxima_execucao, status, criado_em)
+    VALUES (:id_agendamento, :endereco_carteira, :tipo, :codigo_moeda, :endereco_destino,
+            :codigo_destino, :valor, :periodicidade, :execucoes_atrasadas, :inicio, :fim,
+            0, :inicio, 'ATIVO', :agora)
+""")
+
+SQL.registrar("agendamento.listar_por_carteira", f"""
+    SELECT {_COLUNAS_AGENDAMENTO}
+      FROM agendamento
+     WHERE endereco_carteira = :endereco
+     ORDER BY criado_em DESC, id_agendamento
+""")
+
+SQL.registrar("agendamento.cancelar", """
+    UPDATE agendamento
+       SET status = 'CANCELADO'
+     WHERE id_agendamento = :id_agendamento
+       AND endereco_carteira = :endereco
+       AND status IN ('ATIVO', 'SUSPENSO')
+""")
+
+# Sem lock: só para o agendador agrupar por carteira e buscar as cotações
+# antes de abrir as transações (a reivindicação confere tudo de novo).
+SQL.registrar("agendamento.vencidos", """
+    SELECT id_agendamento, endereco_carteira, tipo, codigo_moeda, endereco_destino,
+           codigo_destino, proxima_execucao
+      FROM agendamento
+     WHERE status = 'ATIVO' AND proxima_execucao <= :agora
+     ORDER BY proxima_execucao
+     LIMIT :limite
+""")
+
+# Linhas já reivindicadas por outro processo são puladas, sem esperar o lock
+SQL.registrar("agendamento.reivindicar", f"""
+    SELECT {_COLUNAS_AGENDAMENTO}
+      FROM agendamento
+     WHERE id_agendamento IN :ids
+       AND status = 'ATIVO'
+       AND proxima_execucao <= :agora
+     ORDER BY proxima_execucao, id_agendamento
+       FOR UPDATE SKIP LOCKED
+""", bindparam("ids", expanding=True))
+
+SQL.registrar("agendamento.registrar_execucao", """
+    UPDATE agendamento
+       SET ocorrencia = :ocorrencia,
+           proxima_execucao = :proxima_execucao,
+           status = :status,
+           execucoes = execucoes + :executou,
+           falhas_consecutivas = :falhas_consecutivas,
+           ultima_execucao = :agora,
+           ultimo_erro = :ultimo_erro
+     WHERE id_agendamento = :id_agendamento
+""")
+
+SQL.registrar("execucao_agendador.inserir", """
+    INSERT INTO execucao_agendador (inicio, duracao_ms, carteiras, executados, falhas, adiados,
+                                    atraso_maximo_segundos)
+    VALUES (:inicio, :duracao_ms, :carteiras, :executados, :falhas, :adiados, :atraso_maximo_segundos)
+""")
+
+SQL.registrar("execucao_agendador.ultimas", """
+    SELECT id_execucao, inicio, duracao_ms, carteiras, executados, falhas, adiados, atraso_maximo_segundos
+      FROM execucao_agendador
+     ORDER BY inicio DESC, id_execucao DESC
+     LIMIT :limite
+""")
+
+# ---------------------------------------------------------
+#  Rebalanceamento: cópia das linhas de um conjunto de
+#  buckets para outro shard (ver RebalanceamentoService)
+# ---------------------------------------------------------
+
+# Tabelas com as linhas de cada carteira, na ordem de inserção (chaves
+# estrangeiras para CARTEIRA); os ids do histórico são gerados no destino.
+COLUNAS_POR_TABELA_CARTEIRA = {
+    "carteira": "endereco_carteira, hash_chave_privada, data_criacao, status_ativo, nivel_limite",
+    "saldo_carteira": "endereco_carteira, id_moeda, saldo, data_atualizacao",
+    "resumo_carteira": _COLUNAS_RESUMO,
+    "saldo_arquivado": "endereco_carteira, id_moeda, saldo, taxas, movimentacoes, ultima_data_hora",
+    "deposito_saque": "endereco_carteira, id_moeda, tipo, valor, taxa_valor, data_hora",
+    "conversao": ("endereco_carteira, id_moeda_origem, id_moeda_destino, valor_origem, valor_destino, "
+                  "taxa_percentual, taxa_valor, cotacao_utilizada, data_hora"),
+    "agendamento": _COLUNAS_AGENDAMENTO,
+    "uso_limite": "endereco_carteira, id_moeda, operacao, bucket_inicio, valor, quantidade",
+}
+_COLUNAS_TRANSFERENCIA = "referencia, endereco_origem, endereco_destino, id_moeda, valor, taxa_valor, data_hora"
+
+SQL.registrar("rebalanceamento.enderecos_pagina", """
+    SELECT endereco_carteira
+      FROM carteira
+     WHERE CRC32(endereco_carteira) % :total_buckets IN :buckets
+       AND endereco_carteira > :ultimo_endereco
+     ORDER BY endereco_carteira
+     LIMIT :limite
+""", bindparam("buckets", expanding=True))
+
+SQL.registrar("rebalanceamento.conferir", """
+    SELECT (SELECT COUNT(*) FROM carteira
+             WHERE CRC32(endereco_carteira) % :total_buckets IN :buckets) AS carteiras,
+           (SELECT COUNT(*) FROM saldo_carteira
+             WHERE CRC32(endereco_carteira) % :total_buckets IN :buckets) AS saldos,
+           (SELECT COALESCE(SUM(saldo), 0) FROM saldo_carteira
+             WHERE CRC32(endereco_carteira) % :total_buckets IN :buckets) AS soma_saldos
+""", bindparam("buckets", expanding=True))
+
+for _tabela, _colunas in COLUNAS_POR_TABELA_CARTEIRA.items():
+    _nomes = [c.strip() for c in _colunas.split(",")]
+    SQL.registrar(f"rebalanceamento.ler_{_tabela}", f"""
+    SELECT {", ".join(_nomes)}
+      FROM {_tabela}
+     WHERE endereco_carteira IN :enderecos
+""", bindparam("enderecos", expanding=True))
+    SQL.registrar(f"rebalanceamento.inserir_{_tabela}", f"""
+    INSERT INTO {_tabela} ({", ".join(_nomes)})
+    VALUES ({", ".join(":" + c for c in _nomes)})
+""")
+    SQL.registrar(f"rebalanceamento.apagar_{_tabela}", f"""
+    DELETE FROM {_tabela}
+     WHERE endereco_carteira IN :enderecos
+""", bindparam("enderecos", expanding=True))
+
+SQL.registrar("rebalanceamento.ler_transferencia", f"""
+    SELECT id_transferencia, {_COLUNAS_TRANSFERENCIA}
+      FROM transferencia
+     WHERE endereco_origem IN :enderecos
+    UNION
+    SELECT id_transferencia, {_COLUNAS_TRANSFERENCIA}
+      FROM transferencia
+     WHERE endereco_destino IN :enderecos
+""", bindparam("enderecos", expanding=True))
+
+# A outra ponta pode já ter a mesma transferência (mesma referencia)
+SQL.registrar("rebalanceamento.inserir_transferencia", f"""
+    INSERT IGNORE INTO transferencia ({_COLUNAS_TRANSFERENCIA})
+    VALUES ({", ".join(":" + c.strip() for c in _COLUNAS_TRANSFERENCIA.split(","))})
+""")
+
+SQL.registrar("rebalanceamento.apagar_transferencia", """
+    DELETE FROM transferencia
+     WHERE id_transferencia IN :ids
+""", bindparam("ids", expanding=True))
@@ -1,24 +1,67 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine, Connection
 
 
-# Carrega .env a partir da raiz do projeto
+# Raiz do projeto (onde fica o .env)
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 ENV_PATH = BASE_DIR / ".env"
-load_dotenv(ENV_PATH)
 
 
-def get_database_url() -> str:
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST", "localhost")
-    port = os.getenv("DB_PORT", "3306")
-    db = os.getenv("DB_NAME")
+_configuracao_shards: Optional[List[Tuple[str, str, str]]] = None
+
+
+def configuracao_shards() -> List[Tuple[str, str, str]]:
+    """
+    (host, porta, banco) de cada shard, na ordem dos números de shard. Lida
+    uma vez por processo (total_shards() é chamado em toda operação).
+
+    DB_SHARDS="host:porta/banco,host:porta/banco,..." define os shards; sem ela
+    há um único shard, dado por DB_HOST/DB_PORT/DB_NAME. O shard 0 também
+    guarda o mapa de shards (ver api.persistence.shards).
+    """
+    global _configuracao_shards
+    if _configuracao_shards is not None:
+        return _configuracao_shards
+
+    load_dotenv(ENV_PATH)
+
+    lista = os.getenv("DB_SHARDS", "").strip()
+    if not lista:
+        shards = [(os.getenv("DB_HOST", "localhost"), os.getenv("DB_PORT", "3306"), os.getenv("DB_NAME"))]
+    else:
+        shards = []
+        for item in lista.split(","):
+            endereco, _, db = item.strip().partition("/")
+            host, _, port = endereco.partition(":")
+            if not host or not db:
+                raise RuntimeError(f"Shard inválido em DB_SHARDS: {item.strip()!r} (use host:porta/banco).")
+            shards.append((host, port or "3306", db))
+    _configuracao_shards = shards
+    return shards
+
+
+def total_shards() -> int:
+    return len(configuracao_shards())
+
+
+def get_database_url(user: Optional[str] = None, password: Optional[str] = None, shard: int = 0) -> str:
+    # Carregado aqui, e não no import, para o import do módulo não ter efeitos
+    load_dotenv(ENV_PATH)
+
+    user = user or os.getenv("DB_USER")
+    password = password or os.getenv("DB_PASSWORD")
+    shards = configuracao_shards()
+    if not 0 <= shard < len(shards):
+        raise RuntimeError(f"Shard {shard} não configurado (há {len(shards)}).")
+    host, port, db = shards[shard]
 
     if not all([user, password, db]):
         raise RuntimeError("Variáveis de ambiente do banco não configuradas corretamente.")
@@ -27,22 +70,94 @@ def get_database_url() -> str:
     return f"mysql+mysqlconnector://{user}:{password}@{host}:{port}/{db}"
 
 
-DATABASE_URL = get_database_url()
+# Tamanho do cache de instruções compiladas do SQLAlchemy. O registro em
+# api.persistence.consultas tem algumas dezenas de instruções com texto fixo,
+# então o valor padrão cobre todas com folga sem descartes por LRU.
+QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "200"))
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
 
-engine: Engine = create_engine(
-    DATABASE_URL,
-    future=True,
-    pool_pre_ping=True,
-)
+# Uma engine (e um pool) por shard, criadas no primeiro uso
+_engines: Dict[int, Engine] = {}
+_engine_lock = threading.Lock()
+
+
+def get_engine(shard: int = 0) -> Engine:
+    """
+    Engine do shard, criada no primeiro uso (ou no startup da API, ver
+    iniciar_banco). Importar este módulo não lê o .env nem abre conexões.
+    """
+    engine = _engines.get(shard)
+    if engine is None:
+        with _engine_lock:
+            engine = _engines.get(shard)
+            if engine is None:
+                engine = create_engine(
+                    get_database_url(shard=shard),
+                    future=True,
+                    pool_pre_ping=True,
+                    pool_size=POOL_SIZE,
+                    max_overflow=MAX_OVERFLOW,
+                    query_cache_size=QUERY_CACHE_SIZE,
+                )
+                _engines[shard] = engine
+    return engine
+
+
+def aquecer_pool(quantidade: int) -> int:
+    """
+    Abre até 'quantidade' conexões em paralelo em cada shard e as devolve ao
+    pool, para que as primeiras requisições não paguem o handshake. Retorna
+    quantas abriu no total.
+    """
+    quantidade = max(0, min(quantidade, POOL_SIZE))
+    if quantidade == 0:
+        return 0
+
+    engines = [get_engine(s) for s in range(total_shards())]
+    conexoes = []
+    try:
+        with ThreadPoolExecutor(max_workers=quantidade * len(engines)) as pool:
+            alvos = [e for e in engines for _ in range(quantidade)]
+            for conn in pool.map(lambda e: e.connect(), alvos):
+                conexoes.append(conn)
+    finally:
+        for conn in conexoes:
+            conn.close()
+    return len(conexoes)
+
+
+def verificar_banco():
+    """Verificação de prontidão: uma ida e volta a cada shard. Lança exceção se algum falhar."""
+    for shard in range(total_shards()):
+        with get_engine(shard).connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+
+def encerrar_banco():
+    """Fecha todas as conexões dos pools (shutdown da API)."""
+    with _engine_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def descartar_conexoes_herdadas():
+    """
+    Em processos filhos (fork), esquece as conexões herdadas do pai sem
+    fechá-las (elas continuam sendo do pai).
+    """
+    for engine in list(_engines.values()):
+        engine.dispose(close=False)
 
 
 @contextmanager
-def get_connection() -> Connection:
+def get_connection(shard: int = 0) -> Connection:
     """
-    Entrega uma conexão do SQLAlchemy já com transação aberta.
-    Faz commit automático se der tudo certo, rollback se der erro.
+    Entrega uma conexão do SQLAlchemy (do shard informado) já com transação
+    aberta. Faz commit automático se der tudo certo, rollback se der erro.
     """
-    conn: Connection = engine.connect()
+    conn: Connection = get_engine(shard).connect()
     trans = conn.begin()
     try:
         yield conn
@@ -51,4 +166,4 @@ def get_connection() -> Connection:
         trans.rollback()
         raise
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
@@ -0,0 +1,251 @@
+import hashlib
+import importlib.util
+import os
+import re
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+
+from api.persistence.db import BASE_DIR, get_database_url
+
+DIRETORIO_MIGRACOES = BASE_DIR / "sql" / "migracoes"
+
+# Tabelas de histórico particionadas por mês (RANGE COLUMNS em data_hora)
+TABELAS_PARTICIONADAS = {
+    "deposito_saque": "id_movimento",
+    "conversao": "id_conversao",
+    "transferencia": "id_transferencia",
+}
+MESES_A_FRENTE_PADRAO = 3
+
+_PADRAO_ARQUIVO = re.compile(r"^V(\d+)__(\w+)\.(sql|py)$")
+_PADRAO_PARTICAO_MENSAL = re.compile(r"^p(\d{4})(\d{2})$")
+
+
+def criar_engine_migracao(shard: int = 0) -> Engine:
+    """
+    Engine com o usuário de migração (DB_MIGRACAO_USER/DB_MIGRACAO_PASSWORD).
+    O usuário da API só tem DML; sem essas variáveis usa DB_USER/DB_PASSWORD.
+    Todos os shards têm o mesmo esquema: migrações e partições valem para cada um.
+    """
+    url = get_database_url(os.getenv("DB_MIGRACAO_USER"), os.getenv("DB_MIGRACAO_PASSWORD"), shard)
+    return create_engine(url, future=True, pool_pre_ping=True)
+
+
+def dividir_instrucoes(sql: str) -> List[str]:
+    """Separa um arquivo .sql em instruções (';' no fim da linha), sem comentários de linha."""
+    linhas = [l for l in sql.splitlines() if not l.strip().startswith("--")]
+    instrucoes = re.split(r";\s*$", "\n".join(linhas), flags=re.MULTILINE)
+    return [i.strip() for i in instrucoes if i.strip()]
+
+
+# ---------------------------------------------------------
+#  Partições mensais
+# ---------------------------------------------------------
+
+def inicio_do_mes(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def somar_meses(d: date, meses: int) -> date:
+    total = d.year * 12 + d.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nome_particao(mes: date) -> str:
+    return f"p{mes.year:04d}{mes.month:02d}"
+
+
+def definicao_particao(mes: date) -> str:
+    """Partição do mês: data_hora < primeiro dia do mês seguinte."""
+    return f"PARTITION {nome_particao(mes)} VALUES LESS THAN ('{somar_meses(mes, 1).isoformat()}')"
+
+
+def meses_entre(primeiro: date, ultimo: date) -> List[date]:
+    meses, atual = [], inicio_do_mes(primeiro)
+    while atual <= ultimo:
+        meses.append(atual)
+        atual = somar_meses(atual, 1)
+    return meses
+
+
+class ManutencaoParticoes:
+    """
+    Mantém as partições mensais das tabelas de histórico: cria os meses
+    seguintes (dividindo a partição pmax, que fica sempre vazia) e descarta
+    meses antigos com DROP PARTITION, sem DELETE linha a linha.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def particoes(self, conn: Connection, tabela: str) -> List[str]:
+        return list(conn.execute(text("""
+            SELECT partition_name
+              FROM information_schema.partitions
+             WHERE table_schema = DATABASE()
+               AND LOWER(table_name) = :tabela
+               AND partition_name IS NOT NULL
+             ORDER BY partition_ordinal_position
+        """), {"tabela": tabela}).scalars())
+
+    @staticmethod
+    def _mes(nome: str) -> Optional[date]:
+        encontrado = _PADRAO_PARTICAO_MENSAL.match(nome)
+        return date(int(encontrado.group(1)), int(encontrado.group(2)), 1) if encontrado else None
+
+    def criar_meses(self, meses_a_frente: int = MESES_A_FRENTE_PADRAO) -> Dict[str, List[str]]:
+        """Garante partições até o mês atual + meses_a_frente. Retorna as criadas por tabela."""
+        limite = somar_meses(inicio_do_mes(date.today()), meses_a_frente)
+        criadas: Dict[str, List[str]] = {}
+
+        with self.engine.connect() as conn:
+            for tabela in TABELAS_PARTICIONADAS:
+                existentes = [m for m in map(self._mes, self.particoes(conn, tabela)) if m]
+                if not existentes:
+                    raise ValueError(f"Tabela {tabela} não está particionada por mês (aplique as migrações).")
+
+                novos = meses_entre(somar_meses(max(existentes), 1), limite)
+                if novos:
+                    definicoes = ", ".join([definicao_particao(m) for m in novos]
+                                           + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"])
+                    conn.exec_driver_sql(f"ALTER TABLE {tabela} REORGANIZE PARTITION pmax INTO ({definicoes})")
+                criadas[tabela] = [nome_particao(m) for m in novos]
+
+        return criadas
+
+    def descartar_anteriores(self, mes_limite: date) -> Dict[str, List[str]]:
+        """Remove as partições (e os dados) dos meses anteriores a mes_limite."""
+        mes_limite = inicio_do_mes(mes_limite)
+        removidas: Dict[str, List[str]] = {}
+
+        with self.engine.connect() as conn:
+            for tabela in TABELAS_PARTICIONADAS:
+                nomes = [
+                    nome for nome in self.particoes(conn, tabela)
+                    if nome == "p_anterior" or (self._mes(nome) or mes_limite) < mes_limite
+                ]
+                if nomes:
+                    conn.exec_driver_sql(f"ALTER TABLE {tabela} DROP PARTITION {', '.join(nomes)}")
+                removidas[tabela] = nomes
+
+        return removidas
+
+
+# ---------------------------------------------------------
+#  Migrações versionadas
+# ---------------------------------------------------------
+
+class Migracao:
+    """
+    Um arquivo Vnnn__descricao.sql (instruções separadas por ';') ou
+    Vnnn__descricao.py (função aplicar(conn) para o que depende dos dados).
+    """
+
+    def __init__(self, caminho: Path):
+        encontrado = _PADRAO_ARQUIVO.match(caminho.name)
+        if not encontrado:
+            raise ValueError(f"Nome de migração inválido: {caminho.name}")
+        self.caminho = caminho
+        self.versao = int(encontrado.group(1))
+        self.descricao = encontrado.group(2).replace("_", " ")
+        self.tipo = encontrado.group(3)
+        self.checksum = hashlib.sha256(caminho.read_bytes()).hexdigest()
+
+    def aplicar(self, conn: Connection):
+        if self.tipo == "sql":
+            for instrucao in dividir_instrucoes(self.caminho.read_text(encoding="utf-8")):
+                conn.exec_driver_sql(instrucao)
+            return
+
+        spec = importlib.util.spec_from_file_location(f"migracao_v{self.versao:03d}", self.caminho)
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+        modulo.aplicar(conn)
+
+
+def descobrir_migracoes(diretorio: Path = DIRETORIO_MIGRACOES) -> List[Migracao]:
+    migracoes = sorted(
+        (Migracao(c) for c in diretorio.iterdir() if _PADRAO_ARQUIVO.match(c.name)),
+        key=lambda m: m.versao,
+    )
+    versoes = [m.versao for m in migracoes]
+    if len(versoes) != len(set(versoes)):
+        raise ValueError("Há migrações com a mesma versão.")
+    return migracoes
+
+
+class Migrador:
+    """
+    Aplica as migrações pendentes em ordem e registra cada uma em
+    MIGRACAO_ESQUEMA (versão, checksum do arquivo, data).
+
+    DDL no MySQL faz commit implícito: uma migração que falhe no meio não é
+    desfeita e não é registrada. Corrija a causa e ajuste a base antes de rodar
+    de novo; por isso cada arquivo deve conter uma mudança coesa.
+    """
+
+    def __init__(self, engine: Engine, diretorio: Path = DIRETORIO_MIGRACOES):
+        self.engine = engine
+        self.diretorio = diretorio
+
+    def _garantir_controle(self, conn: Connection):
+        conn.exec_driver_sql("""
+            CREATE TABLE IF NOT EXISTS MIGRACAO_ESQUEMA(
+                versao INT NOT NULL PRIMARY KEY,
+                descricao VARCHAR(200) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                aplicada_em DATETIME NOT NULL
+            )
+        """)
+
+    def aplicadas(self) -> Dict[int, Dict[str, Any]]:
+        with self.engine.begin() as conn:
+            self._garantir_controle(conn)
+            linhas = conn.execute(text(
+                "SELECT versao, descricao, checksum, aplicada_em FROM migracao_esquema ORDER BY versao"
+            )).mappings().all()
+        return {l["versao"]: dict(l) for l in linhas}
+
+    def status(self) -> List[Dict[str, Any]]:
+        aplicadas = self.aplicadas()
+        resultado = []
+        for m in descobrir_migracoes(self.diretorio):
+            registro = aplicadas.get(m.versao)
+            resultado.append({
+                "versao": m.versao,
+                "descricao": m.descricao,
+                "aplicada_em": registro["aplicada_em"] if registro else None,
+                "alterada": bool(registro) and registro["checksum"] != m.checksum,
+            })
+        return resultado
+
+    def migrar(self, ate: Optional[int] = None) -> List[Migracao]:
+        aplicadas = self.aplicadas()
+        migracoes = descobrir_migracoes(self.diretorio)
+
+        alteradas = [m.versao for m in migracoes if m.versao in aplicadas and aplicadas[m.versao]["checksum"] != m.checksum]
+        if alteradas:
+            raise ValueError(f"Migrações já aplicadas foram alteradas: {alteradas}. Crie uma nova versão.")
+
+        executadas = []
+        for m in migracoes:
+            if m.versao in aplicadas or (ate is not None and m.versao > ate):
+                continue
+            with self.engine.begin() as conn:
+                m.aplicar(conn)
+                conn.execute(text("""
+                    INSERT INTO migracao_esquema (versao, descricao, checksum, aplicada_em)
+                    VALUES (:versao, :descricao, :checksum, :aplicada_em)
+                """), {
+                    "versao": m.versao,
+                    "descricao": m.descricao,
+                    "checksum": m.checksum,
+                    "aplicada_em": datetime.now().replace(microsecond=0),
+                })
+            executadas.append(m)
+
+        return executadas
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+from sqlalchemy.engine import Connection
+
+from api.persistence.db import get_connection
+from api.persistence.consultas import SQL
+from api.persistence.shards import SHARD_DIRETORIO, TransacaoDistribuida, shard_da_carteira
+
+
+class LoteAgendamentos:
+    """
+    Agendamentos de uma carteira reivindicados numa transação. 'conexao(shard)'
+    dá a conexão de cada shard envolvido (o da carteira e os dos destinos das
+    transferências); tudo é confirmado junto ao fim do bloco.
+    """
+
+    def __init__(self, shard: int, conexoes: Dict[int, Connection], agendamentos: List[Dict[str, Any]]):
+        self.shard = shard
+        self._conexoes = conexoes
+        self.agendamentos = agendamentos
+
+    def conexao(self, shard: int) -> Connection:
+        return self._conexoes[shard]
+
+    def tem_shard(self, shard: int) -> bool:
+        return shard in self._conexoes
+
+
+class AgendamentoRepository:
+    """
+    Agendamentos (no shard da carteira de origem) e métricas do agendador
+    (no shard 0).
+    """
+
+    @staticmethod
+    def _agora() -> datetime:
+        return datetime.now().replace(microsecond=0)
+
+    def criar(self, agendamento: Dict[str, Any]) -> None:
+        with get_connection(shard_da_carteira(agendamento["endereco_carteira"], escrita=True)) as conn:
+            SQL.executar(conn, "agendamento.inserir", {**agendamento, "agora": self._agora()})
+
+    def listar_por_carteira(self, endereco_carteira: str) -> List[Dict[str, Any]]:
+        with get_connection(shard_da_carteira(endereco_carteira)) as conn:
+            rows = SQL.executar(conn, "agendamento.listar_por_carteira", {"endereco": endereco_carteira}).mappings()
+            return [dict(r) for r in rows]
+
+    def cancelar(self, endereco_carteira: str, id_agendamento: str) -> bool:
+        with get_connection(shard_da_carteira(endereco_carteira, escrita=True)) as conn:
+            return SQL.executar(conn, "agendamento.cancelar", {
+                "id_agendamento": id_agendamento,
+                "endereco": endereco_carteira,
+            }).rowcount == 1
+
+    def vencidos(self, shard: int, agora: datetime, limite: int) -> List[Dict[str, Any]]:
+        """Agendamentos vencidos do shard, mais atrasados primeiro (leitura sem lock)."""
+        with get_connection(shard) as conn:
+            rows = SQL.executar(conn, "agendamento.vencidos", {"agora": agora, "limite": limite}).mappings()
+            return [dict(r) for r in rows]
+
+    @contextmanager
+    def reivindicar(self, endereco_carteira: str, ids: List[str], shards_destino: Iterable[int],
+                    agora: datetime) -> Iterator[LoteAgendamentos]:
+        """
+        Abre a transação da carteira (distribuída, se algum destino estiver em
+        outro shard) e trava os agendamentos informados que continuam
+        vencidos, pulando os que outro processo já travou. Lança
+        ShardEmMigracaoError se a carteira estiver sendo movida.
+        """
+        shard = shard_da_carteira(endereco_carteira, escrita=True)
+        shards = {shard, *shards_destino}
+
+        if len(shards) == 1:
+            with get_connection(shard) as conn:
+                yield self._reivindicar(shard, {shard: conn}, ids, agora)
+        else:
+            with TransacaoDistribuida(shards) as tx:
+                yield self._reivindicar(shard, {s: tx.conexao(s) for s in shards}, ids, agora)
+
+    @staticmethod
+    def _reivindicar(shard: int, conexoes: Dict[int, Connection], ids: List[str],
+                     agora: datetime) -> LoteAgendamentos:
+        rows = SQL.executar(conexoes[shard], "agendamento.reivindicar", {"ids": ids, "agora": agora}).mappings()
+        return LoteAgendamentos(shard, conexoes, [dict(r) for r in rows])
+
+    def registrar_execucao(self, conn: Connection, execucao: Dict[str, Any]) -> None:
+        """Avança o agendamento, na transação do lote."""
+        SQL.executar(conn, "agendamento.registrar_execucao", {**execucao, "agora": self._agora()})
+
+    def registrar_ciclo(self, metricas: Dict[str, Any]) -> None:
+        with get_connection(SHARD_DIRETORIO) as conn:
+            SQL.executar(conn, "execucao_agendador.inserir", metricas)
+
+    def ultimos_ciclos(self, limite: int) -> List[Dict[str, Any]]:
+        with get_connection(SHARD_DIRETORIO) as conn:
+            rows = SQL.executar(conn, "execucao_agendador.ultimas", {"limite": limite}).mappings()
+            return [dict(r) for r in rows]
@@ -0,0 +1,88 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.persistence.db import get_connection
+from api.persistence.consultas import SQL
+
+# ordem (1, 2, 3) de cada tabela nas páginas de movimentações
+TABELAS_POR_ORDEM = {1: "deposito_saque", 2: "conversao", 3: "transferencia"}
+
+
+class ArquivoRepository:
+    """
+    Controle do arquivamento: segmentos arquivados, leitura das movimentações
+    a arquivar e remoção em lotes das tabelas quentes. Cada shard arquiva as
+    suas próprias movimentações (um repositório por shard).
+    """
+
+    def __init__(self, shard: int = 0):
+        self.shard = shard
+
+    @staticmethod
+    def _agora() -> datetime:
+        return datetime.now().replace(microsecond=0)
+
+    def listar_segmentos(self) -> List[Dict[str, Any]]:
+        with get_connection(self.shard) as conn:
+            rows = SQL.executar(conn, "arquivo.segmentos").mappings().all()
+
+        return [dict(r) for r in rows]
+
+    def movimento_mais_antigo(self) -> Optional[datetime]:
+        with get_connection(self.shard) as conn:
+            return SQL.executar(conn, "arquivo.movimento_mais_antigo").scalar()
+
+    def buscar_pagina_movimentos(self, inicio: datetime, fim: datetime,
+                                 cursor: Tuple[datetime, int, int], limite: int) -> List[Dict[str, Any]]:
+        """Página de movimentações das três tabelas em [inicio, fim), após o cursor."""
+        cursor_data_hora, cursor_ordem, cursor_id = cursor
+
+        with get_connection(self.shard) as conn:
+            rows = SQL.executar(conn, "arquivo.movimentos_pagina", {
+                "inicio": inicio,
+                "fim": fim,
+                "cursor_data_hora": cursor_data_hora,
+                "cursor_ordem": cursor_ordem,
+                "cursor_id": cursor_id,
+                "limite": limite,
+            }).mappings().all()
+
+        return [dict(r) for r in rows]
+
+    def registrar_segmento(self, inicio: datetime, fim: datetime, arquivo: str, indice: str,
+                           linhas: int, checksum: str) -> int:
+        with get_connection(self.shard) as conn:
+            result = SQL.executar(conn, "arquivo.registrar_segmento", {
+                "inicio": inicio,
+                "fim": fim,
+                "arquivo": arquivo,
+                "indice": indice,
+                "linhas": linhas,
+                "checksum": checksum,
+                "criado_em": self._agora(),
+            })
+            return result.lastrowid
+
+    def concluir_segmento(self, id_segmento: int):
+        with get_connection(self.shard) as conn:
+            SQL.executar(conn, "arquivo.concluir_segmento", {
+                "id_segmento": id_segmento,
+                "concluido_em": self._agora(),
+            })
+
+    def consolidar_e_apagar(self, ordem: int, ids: List[int], inicio: datetime, fim: datetime) -> int:
+        """
+        Numa transação curta: soma as variações do lote em SALDO_ARQUIVADO e
+        apaga as linhas da tabela quente. Ids já apagados são ignorados, então
+        repetir um lote (retomada) não conta nada duas vezes.
+        """
+        if not ids:
+            return 0
+
+        tabela = TABELAS_POR_ORDEM[ordem]
+        parametros = {"ids": ids, "inicio": inicio, "fim": fim}
+
+        with get_connection(self.shard) as conn:
+            SQL.executar(conn, f"arquivo.consolidar_{tabela}", parametros)
+            result = SQL.executar(conn, f"arquivo.apagar_{tabela}", parametros)
+            return result.rowcount
@@ -1,21 +1,176 @@
+import heapq
 import os
+import random
 import secrets
 import hashlib
-from typing import Dict, Any, Optional, List
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, List, Tuple
 
 
+from sqlalchemy.engine import Connection
+
 from api.models.carteira_models import SaldoItem
-from sqlalchemy import text
+from api.models.dinheiro import ZERO, Dinheiro
+from api.models.limites import LimiteExcedidoError, LimiteJanela, inicio_da_janela, inicio_do_bucket
 from datetime import datetime
 from api.persistence.db import get_connection
+from api.persistence.consultas import SQL
+from api.persistence.cache_compartilhado import NS_CARTEIRAS, NS_MOEDAS, obter_cache
+from api.persistence.shards import TransacaoDistribuida, agrupar_por_shard, em_cada_shard, shard_da_carteira
 from decimal import Decimal
 
+# Número de linhas por bucket do resumo de taxas (espalha a disputa de lock)
+PARTICOES_RESUMO_TAXAS = int(os.getenv("RESUMO_TAXAS_PARTICOES", "8"))
+
+# Validade das carteiras no cache compartilhado: mudanças de status feitas pela
+# API invalidam a entrada na hora; o TTL cobre alterações feitas direto no banco.
+TTL_CACHE_CARTEIRAS_SEGUNDOS = float(os.getenv("CACHE_CARTEIRAS_TTL_SEGUNDOS", "300"))
+# Depois de uma alteração, a entrada vira um marcador por este tempo: uma leitura
+# que buscou a linha antiga antes do commit não consegue regravá-la no cache.
+TTL_INVALIDACAO_CARTEIRAS_SEGUNDOS = float(os.getenv("CACHE_CARTEIRAS_INVALIDACAO_SEGUNDOS", "10"))
+
 
 class CarteiraRepository:
     """
     Acesso a dados da carteira usando SQLAlchemy Core + SQL puro.
+    Todas as instruções SQL ficam no registro central (api.persistence.consultas).
+    Cada operação vai ao shard da carteira (api.persistence.shards); listagens
+    consultam todos os shards em paralelo.
     """
 
+    # Catálogo de moedas (codigo -> id_moeda), compartilhado entre instâncias.
+    # A tabela MOEDA é praticamente estática: o primeiro worker a carregá-la
+    # publica o catálogo no cache compartilhado e os demais o leem de lá.
+    _catalogo_moedas: Optional[Dict[str, int]] = None
+
+    @staticmethod
+    def _agora() -> datetime:
+        """
+        Data/hora gerada na aplicação, na mesma precisão das colunas DATETIME.
+
+        Hora local do host da aplicação (naive), no lugar do CURRENT_TIMESTAMP
+        do MySQL (fuso do servidor do banco): os hosts da API e dos jobs devem
+        rodar no fuso do servidor do banco, com relógio sincronizado (NTP).
+        Os movimentos a tomam depois do lock do saldo (saldo.bloquear), para
+        que a data siga a ordem de commit no mesmo saldo.
+        """
+        return datetime.now().replace(microsecond=0)
+
+    @staticmethod
+    @contextmanager
+    def _conexao(conn: Optional[Connection], shard: int) -> Iterator[Connection]:
+        """
+        Conexão do chamador, quando informada (ele controla a transação e o
+        commit, ex.: o agendador executando várias operações de uma vez), ou
+        uma transação nova no shard.
+        """
+        if conn is not None:
+            yield conn
+        else:
+            with get_connection(shard) as nova:
+                yield nova
+
+    def _carregar_catalogo_moedas(self, conn, usar_cache: bool = True) -> Dict[str, int]:
+        """
+        Carrega o catálogo do cache compartilhado ou, se não estiver lá (ou
+        usar_cache=False), do banco, publicando-o para os outros workers.
+        """
+        cache = obter_cache()
+        item = cache.obter(NS_MOEDAS, "catalogo") if usar_cache else None
+        if item is not None:
+            catalogo = item[0]
+        else:
+            rows = SQL.executar(conn, "moeda.listar").mappings().all()
+            catalogo = {r["codigo"]: r["id_moeda"] for r in rows}
+            cache.gravar(NS_MOEDAS, "catalogo", catalogo)
+
+        CarteiraRepository._catalogo_moedas = catalogo
+        return catalogo
+
+    def _id_moeda(self, conn, codigo_moeda: str) -> Optional[int]:
+        """
+        Resolve o id da moeda pelo catálogo em memória.
+        Se o código não for encontrado, tenta o catálogo compartilhado (outro
+        worker pode já ter recarregado) e, por fim, o banco.
+        """
+        catalogo = CarteiraRepository._catalogo_moedas
+        if catalogo is None or codigo_moeda not in catalogo:
+            catalogo = self._carregar_catalogo_moedas(conn)
+        if codigo_moeda not in catalogo:
+            catalogo = self._carregar_catalogo_moedas(conn, usar_cache=False)
+        return catalogo.get(codigo_moeda)
+
+    def aquecer_catalogo(self) -> int:
+        """Carrega o catálogo de moedas antecipadamente (startup da API). Retorna quantas moedas há."""
+        # MOEDA é igual em todos os shards: basta o primeiro
+        with get_connection() as conn:
+            return len(self._carregar_catalogo_moedas(conn))
+
+    @classmethod
+    def catalogo_carregado(cls) -> bool:
+        return cls._catalogo_moedas is not None
+
+    def _acumular_resumo_taxas(self, conn, data_hora: datetime, id_moeda: int, tipo_operacao: str,
+                               volume: Dinheiro, taxa: Dinheiro):
+        """
+        Soma a movimentação no rollup por hora (RESUMO_TAXAS), na mesma transação.
+        """
+        SQL.executar(conn, "resumo_taxas.acumular", {
+            "bucket_hora": data_hora.replace(minute=0, second=0, microsecond=0),
+            "id_moeda": id_moeda,
+            "tipo_operacao": tipo_operacao,
+            "particao": random.randrange(PARTICOES_RESUMO_TAXAS),
+            "volume": volume.para_decimal(),
+            "taxa": taxa.para_decimal(),
+        })
+
+    def _projetar(self, conn, endereco: str, codigo_moeda: str, variacao: Dinheiro, taxa: Dinheiro,
+                  data_hora: datetime, movimentacoes: int = 1):
+        """
+        Aplica a movimentação na projeção RESUMO_CARTEIRA, na mesma transação
+        da operação (a leitura das listagens nunca vê uma sem a outra).
+        """
+        SQL.executar(conn, "resumo_carteira.aplicar_movimento", {
+            "endereco": endereco,
+            "codigo_moeda": codigo_moeda,
+            "variacao": variacao.para_decimal(),
+            "taxa": taxa.para_decimal(),
+            "movimentacoes": movimentacoes,
+            "data_hora": data_hora,
+        })
+
+    def _consumir_limite(self, conn, endereco: str, id_moeda: int, codigo_moeda: str, operacao: str,
+                         valor: Dinheiro, data_hora: datetime, limite: Optional[LimiteJanela]):
+        """
+        Confere o limite da janela (se houver) e soma a operação ao intervalo
+        atual de USO_LIMITE, na transação do débito. O lock do saldo (tomado
+        antes) serializa as operações da carteira na moeda.
+        """
+        if limite is not None:
+            uso = SQL.executar(conn, "uso_limite.somar", {
+                "endereco": endereco,
+                "id_moeda": id_moeda,
+                "operacao": operacao,
+                "desde": inicio_da_janela(data_hora, limite.janela),
+            }).mappings().one()
+            usado = Dinheiro.de_decimal(uso["valor"])
+            if limite.valor_maximo is not None and usado + valor > limite.valor_maximo:
+                raise LimiteExcedidoError(
+                    f"Limite de {operacao.lower()} excedido: {usado} de {limite.valor_maximo} {codigo_moeda} "
+                    f"já usados na janela."
+                )
+            if limite.operacoes_maximas is not None and uso["quantidade"] >= limite.operacoes_maximas:
+                raise LimiteExcedidoError(
+                    f"Limite de {limite.operacoes_maximas} operações de {operacao.lower()} em {codigo_moeda} na janela atingido."
+                )
+
+        SQL.executar(conn, "uso_limite.acumular", {
+            "endereco": endereco,
+            "id_moeda": id_moeda,
+            "operacao": operacao,
+            "bucket_inicio": inicio_do_bucket(data_hora),
+            "valor": valor.para_decimal(),
+        })
 
     def criar_nova_carteira(self, endereco: str, hash_chave_privada: str, data_criacao: datetime, status: str) -> Dict[str, Any]:
         """
@@ -32,137 +187,187 @@ class CarteiraRepository:
         except ValueError:
             raise ValueError("Hash da chave privada deve ser hexadecimal.")
         
-        with get_connection() as conn:
-            conn.execute(
-                text("""
-                    INSERT INTO carteira (endereco_carteira, hash_chave_privada, data_criacao, status_ativo)
-                    VALUES (:endereco, :hash_privada, :data_criacao, :status)
-                """),
-                {
-                    "endereco": endereco,
-                    "hash_privada": hash_chave_privada.lower().strip(),
-                    "data_criacao": data_criacao,
-                    "status": status,
-                },
-            )
+        with get_connection(shard_da_carteira(endereco, escrita=True)) as conn:
+            SQL.executar(conn, "carteira.inserir", {
+                "endereco": endereco,
+                "hash_privada": hash_chave_privada.lower().strip(),
+                "data_criacao": data_criacao,
+                "status": status,
+            })
+            SQL.executar(conn, "resumo_carteira.inserir", {
+                "endereco": endereco,
+                "data_criacao": data_criacao,
+                "status": status,
+            })
 
-            row = conn.execute(
-                text("""
-                    SELECT endereco_carteira, data_criacao, status_ativo
-                    FROM carteira
-                    WHERE endereco_carteira = :endereco
-                """),
-                {"endereco": endereco},
-            ).mappings().first()
-
-        return dict(row) if row else {}
+        return {
+            "endereco_carteira": endereco,
+            "data_criacao": data_criacao,
+            "status_ativo": status,
+        }
 
 
     def buscar_por_endereco(self, endereco_carteira: str) -> Optional[Dict[str, Any]]:
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    SELECT endereco_carteira,
-                           hash_chave_privada,
-                           data_criacao,
-                           status_ativo AS status
-                      FROM carteira
-                     WHERE endereco_carteira = :endereco
-                """),
-                {"endereco": endereco_carteira},
-            ).mappings().first()
+        """
+        Dados da carteira (status e hash da chave), lidos do cache compartilhado
+        quando presentes. Carteiras inexistentes não são guardadas no cache.
+        """
+        cache = obter_cache()
+        item = cache.obter(NS_CARTEIRAS, endereco_carteira)
+        if item is not None and item[0] is not None:
+            return item[0]
 
-        return dict(row) if row else None
+        with get_connection(shard_da_carteira(endereco_carteira)) as conn:
+            row = SQL.executar(conn, "carteira.buscar_por_endereco", {"endereco": endereco_carteira}).mappings().first()
+
+        if not row:
+            return None
+
+        carteira = dict(row)
+        # Só preenche entrada ausente: com o marcador de uma alteração recente
+        # (ver _invalidar_cache), a linha lida aqui pode ser anterior ao commit
+        cache.gravar(NS_CARTEIRAS, endereco_carteira, carteira, TTL_CACHE_CARTEIRAS_SEGUNDOS, se_ausente=True)
+        return carteira
+
+    @staticmethod
+    def _invalidar_cache(endereco_carteira: str):
+        """
+        Chamado depois do commit de uma alteração da carteira. Em vez de gravar
+        a versão nova (que uma leitura ou alteração concorrente poderia
+        sobrescrever com dados antigos), deixa um marcador: até ele expirar,
+        as leituras vão ao banco.
+        """
+        obter_cache().gravar(NS_CARTEIRAS, endereco_carteira, None, TTL_INVALIDACAO_CARTEIRAS_SEGUNDOS)
 
 
     def listar(self) -> List[Dict[str, Any]]:
-        with get_connection() as conn:
-            rows = conn.execute(
-                text("""
-                    SELECT endereco_carteira,
-                           hash_chave_privada,
-                           data_criacao,
-                           status_ativo AS status
-                      FROM carteira
-                     ORDER BY data_criacao DESC
-                """)
-            ).mappings().all()
+        def listar_shard(shard: int) -> List[Dict[str, Any]]:
+            with get_connection(shard) as conn:
+                return [dict(r) for r in SQL.executar(conn, "resumo_carteira.listar").mappings()]
 
-        return [dict(r) for r in rows]
+        # Cada shard já vem ordenado (mais recentes primeiro): só intercala
+        por_shard = em_cada_shard(listar_shard)
+        if len(por_shard) == 1:
+            return por_shard[0]
+        return list(heapq.merge(*por_shard, key=lambda r: r["data_criacao"], reverse=True))
 
 
     def atualizar_status(self, endereco_carteira: str, status: str) -> Optional[Dict[str, Any]]:
-        with get_connection() as conn:
-            resultado = conn.execute(
-                text("""
-                    UPDATE carteira
-                       SET status_ativo = :status
-                     WHERE endereco_carteira = :endereco
-                """),
-                {"status": status, "endereco": endereco_carteira},
-            )
+        with get_connection(shard_da_carteira(endereco_carteira, escrita=True)) as conn:
+            row = SQL.executar(conn, "carteira.bloquear", {"endereco": endereco_carteira}).mappings().first()
 
-            if resultado.rowcount == 0:
+            if not row:
                 return None
-            
-            row = conn.execute(
-                text("""
-                    SELECT endereco_carteira,
-                           hash_chave_privada,
-                           data_criacao,
-                           status_ativo AS status
-                      FROM carteira
-                     WHERE endereco_carteira = :endereco
-                """),
-                {"endereco": endereco_carteira},
-            ).mappings().first()
 
-        return dict(row) if row else None
+            SQL.executar(conn, "carteira.atualizar_status", {"status": status, "endereco": endereco_carteira})
+            SQL.executar(conn, "resumo_carteira.atualizar_status", {"status": status, "endereco": endereco_carteira})
+
+        self._invalidar_cache(endereco_carteira)
+        carteira = dict(row)
+        carteira["status"] = status
+        return carteira
 
 
+    def atualizar_nivel_limite(self, endereco_carteira: str, nivel: str) -> Optional[Dict[str, Any]]:
+        with get_connection(shard_da_carteira(endereco_carteira, escrita=True)) as conn:
+            row = SQL.executar(conn, "carteira.bloquear", {"endereco": endereco_carteira}).mappings().first()
+
+            if not row:
+                return None
+
+            SQL.executar(conn, "carteira.atualizar_nivel_limite", {"nivel": nivel, "endereco": endereco_carteira})
+
+        self._invalidar_cache(endereco_carteira)
+        carteira = dict(row)
+        carteira["nivel_limite"] = nivel
+        return carteira
+
+    def buscar_uso_limites(self, endereco_carteira: str, desde: datetime) -> List[Dict[str, Any]]:
+        """Uso (valor e quantidade) por moeda e operação a partir de 'desde'."""
+        with get_connection(shard_da_carteira(endereco_carteira)) as conn:
+            rows = SQL.executar(conn, "uso_limite.por_carteira", {
+                "endereco": endereco_carteira,
+                "desde": desde,
+            }).mappings().all()
+
+        return [dict(r) for r in rows]
+
+    def limpar_uso_limites(self, shard: int, antes_de: datetime, limite: int) -> int:
+        """Apaga até 'limite' intervalos de uso anteriores a 'antes_de' (uma transação curta)."""
+        with get_connection(shard) as conn:
+            return SQL.executar(conn, "uso_limite.apagar_antigos", {"antes_de": antes_de, "limite": limite}).rowcount
+
     def buscar_saldos(self, endereco_carteira: str) -> List[Dict[str, Any]]:
         """
         Retorna todos os saldos de uma carteira com informações das moedas.
         """
-        with get_connection() as conn:
-            rows = conn.execute(
-                text("""
-                    SELECT sc.id_moeda,
-                           m.codigo AS codigo_moeda,
-                           m.nome AS nome_moeda,
-                           sc.saldo,
-                           sc.data_atualizacao
-                      FROM saldo_carteira sc
-                      JOIN moeda m ON sc.id_moeda = m.id_moeda
-                     WHERE sc.endereco_carteira = :endereco
-                     ORDER BY m.codigo
-                """),
-                {"endereco": endereco_carteira},
-            ).mappings().all()
+        with get_connection(shard_da_carteira(endereco_carteira)) as conn:
+            rows = SQL.executar(conn, "saldo.listar_por_carteira", {"endereco": endereco_carteira}).mappings().all()
 
         return [dict(r) for r in rows]
     
-    def buscar_saldo_por_moeda(self, endereco_carteira: str, codigo_moeda: str) -> Optional[Decimal]:
+    def buscar_saldos_carteiras(self, enderecos: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Saldos de várias carteiras numa única consulta (por shard, em paralelo),
+        agrupados por endereço: {endereco: {"status": ..., "saldos": [...]}}.
+        Carteiras sem saldo vêm com a lista vazia; endereços inexistentes não aparecem.
+        """
+        if not enderecos:
+            return {}
+
+        grupos = agrupar_por_shard(enderecos)
+
+        def consultar_shard(shard: int):
+            with get_connection(shard) as conn:
+                return SQL.executar(conn, "saldo.listar_por_carteiras", {"enderecos": grupos[shard]}).mappings().all()
+
+        carteiras: Dict[str, Dict[str, Any]] = {}
+        for r in (r for rows in em_cada_shard(consultar_shard, grupos) for r in rows):
+            carteira = carteiras.setdefault(r["endereco_carteira"], {"status": r["status"], "saldos": []})
+            if r["id_moeda"] is not None:
+                carteira["saldos"].append({
+                    "id_moeda": r["id_moeda"],
+                    "codigo_moeda": r["codigo_moeda"],
+                    "nome_moeda": r["nome_moeda"],
+                    "saldo": Dinheiro.de_decimal(r["saldo"]),
+                    "data_atualizacao": r["data_atualizacao"],
+                })
+        return carteiras
+
+    def existe_moeda(self, codigo_moeda: str) -> bool:
+        """Consulta o catálogo de moedas (só vai ao banco se o código não estiver em memória)."""
+        catalogo = CarteiraRepository._catalogo_moedas
+        if catalogo is not None and codigo_moeda in catalogo:
+            return True
+        with get_connection() as conn:
+            return self._id_moeda(conn, codigo_moeda) is not None
+
+    def buscar_versao_saldos(self, endereco_carteira: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna um resumo agregado (status, quantidade, última atualização e checksum)
+        dos saldos da carteira, sem trafegar as linhas de saldo.
+        Retorna None se a carteira não existir.
+        """
+        with get_connection(shard_da_carteira(endereco_carteira)) as conn:
+            row = SQL.executar(conn, "saldo.versao_por_carteira", {"endereco": endereco_carteira}).mappings().first()
+
+        return dict(row) if row else None
+
+    def buscar_saldo_por_moeda(self, endereco_carteira: str, codigo_moeda: str) -> Optional[Dinheiro]:
         """
         Retorna o saldo de uma moeda específica de uma carteira.
         Retorna None se a carteira não tiver saldo para essa moeda.
         """
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    SELECT sc.saldo
-                      FROM saldo_carteira sc
-                      JOIN moeda m ON sc.id_moeda = m.id_moeda
-                     WHERE sc.endereco_carteira = :endereco
-                       AND m.codigo = :codigo_moeda
-                """),
-                {"endereco": endereco_carteira, "codigo_moeda": codigo_moeda},
-            ).mappings().first()
+        with get_connection(shard_da_carteira(endereco_carteira)) as conn:
+            row = SQL.executar(conn, "saldo.buscar_por_codigo", {
+                "endereco": endereco_carteira,
+                "codigo_moeda": codigo_moeda,
+            }).mappings().first()
 
         if not row:
             return None
         
-        return row["saldo"]
+        return Dinheiro.de_decimal(row["saldo"])
     
     def inicializar_saldos(self, endereco_carteira: str, saldos_iniciais: List[SaldoItem]):
         codigos = [s.codigo_moeda for s in saldos_iniciais]
@@ -172,24 +377,10 @@ class CarteiraRepository:
             if not codigo.isalnum() or len(codigo) > 5:
                 raise ValueError(f"Código de moeda inválido: {codigo}")
         
-        with get_connection() as conn:
-            # Como os códigos vêm de uma lista fixa e validada, podemos usar f-string com segurança
-            # Mas ainda melhor seria usar uma abordagem mais segura
-            codigos_quoted = ', '.join([f"'{c}'" for c in codigos])
-            
-            moedas_map = conn.execute(
-                text(f"""
-                    SELECT id_moeda, codigo
-                    FROM moeda
-                    WHERE codigo IN ({codigos_quoted})
-                """)
-            ).mappings().all()
-            
-            moeda_id_map = {m["codigo"]: m["id_moeda"] for m in moedas_map}
-            
+        with get_connection(shard_da_carteira(endereco_carteira, escrita=True)) as conn:
             dados_para_insercao = []
             for saldo_item in saldos_iniciais:
-                id_moeda = moeda_id_map.get(saldo_item.codigo_moeda)
+                id_moeda = self._id_moeda(conn, saldo_item.codigo_moeda)
                 
                 if id_moeda is None:
                     print(f"Aviso: Moeda {saldo_item.codigo_moeda} não encontrada no DB. Ignorando inicialização.")
@@ -198,17 +389,11 @@ class CarteiraRepository:
                 dados_para_insercao.append({
                     "endereco_carteira": endereco_carteira,
                     "id_moeda": id_moeda,
-                    "saldo": saldo_item.saldo,
+                    "saldo": saldo_item.saldo.para_decimal(),
                 })
             
             if dados_para_insercao:
-                conn.execute(
-                    text("""
-                        INSERT INTO saldo_carteira (endereco_carteira, id_moeda, saldo)
-                        VALUES (:endereco_carteira, :id_moeda, :saldo)
-                    """),
-                    dados_para_insercao,
-                )
+                SQL.executar(conn, "saldo.inserir", dados_para_insercao)
     
     def validar_chave_privada(self, endereco_carteira: str, chave_privada: str) -> bool:
         """
@@ -226,15 +411,8 @@ class CarteiraRepository:
         # Calcula o hash da chave fornecida
         hash_fornecido = hashlib.sha256(chave_privada_limpa.encode('utf-8')).hexdigest()
         
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    SELECT hash_chave_privada
-                      FROM carteira
-                     WHERE endereco_carteira = :endereco
-                """),
-                {"endereco": endereco_carteira},
-            ).mappings().first()
+        # O hash não muda depois de criada a carteira: vem do cache compartilhado
+        row = self.buscar_por_endereco(endereco_carteira)
 
         if not row:
             return False
@@ -255,53 +433,36 @@ class CarteiraRepository:
         return hash_fornecido == hash_armazenado
 
 
-    def registrar_deposito(self, endereco_carteira: str, codigo_moeda: str, valor: Decimal) -> Dict[str, Any]:
-        with get_connection() as conn:
-            moeda_row = conn.execute(
-                text("SELECT id_moeda FROM moeda WHERE codigo = :codigo"),
-                {"codigo": codigo_moeda}
-            ).mappings().first()
+    def registrar_deposito(self, endereco_carteira: str, codigo_moeda: str, valor: Dinheiro) -> Dict[str, Any]:
+        with get_connection(shard_da_carteira(endereco_carteira, escrita=True)) as conn:
+            id_moeda = self._id_moeda(conn, codigo_moeda)
 
-            if not moeda_row:
+            if id_moeda is None:
                 raise ValueError(f"Moeda com código {codigo_moeda} não encontrada.")
-            
-            id_moeda = moeda_row["id_moeda"]
-
-            movimento_result = conn.execute(
-                text("""
-                    INSERT INTO deposito_saque (endereco_carteira, id_moeda, tipo, valor, taxa_valor)
-                    VALUES (:endereco, :id_moeda, 'DEPOSITO', :valor, 0.00)
-                """),
-                {
-                    "endereco": endereco_carteira,
-                    "id_moeda": id_moeda,
-                    "valor": valor
-                },
-            )
+
+            self._bloquear_carteira(conn, endereco_carteira)
+            data_hora = self._agora()
+
+            movimento_result = SQL.executar(conn, "deposito_saque.inserir", {
+                "endereco": endereco_carteira,
+                "id_moeda": id_moeda,
+                "tipo": "DEPOSITO",
+                "valor": valor.para_decimal(),
+                "taxa": ZERO.para_decimal(),
+                "data_hora": data_hora,
+            })
             
             id_movimento = movimento_result.lastrowid
 
-            conn.execute(
-                text("""
-                    INSERT INTO saldo_carteira (endereco_carteira, id_moeda, saldo)
-                    VALUES (:endereco, :id_moeda, :valor)
-                    ON DUPLICATE KEY UPDATE saldo = saldo + :valor, data_atualizacao = CURRENT_TIMESTAMP
-                """),
-                {
-                    "endereco": endereco_carteira,
-                    "id_moeda": id_moeda,
-                    "valor": valor
-                },
-            )
+            SQL.executar(conn, "saldo.creditar", {
+                "endereco": endereco_carteira,
+                "id_moeda": id_moeda,
+                "valor": valor.para_decimal(),
+                "data_atualizacao": data_hora,
+            })
 
-            movimento_data = conn.execute(
-                text("""
-                    SELECT id_movimento, data_hora
-                    FROM deposito_saque
-                    WHERE id_movimento = :id
-                """),
-                {"id": id_movimento}
-            ).mappings().first()
+            self._acumular_resumo_taxas(conn, data_hora, id_moeda, "DEPOSITO", valor, ZERO)
+            self._projetar(conn, endereco_carteira, codigo_moeda, valor, ZERO, data_hora)
         
         return {
             "id_movimento": id_movimento,
@@ -309,75 +470,52 @@ class CarteiraRepository:
             "codigo_moeda": codigo_moeda,
             "tipo": "DEPOSITO",
             "valor": valor,
-            "taxa_valor": Decimal("0.00"),
-            "data_hora": movimento_data["data_hora"]
+            "taxa_valor": ZERO,
+            "data_hora": data_hora
         }
         
-    def registrar_saque(self, endereco_carteira: str, codigo_moeda: str, valor: Decimal, taxa: Decimal, valor_total_debito: Decimal) -> Dict[str, Any]:
+    def registrar_saque(self, endereco_carteira: str, codigo_moeda: str, valor: Dinheiro, taxa: Dinheiro,
+                        valor_total_debito: Dinheiro, limite: Optional[LimiteJanela] = None) -> Dict[str, Any]:
         """
-        Executa o saque de forma transacional: verifica saldo, registra o movimento e debita o saldo.
+        Executa o saque de forma transacional: verifica saldo e limite, registra o movimento e debita o saldo.
         """
-        with get_connection() as conn:
-            moeda_row = conn.execute(
-                text("SELECT id_moeda FROM moeda WHERE codigo = :codigo"),
-                {"codigo": codigo_moeda}
-            ).mappings().first()
+        with get_connection(shard_da_carteira(endereco_carteira, escrita=True)) as conn:
+            id_moeda = self._id_moeda(conn, codigo_moeda)
 
-            if not moeda_row:
+            if id_moeda is None:
                 raise ValueError(f"Moeda com código {codigo_moeda} não encontrada.")
             
-            id_moeda = moeda_row["id_moeda"]
-
-            saldo_row = conn.execute(
-                text("""
-                    SELECT saldo FROM saldo_carteira
-                    WHERE endereco_carteira = :endereco AND id_moeda = :id_moeda
-                    FOR UPDATE
-                """),
-                {"endereco": endereco_carteira, "id_moeda": id_moeda}
-            ).mappings().first()
-
-            saldo_atual = saldo_row["saldo"] if saldo_row else Decimal("0.00")
+            saldo_row = SQL.executar(conn, "saldo.bloquear", {"endereco": endereco_carteira, "id_moeda": id_moeda}).mappings().first()
+            # Depois do lock: a data segue a ordem de commit dos movimentos do saldo
+            data_hora = self._agora()
+
+            saldo_atual = Dinheiro.de_decimal(saldo_row["saldo"]) if saldo_row else ZERO
             
             if saldo_atual < valor_total_debito:
                 raise ValueError(f"Saldo insuficiente ({saldo_atual}) para débito total de ({valor_total_debito}).")
 
-            movimento_result = conn.execute(
-                text("""
-                    INSERT INTO deposito_saque (endereco_carteira, id_moeda, tipo, valor, taxa_valor)
-                    VALUES (:endereco, :id_moeda, 'SAQUE', :valor, :taxa)
-                """),
-                {
-                    "endereco": endereco_carteira,
-                    "id_moeda": id_moeda,
-                    "valor": valor,
-                    "taxa": taxa
-                },
-            )
+            self._consumir_limite(conn, endereco_carteira, id_moeda, codigo_moeda, "SAQUE", valor, data_hora, limite)
+
+            movimento_result = SQL.executar(conn, "deposito_saque.inserir", {
+                "endereco": endereco_carteira,
+                "id_moeda": id_moeda,
+                "tipo": "SAQUE",
+                "valor": valor.para_decimal(),
+                "taxa": taxa.para_decimal(),
+                "data_hora": data_hora,
+            })
             
             id_movimento = movimento_result.lastrowid
 
-            conn.execute(
-                text("""
-                    UPDATE saldo_carteira
-                    SET saldo = saldo - :total_debito, data_atualizacao = CURRENT_TIMESTAMP
-                    WHERE endereco_carteira = :endereco AND id_moeda = :id_moeda
-                """),
-                {
-                    "endereco": endereco_carteira,
-                    "id_moeda": id_moeda,
-                    "total_debito": valor_total_debito
-                },
-            )
+            SQL.executar(conn, "saldo.debitar", {
+                "endereco": endereco_carteira,
+                "id_moeda": id_moeda,
+                "valor": valor_total_debito.para_decimal(),
+                "data_atualizacao": data_hora,
+            })
 
-            movimento_data = conn.execute(
-                text("""
-                    SELECT data_hora
-                    FROM deposito_saque
-                    WHERE id_movimento = :id
-                """),
-                {"id": id_movimento}
-            ).mappings().first()
+            self._acumular_resumo_taxas(conn, data_hora, id_moeda, "SAQUE", valor, taxa)
+            self._projetar(conn, endereco_carteira, codigo_moeda, -valor_total_debito, taxa, data_hora)
         
         return {
             "id_movimento": id_movimento,
@@ -386,96 +524,68 @@ class CarteiraRepository:
             "tipo": "SAQUE",
             "valor": valor,
             "taxa_valor": taxa,
-            "data_hora": movimento_data["data_hora"]
+            "data_hora": data_hora
         }
     
     def registrar_conversao(self, endereco_carteira: str, codigo_origem: str, codigo_destino: str, 
-                            valor_origem: Decimal, valor_destino: Decimal, taxa_percentual: Decimal, 
-                            taxa_valor: Decimal, cotacao_utilizada: Decimal) -> Dict[str, Any]:
+                            valor_origem: Dinheiro, valor_destino: Dinheiro, taxa_percentual: Decimal, 
+                            taxa_valor: Dinheiro, cotacao_utilizada: Decimal,
+                            conn: Optional[Connection] = None) -> Dict[str, Any]:
         """
         Executa a conversão de forma transacional: registra a operação, debita a origem e credita o destino.
+        Com 'conn', roda na transação do chamador (conexão do shard da carteira).
         """
-        with get_connection() as conn:
-            moedas_map = conn.execute(
-                text(f"""
-                    SELECT id_moeda, codigo
-                    FROM moeda
-                    WHERE codigo IN ('{codigo_origem}', '{codigo_destino}')
-                """)
-            ).mappings().all()
-
-            if len(moedas_map) < 2:
+        if codigo_origem == codigo_destino:
+            raise ValueError("Moedas de origem e destino devem ser diferentes.")
+
+        with self._conexao(conn, shard_da_carteira(endereco_carteira, escrita=True)) as conn:
+            id_moeda_origem = self._id_moeda(conn, codigo_origem)
+            id_moeda_destino = self._id_moeda(conn, codigo_destino)
+
+            if id_moeda_origem is None or id_moeda_destino is None:
                 raise ValueError("Moeda de origem ou destino não encontrada no cadastro.")
-            
-            id_moeda_origem = next(m["id_moeda"] for m in moedas_map if m["codigo"] == codigo_origem)
-            id_moeda_destino = next(m["id_moeda"] for m in moedas_map if m["codigo"] == codigo_destino)
-
-            saldo_origem_row = conn.execute(
-                text("""
-                    SELECT saldo FROM saldo_carteira
-                    WHERE endereco_carteira = :endereco AND id_moeda = :id_origem
-                    FOR UPDATE
-                """),
-                {"endereco": endereco_carteira, "id_origem": id_moeda_origem}
-            ).mappings().first()
-
-            saldo_atual = saldo_origem_row["saldo"] if saldo_origem_row else Decimal("0.00")
+
+            saldo_origem_row = SQL.executar(conn, "saldo.bloquear", {"endereco": endereco_carteira, "id_moeda": id_moeda_origem}).mappings().first()
+            data_hora = self._agora()
+
+            saldo_atual = Dinheiro.de_decimal(saldo_origem_row["saldo"]) if saldo_origem_row else ZERO
             
             if saldo_atual < valor_origem:
                 raise ValueError(f"Saldo insuficiente ({saldo_atual}) na moeda {codigo_origem} para conversão.")
 
-            conn.execute(
-                text("""
-                    UPDATE saldo_carteira
-                       SET saldo = saldo - :valor_origem, data_atualizacao = CURRENT_TIMESTAMP
-                     WHERE endereco_carteira = :endereco AND id_moeda = :id_origem
-                """),
-                {
-                    "endereco": endereco_carteira,
-                    "id_origem": id_moeda_origem,
-                    "valor_origem": valor_origem
-                },
-            )
+            SQL.executar(conn, "saldo.debitar", {
+                "endereco": endereco_carteira,
+                "id_moeda": id_moeda_origem,
+                "valor": valor_origem.para_decimal(),
+                "data_atualizacao": data_hora,
+            })
             
-            conn.execute(
-                text("""
-                    INSERT INTO saldo_carteira (endereco_carteira, id_moeda, saldo)
-                    VALUES (:endereco, :id_destino, :valor_destino)
-                    ON DUPLICATE KEY UPDATE saldo = saldo + :valor_destino, data_atualizacao = CURRENT_TIMESTAMP
-                """),
-                {
-                    "endereco": endereco_carteira,
-                    "id_destino": id_moeda_destino,
-                    "valor_destino": valor_destino
-                },
-            )
+            SQL.executar(conn, "saldo.creditar", {
+                "endereco": endereco_carteira,
+                "id_moeda": id_moeda_destino,
+                "valor": valor_destino.para_decimal(),
+                "data_atualizacao": data_hora,
+            })
             
-            movimento_result = conn.execute(
-                text("""
-                    INSERT INTO conversao (endereco_carteira, id_moeda_origem, id_moeda_destino, valor_origem, 
-                                           valor_destino, taxa_percentual, taxa_valor, cotacao_utilizada)
-                    VALUES (:endereco, :id_origem, :id_destino, :v_origem, :v_destino, :t_perc, :t_valor, :cotacao)
-                """),
-                {
-                    "endereco": endereco_carteira,
-                    "id_origem": id_moeda_origem,
-                    "id_destino": id_moeda_destino,
-                    "v_origem": valor_origem,
-                    "v_destino": valor_destino,
-                    "t_perc": taxa_percentual,
-                    "t_valor": taxa_valor,
-                    "cotacao": cotacao_utilizada
-                },
-            )
+            movimento_result = SQL.executar(conn, "conversao.inserir", {
+                "endereco": endereco_carteira,
+                "id_origem": id_moeda_origem,
+                "id_destino": id_moeda_destino,
+                "v_origem": valor_origem.para_decimal(),
+                "v_destino": valor_destino.para_decimal(),
+                "t_perc": taxa_percentual,
+                "t_valor": taxa_valor.para_decimal(),
+                "cotacao": cotacao_utilizada,
+                "data_hora": data_hora,
+            })
             
             id_conversao = movimento_result.lastrowid
-            
-            movimento_data = conn.execute(
-                text("""
-                    SELECT data_hora FROM conversao WHERE id_conversao = :id
-                """),
-                {"id": id_conversao}
-            ).mappings().first()
+
+            # A taxa da conversão é cobrada na moeda de destino
+            self._acumular_resumo_taxas(conn, data_hora, id_moeda_destino, "CONVERSAO", valor_destino, taxa_valor)
+            # Uma movimentação, contada no lado de destino (onde a taxa é cobrada)
+            self._projetar(conn, endereco_carteira, codigo_origem, -valor_origem, ZERO, data_hora, 0)
+            self._projetar(conn, endereco_carteira, codigo_destino, valor_destino, taxa_valor, data_hora)
                 
         return {
             "id_conversao": id_conversao,
@@ -486,88 +596,56 @@ class CarteiraRepository:
             "valor_destino": valor_destino,
             "taxa_valor": taxa_valor,
             "cotacao_utilizada": cotacao_utilizada,
-            "data_hora": movimento_data["data_hora"]
+            "data_hora": data_hora
         }
         
     def registrar_transferencia(self, endereco_origem: str, endereco_destino: str, codigo_moeda: str, 
-                                valor_liquido: Decimal, valor_total_debito: Decimal, taxa_valor: Decimal) -> Dict[str, Any]:
+                                valor_liquido: Dinheiro, valor_total_debito: Dinheiro, taxa_valor: Dinheiro,
+                                conn: Optional[Connection] = None,
+                                conn_destino: Optional[Connection] = None,
+                                limite: Optional[LimiteJanela] = None) -> Dict[str, Any]:
         """
-        Executa a transferência de forma transacional: debita a origem, credita o destino e registra o movimento.
+        Executa a transferência de forma transacional: confere saldo e limite, debita a origem, credita o destino e registra o movimento.
+        Com origem e destino em shards diferentes, usa uma transação distribuída
+        (XA) e grava a linha da transferência nos dois shards.
+
+        Com 'conn' (shard da origem), roda na transação do chamador; se o
+        destino estiver em outro shard, 'conn_destino' (do shard do destino,
+        na mesma transação distribuída) é obrigatória.
         """
-        with get_connection() as conn:
-            moeda_row = conn.execute(
-                text("SELECT id_moeda FROM moeda WHERE codigo = :codigo"),
-                {"codigo": codigo_moeda}
-            ).mappings().first()
+        shard_origem = shard_da_carteira(endereco_origem, escrita=True)
+        shard_destino = shard_da_carteira(endereco_destino, escrita=True)
+        referencia = secrets.token_hex(16)
 
-            if not moeda_row:
-                raise ValueError(f"Moeda com código {codigo_moeda} não encontrada.")
-            
-            id_moeda = moeda_row["id_moeda"]
-
-            saldo_origem_row = conn.execute(
-                text("""
-                    SELECT saldo FROM saldo_carteira
-                    WHERE endereco_carteira = :endereco_origem AND id_moeda = :id_moeda
-                    FOR UPDATE
-                """),
-                {"endereco_origem": endereco_origem, "id_moeda": id_moeda}
-            ).mappings().first()
-
-            saldo_atual = saldo_origem_row["saldo"] if saldo_origem_row else Decimal("0.00")
-            
-            if saldo_atual < valor_total_debito:
-                raise ValueError(f"Saldo insuficiente ({saldo_atual}) na origem para débito total de ({valor_total_debito}).")
-
-            conn.execute(
-                text("""
-                    UPDATE saldo_carteira
-                       SET saldo = saldo - :total_debito, data_atualizacao = CURRENT_TIMESTAMP
-                     WHERE endereco_carteira = :endereco_origem AND id_moeda = :id_moeda
-                """),
-                {
-                    "endereco_origem": endereco_origem,
-                    "id_moeda": id_moeda,
-                    "total_debito": valor_total_debito
-                },
-            )
-            
-            conn.execute(
-                text("""
-                    INSERT INTO saldo_carteira (endereco_carteira, id_moeda, saldo)
-                    VALUES (:endereco_destino, :id_moeda, :valor_liquido)
-                    ON DUPLICATE KEY UPDATE saldo = saldo + :valor_liquido, data_atualizacao = CURRENT_TIMESTAMP
-                """),
-                {
-                    "endereco_destino": endereco_destino,
-                    "id_moeda": id_moeda,
-                    "valor_liquido": valor_liquido
-                },
-            )
-            
-            movimento_result = conn.execute(
-                text("""
-                    INSERT INTO transferencia (endereco_origem, endereco_destino, id_moeda, valor, taxa_valor)
-                    VALUES (:origem, :destino, :id_moeda, :valor_liquido, :taxa_valor)
-                """),
-                {
-                    "origem": endereco_origem,
-                    "destino": endereco_destino,
-                    "id_moeda": id_moeda,
-                    "valor_liquido": valor_liquido,
-                    "taxa_valor": taxa_valor
-                },
+        if conn is not None and shard_origem != shard_destino and conn_destino is None:
+            raise RuntimeError("Transferência entre shards na transação do chamador exige a conexão do destino.")
+
+        if shard_origem == shard_destino:
+            with self._conexao(conn, shard_origem) as conn:
+                id_moeda = self._id_moeda(conn, codigo_moeda)
+                if id_moeda is None:
+                    raise ValueError(f"Moeda com código {codigo_moeda} não encontrada.")
+
+                self._bloquear_carteira(conn, endereco_destino)
+                id_transferencia, data_hora = self._registrar_saida_transferencia(
+                    conn, endereco_origem, endereco_destino, codigo_moeda, id_moeda,
+                    valor_liquido, valor_total_debito, taxa_valor, referencia, limite,
+                )
+                self._registrar_entrada_transferencia(
+                    conn, endereco_destino, codigo_moeda, id_moeda, valor_liquido, data_hora,
+                )
+        elif conn is not None:
+            id_transferencia, data_hora = self._registrar_transferencia_entre_shards(
+                conn, conn_destino, endereco_origem, endereco_destino, codigo_moeda,
+                valor_liquido, valor_total_debito, taxa_valor, referencia, limite,
             )
-            
-            id_transferencia = movimento_result.lastrowid
-            
-            movimento_data = conn.execute(
-                text("""
-                    SELECT data_hora FROM transferencia WHERE id_transferencia = :id
-                """),
-                {"id": id_transferencia}
-            ).mappings().first()
-                
+        else:
+            with TransacaoDistribuida([shard_origem, shard_destino]) as tx:
+                id_transferencia, data_hora = self._registrar_transferencia_entre_shards(
+                    tx.conexao(shard_origem), tx.conexao(shard_destino), endereco_origem, endereco_destino,
+                    codigo_moeda, valor_liquido, valor_total_debito, taxa_valor, referencia, limite,
+                )
+
         return {
             "id_transferencia": id_transferencia,
             "endereco_origem": endereco_origem,
@@ -575,5 +653,98 @@ class CarteiraRepository:
             "codigo_moeda": codigo_moeda,
             "valor": valor_liquido,
             "taxa_valor": taxa_valor,
-            "data_hora": movimento_data["data_hora"]
-        }
\ No newline at end of file
+            "data_hora": data_hora
+        }
+
+    def _registrar_transferencia_entre_shards(self, conn_origem, conn_destino, endereco_origem: str,
+                                             endereco_destino: str, codigo_moeda: str, valor_liquido: Dinheiro,
+                                             valor_total_debito: Dinheiro, taxa_valor: Dinheiro, referencia: str,
+                                             limite: Optional[LimiteJanela]) -> Tuple[int, datetime]:
+        id_moeda = self._id_moeda(conn_origem, codigo_moeda)
+        if id_moeda is None:
+            raise ValueError(f"Moeda com código {codigo_moeda} não encontrada.")
+
+        self._bloquear_carteira(conn_destino, endereco_destino)
+        id_transferencia, data_hora = self._registrar_saida_transferencia(
+            conn_origem, endereco_origem, endereco_destino, codigo_moeda, id_moeda,
+            valor_liquido, valor_total_debito, taxa_valor, referencia, limite,
+        )
+        # A mesma linha (mesma referencia) no shard do destino, para o
+        # extrato e a reconciliação dele; o rollup de taxas fica na origem.
+        self._inserir_transferencia(
+            conn_destino, endereco_origem, endereco_destino, id_moeda,
+            valor_liquido, taxa_valor, referencia, data_hora,
+        )
+        self._registrar_entrada_transferencia(
+            conn_destino, endereco_destino, codigo_moeda, id_moeda, valor_liquido, data_hora,
+        )
+        return id_transferencia, data_hora
+
+    def _bloquear_carteira(self, conn, endereco_carteira: str):
+        """
+        Trava compartilhada na linha da carteira antes de gravar histórico:
+        as tabelas de histórico particionadas não têm chave estrangeira (V003),
+        então é isto que garante que a carteira existe até o commit.
+        """
+        if SQL.executar(conn, "carteira.bloquear_compartilhado", {"endereco": endereco_carteira}).first() is None:
+            raise ValueError("Carteira não encontrada")
+
+    def _inserir_transferencia(self, conn, endereco_origem: str, endereco_destino: str, id_moeda: int,
+                               valor_liquido: Dinheiro, taxa_valor: Dinheiro, referencia: str,
+                               data_hora: datetime) -> int:
+        movimento_result = SQL.executar(conn, "transferencia.inserir", {
+            "referencia": referencia,
+            "origem": endereco_origem,
+            "destino": endereco_destino,
+            "id_moeda": id_moeda,
+            "valor_liquido": valor_liquido.para_decimal(),
+            "taxa_valor": taxa_valor.para_decimal(),
+            "data_hora": data_hora,
+        })
+        return movimento_result.lastrowid
+
+    def _registrar_saida_transferencia(self, conn, endereco_origem: str, endereco_destino: str, codigo_moeda: str,
+                                       id_moeda: int, valor_liquido: Dinheiro, valor_total_debito: Dinheiro,
+                                       taxa_valor: Dinheiro, referencia: str,
+                                       limite: Optional[LimiteJanela]) -> Tuple[int, datetime]:
+        """
+        Lado da origem: verifica saldo e limite, debita, registra a transferência
+        e a taxa. Devolve o id da transferência e a data/hora do movimento,
+        tomada depois do lock do saldo da origem.
+        """
+        saldo_origem_row = SQL.executar(conn, "saldo.bloquear", {"endereco": endereco_origem, "id_moeda": id_moeda}).mappings().first()
+        data_hora = self._agora()
+
+        saldo_atual = Dinheiro.de_decimal(saldo_origem_row["saldo"]) if saldo_origem_row else ZERO
+        
+        if saldo_atual < valor_total_debito:
+            raise ValueError(f"Saldo insuficiente ({saldo_atual}) na origem para débito total de ({valor_total_debito}).")
+
+        self._consumir_limite(conn, endereco_origem, id_moeda, codigo_moeda, "TRANSFERENCIA", valor_liquido,
+                              data_hora, limite)
+
+        SQL.executar(conn, "saldo.debitar", {
+            "endereco": endereco_origem,
+            "id_moeda": id_moeda,
+            "valor": valor_total_debito.para_decimal(),
+            "data_atualizacao": data_hora,
+        })
+
+        id_transferencia = self._inserir_transferencia(
+            conn, endereco_origem, endereco_destino, id_moeda, valor_liquido, taxa_valor, referencia, data_hora,
+        )
+
+        self._acumular_resumo_taxas(conn, data_hora, id_moeda, "TRANSFERENCIA", valor_liquido, taxa_valor)
+        self._projetar(conn, endereco_origem, codigo_moeda, -valor_total_debito, taxa_valor, data_hora)
+        return id_transferencia, data_hora
+
+    def _registrar_entrada_transferencia(self, conn, endereco_destino: str, codigo_moeda: str, id_moeda: int,
+                                         valor_liquido: Dinheiro, data_hora: datetime):
+        """Lado do destino: credita o valor líquido."""
+        SQL.executar(conn, "saldo.creditar", {
+            "endereco": endereco_destino,
+            "id_moeda": id_moeda,
+            "valor": valor_liquido.para_decimal(),
+            "data_atualizacao": data_hora,
+        })
+        self._projetar(conn, endereco_destino, codigo_moeda, valor_liquido, ZERO, data_hora)
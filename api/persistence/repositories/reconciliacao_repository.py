@@ -0,0 +1,64 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from api.persistence.db import get_connection
+from api.persistence.consultas import SQL
+
+
+class ReconciliacaoRepository:
+    """
+    Consultas agregadas (por conjunto) usadas na reconciliação de saldos.
+    Cada shard é reconciliado separadamente: as consultas partem das carteiras
+    do próprio shard, então a cópia de uma transferência entre shards só conta
+    para a ponta que está nele.
+    """
+
+    def __init__(self, shard: int = 0):
+        self.shard = shard
+
+    def divergencias_faixa(self, de: str, ate: str, tolerancia: Decimal) -> List[Dict[str, Any]]:
+        """
+        Compara saldo x saldo esperado de todas as carteiras com endereço em [de, ate).
+        Retorna apenas as linhas divergentes.
+        """
+        with get_connection(self.shard) as conn:
+            rows = SQL.executar(conn, "reconciliacao.divergencias_faixa", {
+                "de": de,
+                "ate": ate,
+                "tolerancia": tolerancia,
+            }).mappings().all()
+
+        return [dict(r) for r in rows]
+
+    def divergencias_carteiras(self, enderecos: List[str], tolerancia: Decimal) -> List[Dict[str, Any]]:
+        if not enderecos:
+            return []
+
+        with get_connection(self.shard) as conn:
+            rows = SQL.executar(conn, "reconciliacao.divergencias_carteiras", {
+                "enderecos": enderecos,
+                "tolerancia": tolerancia,
+            }).mappings().all()
+
+        return [dict(r) for r in rows]
+
+    def carteiras_alteradas(self, de: str, ate: str, desde: datetime) -> List[str]:
+        with get_connection(self.shard) as conn:
+            rows = SQL.executar(conn, "reconciliacao.carteiras_alteradas", {
+                "de": de,
+                "ate": ate,
+                "desde": desde,
+            }).all()
+
+        return [r[0] for r in rows]
+
+    def movimentos(self, endereco_carteira: str, id_moeda: int, limite: int) -> List[Dict[str, Any]]:
+        with get_connection(self.shard) as conn:
+            rows = SQL.executar(conn, "reconciliacao.movimentos", {
+                "endereco": endereco_carteira,
+                "id_moeda": id_moeda,
+                "limite": limite,
+            }).mappings().all()
+
+        return [dict(r) for r in rows]
@@ -0,0 +1,124 @@
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from api.persistence.db import get_connection, total_shards
+from api.persistence.consultas import SQL
+from api.persistence.shards import em_cada_shard, shard_da_carteira
+
+TAMANHO_LOTE_PADRAO = 50_000
+
+
+class RelatorioRepository:
+    """
+    Consultas de leitura em massa usadas por relatórios e jobs em lote.
+    Com vários shards, percorrem (ou consultam em paralelo) todos eles.
+    """
+
+    def listar_moedas(self) -> List[Dict[str, Any]]:
+        # MOEDA é igual em todos os shards
+        with get_connection() as conn:
+            rows = SQL.executar(conn, "moeda.listar").mappings().all()
+
+        return [dict(r) for r in rows]
+
+    def iterar_saldos(self, tamanho_lote: int = TAMANHO_LOTE_PADRAO) -> Iterator[List[tuple]]:
+        """
+        Percorre SALDO_CARTEIRA em ordem de (endereco_carteira, id_moeda), em lotes
+        de tuplas (endereco_carteira, id_moeda, saldo em unidades de 10^-8).
+
+        A paginação é por chave (keyset) sobre a chave primária, então a memória
+        fica limitada ao tamanho do lote. Todas as páginas de um shard são lidas
+        na mesma transação, o que dá uma visão consistente dos saldos dele; os
+        shards são percorridos um após o outro (as linhas de cada carteira
+        continuam contíguas). O saldo já vem como inteiro escalado
+        (Dinheiro.unidades, exato) para o cálculo vetorizado.
+        """
+        for shard in range(total_shards()):
+            ultimo_endereco, ultimo_id_moeda = "", -1
+
+            with get_connection(shard) as conn:
+                while True:
+                    lote = SQL.executar(conn, "relatorio.saldos_pagina", {
+                        "ultimo_endereco": ultimo_endereco,
+                        "ultimo_id_moeda": ultimo_id_moeda,
+                        "limite": tamanho_lote,
+                    }).all()
+
+                    if not lote:
+                        break
+
+                    yield [tuple(r) for r in lote]
+
+                    if len(lote) < tamanho_lote:
+                        break
+                    ultimo_endereco, ultimo_id_moeda = lote[-1][0], lote[-1][1]
+
+    def resumo_taxas(self, inicio: datetime, fim: datetime, granularidade: str) -> List[Dict[str, Any]]:
+        """
+        Lê apenas o rollup RESUMO_TAXAS, agrupado por hora ou por dia. Cada
+        shard tem o seu rollup: as linhas de mesmo período, moeda e operação
+        são somadas.
+        """
+        consulta = "relatorio.taxas_por_dia" if granularidade == "dia" else "relatorio.taxas_por_hora"
+
+        def consultar_shard(shard: int) -> List[Dict[str, Any]]:
+            with get_connection(shard) as conn:
+                return [dict(r) for r in SQL.executar(conn, consulta, {"inicio": inicio, "fim": fim}).mappings()]
+
+        por_shard = em_cada_shard(consultar_shard)
+        if len(por_shard) == 1:
+            return por_shard[0]
+
+        somadas: Dict[tuple, Dict[str, Any]] = {}
+        for row in (r for rows in por_shard for r in rows):
+            chave = (row["periodo"], row["codigo_moeda"], row["tipo_operacao"])
+            atual = somadas.get(chave)
+            if atual is None:
+                somadas[chave] = row
+            else:
+                for coluna in ("quantidade", "volume", "taxa_total"):
+                    atual[coluna] += row[coluna]
+        return [somadas[chave] for chave in sorted(somadas)]
+
+    def reconstruir_resumo_taxas(self, inicio: datetime, fim: datetime):
+        """
+        Recalcula RESUMO_TAXAS no intervalo a partir das tabelas de histórico.
+        Usado para carga inicial de períodos anteriores ao rollup. Cada shard
+        recalcula o seu (uma transação por shard).
+        """
+        def reconstruir_shard(shard: int):
+            with get_connection(shard) as conn:
+                SQL.executar(conn, "resumo_taxas.limpar_periodo", {"inicio": inicio, "fim": fim})
+                for consulta in ("resumo_taxas.reconstruir_deposito_saque",
+                                 "resumo_taxas.reconstruir_conversao",
+                                 "resumo_taxas.reconstruir_transferencia"):
+                    SQL.executar(conn, consulta, {"inicio": inicio, "fim": fim})
+
+        em_cada_shard(reconstruir_shard)
+
+    def buscar_pagina_extrato(self, endereco_carteira: Optional[str], inicio: datetime, fim: datetime,
+                              cursor: Tuple[datetime, int, int], limite: int,
+                              shard: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Uma página do extrato (depósitos/saques, conversões e transferências),
+        em ordem de (data_hora, ordem, id_movimento), após o cursor informado.
+        Sem endereço, retorna as movimentações de todas as carteiras do shard
+        no período. Com endereço, o shard padrão é o da carteira.
+        """
+        consulta = "extrato.pagina_carteira" if endereco_carteira else "extrato.pagina_periodo"
+        cursor_data_hora, cursor_ordem, cursor_id = cursor
+        if shard is None:
+            shard = shard_da_carteira(endereco_carteira) if endereco_carteira else 0
+
+        with get_connection(shard) as conn:
+            rows = SQL.executar(conn, consulta, {
+                "endereco": endereco_carteira,
+                "inicio": inicio,
+                "fim": fim,
+                "cursor_data_hora": cursor_data_hora,
+                "cursor_ordem": cursor_ordem,
+                "cursor_id": cursor_id,
+                "limite": limite,
+            }).mappings().all()
+
+        return [dict(r) for r in rows]
@@ -0,0 +1,87 @@
+import heapq
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.models.carteira_models import MOEDAS_OBRIGATORIAS
+from api.models.dinheiro import Dinheiro
+from api.persistence.db import get_connection
+from api.persistence.consultas import SQL
+from api.persistence.shards import em_cada_shard, shard_da_carteira
+
+ORDENACOES_RESUMO = ("data_criacao", "ultima_atividade")
+
+
+class ResumoCarteiraRepository:
+    """
+    Leitura e reconstrução da projeção RESUMO_CARTEIRA. A manutenção
+    incremental fica no CarteiraRepository, na transação de cada operação.
+    """
+
+    def buscar(self, ordenar_por: str, status: Optional[str], codigo_moeda: Optional[str],
+               saldo_minimo: Optional[Decimal], ativa_desde: Optional[datetime],
+               cursor: Optional[Tuple[datetime, str]], limite: int) -> List[Dict[str, Any]]:
+        """
+        Página de carteiras (mais recentes primeiro), após o cursor (valor da
+        ordenação, endereço). Cada shard devolve a sua página e elas são
+        intercaladas pela mesma chave, cortando no limite.
+        """
+        if ordenar_por not in ORDENACOES_RESUMO:
+            raise ValueError(f"Ordenação inválida: {ordenar_por}.")
+
+        cursor_valor, cursor_endereco = cursor if cursor else (None, None)
+
+        parametros = {
+            "status": status,
+            "codigo_moeda": codigo_moeda,
+            "saldo_minimo": saldo_minimo if saldo_minimo is not None else Decimal("0"),
+            "ativa_desde": ativa_desde,
+            "cursor_valor": cursor_valor,
+            "cursor_endereco": cursor_endereco,
+            "limite": limite,
+        }
+
+        def buscar_shard(shard: int) -> List[Dict[str, Any]]:
+            with get_connection(shard) as conn:
+                rows = SQL.executar(conn, f"resumo_carteira.buscar_por_{ordenar_por}", parametros).mappings()
+                return [dict(r) for r in rows]
+
+        por_shard = em_cada_shard(buscar_shard)
+        if len(por_shard) == 1:
+            return por_shard[0]
+        intercaladas = heapq.merge(*por_shard, key=lambda r: (r[ordenar_por], r["endereco_carteira"]), reverse=True)
+        return [r for _, r in zip(range(limite), intercaladas)]
+
+    def enderecos_pagina(self, ultimo_endereco: str, limite: int, shard: int = 0) -> List[str]:
+        with get_connection(shard) as conn:
+            return list(SQL.executar(conn, "resumo_carteira.enderecos_pagina", {
+                "ultimo_endereco": ultimo_endereco,
+                "limite": limite,
+            }).scalars())
+
+    def reconstruir(self, enderecos: List[str], shard: int = 0) -> int:
+        """Recalcula as linhas das carteiras informadas (todas do shard) a partir das tabelas de origem."""
+        if not enderecos:
+            return 0
+
+        with get_connection(shard) as conn:
+            SQL.executar(conn, "resumo_carteira.reconstruir", {"enderecos": enderecos})
+        return len(enderecos)
+
+    def buscar_saldos(self, endereco_carteira: str) -> Optional[Dict[str, Any]]:
+        """
+        Saldos absolutos da carteira e a versão da linha (incrementada na
+        transação de cada operação), lidos juntos: {"versao": ..., "saldos": [...]}.
+        """
+        with get_connection(shard_da_carteira(endereco_carteira)) as conn:
+            row = SQL.executar(conn, "resumo_carteira.saldos", {"endereco": endereco_carteira}).mappings().first()
+
+        if not row:
+            return None
+        return {
+            "versao": row["versao"],
+            "saldos": [
+                {"codigo_moeda": codigo, "saldo": Dinheiro.de_decimal(row[f"saldo_{codigo.lower()}"])}
+                for codigo in MOEDAS_OBRIGATORIAS
+            ],
+        }
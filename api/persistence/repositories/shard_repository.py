@@ -0,0 +1,111 @@
+from datetime import datetime
+from typing import Any, Dict, List, Set
+
+from api.persistence.db import get_connection
+from api.persistence.consultas import COLUNAS_POR_TABELA_CARTEIRA, SQL
+from api.persistence.shards import SHARD_DIRETORIO, TOTAL_BUCKETS
+
+
+class ShardRepository:
+    """
+    Mapa de shards (no diretório) e cópia/remoção das linhas de um conjunto de
+    carteiras entre shards, usadas pelo rebalanceamento.
+    """
+
+    @staticmethod
+    def _agora() -> datetime:
+        return datetime.now().replace(microsecond=0)
+
+    # --- mapa -------------------------------------------------------------
+
+    def listar_mapa(self) -> List[Dict[str, Any]]:
+        with get_connection(SHARD_DIRETORIO) as conn:
+            return [dict(r) for r in SQL.executar(conn, "mapa_shards.listar").mappings()]
+
+    def inicializar_mapa(self, total_shards: int) -> int:
+        """Cria as entradas que faltam, distribuindo os buckets em rodízio (bucket % total_shards)."""
+        with get_connection(SHARD_DIRETORIO) as conn:
+            existentes = {r["bucket"] for r in SQL.executar(conn, "mapa_shards.listar").mappings()}
+            novos = [
+                {"bucket": b, "shard": b % total_shards, "agora": self._agora()}
+                for b in range(TOTAL_BUCKETS) if b not in existentes
+            ]
+            if novos:
+                SQL.executar(conn, "mapa_shards.inserir", novos)
+        return len(novos)
+
+    def _mudar_mapa(self, nome: str, parametros: Dict[str, Any]) -> int:
+        with get_connection(SHARD_DIRETORIO) as conn:
+            return SQL.executar(conn, nome, {**parametros, "agora": self._agora()}).rowcount
+
+    def marcar_migrando(self, buckets: List[int], origem: int) -> int:
+        return self._mudar_mapa("mapa_shards.marcar_migrando", {"buckets": buckets, "origem": origem})
+
+    def concluir_migracao(self, buckets: List[int], origem: int, destino: int) -> int:
+        return self._mudar_mapa("mapa_shards.concluir_migracao",
+                                {"buckets": buckets, "origem": origem, "destino": destino})
+
+    def cancelar_migracao(self, buckets: List[int], origem: int) -> int:
+        return self._mudar_mapa("mapa_shards.cancelar_migracao", {"buckets": buckets, "origem": origem})
+
+    # --- linhas das carteiras ---------------------------------------------
+
+    def enderecos_pagina(self, shard: int, buckets: List[int], ultimo_endereco: str, limite: int) -> List[str]:
+        with get_connection(shard) as conn:
+            return list(SQL.executar(conn, "rebalanceamento.enderecos_pagina", {
+                "total_buckets": TOTAL_BUCKETS,
+                "buckets": buckets,
+                "ultimo_endereco": ultimo_endereco,
+                "limite": limite,
+            }).scalars())
+
+    def conferir(self, shard: int, buckets: List[int]) -> Dict[str, Any]:
+        """Quantidade de carteiras e de saldos e soma dos saldos dos buckets no shard."""
+        with get_connection(shard) as conn:
+            return dict(SQL.executar(conn, "rebalanceamento.conferir", {
+                "total_buckets": TOTAL_BUCKETS,
+                "buckets": buckets,
+            }).mappings().one())
+
+    def ler_transferencias(self, shard: int, enderecos: List[str]) -> List[Dict[str, Any]]:
+        with get_connection(shard) as conn:
+            rows = SQL.executar(conn, "rebalanceamento.ler_transferencia", {"enderecos": enderecos}).mappings()
+            return [dict(r) for r in rows]
+
+    def copiar_carteiras(self, origem: int, destino: int, enderecos: List[str]) -> None:
+        """
+        Copia todas as linhas das carteiras de 'origem' para 'destino' numa
+        transação no destino. Linhas que já estejam lá (cópia interrompida)
+        são apagadas antes, então repetir a cópia é seguro.
+        """
+        if not enderecos:
+            return
+
+        with get_connection(origem) as conn:
+            linhas = {
+                tabela: [dict(r) for r in SQL.executar(conn, f"rebalanceamento.ler_{tabela}",
+                                                        {"enderecos": enderecos}).mappings()]
+                for tabela in COLUNAS_POR_TABELA_CARTEIRA
+            }
+        transferencias = self.ler_transferencias(origem, enderecos)
+
+        with get_connection(destino) as conn:
+            self._apagar_tabelas(conn, enderecos)
+            for tabela, rows in linhas.items():
+                if rows:
+                    SQL.executar(conn, f"rebalanceamento.inserir_{tabela}", rows)
+            if transferencias:
+                SQL.executar(conn, "rebalanceamento.inserir_transferencia", transferencias)
+
+    def apagar_carteiras(self, shard: int, enderecos: List[str], transferencias: Set[int]) -> None:
+        """Remove as linhas das carteiras do shard e as transferências informadas (ids)."""
+        with get_connection(shard) as conn:
+            self._apagar_tabelas(conn, enderecos)
+            if transferencias:
+                SQL.executar(conn, "rebalanceamento.apagar_transferencia", {"ids": sorted(transferencias)})
+
+    @staticmethod
+    def _apagar_tabelas(conn, enderecos: List[str]):
+        # Ordem inversa da inserção: CARTEIRA por último (chaves estrangeiras)
+        for tabela in reversed(list(COLUNAS_POR_TABELA_CARTEIRA)):
+            SQL.executar(conn, f"rebalanceamento.apagar_{tabela}", {"enderecos": enderecos})
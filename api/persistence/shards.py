@@ -0,0 +1,332 @@
+"""
+Distribuição das carteiras entre shards (bancos MySQL independentes, ver
+DB_SHARDS em api.persistence.db).
+
+Cada carteira cai num bucket, CRC32(endereco) % TOTAL_BUCKETS (a mesma conta
+do CRC32() do MySQL, usada pelo rebalanceamento para selecionar as linhas de
+um bucket). O mapa bucket -> shard fica em MAPA_SHARDS, no shard 0 (diretório),
+e é lido com cache em memória por SHARDS_MAPA_TTL_SEGUNDOS; mover um bucket é
+copiar as linhas e trocar a entrada do mapa (api.jobs.rebalancear_shards).
+
+Tudo que é de uma carteira (CARTEIRA, SALDO_CARTEIRA, histórico, RESUMO_CARTEIRA,
+SALDO_ARQUIVADO) fica no shard dela. Uma transferência entre carteiras de shards
+diferentes grava a mesma linha (mesma referencia) nos dois, numa transação XA
+coordenada por TransacaoDistribuida. O catálogo (MOEDA) é igual em todos os
+shards (carga da V001), então os ids de moeda valem em qualquer um.
+
+Com um único shard (sem DB_SHARDS) o mapa não é consultado. Para testar com
+vários, bastam bancos separados (no mesmo servidor ou em instâncias locais em
+portas diferentes), por exemplo
+DB_SHARDS="localhost:3306/carteira_0,localhost:3307/carteira_1", seguidos de
+api.jobs.migrar e api.jobs.rebalancear_shards inicializar.
+"""
+import os
+import secrets
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, TypeVar
+
+from sqlalchemy.engine import Connection
+
+from api.persistence.consultas import SQL
+from api.persistence.db import get_connection, get_engine, total_shards
+
+TOTAL_BUCKETS = 1024
+SHARD_DIRETORIO = 0
+
+ESTADO_ATIVO = "ATIVO"
+ESTADO_MIGRANDO = "MIGRANDO"
+
+# Por quanto tempo cada processo usa o mapa sem reler. O rebalanceamento espera
+# mais do que isso entre marcar um bucket e copiá-lo (ver RebalanceamentoService).
+TTL_MAPA_SEGUNDOS = float(os.getenv("SHARDS_MAPA_TTL_SEGUNDOS", "5"))
+THREADS_CONSULTA = int(os.getenv("SHARDS_THREADS", "16"))
+
+PREFIXO_XID = "carteira-"
+
+T = TypeVar("T")
+
+
+class ShardEmMigracaoError(Exception):
+    """Carteira num bucket sendo movido entre shards: escritas recusadas por alguns segundos."""
+
+
+def bucket_da_carteira(endereco_carteira: str) -> int:
+    return zlib.crc32(endereco_carteira.encode("utf-8")) % TOTAL_BUCKETS
+
+
+class MapaShards:
+    """Mapa bucket -> shard do processo, relido do diretório a cada TTL."""
+
+    def __init__(self, ttl: float = TTL_MAPA_SEGUNDOS):
+        self.ttl = ttl
+        self._shards: Optional[List[int]] = None
+        self._migrando: FrozenSet[int] = frozenset()
+        self._carregado_em = 0.0
+        self._lock = threading.Lock()
+
+    def _vencido(self) -> bool:
+        return self._shards is None or time.monotonic() - self._carregado_em > self.ttl
+
+    def _carregar(self):
+        total = total_shards()
+        if total == 1:
+            shards, migrando = [0] * TOTAL_BUCKETS, set()
+        else:
+            with get_connection(SHARD_DIRETORIO) as conn:
+                rows = SQL.executar(conn, "mapa_shards.listar").mappings().all()
+            if len(rows) != TOTAL_BUCKETS:
+                raise RuntimeError(
+                    "Mapa de shards incompleto: rode python -m api.jobs.rebalancear_shards inicializar."
+                )
+            shards, migrando = [0] * TOTAL_BUCKETS, set()
+            for r in rows:
+                if r["shard"] >= total:
+                    raise RuntimeError(f"O mapa aponta para o shard {r['shard']}, que não está em DB_SHARDS.")
+                shards[r["bucket"]] = r["shard"]
+                if r["estado"] == ESTADO_MIGRANDO:
+                    migrando.add(r["bucket"])
+
+        self._shards, self._migrando = shards, frozenset(migrando)
+        self._carregado_em = time.monotonic()
+
+    def _atual(self):
+        if self._vencido():
+            with self._lock:
+                if self._vencido():
+                    self._carregar()
+        return self._shards, self._migrando
+
+    def shard(self, endereco_carteira: str, escrita: bool = False) -> int:
+        shards, migrando = self._atual()
+        bucket = bucket_da_carteira(endereco_carteira)
+        if escrita and bucket in migrando:
+            raise ShardEmMigracaoError("Carteira em migração entre shards; tente novamente em alguns segundos.")
+        return shards[bucket]
+
+    def invalidar(self):
+        with self._lock:
+            self._shards = None
+
+
+mapa_shards = MapaShards()
+
+
+def shard_da_carteira(endereco_carteira: str, escrita: bool = False) -> int:
+    """Shard da carteira; com escrita=True lança ShardEmMigracaoError se o bucket estiver sendo movido."""
+    if total_shards() == 1:
+        return 0
+    return mapa_shards.shard(endereco_carteira, escrita)
+
+
+def agrupar_por_shard(enderecos: Iterable[str]) -> Dict[int, List[str]]:
+    grupos: Dict[int, List[str]] = {}
+    for endereco in enderecos:
+        grupos.setdefault(shard_da_carteira(endereco), []).append(endereco)
+    return grupos
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def em_cada_shard(funcao: Callable[[int], T], shards: Optional[Iterable[int]] = None) -> List[T]:
+    """
+    Executa funcao(shard) em paralelo em cada shard (todos, por padrão) e
+    devolve os resultados na ordem dos shards. Com um shard, roda direto.
+    """
+    global _executor
+    shards = list(range(total_shards())) if shards is None else list(shards)
+    if len(shards) <= 1:
+        return [funcao(s) for s in shards]
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=THREADS_CONSULTA, thread_name_prefix="shards")
+    return list(_executor.map(funcao, shards))
+
+
+# ---------------------------------------------------------
+#  Transações entre shards (XA)
+# ---------------------------------------------------------
+
+def _agora() -> datetime:
+    return datetime.now().replace(microsecond=0)
+
+
+class TransacaoDistribuida:
+    """
+    Transação XA (two-phase commit) nos shards informados, usada quando uma
+    operação grava em mais de um (transferência entre shards).
+
+        with TransacaoDistribuida([0, 1]) as tx:
+            ... SQL.executar(tx.conexao(0), ...) ...
+
+    O log em TRANSACAO_DISTRIBUIDA (shard 0) é o ponto de decisão: depois que
+    todos os participantes fazem PREPARE, o coordenador muda INICIADA para
+    CONFIRMADA e a transação vale em todos; antes disso, qualquer falha desfaz
+    tudo. Se o processo cair entre o PREPARE e o COMMIT, as transações ficam
+    preparadas nos shards e api.jobs.recuperar_transacoes_shards as conclui
+    (ou desfaz) pelo estado do log.
+    """
+
+    def __init__(self, shards: Iterable[int]):
+        self.xid = PREFIXO_XID + secrets.token_hex(16)
+        self.shards = sorted(set(shards))
+        self._conexoes: Dict[int, Connection] = {}
+        self._transacoes: Dict[int, Any] = {}
+
+    def conexao(self, shard: int) -> Connection:
+        return self._conexoes[shard]
+
+    def __enter__(self) -> "TransacaoDistribuida":
+        with get_connection(SHARD_DIRETORIO) as conn:
+            SQL.executar(conn, "transacao_distribuida.iniciar", {
+                "xid": self.xid,
+                "shards": ",".join(str(s) for s in self.shards),
+                "agora": _agora(),
+            })
+        try:
+            for shard in self.shards:
+                conn = get_engine(shard).connect()
+                self._conexoes[shard] = conn
+                self._transacoes[shard] = conn.begin_twophase(self.xid)
+        except Exception:
+            self._desfazer()
+            raise
+        return self
+
+    def __exit__(self, tipo, erro, rastro) -> bool:
+        if tipo is not None:
+            self._desfazer()
+            return False
+
+        try:
+            for transacao in self._transacoes.values():
+                transacao.prepare()
+        except Exception:
+            self._desfazer()
+            raise
+
+        try:
+            confirmada = self._decidir("CONFIRMADA")
+        except Exception:
+            # Não se sabe se a decisão foi gravada: as transações ficam
+            # preparadas e a recuperação segue o que estiver no log.
+            self._abandonar()
+            raise
+        if not confirmada:
+            # A recuperação abortou a transação antes (coordenador lento demais)
+            self._desfazer(registrar=False)
+            raise RuntimeError(f"Transação distribuída {self.xid} abortada pela recuperação.")
+
+        pendentes = []
+        for shard, transacao in self._transacoes.items():
+            try:
+                transacao.commit()
+            except Exception as e:
+                pendentes.append(shard)
+                print(f"Aviso: COMMIT da transação {self.xid} falhou no shard {shard} ({e}); "
+                      f"será concluída por api.jobs.recuperar_transacoes_shards.")
+        if pendentes:
+            self._abandonar(pendentes)
+        else:
+            self._fechar()
+            with get_connection(SHARD_DIRETORIO) as conn:
+                SQL.executar(conn, "transacao_distribuida.concluir", {"xid": self.xid, "agora": _agora()})
+        return False
+
+    def _decidir(self, estado: str) -> bool:
+        with get_connection(SHARD_DIRETORIO) as conn:
+            result = SQL.executar(conn, "transacao_distribuida.decidir", {
+                "xid": self.xid, "estado": estado, "agora": _agora(),
+            })
+            return result.rowcount == 1
+
+    def _desfazer(self, registrar: bool = True):
+        for shard, transacao in self._transacoes.items():
+            try:
+                transacao.rollback()
+            except Exception as e:
+                print(f"Aviso: ROLLBACK da transação {self.xid} falhou no shard {shard}: {e}")
+        self._fechar()
+        if registrar:
+            try:
+                self._decidir("ABORTADA")
+            except Exception as e:
+                print(f"Aviso: não foi possível registrar a transação {self.xid} como abortada: {e}")
+
+    def _abandonar(self, shards: Optional[Iterable[int]] = None):
+        # Conexões com transação preparada não podem voltar ao pool (o reset
+        # faria ROLLBACK); descartadas, a transação continua preparada no banco.
+        for shard in (self.shards if shards is None else shards):
+            self._conexoes.pop(shard).invalidate()
+        self._fechar()
+
+    def _fechar(self):
+        for conn in self._conexoes.values():
+            conn.close()
+        self._conexoes.clear()
+
+
+def recuperar_transacoes(idade_minima: timedelta = timedelta(minutes=5)) -> List[Dict[str, Any]]:
+    """
+    Conclui as transações XA criadas há mais de 'idade_minima' que ficaram
+    preparadas nos shards: COMMIT se o log as registrou como CONFIRMADA,
+    ROLLBACK se foram abortadas ou continuam INICIADA (o coordenador não
+    chegou a decidir; o log é marcado ABORTADA antes, para ele não confirmar
+    depois).
+    Retorna uma linha por transação tratada (xid, shard, acao).
+    """
+    limite = _agora() - idade_minima
+    preparadas: Dict[str, List[int]] = {}
+    for shard in range(total_shards()):
+        engine = get_engine(shard)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for xid in engine.dialect.do_recover_twophase(conn):
+                xid = xid.decode("utf-8") if isinstance(xid, (bytes, bytearray)) else str(xid)
+                if xid.startswith(PREFIXO_XID):
+                    preparadas.setdefault(xid, []).append(shard)
+
+    log: Dict[str, Dict[str, Any]] = {}
+    if preparadas:
+        with get_connection(SHARD_DIRETORIO) as conn:
+            rows = SQL.executar(conn, "transacao_distribuida.buscar", {"xids": list(preparadas)}).mappings().all()
+        log = {r["xid"]: dict(r) for r in rows}
+
+    tratadas = []
+    for xid, shards in preparadas.items():
+        registro = log.get(xid)
+        if registro and registro["criada_em"] >= limite:
+            continue  # o coordenador ainda pode estar trabalhando nela
+        estado = registro["estado"] if registro else None
+        if estado == "INICIADA":
+            with get_connection(SHARD_DIRETORIO) as conn:
+                SQL.executar(conn, "transacao_distribuida.decidir", {"xid": xid, "estado": "ABORTADA", "agora": _agora()})
+                estado = SQL.executar(conn, "transacao_distribuida.buscar", {"xids": [xid]}).mappings().first()["estado"]
+
+        confirmar = estado in ("CONFIRMADA", "CONCLUIDA")
+        for shard in shards:
+            engine = get_engine(shard)
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                if confirmar:
+                    engine.dialect.do_commit_twophase(conn, xid, is_prepared=True, recover=True)
+                else:
+                    engine.dialect.do_rollback_twophase(conn, xid, is_prepared=True, recover=True)
+            tratadas.append({"xid": xid, "shard": shard, "acao": "COMMIT" if confirmar else "ROLLBACK"})
+
+        if confirmar:
+            with get_connection(SHARD_DIRETORIO) as conn:
+                SQL.executar(conn, "transacao_distribuida.concluir", {"xid": xid, "agora": _agora()})
+
+    # Confirmadas sem nada preparado: o COMMIT chegou aos shards, só faltou o log
+    with get_connection(SHARD_DIRETORIO) as conn:
+        for xid in SQL.executar(conn, "transacao_distribuida.confirmadas_antes_de", {"antes_de": limite}).scalars():
+            if xid not in preparadas:
+                SQL.executar(conn, "transacao_distribuida.concluir", {"xid": xid, "agora": _agora()})
+
+    return tratadas
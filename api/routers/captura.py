@@ -0,0 +1,202 @@
+"""
+Middleware ASGI da captura de tráfego (ver api.services.captura_service).
+
+Só age com a captura ligada e em requisições amostradas das rotas
+/carteiras (menos o stream de eventos). Antes da primeira requisição de cada
+carteira amostrada (e do destino de cada transferência), grava o estado dela
+(status, nível de limites e saldos), que a reprodução usa para montar o banco
+novo; é a única leitura extra no caminho da requisição, uma vez por carteira
+e processo.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from api.persistence.repositories.carteira_repository import CarteiraRepository
+from api.services.captura_service import (
+    CABECALHO_CHAVE_PRIVADA,
+    CABECALHOS_CAPTURADOS,
+    FRACAO_AMOSTRAGEM,
+    EscritorCaptura,
+    escritor_captura,
+    na_amostra,
+    redigir,
+    tokenizar,
+)
+
+PREFIXO_CAPTURADO = "/carteiras"
+_CAMINHO_CARTEIRA = re.compile(r"^/carteiras/([0-9a-fA-F]{32})(?:/|$)")
+# Requisições com corpo maior não são capturadas
+TAMANHO_MAXIMO_CORPO = 64 * 1024
+
+
+def _json_ou_none(dados: bytes) -> Any:
+    try:
+        return json.loads(dados) if dados else None
+    except ValueError:
+        return None
+
+
+async def _ler_corpo(receive) -> Tuple[Optional[bytes], Callable[[], Awaitable[Dict[str, Any]]]]:
+    """
+    Lê o corpo inteiro e devolve um 'receive' que o entrega de novo ao app.
+    Corpo None = não capturar (grande demais ou cliente desconectou).
+    """
+    mensagens: List[Dict[str, Any]] = []
+    tamanho = 0
+    while True:
+        mensagem = await receive()
+        mensagens.append(mensagem)
+        if mensagem["type"] != "http.request":
+            break
+        tamanho += len(mensagem.get("body", b""))
+        if not mensagem.get("more_body", False):
+            break
+
+    completo = mensagens[-1]["type"] == "http.request" and tamanho <= TAMANHO_MAXIMO_CORPO
+    corpo = b"".join(m.get("body", b"") for m in mensagens) if completo else None
+
+    async def receber() -> Dict[str, Any]:
+        if mensagens:
+            return mensagens.pop(0)
+        return await receive()
+
+    return corpo, receber
+
+
+class MiddlewareCaptura:
+
+    def __init__(self, app, escritor: EscritorCaptura = escritor_captura, fracao: float = FRACAO_AMOSTRAGEM,
+                 carteira_repo: Optional[CarteiraRepository] = None):
+        self.app = app
+        self.escritor = escritor
+        self.fracao = fracao
+        self.carteira_repo = carteira_repo or CarteiraRepository()
+        # Carteiras cujo estado este processo já gravou (ou que nasceram na captura)
+        self._conhecidas: Set[str] = set()
+
+    async def __call__(self, scope, receive, send):
+        caminho = scope.get("path", "")
+        if (scope["type"] != "http" or not self.escritor.ativo or caminho.endswith("/eventos")
+                or not (caminho == PREFIXO_CAPTURADO or caminho.startswith(PREFIXO_CAPTURADO + "/"))):
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope["method"]
+        encontrado = _CAMINHO_CARTEIRA.match(caminho)
+        endereco = encontrado.group(1) if encontrado else None
+        criacao = metodo == "POST" and caminho.rstrip("/") == PREFIXO_CAPTURADO
+        if endereco is not None:
+            amostrada = na_amostra(endereco, self.fracao)
+        else:
+            # Criação: decidida pelo endereço criado, depois da resposta
+            amostrada = criacao or random.random() < self.fracao
+        if not amostrada:
+            await self.app(scope, receive, send)
+            return
+
+        corpo_bytes, receber = await _ler_corpo(receive)
+        if corpo_bytes is None:
+            await self.app(scope, receber, send)
+            return
+        corpo = _json_ou_none(corpo_bytes)
+
+        if endereco is not None:
+            await self._gravar_estados(endereco, corpo)
+
+        # Da resposta só interessam o id criado e a cotação usada
+        guardar_resposta = criacao or (metodo == "POST" and caminho.endswith(("/conversoes", "/agendamentos")))
+        resposta = {"status": 500, "partes": []}
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                resposta["status"] = mensagem["status"]
+            elif mensagem["type"] == "http.response.body" and guardar_resposta:
+                resposta["partes"].append(mensagem.get("body", b""))
+            await send(mensagem)
+
+        t = time.time()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receber, enviar)
+        finally:
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            self._registrar(scope, caminho, corpo, t, duracao_ms, resposta["status"],
+                            _json_ou_none(b"".join(resposta["partes"])), criacao)
+
+    def _registrar(self, scope, caminho: str, corpo: Any, t: float, duracao_ms: float, status: int,
+                   resposta: Any, criacao: bool):
+        registro = {
+            "tipo": "requisicao",
+            "t": t,
+            "metodo": scope["method"],
+            "caminho": caminho,
+            "consulta": scope.get("query_string", b"").decode("latin-1"),
+            "cabecalhos": self._cabecalhos(scope),
+            "corpo": redigir(corpo),
+            "status": status,
+            "duracao_ms": round(duracao_ms, 3),
+        }
+
+        if criacao:
+            criado = resposta.get("endereco_carteira") if isinstance(resposta, dict) else None
+            if not criado or not na_amostra(criado, self.fracao):
+                return
+            self._conhecidas.add(criado)
+            registro["criado"] = criado
+        elif isinstance(resposta, dict):
+            if "id_agendamento" in resposta:
+                registro["criado"] = resposta["id_agendamento"]
+            elif resposta.get("cotacao_utilizada") is not None:
+                registro["cotacao"] = {
+                    "par": f"{resposta.get('codigo_origem')}-{resposta.get('codigo_destino')}",
+                    "valor": str(resposta["cotacao_utilizada"]),
+                }
+
+        self.escritor.registrar(registro)
+
+    @staticmethod
+    def _cabecalhos(scope) -> Dict[str, str]:
+        cabecalhos = {}
+        for nome, valor in scope.get("headers", []):
+            nome = nome.decode("latin-1").lower()
+            if nome in CABECALHOS_CAPTURADOS:
+                cabecalhos[nome] = valor.decode("latin-1")
+            elif nome == CABECALHO_CHAVE_PRIVADA and valor.strip():
+                cabecalhos[nome] = tokenizar(valor.decode("latin-1").strip())
+        return cabecalhos
+
+    async def _gravar_estados(self, endereco: str, corpo: Any):
+        candidatos = [endereco]
+        if isinstance(corpo, dict) and isinstance(corpo.get("endereco_destino"), str):
+            candidatos.append(corpo["endereco_destino"])
+        novas = [e for e in dict.fromkeys(candidatos) if e not in self._conhecidas]
+        if not novas:
+            return
+
+        self._conhecidas.update(novas)
+        t = time.time()
+        for e in novas:
+            try:
+                estado = await asyncio.to_thread(self._estado, e)
+            except Exception:
+                # Banco indisponível ou carteira em migração: tenta na próxima requisição
+                self._conhecidas.discard(e)
+                continue
+            self.escritor.registrar({"tipo": "estado", "t": t, **estado})
+
+    def _estado(self, endereco: str) -> Dict[str, Any]:
+        carteira = self.carteira_repo.buscar_por_endereco(endereco)
+        if not carteira:
+            return {"endereco": endereco, "existe": False}
+        return {
+            "endereco": endereco,
+            "existe": True,
+            "data_criacao": carteira["data_criacao"].isoformat(),
+            "status": carteira["status"],
+            "nivel_limite": carteira.get("nivel_limite"),
+            "saldos": {r["codigo_moeda"]: str(r["saldo"]) for r in self.carteira_repo.buscar_saldos(endereco)},
+        }
@@ -1,5 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List, Dict, Any
+import asyncio
+import os
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Dict, Any, Optional
 
 from api.models.carteira_models import (
     CarteiraCriada,
@@ -8,10 +15,32 @@ from api.models.carteira_models import (
     MovimentoInput,
     MovimentoHistorico,
     ConversaoInput,
-    TransferenciaInput
+    TransferenciaInput,
+    SaldosLoteInput,
+    Agendamento,
+    AgendamentoInput,
 )
-from api.services.carteira_service import CarteiraService
+from api.services.carteira_service import CarteiraService, etag_confere
 from api.persistence.repositories.carteira_repository import CarteiraRepository
+from api.services.eventos_service import RESSINCRONIZAR, barramento, formatar_sse, saldos_versionados
+from api.routers.respostas import RespostaJSONRapida, json_em_blocos, resposta_arquivo
+from api.persistence.repositories.relatorio_repository import RelatorioRepository
+from api.persistence.repositories.arquivo_repository import ArquivoRepository
+from api.services.extrato_service import ExtratoService
+from api.persistence.repositories.resumo_carteira_repository import ResumoCarteiraRepository
+from api.services.resumo_carteira_service import LIMITE_PADRAO_RESUMO, ResumoCarteiraService
+from api.services.provedores_cotacao import CotacaoIndisponivelError
+from api.persistence.shards import ShardEmMigracaoError
+from api.persistence.repositories.agendamento_repository import AgendamentoRepository
+from api.services.agendador_service import AgendamentoService
+from api.models.limites import LimiteExcedidoError
+from api.services.limites_service import LimitesService
+
+INTERVALO_HEARTBEAT_SSE = float(os.getenv("SSE_HEARTBEAT_SEGUNDOS", "15"))
+# A partir de quantas carteiras a resposta de saldos em lote é serializada em
+# blocos (StreamingResponse). Só a serialização é incremental: as linhas do lote
+# (no máximo SALDOS_LOTE_MAXIMO carteiras) já estão todas em memória.
+LIMIAR_STREAMING_SALDOS_LOTE = int(os.getenv("SALDOS_LOTE_STREAMING_A_PARTIR_DE", "100"))
 
 
 router = APIRouter(prefix="/carteiras", tags=["carteiras"])
@@ -22,6 +51,27 @@ def get_carteira_service() -> CarteiraService:
     return CarteiraService(repo)
 
 
+def get_extrato_service() -> ExtratoService:
+    return ExtratoService(RelatorioRepository(), ArquivoRepository())
+
+
+def get_resumo_carteira_service() -> ResumoCarteiraService:
+    return ResumoCarteiraService(ResumoCarteiraRepository())
+
+
+def get_agendamento_service() -> AgendamentoService:
+    return AgendamentoService(AgendamentoRepository(), CarteiraRepository())
+
+
+def get_limites_service() -> LimitesService:
+    return LimitesService(CarteiraRepository())
+
+
+def _limite_excedido(e: LimiteExcedidoError) -> HTTPException:
+    cabecalhos = {"Retry-After": str(e.tentar_em_segundos)} if e.tentar_em_segundos else None
+    return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e), headers=cabecalhos)
+
+
 @router.post("", response_model=CarteiraCriada, status_code=201)
 def criar_carteira(
     service: CarteiraService = Depends(get_carteira_service),
@@ -32,27 +82,91 @@ def criar_carteira(
     """
     try:
         return service.criar_carteira()
+    except ShardEmMigracaoError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("", response_model=List[Carteira])
 def listar_carteiras(service: CarteiraService = Depends(get_carteira_service)):
-    """Lista todas as carteiras."""
-    return service.listar()
+    """Lista todas as carteiras (lidas da projeção RESUMO_CARTEIRA)."""
+    return RespostaJSONRapida(content=service.listar_rapido())
+
+
+@router.get("/resumo")
+def buscar_resumo_carteiras(
+    status_carteira: Optional[str] = Query(None, alias="status", description="ATIVA ou BLOQUEADA"),
+    moeda: Optional[str] = Query(None, description="Moeda do filtro de saldo mínimo"),
+    saldo_minimo: Optional[Decimal] = None,
+    ativa_desde: Optional[datetime] = Query(None, description="Última atividade a partir de"),
+    ordenar_por: str = Query("data_criacao", description="'data_criacao' ou 'ultima_atividade'"),
+    cursor: Optional[str] = None,
+    limite: int = LIMITE_PADRAO_RESUMO,
+    service: ResumoCarteiraService = Depends(get_resumo_carteira_service),
+):
+    """
+    Carteiras com status, saldos e taxas pagas por moeda, quantidade de
+    movimentações e última atividade, lidas só da projeção RESUMO_CARTEIRA.
+    Paginação por cursor (campo 'proximo_cursor').
+    """
+    try:
+        return RespostaJSONRapida(content=service.buscar(
+            status_carteira, moeda, saldo_minimo, ativa_desde, ordenar_por, cursor, limite
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.post("/saldos:batch")
+async def buscar_saldos_lote(
+    entrada: SaldosLoteInput,
+    service: CarteiraService = Depends(get_carteira_service),
+):
+    """
+    Saldos de várias carteiras com uma única consulta ao banco.
+    Opcionalmente inclui o status de cada carteira e o valor dos saldos numa
+    moeda de avaliação. Lotes grandes são serializados em blocos: o cliente
+    começa a receber antes do fim da serialização, mas o lote inteiro é lido
+    do banco antes da resposta (a avaliação precisa de todas as moedas dele).
+    """
+    try:
+        resultado = await run_in_threadpool(service.buscar_saldos_lote, entrada.enderecos, entrada.incluir_status)
+        if entrada.moeda_avaliacao:
+            resultado = await service.avaliar_saldos_lote(resultado, entrada.moeda_avaliacao)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except CotacaoIndisponivelError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    if len(resultado["carteiras"]) >= LIMIAR_STREAMING_SALDOS_LOTE:
+        return StreamingResponse(json_em_blocos(resultado, "carteiras"), media_type="application/json")
+    return RespostaJSONRapida(content=resultado)
 
 
 @router.get("/{endereco_carteira}", response_model=Carteira)
 def buscar_carteira(
     endereco_carteira: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
     service: CarteiraService = Depends(get_carteira_service),
 ):
-    """Busca uma carteira por endereço."""
+    """Busca uma carteira por endereço. Suporta GET condicional (ETag)."""
     try:
-        return service.buscar_por_endereco(endereco_carteira)
+        etag, carteira = service.buscar_por_endereco_condicional(endereco_carteira, if_none_match)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+    if carteira is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return carteira
+
 
 @router.delete("/{endereco_carteira}", response_model=Carteira)
 def bloquear_carteira(
@@ -64,20 +178,141 @@ def bloquear_carteira(
         return service.bloquear(endereco_carteira)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ShardEmMigracaoError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
 
 @router.get("/{endereco_carteira}/saldos", response_model=List[SaldoItem])
 def buscar_saldos_carteira(
     endereco_carteira: str,
+    if_none_match: Optional[str] = Header(default=None),
     service: CarteiraService = Depends(get_carteira_service),
 ):
-    """Retorna todos os saldos de uma carteira específica."""
+    """
+    Retorna todos os saldos de uma carteira específica.
+    Suporta GET condicional: com If-None-Match válido responde 304 sem ler os saldos.
+    """
     try:
-        return service.buscar_saldos(endereco_carteira)
+        etag = service.versao_saldos(endereco_carteira)
+        if etag is not None and etag_confere(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        return RespostaJSONRapida(
+            content=service.buscar_saldos_rapido(endereco_carteira),
+            headers={"ETag": etag} if etag else None,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/{endereco_carteira}/extrato")
+def exportar_extrato_carteira(
+    endereco_carteira: str,
+    formato: str = "csv",
+    compressao: str = "nenhuma",
+    inicio: Optional[datetime] = None,
+    fim: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    service: ExtratoService = Depends(get_extrato_service),
+):
+    """
+    Exporta todas as movimentações da carteira (CSV ou Parquet, com gzip/zstd).
+    Cada linha traz um cursor; passe-o em ?cursor= para retomar após uma interrupção.
+    """
+    try:
+        blocos = service.exportar(endereco_carteira, formato, compressao, inicio, fim, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    media_type, extensao = service.tipo_conteudo(formato, compressao)
+    return resposta_arquivo(blocos, media_type, f"extrato_{endereco_carteira}.{extensao}")
+
+
+@router.get("/{endereco_carteira}/eventos")
+async def assinar_eventos_carteira(
+    endereco_carteira: str,
+    request: Request,
+    service: CarteiraService = Depends(get_carteira_service),
+):
+    """
+    Stream (Server-Sent Events) de saldos e movimentações da carteira.
+    Envia primeiro os saldos atuais e depois cada movimento confirmado,
+    seguido dos saldos absolutos da carteira. Eventos de saldo trazem a
+    versão da carteira; versões já enviadas não são repetidas. Se o cliente
+    não acompanhar, recebe 'ressincronizar' com saldos novos.
+
+    O barramento é por processo: movimentos feitos por outro worker ou pelo
+    job de agendamentos não chegam pela fila. A cada heartbeat o stream lê a
+    versão da carteira e, se ela avançou, envia os saldos; assim converge em
+    até SSE_HEARTBEAT_SEGUNDOS, venha a escrita de onde vier (mas só os
+    movimentos deste processo geram eventos 'movimento').
+    """
+    try:
+        await run_in_threadpool(service.buscar_por_endereco, endereco_carteira)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    # Assina antes de ler os saldos: movimentos confirmados entre as duas
+    # coisas chegam com versão menor ou igual e são descartados
+    fila = barramento.assinar(endereco_carteira)
+
+    async def gerar_eventos():
+        ultima_versao = -1
+
+        async def saldos_atuais(nome_evento: str) -> str:
+            nonlocal ultima_versao
+            saldos = await run_in_threadpool(saldos_versionados, endereco_carteira)
+            if saldos is None:
+                # Projeção ainda sem a carteira: saldos das linhas de origem, sem versão
+                linhas = await run_in_threadpool(service.buscar_saldos_rapido, endereco_carteira)
+                saldos = {"versao": None, "saldos": linhas}
+            else:
+                ultima_versao = max(ultima_versao, saldos["versao"])
+            return formatar_sse({"evento": nome_evento, "endereco_carteira": endereco_carteira, **saldos})
+
+        async def verificar_versao() -> str:
+            # Heartbeat: uma leitura de linha única na projeção pega escritas
+            # de outros processos; sem novidade (ou com o banco fora), só o ping
+            nonlocal ultima_versao
+            try:
+                saldos = await run_in_threadpool(saldos_versionados, endereco_carteira)
+            except Exception:
+                saldos = None
+            if saldos is None or saldos["versao"] <= ultima_versao:
+                return ": ping\n\n"
+            ultima_versao = saldos["versao"]
+            return formatar_sse({"evento": "saldos", "endereco_carteira": endereco_carteira, **saldos})
+
+        try:
+            yield await saldos_atuais("saldos")
+
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=INTERVALO_HEARTBEAT_SSE)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield await verificar_versao()
+                    continue
+
+                if evento is RESSINCRONIZAR:
+                    yield await saldos_atuais("ressincronizar")
+                    continue
+                if evento["evento"] == "saldos":
+                    if evento["versao"] <= ultima_versao:
+                        continue
+                    ultima_versao = evento["versao"]
+                yield formatar_sse(evento)
+        finally:
+            barramento.cancelar(endereco_carteira, fila)
+
+    return StreamingResponse(
+        gerar_eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/{endereco_carteira}/depositos",
              response_model=MovimentoHistorico,
              status_code=status.HTTP_201_CREATED)
@@ -93,8 +328,12 @@ def realizar_deposito(
             codigo_moeda=movimento.codigo_moeda,
             valor=movimento.valor
         )
+    except LimiteExcedidoError as e:
+        raise _limite_excedido(e)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ShardEmMigracaoError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -121,10 +360,14 @@ def realizar_saque(
             valor_saque=movimento.valor,
             chave_privada=movimento.chave_privada
         )
+    except LimiteExcedidoError as e:
+        raise _limite_excedido(e)
     except ValueError as e:
         if "Chave privada inválida" in str(e) or "Chave privada" in str(e):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ShardEmMigracaoError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -137,7 +380,7 @@ async def realizar_conversao(
     conversao: ConversaoInput,
     service: CarteiraService = Depends(get_carteira_service),
 ):
-    """Converte saldo usando cotação da Coinbase com taxa aplicada."""
+    """Converte saldo usando a cotação do provedor (ou de uma cotação firme) com taxa aplicada."""
     if not conversao.chave_privada or not conversao.chave_privada.strip():
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
@@ -149,12 +392,16 @@ async def realizar_conversao(
             endereco_carteira=endereco_carteira,
             conversao_data=conversao
         )
+    except LimiteExcedidoError as e:
+        raise _limite_excedido(e)
     except ValueError as e:
         if "Chave privada inválida" in str(e) or "Chave privada" in str(e):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
         elif "Saldo insuficiente" in str(e):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except (CotacaoIndisponivelError, ShardEmMigracaoError) as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro: {e}")
 
@@ -176,6 +423,8 @@ def realizar_transferencia(
             endereco_origem=endereco_origem,
             transferencia_data=transferencia
         )
+    except LimiteExcedidoError as e:
+        raise _limite_excedido(e)
     except ValueError as e:
         if "Chave privada" in str(e):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
@@ -183,5 +432,74 @@ def realizar_transferencia(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         else:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ShardEmMigracaoError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.post("/{endereco_carteira}/agendamentos",
+             response_model=Agendamento,
+             status_code=status.HTTP_201_CREATED)
+def criar_agendamento(
+    endereco_carteira: str,
+    agendamento: AgendamentoInput,
+    service: AgendamentoService = Depends(get_agendamento_service),
+) -> Agendamento:
+    """
+    Agenda uma transferência ou conversão, única ou recorrente (ordem
+    permanente), executada pelo agendador a partir de 'inicio'.
+    """
+    try:
+        return service.criar(endereco_carteira, agendamento)
+    except ValueError as e:
+        if "Chave privada" in str(e):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ShardEmMigracaoError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.get("/{endereco_carteira}/agendamentos", response_model=List[Agendamento])
+def listar_agendamentos(
+    endereco_carteira: str,
+    service: AgendamentoService = Depends(get_agendamento_service),
+):
+    """Agendamentos da carteira (inclusive concluídos e cancelados), com a próxima execução."""
+    try:
+        return service.listar(endereco_carteira)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.delete("/{endereco_carteira}/agendamentos/{id_agendamento}", status_code=status.HTTP_204_NO_CONTENT)
+def cancelar_agendamento(
+    endereco_carteira: str,
+    id_agendamento: str,
+    chave_privada: Optional[str] = Header(default=None, alias="X-Chave-Privada"),
+    service: AgendamentoService = Depends(get_agendamento_service),
+):
+    """Cancela um agendamento ativo ou suspenso (chave privada no cabeçalho X-Chave-Privada)."""
+    try:
+        service.cancelar(endereco_carteira, id_agendamento, chave_privada)
+    except ValueError as e:
+        if "Chave privada" in str(e):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ShardEmMigracaoError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/{endereco_carteira}/limites")
+def buscar_limites(
+    endereco_carteira: str,
+    service: LimitesService = Depends(get_limites_service),
+) -> Dict[str, Any]:
+    """Nível de limites da carteira e quanto já foi usado na janela atual."""
+    try:
+        return service.resumo(endereco_carteira)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+
+from api.models.carteira_models import CotacaoInput, CotacaoFirme
+from api.services.carteira_service import TAXA_CONVERSAO_PERCENTUAL
+from api.services.cotacao_service import CotacaoService, armazem_cotacoes
+from api.services.provedores_cotacao import CotacaoIndisponivelError
+
+
+router = APIRouter(prefix="/cotacoes", tags=["cotacoes"])
+
+
+def get_cotacao_service() -> CotacaoService:
+    return CotacaoService(armazem_cotacoes, TAXA_CONVERSAO_PERCENTUAL)
+
+
+@router.post("",
+            response_model=CotacaoFirme,
+            status_code=status.HTTP_201_CREATED)
+async def criar_cotacao(
+    cotacao: CotacaoInput,
+    service: CotacaoService = Depends(get_cotacao_service),
+) -> CotacaoFirme:
+    """
+    Cotação firme: a taxa fica garantida até 'expira_em'. Envie o id_cotacao
+    numa conversão do mesmo valor_origem para executá-la com esta taxa (uso
+    único); cotação sem valor_origem serve só de consulta.
+    """
+    try:
+        return await service.criar_cotacao(
+            codigo_origem=cotacao.codigo_origem,
+            codigo_destino=cotacao.codigo_destino,
+            valor_origem=cotacao.valor_origem,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except CotacaoIndisponivelError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Falha ao obter cotação: {e}")
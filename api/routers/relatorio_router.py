@@ -0,0 +1,113 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.concurrency import run_in_threadpool
+
+from api.persistence.repositories.relatorio_repository import RelatorioRepository
+from api.persistence.repositories.arquivo_repository import ArquivoRepository
+from api.services.avaliacao_service import AvaliacaoService, TOP_N_PADRAO
+from api.services.relatorio_service import RelatorioService
+from api.services.extrato_service import ExtratoService
+from api.routers.respostas import RespostaJSONRapida, resposta_arquivo
+from api.services.provedores_cotacao import CotacaoIndisponivelError
+from api.persistence.repositories.agendamento_repository import AgendamentoRepository
+from api.persistence.repositories.carteira_repository import CarteiraRepository
+from api.services.agendador_service import AgendadorService
+
+
+router = APIRouter(prefix="/relatorios", tags=["relatorios"])
+
+
+def get_avaliacao_service() -> AvaliacaoService:
+    return AvaliacaoService(RelatorioRepository())
+
+
+def get_relatorio_service() -> RelatorioService:
+    return RelatorioService(RelatorioRepository())
+
+
+def get_extrato_service() -> ExtratoService:
+    return ExtratoService(RelatorioRepository(), ArquivoRepository())
+
+
+def get_agendador_service() -> AgendadorService:
+    return AgendadorService(AgendamentoRepository(), CarteiraRepository())
+
+
+@router.get("/avaliacao")
+async def avaliar_carteiras(
+    moeda: str = Query("USD", description="Moeda de avaliação (ex.: USD, BRL)"),
+    top: int = Query(TOP_N_PADRAO, ge=0, le=1000),
+    service: AvaliacaoService = Depends(get_avaliacao_service),
+):
+    """
+    Valor total de todas as carteiras na moeda escolhida, com as maiores
+    carteiras e a exposição agregada por moeda (uma única rodada de cotações).
+    """
+    moeda = moeda.upper()
+    try:
+        moedas, cotacoes = await service.cotacoes_snapshot(moeda)
+        resultado = await run_in_threadpool(service.avaliar, moeda, moedas, cotacoes, top)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except CotacaoIndisponivelError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    return RespostaJSONRapida(content=resultado)
+
+
+@router.get("/taxas")
+def resumo_taxas(
+    inicio: Optional[datetime] = None,
+    fim: Optional[datetime] = None,
+    granularidade: str = Query("dia", description="'hora' ou 'dia'"),
+    service: RelatorioService = Depends(get_relatorio_service),
+):
+    """
+    Receita de taxas e volume por período, moeda e tipo de operação,
+    lidos somente do rollup por hora.
+    """
+    try:
+        return RespostaJSONRapida(content=service.resumo_taxas(inicio, fim, granularidade))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.get("/extrato")
+def exportar_extrato_periodo(
+    inicio: datetime,
+    fim: datetime,
+    formato: str = "csv",
+    compressao: str = "nenhuma",
+    cursor: Optional[str] = None,
+    service: ExtratoService = Depends(get_extrato_service),
+):
+    """
+    Exporta as movimentações de todas as carteiras no período (auditoria).
+    Retomável pelo cursor da última linha recebida.
+    """
+    try:
+        blocos = service.exportar(None, formato, compressao, inicio, fim, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    media_type, extensao = service.tipo_conteudo(formato, compressao)
+    nome = f"extrato_{inicio:%Y%m%d}_{fim:%Y%m%d}.{extensao}"
+    return resposta_arquivo(blocos, media_type, nome)
+
+
+@router.get("/agendador")
+def ciclos_agendador(
+    limite: int = Query(20, ge=1, le=500),
+    service: AgendadorService = Depends(get_agendador_service),
+):
+    """Métricas dos últimos ciclos do agendador (executados, falhas, adiados, atraso e duração)."""
+    try:
+        return RespostaJSONRapida(content=service.ultimos_ciclos(limite))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -0,0 +1,77 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator
+
+from fastapi.responses import Response, StreamingResponse
+
+from api.models.dinheiro import Dinheiro
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele usamos o json da stdlib
+    orjson = None
+
+
+def _serializar_padrao(obj: Any):
+    # Decimal vira string para não perder precisão (mesmo formato do Pydantic)
+    if isinstance(obj, (Decimal, Dinheiro)):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+
+def serializar_json(conteudo: Any) -> bytes:
+    """
+    Serializa dicts/listas vindos do repositório direto para JSON.
+    Decimal/Dinheiro -> string exata, datetime -> ISO 8601 (como o Pydantic faz).
+    """
+    if orjson is not None:
+        return orjson.dumps(conteudo, default=_serializar_padrao)
+    return json.dumps(
+        conteudo,
+        default=_serializar_padrao,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class RespostaJSONRapida(Response):
+    """
+    Resposta JSON para dados já confiáveis (linhas do banco).
+    Retornar uma Response faz o FastAPI pular a revalidação pelo response_model.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return serializar_json(content)
+
+
+def resposta_arquivo(blocos: Iterator[bytes], media_type: str, nome_arquivo: str) -> StreamingResponse:
+    """Download em streaming (os blocos são enviados conforme são gerados)."""
+    return StreamingResponse(
+        blocos,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'},
+    )
+
+
+def json_em_blocos(conteudo: Dict[str, Any], campo_lista: str, itens_por_bloco: int = 100) -> Iterator[bytes]:
+    """
+    Serializa um objeto cujo último campo é uma lista longa em vários blocos
+    (para StreamingResponse): o cliente recebe os primeiros itens sem esperar
+    a serialização do resto. O JSON final é o mesmo de serializar_json.
+    """
+    itens = conteudo[campo_lista]
+    demais = {k: v for k, v in conteudo.items() if k != campo_lista}
+
+    inicio = serializar_json(demais)[:-1]
+    yield inicio + (b"," if demais else b"") + serializar_json(campo_lista) + b":["
+
+    for i in range(0, len(itens), itens_por_bloco):
+        bloco = serializar_json(itens[i:i + itens_por_bloco])[1:-1]
+        yield (b"," if i else b"") + bloco
+
+    yield b"]}"
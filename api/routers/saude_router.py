@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse
+
+from api.services.saude_service import verificar_prontidao
+
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/ready")
+async def prontidao(request: Request):
+    """
+    Prontidão para receber tráfego (banco acessível e catálogo carregado).
+    Responde 503 enquanto não estiver pronto.
+    """
+    pronto, verificacoes = await verificar_prontidao(request.app.state.estado)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if pronto else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "pronto" if pronto else "indisponivel", "verificacoes": verificacoes},
+    )
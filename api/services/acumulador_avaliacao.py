@@ -0,0 +1,129 @@
+"""
+Acumulador vetorizado (numpy) da avaliação de carteiras. Fica num módulo à
+parte para o numpy só ser importado quando uma avaliação roda, e não no
+import da API.
+"""
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from api.models.dinheiro import FATOR, formatar_unidades
+
+
+class AcumuladorAvaliacao:
+    """
+    Avaliação vetorizada de carteiras a partir de lotes de linhas de saldo.
+
+    Cada lote (endereco_carteira, id_moeda, saldo em unidades de 10^-8),
+    ordenado por carteira, é pivotado numa matriz int64 carteiras x moedas e
+    multiplicado pelo vetor de cotações. A exposição por moeda é somada em
+    inteiros, exata; só o valor avaliado é float. Mantém apenas o top-N e a
+    exposição agregada, então a memória não depende do número total de carteiras.
+    """
+
+    def __init__(self, moedas: List[Dict[str, Any]], cotacoes: Dict[str, Decimal], top_n: int):
+        self.codigos = [m["codigo"] for m in moedas if m["codigo"] in cotacoes]
+        self.taxas = np.array([float(cotacoes[c]) for c in self.codigos], dtype=np.float64)
+        self.top_n = top_n
+
+        ids = {m["codigo"]: m["id_moeda"] for m in moedas}
+        maior_id = max(ids.values(), default=0)
+        self._coluna_por_id = np.full(maior_id + 1, -1, dtype=np.int64)
+        for coluna, codigo in enumerate(self.codigos):
+            self._coluna_por_id[ids[codigo]] = coluna
+
+        # Inteiros do Python: a soma de todas as carteiras pode passar de int64
+        self.exposicao = [0] * len(self.codigos)
+        self.total_carteiras = 0
+        self._top_enderecos = np.empty(0, dtype=object)
+        self._top_valores = np.empty(0, dtype=np.float64)
+        self._pendentes: List[tuple] = []
+
+    def adicionar_lote(self, linhas: List[tuple]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Processa um lote e retorna (enderecos, totais) das carteiras completas.
+        As linhas da última carteira ficam pendentes, pois ela pode continuar
+        no próximo lote.
+        """
+        linhas = self._pendentes + linhas
+        if not linhas:
+            return self._processar([])
+
+        ultimo = linhas[-1][0]
+        corte = len(linhas)
+        while corte > 0 and linhas[corte - 1][0] == ultimo:
+            corte -= 1
+
+        self._pendentes = linhas[corte:]
+        return self._processar(linhas[:corte])
+
+    def finalizar(self) -> Tuple[np.ndarray, np.ndarray]:
+        linhas, self._pendentes = self._pendentes, []
+        return self._processar(linhas)
+
+    def _processar(self, linhas: List[tuple]) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(linhas)
+        if n == 0:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.float64)
+
+        enderecos = np.array([l[0] for l in linhas], dtype=object)
+        ids = np.fromiter((l[1] for l in linhas), dtype=np.int64, count=n)
+        saldos = np.fromiter((l[2] for l in linhas), dtype=np.int64, count=n)
+
+        # Linhas vêm ordenadas por carteira: marca o início de cada uma
+        inicio = np.empty(n, dtype=bool)
+        inicio[0] = True
+        inicio[1:] = enderecos[1:] != enderecos[:-1]
+        indice_carteira = np.cumsum(inicio) - 1
+        unicos = enderecos[inicio]
+
+        # Moedas fora do catálogo (ou sem cotação) ficam com coluna -1 e são ignoradas
+        fora_catalogo = ids >= len(self._coluna_por_id)
+        colunas = self._coluna_por_id[np.where(fora_catalogo, 0, ids)]
+        colunas[fora_catalogo] = -1
+        validas = colunas >= 0
+
+        matriz = np.zeros((len(unicos), len(self.codigos)), dtype=np.int64)
+        matriz[indice_carteira[validas], colunas[validas]] = saldos[validas]
+
+        totais = (matriz @ self.taxas) / FATOR
+        # Soma em inteiros do Python (dtype=object): em int64 a soma do lote
+        # passaria do limite sem erro nenhum
+        for coluna, soma in enumerate(matriz.sum(axis=0, dtype=object).tolist()):
+            self.exposicao[coluna] += int(soma)
+        self.total_carteiras += len(unicos)
+        self._atualizar_top(unicos, totais)
+
+        return unicos, totais
+
+    def _atualizar_top(self, enderecos: np.ndarray, totais: np.ndarray):
+        if self.top_n <= 0:
+            return
+
+        enderecos = np.concatenate([self._top_enderecos, enderecos])
+        totais = np.concatenate([self._top_valores, totais])
+        if len(totais) > self.top_n:
+            indices = np.argpartition(totais, -self.top_n)[-self.top_n:]
+            enderecos, totais = enderecos[indices], totais[indices]
+
+        self._top_enderecos, self._top_valores = enderecos, totais
+
+    def resultado(self, moeda_avaliacao: str) -> Dict[str, Any]:
+        ordem = np.argsort(-self._top_valores)
+        exposicao_valorizada = np.array([q / FATOR for q in self.exposicao], dtype=np.float64) * self.taxas
+
+        return {
+            "moeda_avaliacao": moeda_avaliacao,
+            "total_carteiras": int(self.total_carteiras),
+            "valor_total": float(exposicao_valorizada.sum()),
+            "cotacoes": {c: float(t) for c, t in zip(self.codigos, self.taxas)},
+            "maiores_carteiras": [
+                {"endereco_carteira": self._top_enderecos[i], "valor_total": float(self._top_valores[i])}
+                for i in ordem
+            ],
+            "exposicao": [
+                {"codigo_moeda": c, "quantidade": formatar_unidades(q), "valor": float(v)}
+                for c, q, v in zip(self.codigos, self.exposicao, exposicao_valorizada)
+            ],
+        }
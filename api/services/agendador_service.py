@@ -0,0 +1,441 @@
+"""
+Agendamentos (ordens permanentes) e o agendador que os executa.
+
+A cada ciclo o agendador lê os agendamentos vencidos de todos os shards,
+agrupa por carteira de origem e busca uma cotação por par de moedas das
+conversões. Cada carteira é executada numa única transação (distribuída, se
+houver transferências para outros shards): os agendamentos são reivindicados
+com FOR UPDATE SKIP LOCKED, executados pelo mesmo CarteiraRepository das
+operações da API e avançados para a próxima ocorrência. Várias carteiras
+rodam em paralelo, até AGENDADOR_CARTEIRAS_PARALELAS.
+
+Falhas de negócio (saldo insuficiente) pulam a ocorrência e contam em
+falhas_consecutivas; depois de AGENDADOR_MAXIMO_FALHAS o agendamento é
+SUSPENSO. Conversões sem cotação e carteiras em migração entre shards ficam
+para o próximo ciclo (adiados), sem consumir a ocorrência.
+
+O agendador roda dentro da API com AGENDADOR_ATIVO=1 (um por worker; o SKIP
+LOCKED evita execução dupla) ou como processo separado com
+python -m api.jobs.executar_agendamentos.
+"""
+import asyncio
+import calendar
+import os
+import secrets
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from api.models.carteira_models import Agendamento, AgendamentoInput
+from api.models.dinheiro import ZERO, Dinheiro
+from api.persistence.repositories.agendamento_repository import AgendamentoRepository, LoteAgendamentos
+from api.persistence.repositories.carteira_repository import CarteiraRepository
+from api.persistence.shards import ShardEmMigracaoError, em_cada_shard, shard_da_carteira
+from api.services.carteira_service import TAXA_CONVERSAO_PERCENTUAL, TAXA_TRANSFERENCIA_PERCENTUAL
+from api.services.cotacao_service import calcular_conversao
+from api.services.eventos_service import publicar_movimento
+from api.services.limites_service import LimitesService
+from api.services.provedores_cotacao import CotacaoObtida, obter_cotacao
+
+AGENDADOR_ATIVO = os.getenv("AGENDADOR_ATIVO", "0") == "1"
+INTERVALO_AGENDADOR_SEGUNDOS = float(os.getenv("AGENDADOR_INTERVALO_SEGUNDOS", "30"))
+CARTEIRAS_PARALELAS = int(os.getenv("AGENDADOR_CARTEIRAS_PARALELAS", "4"))
+# Vencidos lidos por shard em cada ciclo e executados por carteira numa transação
+VENCIDOS_POR_CICLO = int(os.getenv("AGENDADOR_VENCIDOS_POR_CICLO", "1000"))
+MAXIMO_POR_CARTEIRA = int(os.getenv("AGENDADOR_MAXIMO_POR_CARTEIRA", "50"))
+# Ocorrências atrasadas executadas de uma vez por agendamento (política TODAS)
+MAXIMO_ATRASADAS_POR_CICLO = int(os.getenv("AGENDADOR_MAXIMO_ATRASADAS", "31"))
+MAXIMO_FALHAS_CONSECUTIVAS = int(os.getenv("AGENDADOR_MAXIMO_FALHAS", "3"))
+
+STATUS_ATIVO = "ATIVO"
+STATUS_SUSPENSO = "SUSPENSO"
+STATUS_CONCLUIDO = "CONCLUIDO"
+
+
+def ocorrencia_em(inicio: datetime, periodicidade: str, k: int) -> datetime:
+    """Data da k-ésima ocorrência (k=0 é o início). Mensal mantém o dia, limitado ao fim do mês."""
+    if periodicidade == "DIARIA":
+        return inicio + timedelta(days=k)
+    if periodicidade == "SEMANAL":
+        return inicio + timedelta(weeks=k)
+    if periodicidade == "MENSAL":
+        ano, mes = divmod(inicio.year * 12 + inicio.month - 1 + k, 12)
+        dia = min(inicio.day, calendar.monthrange(ano, mes + 1)[1])
+        return inicio.replace(year=ano, month=mes + 1, day=dia)
+    return inicio
+
+
+def _sem_fuso(data: datetime) -> datetime:
+    # As colunas DATETIME guardam o horário local, como datetime.now()
+    if data.tzinfo is not None:
+        data = data.astimezone().replace(tzinfo=None)
+    return data.replace(microsecond=0)
+
+
+def _formatar(row: Dict[str, Any]) -> Agendamento:
+    return Agendamento(**{campo: row.get(campo) for campo in Agendamento.model_fields})
+
+
+class AgendamentoService:
+    """Cadastro das ordens permanentes de uma carteira."""
+
+    def __init__(self, agendamento_repo: AgendamentoRepository, carteira_repo: CarteiraRepository):
+        self.agendamento_repo = agendamento_repo
+        self.carteira_repo = carteira_repo
+
+    def _validar_chave(self, endereco_carteira: str, chave_privada: Optional[str]):
+        if not chave_privada or not chave_privada.strip():
+            raise ValueError("Chave privada é obrigatória para agendamentos.")
+        if not self.carteira_repo.validar_chave_privada(endereco_carteira, chave_privada.strip()):
+            raise ValueError("Chave privada inválida ou carteira não encontrada.")
+
+    def criar(self, endereco_carteira: str, dados: AgendamentoInput) -> Agendamento:
+        self._validar_chave(endereco_carteira, dados.chave_privada)
+
+        if dados.valor <= ZERO:
+            raise ValueError("O valor do agendamento deve ser positivo.")
+        codigo_moeda = dados.codigo_moeda.upper()
+        if not self.carteira_repo.existe_moeda(codigo_moeda):
+            raise ValueError(f"Moeda com código {codigo_moeda} não encontrada.")
+
+        endereco_destino = codigo_destino = None
+        if dados.tipo == "TRANSFERENCIA":
+            if not dados.endereco_destino or dados.codigo_destino:
+                raise ValueError("Transferências agendadas exigem endereco_destino (e não codigo_destino).")
+            endereco_destino = dados.endereco_destino.strip()
+            if not self.carteira_repo.buscar_por_endereco(endereco_destino):
+                raise ValueError("Carteira de destino não encontrada.")
+        else:
+            if not dados.codigo_destino or dados.endereco_destino:
+                raise ValueError("Conversões agendadas exigem codigo_destino (e não endereco_destino).")
+            codigo_destino = dados.codigo_destino.upper()
+            if codigo_destino == codigo_moeda:
+                raise ValueError("A moeda de destino deve ser diferente da moeda de origem.")
+            if not self.carteira_repo.existe_moeda(codigo_destino):
+                raise ValueError(f"Moeda com código {codigo_destino} não encontrada.")
+
+        inicio = _sem_fuso(dados.inicio)
+        fim = _sem_fuso(dados.fim) if dados.fim is not None else None
+        if fim is not None and fim < inicio:
+            raise ValueError("O fim do agendamento deve ser posterior ao início.")
+
+        agendamento = {
+            "id_agendamento": secrets.token_hex(16),
+            "endereco_carteira": endereco_carteira,
+            "tipo": dados.tipo,
+            "codigo_moeda": codigo_moeda,
+            "endereco_destino": endereco_destino,
+            "codigo_destino": codigo_destino,
+            "valor": dados.valor.para_decimal(),
+            "periodicidade": dados.periodicidade,
+            "execucoes_atrasadas": dados.execucoes_atrasadas,
+            "inicio": inicio,
+            "fim": fim,
+        }
+        self.agendamento_repo.criar(agendamento)
+
+        return _formatar({
+            **agendamento,
+            "valor": dados.valor,
+            "proxima_execucao": inicio,
+            "status": STATUS_ATIVO,
+            "execucoes": 0,
+            "falhas_consecutivas": 0,
+        })
+
+    def listar(self, endereco_carteira: str) -> List[Agendamento]:
+        if not self.carteira_repo.buscar_por_endereco(endereco_carteira):
+            raise ValueError("Carteira não encontrada")
+        return [_formatar(r) for r in self.agendamento_repo.listar_por_carteira(endereco_carteira)]
+
+    def cancelar(self, endereco_carteira: str, id_agendamento: str, chave_privada: Optional[str]):
+        self._validar_chave(endereco_carteira, chave_privada)
+        if not self.agendamento_repo.cancelar(endereco_carteira, id_agendamento):
+            raise ValueError("Agendamento não encontrado ou já encerrado.")
+
+
+class _Adiado(Exception):
+    """Agendamento que não pode rodar agora (sem cotação, destino em migração); fica vencido."""
+
+
+class AgendadorService:
+
+    def __init__(self, agendamento_repo: AgendamentoRepository, carteira_repo: CarteiraRepository,
+                 carteiras_paralelas: int = CARTEIRAS_PARALELAS, vencidos_por_ciclo: int = VENCIDOS_POR_CICLO,
+                 maximo_por_carteira: int = MAXIMO_POR_CARTEIRA, limites: Optional[LimitesService] = None):
+        self.agendamento_repo = agendamento_repo
+        self.carteira_repo = carteira_repo
+        self.limites = limites or LimitesService(carteira_repo)
+        self.carteiras_paralelas = carteiras_paralelas
+        self.vencidos_por_ciclo = vencidos_por_ciclo
+        self.maximo_por_carteira = maximo_por_carteira
+
+    async def executar_ciclo(self, agora: Optional[datetime] = None) -> Dict[str, Any]:
+        """Executa os agendamentos vencidos até 'agora' e devolve (e grava) as métricas do ciclo."""
+        relogio = time.perf_counter()
+        agora = _sem_fuso(agora or datetime.now())
+
+        por_shard = await asyncio.to_thread(
+            em_cada_shard, lambda shard: self.agendamento_repo.vencidos(shard, agora, self.vencidos_por_ciclo)
+        )
+        vencidos = [a for lista in por_shard for a in lista]
+
+        por_carteira: Dict[str, List[Dict[str, Any]]] = {}
+        for a in vencidos:
+            por_carteira.setdefault(a["endereco_carteira"], []).append(a)
+
+        cotacoes = await self._cotacoes({
+            (a["codigo_moeda"], a["codigo_destino"]) for a in vencidos if a["tipo"] == "CONVERSAO"
+        })
+
+        semaforo = asyncio.Semaphore(self.carteiras_paralelas)
+
+        async def executar(endereco: str, itens: List[Dict[str, Any]]) -> Counter:
+            async with semaforo:
+                return await asyncio.to_thread(
+                    self._executar_carteira, endereco, itens[:self.maximo_por_carteira], cotacoes, agora
+                )
+
+        enderecos = list(por_carteira)
+        resultados = await asyncio.gather(*(executar(e, por_carteira[e]) for e in enderecos),
+                                          return_exceptions=True)
+
+        contagem: Counter = Counter()
+        for endereco, resultado in zip(enderecos, resultados):
+            if isinstance(resultado, Exception):
+                print(f"Aviso: agendamentos da carteira {endereco} não executados: {resultado}")
+                contagem["adiados"] += len(por_carteira[endereco])
+            else:
+                contagem.update(resultado)
+
+        metricas = {
+            "inicio": agora,
+            "duracao_ms": int((time.perf_counter() - relogio) * 1000),
+            "vencidos": len(vencidos),
+            "carteiras": len(enderecos),
+            "executados": contagem["executados"],
+            "falhas": contagem["falhas"],
+            "adiados": contagem["adiados"],
+            "atraso_maximo_segundos": int(max(
+                ((agora - a["proxima_execucao"]).total_seconds() for a in vencidos), default=0
+            )),
+            "por_tipo": {tipo: contagem[tipo] for tipo in ("TRANSFERENCIA", "CONVERSAO")},
+        }
+        try:
+            await asyncio.to_thread(self.agendamento_repo.registrar_ciclo, {
+                campo: metricas[campo]
+                for campo in ("inicio", "duracao_ms", "carteiras", "executados", "falhas", "adiados",
+                              "atraso_maximo_segundos")
+            })
+        except Exception as e:
+            print(f"Aviso: métricas do ciclo do agendador não gravadas: {e}")
+        return metricas
+
+    async def executar_continuamente(self, parar: asyncio.Event,
+                                     intervalo: float = INTERVALO_AGENDADOR_SEGUNDOS,
+                                     ao_concluir: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """Ciclos a cada 'intervalo' até 'parar'; depois de um ciclo cheio, roda o próximo sem esperar."""
+        while not parar.is_set():
+            cheio = False
+            try:
+                metricas = await self.executar_ciclo()
+                if ao_concluir:
+                    ao_concluir(metricas)
+                cheio = (metricas["vencidos"] >= self.vencidos_por_ciclo
+                         and metricas["executados"] + metricas["falhas"] > 0)
+            except Exception as e:
+                print(f"Aviso: ciclo do agendador falhou: {e}")
+            if cheio:
+                continue
+            try:
+                await asyncio.wait_for(parar.wait(), intervalo)
+            except asyncio.TimeoutError:
+                pass
+
+    def ultimos_ciclos(self, limite: int = 20) -> List[Dict[str, Any]]:
+        return self.agendamento_repo.ultimos_ciclos(limite)
+
+    @staticmethod
+    async def _cotacoes(pares: Set[Tuple[str, str]]) -> Dict[Tuple[str, str], CotacaoObtida]:
+        """Uma cotação por par para o ciclo todo, sem cair para a última conhecida."""
+        pares = sorted(pares)
+        obtidas = await asyncio.gather(
+            *(obter_cotacao(origem, destino, aceitar_ultima_conhecida=False) for origem, destino in pares),
+            return_exceptions=True,
+        )
+        cotacoes = {}
+        for par, obtida in zip(pares, obtidas):
+            if isinstance(obtida, Exception):
+                print(f"Aviso: sem cotação {par[0]}->{par[1]}; conversões agendadas adiadas: {obtida}")
+            else:
+                cotacoes[par] = obtida
+        return cotacoes
+
+    def _executar_carteira(self, endereco_carteira: str, itens: List[Dict[str, Any]],
+                           cotacoes: Dict[Tuple[str, str], CotacaoObtida], agora: datetime) -> Counter:
+        """Executa os agendamentos vencidos de uma carteira numa transação (roda numa thread)."""
+        resultado: Counter = Counter()
+        eventos: List[tuple] = []
+        shards_destino = {
+            shard_da_carteira(a["endereco_destino"]) for a in itens if a["tipo"] == "TRANSFERENCIA"
+        }
+
+        try:
+            with self.agendamento_repo.reivindicar(
+                endereco_carteira, [a["id_agendamento"] for a in itens], shards_destino, agora,
+            ) as lote:
+                for agendamento in lote.agendamentos:
+                    self._executar_agendamento(lote, agendamento, cotacoes, agora, resultado, eventos)
+        except ShardEmMigracaoError:
+            resultado["adiados"] += len(itens)
+            return resultado
+
+        # Só depois do commit
+        for evento in eventos:
+            publicar_movimento(*evento)
+        return resultado
+
+    def _executar_agendamento(self, lote: LoteAgendamentos, agendamento: Dict[str, Any],
+                              cotacoes: Dict[Tuple[str, str], CotacaoObtida], agora: datetime,
+                              resultado: Counter, eventos: List[tuple]):
+        for _ in range(MAXIMO_ATRASADAS_POR_CICLO):
+            try:
+                eventos_operacao = self._executar_operacao(lote, agendamento, cotacoes)
+            except (_Adiado, ShardEmMigracaoError):
+                resultado["adiados"] += 1
+                return
+            except ValueError as e:
+                # O repositório valida antes de gravar: nada da operação ficou na transação
+                resultado["falhas"] += 1
+                self._avancar(lote, agendamento, agora, str(e))
+                return
+
+            resultado["executados"] += 1
+            resultado[agendamento["tipo"]] += 1
+            eventos.extend(eventos_operacao)
+            if not self._avancar(lote, agendamento, agora, None):
+                return
+
+    def _executar_operacao(self, lote: LoteAgendamentos, agendamento: Dict[str, Any],
+                           cotacoes: Dict[Tuple[str, str], CotacaoObtida]) -> List[tuple]:
+        """Executa uma ocorrência na transação do lote; devolve os eventos a publicar."""
+        origem = agendamento["endereco_carteira"]
+        codigo_moeda = agendamento["codigo_moeda"]
+        valor = Dinheiro.de_decimal(agendamento["valor"])
+        conn = lote.conexao(lote.shard)
+
+        if agendamento["tipo"] == "TRANSFERENCIA":
+            destino = agendamento["endereco_destino"]
+            shard_destino = shard_da_carteira(destino, escrita=True)
+            if not lote.tem_shard(shard_destino):
+                raise _Adiado()  # destino mudou de shard depois da leitura dos vencidos
+
+            taxa_valor = valor.percentual(TAXA_TRANSFERENCIA_PERCENTUAL)
+            valor_total_debito = valor + taxa_valor
+            movimento = self.carteira_repo.registrar_transferencia(
+                endereco_origem=origem,
+                endereco_destino=destino,
+                codigo_moeda=codigo_moeda,
+                valor_liquido=valor,
+                valor_total_debito=valor_total_debito,
+                taxa_valor=taxa_valor,
+                conn=conn,
+                conn_destino=lote.conexao(shard_destino) if shard_destino != lote.shard else None,
+                # Limite da janela vale também para as agendadas (excedido conta como falha)
+                limite=self.limites.limite(origem, "TRANSFERENCIA", codigo_moeda),
+            )
+            movimento["id_agendamento"] = agendamento["id_agendamento"]
+            return [
+                (origem, "TRANSFERENCIA", movimento, {codigo_moeda: -valor_total_debito}),
+                (destino, "TRANSFERENCIA", movimento, {codigo_moeda: valor}),
+            ]
+
+        codigo_destino = agendamento["codigo_destino"]
+        obtida = cotacoes.get((codigo_moeda, codigo_destino))
+        if obtida is None:
+            raise _Adiado()
+
+        valor_destino, taxa_valor = calcular_conversao(valor, obtida.valor, TAXA_CONVERSAO_PERCENTUAL)
+        movimento = self.carteira_repo.registrar_conversao(
+            endereco_carteira=origem,
+            codigo_origem=codigo_moeda,
+            codigo_destino=codigo_destino,
+            valor_origem=valor,
+            valor_destino=valor_destino,
+            taxa_percentual=TAXA_CONVERSAO_PERCENTUAL,
+            taxa_valor=taxa_valor,
+            cotacao_utilizada=obtida.valor,
+            conn=conn,
+        )
+        movimento["fonte_cotacao"] = obtida.fonte
+        movimento["cotacao_obtida_em"] = obtida.obtida_em
+        movimento["id_agendamento"] = agendamento["id_agendamento"]
+        return [(origem, "CONVERSAO", movimento, {codigo_moeda: -valor, codigo_destino: valor_destino})]
+
+    def _avancar(self, lote: LoteAgendamentos, agendamento: Dict[str, Any], agora: datetime,
+                 erro: Optional[str]) -> bool:
+        """
+        Passa o agendamento para a próxima ocorrência (na transação do lote).
+        Retorna True se ele continua vencido e deve rodar de novo (política TODAS).
+        """
+        periodicidade = agendamento["periodicidade"]
+        falhas = agendamento["falhas_consecutivas"] + 1 if erro else 0
+        ocorrencia = agendamento["ocorrencia"] + 1
+
+        if periodicidade == "UNICA":
+            proxima = agendamento["proxima_execucao"]
+            status = STATUS_SUSPENSO if erro else STATUS_CONCLUIDO
+        else:
+            if agendamento["execucoes_atrasadas"] == "UMA":
+                while ocorrencia_em(agendamento["inicio"], periodicidade, ocorrencia) <= agora:
+                    ocorrencia += 1
+            proxima = ocorrencia_em(agendamento["inicio"], periodicidade, ocorrencia)
+            if agendamento["fim"] is not None and proxima > agendamento["fim"]:
+                status = STATUS_CONCLUIDO
+            elif falhas >= MAXIMO_FALHAS_CONSECUTIVAS:
+                status = STATUS_SUSPENSO
+            else:
+                status = STATUS_ATIVO
+
+        self.agendamento_repo.registrar_execucao(lote.conexao(lote.shard), {
+            "id_agendamento": agendamento["id_agendamento"],
+            "ocorrencia": ocorrencia,
+            "proxima_execucao": proxima,
+            "status": status,
+            "executou": 0 if erro else 1,
+            "falhas_consecutivas": falhas,
+            "ultimo_erro": erro[:255] if erro else None,
+        })
+        agendamento.update(ocorrencia=ocorrencia, proxima_execucao=proxima, status=status,
+                           falhas_consecutivas=falhas)
+        return status == STATUS_ATIVO and erro is None and proxima <= agora
+
+
+# ---------------------------------------------------------
+#  Agendador dentro da API (AGENDADOR_ATIVO=1)
+# ---------------------------------------------------------
+
+_tarefa: Optional[asyncio.Task] = None
+_parar: Optional[asyncio.Event] = None
+
+
+def iniciar_agendador() -> bool:
+    """Inicia o agendador em segundo plano no event loop da API, se habilitado."""
+    global _tarefa, _parar
+    if not AGENDADOR_ATIVO or _tarefa is not None:
+        return False
+    _parar = asyncio.Event()
+    agendador = AgendadorService(AgendamentoRepository(), CarteiraRepository())
+    _tarefa = asyncio.create_task(agendador.executar_continuamente(_parar))
+    return True
+
+
+async def encerrar_agendador():
+    """Pede para o agendador parar e espera o ciclo em andamento terminar."""
+    global _tarefa, _parar
+    if _tarefa is None:
+        return
+    _parar.set()
+    await _tarefa
+    _tarefa, _parar = None, None
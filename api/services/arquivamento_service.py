@@ -0,0 +1,114 @@
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from api.persistence.arquivo_movimentos import ArquivoMovimentos, EscritorSegmento, exigir_pyarrow
+from api.persistence.migracoes import inicio_do_mes, somar_meses
+from api.persistence.repositories.arquivo_repository import ArquivoRepository
+
+TAMANHO_PAGINA_ARQUIVAMENTO = 10_000
+TAMANHO_LOTE_REMOCAO = 2_000
+
+
+def corte_arquivado(segmentos: List[Dict[str, Any]]) -> Optional[datetime]:
+    """
+    Instante até o qual o histórico é lido do arquivo. Movimentações com
+    data_hora anterior podem ainda estar nas tabelas quentes (remoção em
+    andamento), mas são ignoradas lá.
+    """
+    return max((s["fim"] for s in segmentos), default=None)
+
+
+class ArquivamentoService:
+    """
+    Move movimentações antigas das tabelas quentes para segmentos mensais.
+
+    Para cada mês anterior ao corte:
+    1. copia as movimentações para um segmento Parquet (+ índice por carteira);
+    2. registra o segmento (status COPIADO): a partir daqui as leituras usam o
+       arquivo para esse mês;
+    3. remove as linhas das tabelas quentes em lotes pequenos, cada um numa
+       transação curta que também acumula SALDO_ARQUIVADO;
+    4. marca o segmento como CONCLUIDO.
+
+    Interrompido em qualquer ponto, rodar de novo retoma: segmentos COPIADO
+    voltam ao passo 3 e arquivos temporários são descartados.
+    """
+
+    def __init__(self, arquivo_repo: ArquivoRepository, arquivo: ArquivoMovimentos):
+        self.arquivo_repo = arquivo_repo
+        self.arquivo = arquivo
+
+    def arquivar(self, anteriores_a: date, tamanho_pagina: int = TAMANHO_PAGINA_ARQUIVAMENTO,
+                 tamanho_lote: int = TAMANHO_LOTE_REMOCAO,
+                 ao_progredir: Optional[Callable[[str], None]] = None) -> List[Dict[str, Any]]:
+        exigir_pyarrow()
+        avisar = ao_progredir or (lambda mensagem: None)
+        corte = datetime.combine(inicio_do_mes(anteriores_a), datetime.min.time())
+        if corte > datetime.now():
+            raise ValueError("O corte do arquivamento não pode estar no futuro.")
+
+        segmentos = self.arquivo_repo.listar_segmentos()
+        for segmento in segmentos:
+            if segmento["status"] != "CONCLUIDO":
+                avisar(f"Retomando remoção do segmento {segmento['arquivo']}")
+                self._remover_arquivadas(segmento, tamanho_lote, avisar)
+
+        mais_antigo = self.arquivo_repo.movimento_mais_antigo()
+        ultimo_fim = corte_arquivado(segmentos)
+        if mais_antigo is None:
+            return []
+        if ultimo_fim is not None and mais_antigo < ultimo_fim:
+            # Não acontece em operação normal: o extrato já ignora essas linhas
+            raise ValueError(f"Há movimentações anteriores a {ultimo_fim} fora do arquivo.")
+
+        novos = []
+        mes = inicio_do_mes(mais_antigo.date())
+        while datetime.combine(somar_meses(mes, 1), datetime.min.time()) <= corte:
+            inicio = datetime.combine(mes, datetime.min.time())
+            fim = datetime.combine(somar_meses(mes, 1), datetime.min.time())
+            segmento = self._copiar_mes(inicio, fim, tamanho_pagina, avisar)
+            if segmento is not None:
+                self._remover_arquivadas(segmento, tamanho_lote, avisar)
+                novos.append(segmento)
+            mes = somar_meses(mes, 1)
+
+        return novos
+
+    def _copiar_mes(self, inicio: datetime, fim: datetime, tamanho_pagina: int,
+                    avisar: Callable[[str], None]) -> Optional[Dict[str, Any]]:
+        # Meses depois do último segmento registrado: um arquivo já existente
+        # é sobra de execução interrompida e pode ser regravado.
+        escritor = EscritorSegmento(f"movimentos_{inicio:%Y%m}", self.arquivo.diretorio, substituir_orfao=True)
+        try:
+            cursor = (inicio, 0, 0)
+            while True:
+                pagina = self.arquivo_repo.buscar_pagina_movimentos(inicio, fim, cursor, tamanho_pagina)
+                escritor.adicionar(pagina)
+                if len(pagina) < tamanho_pagina:
+                    break
+                ultima = pagina[-1]
+                cursor = (ultima["data_hora"], ultima["ordem"], ultima["id_movimento"])
+        except BaseException:
+            escritor.descartar()
+            raise
+
+        if escritor.linhas == 0:
+            escritor.descartar()
+            return None
+
+        dados = escritor.finalizar()
+        id_segmento = self.arquivo_repo.registrar_segmento(inicio, fim, dados["arquivo"], dados["indice"],
+                                                           dados["linhas"], dados["checksum"])
+        avisar(f"Segmento {dados['arquivo']} gravado ({dados['linhas']} movimentações)")
+        return {"id_segmento": id_segmento, "inicio": inicio, "fim": fim, "status": "COPIADO", **dados}
+
+    def _remover_arquivadas(self, segmento: Dict[str, Any], tamanho_lote: int, avisar: Callable[[str], None]):
+        removidas = 0
+        for ordem, ids in self.arquivo.linhas_para_remover(segmento).items():
+            for i in range(0, len(ids), tamanho_lote):
+                removidas += self.arquivo_repo.consolidar_e_apagar(
+                    ordem, ids[i:i + tamanho_lote], segmento["inicio"], segmento["fim"]
+                )
+
+        self.arquivo_repo.concluir_segmento(segmento["id_segmento"])
+        avisar(f"Segmento {segmento['arquivo']} concluído ({removidas} linhas removidas das tabelas quentes)")
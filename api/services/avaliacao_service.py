@@ -0,0 +1,61 @@
+import asyncio
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from api.persistence.repositories.relatorio_repository import RelatorioRepository, TAMANHO_LOTE_PADRAO
+from api.services.provedores_cotacao import CotacaoIndisponivelError, get_cotacao
+
+TOP_N_PADRAO = 10
+
+
+class AvaliacaoService:
+
+    def __init__(self, relatorio_repo: RelatorioRepository):
+        self.relatorio_repo = relatorio_repo
+
+    async def cotacoes_snapshot(self, moeda_avaliacao: str) -> Tuple[List[Dict[str, Any]], Dict[str, Decimal]]:
+        """
+        Busca, uma única vez e em paralelo, a cotação de cada moeda cadastrada
+        para a moeda de avaliação.
+        """
+        moedas = self.relatorio_repo.listar_moedas()
+        codigos = [m["codigo"] for m in moedas]
+
+        if moeda_avaliacao not in codigos:
+            raise ValueError(f"Moeda de avaliação {moeda_avaliacao} não encontrada.")
+
+        outras = [c for c in codigos if c != moeda_avaliacao]
+        try:
+            valores = await asyncio.gather(*(get_cotacao(c, moeda_avaliacao) for c in outras))
+        except CotacaoIndisponivelError:
+            raise
+        except Exception as e:
+            raise Exception(f"Falha ao obter cotações para {moeda_avaliacao}: {e}")
+
+        cotacoes = dict(zip(outras, valores))
+        cotacoes[moeda_avaliacao] = Decimal("1")
+        return moedas, cotacoes
+
+    def avaliar(self, moeda_avaliacao: str, moedas: List[Dict[str, Any]], cotacoes: Dict[str, Decimal],
+                top_n: int = TOP_N_PADRAO, tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                ao_avaliar_lote: Optional[Callable[["np.ndarray", "np.ndarray"], None]] = None) -> Dict[str, Any]:
+        """
+        Percorre todos os saldos em lotes e calcula o valor de cada carteira.
+        ao_avaliar_lote recebe (enderecos, totais) de cada lote, para quem precisar
+        dos totais por carteira (ex.: o job em lote).
+        """
+        # numpy só é carregado quando uma avaliação roda
+        from api.services.acumulador_avaliacao import AcumuladorAvaliacao
+
+        acumulador = AcumuladorAvaliacao(moedas, cotacoes, top_n)
+
+        for lote in self.relatorio_repo.iterar_saldos(tamanho_lote):
+            enderecos, totais = acumulador.adicionar_lote(lote)
+            if ao_avaliar_lote and len(enderecos):
+                ao_avaliar_lote(enderecos, totais)
+
+        enderecos, totais = acumulador.finalizar()
+        if ao_avaliar_lote and len(enderecos):
+            ao_avaliar_lote(enderecos, totais)
+
+        return acumulador.resultado(moeda_avaliacao)
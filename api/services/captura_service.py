@@ -0,0 +1,173 @@
+"""
+Captura de tráfego real das rotas /carteiras para reprodução em testes de
+desempenho (ver api.services.replay_service e api.jobs.reproduzir_trafego).
+
+A amostragem é por carteira: uma carteira na amostra tem todas as requisições
+capturadas (da criação em diante, se ela nasceu durante a captura), para que
+a reprodução encontre o mesmo saldo que produção encontrou. Rotas sem
+carteira (listagens, saldos em lote) são amostradas por requisição.
+
+Os registros são redigidos antes de sair do processo: chaves privadas viram
+tokens (HMAC com segredo aleatório do processo, irreversível), só cabeçalhos
+da lista CABECALHOS_CAPTURADOS são guardados e corpos de resposta não são
+gravados (só o endereço/id criado e a cotação usada nas conversões).
+
+A gravação (JSON por linha, gzip, um arquivo por processo com rotação) roda
+numa thread própria; com a fila cheia o registro é descartado e contado, sem
+atrasar a requisição.
+
+Configuração (variáveis de ambiente):
+    CAPTURA_TRAFEGO_ATIVA=1         liga a captura (padrão: 0)
+    CAPTURA_AMOSTRAGEM=0.01         fração das carteiras/requisições capturadas
+    CAPTURA_DIRETORIO=capturas      onde os arquivos .jsonl.gz são gravados
+    CAPTURA_REGISTROS_POR_ARQUIVO   rotação (padrão: 100000)
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import secrets
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+CAPTURA_ATIVA = os.getenv("CAPTURA_TRAFEGO_ATIVA", "0") == "1"
+FRACAO_AMOSTRAGEM = float(os.getenv("CAPTURA_AMOSTRAGEM", "0.01"))
+DIRETORIO_CAPTURA = os.getenv("CAPTURA_DIRETORIO", "capturas")
+REGISTROS_POR_ARQUIVO = int(os.getenv("CAPTURA_REGISTROS_POR_ARQUIVO", "100000"))
+TAMANHO_FILA_CAPTURA = int(os.getenv("CAPTURA_TAMANHO_FILA", "10000"))
+
+PREFIXO_TOKEN = "tok:"
+CABECALHOS_CAPTURADOS = ("content-type", "if-none-match", "accept")
+CABECALHO_CHAVE_PRIVADA = "x-chave-privada"
+
+# Segredo do processo: tokens não são reversíveis nem comparáveis entre processos
+_SEGREDO_TOKENS = secrets.token_bytes(32)
+
+
+def tokenizar(chave_privada: str) -> str:
+    return PREFIXO_TOKEN + hmac.new(_SEGREDO_TOKENS, chave_privada.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def redigir(valor: Any) -> Any:
+    """Troca por tokens os campos 'chave_privada*' de um corpo JSON."""
+    if isinstance(valor, dict):
+        return {
+            k: tokenizar(v.strip()) if k.startswith("chave_privada") and isinstance(v, str) and v.strip() else redigir(v)
+            for k, v in valor.items()
+        }
+    if isinstance(valor, list):
+        return [redigir(v) for v in valor]
+    return valor
+
+
+def na_amostra(endereco_carteira: str, fracao: float = FRACAO_AMOSTRAGEM) -> bool:
+    # Hash próprio (não o CRC32 dos shards): a amostra não pode se concentrar
+    # nos buckets de um shard
+    h = hashlib.blake2b(endereco_carteira.encode("utf-8"), digest_size=8, person=b"captura").digest()
+    return int.from_bytes(h, "big") < fracao * 2 ** 64
+
+
+class EscritorCaptura:
+    """Grava os registros em segundo plano em <diretorio>/captura-<inicio>-<pid>.jsonl.gz."""
+
+    def __init__(self, diretorio: str = DIRETORIO_CAPTURA, registros_por_arquivo: int = REGISTROS_POR_ARQUIVO,
+                 tamanho_fila: int = TAMANHO_FILA_CAPTURA):
+        self.diretorio = diretorio
+        self.registros_por_arquivo = registros_por_arquivo
+        self.gravados = 0
+        self.descartados = 0
+        self._fila: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=tamanho_fila)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None
+
+    def iniciar(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._thread = threading.Thread(target=self._executar, name="captura-trafego", daemon=True)
+        self._thread.start()
+
+    def registrar(self, registro: Dict[str, Any]):
+        try:
+            self._fila.put_nowait(registro)
+        except queue.Full:
+            self.descartados += 1
+
+    def encerrar(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self._fila.put(None, timeout=timeout)
+        self._thread.join(timeout)
+        self._thread = None
+        if self.descartados:
+            print(f"Aviso: {self.descartados} registros de captura descartados (fila cheia).")
+
+    def _novo_arquivo(self):
+        nome = f"captura-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.jsonl.gz"
+        return gzip.open(os.path.join(self.diretorio, nome), "wt", encoding="utf-8")
+
+    def _executar(self):
+        arquivo, no_arquivo = None, 0
+        try:
+            while True:
+                try:
+                    registro = self._fila.get(timeout=1.0)
+                except queue.Empty:
+                    # Ocioso: deixa o que já foi capturado legível no disco
+                    if arquivo is not None:
+                        arquivo.flush()
+                    continue
+                if registro is None:
+                    return
+
+                if arquivo is None:
+                    arquivo = self._novo_arquivo()
+                arquivo.write(json.dumps(registro, ensure_ascii=False, separators=(",", ":")))
+                arquivo.write("\n")
+                self.gravados += 1
+                no_arquivo += 1
+                if no_arquivo >= self.registros_por_arquivo:
+                    arquivo.close()
+                    arquivo, no_arquivo = None, 0
+        finally:
+            if arquivo is not None:
+                arquivo.close()
+
+
+escritor_captura = EscritorCaptura()
+
+
+def iniciar_captura() -> bool:
+    if not CAPTURA_ATIVA or escritor_captura.ativo:
+        return False
+    escritor_captura.iniciar()
+    return True
+
+
+def encerrar_captura():
+    escritor_captura.encerrar()
+
+
+def _ler_arquivo(caminho: str) -> Iterator[Dict[str, Any]]:
+    try:
+        with gzip.open(caminho, "rt", encoding="utf-8") as f:
+            for linha in f:
+                if linha.strip():
+                    yield json.loads(linha)
+    except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+        # Arquivo de um processo que não encerrou a captura: vale o que foi lido
+        print(f"Aviso: captura {caminho} truncada; usando os registros completos.")
+
+
+def ler_captura(diretorio: str) -> List[Dict[str, Any]]:
+    """Registros de todos os arquivos do diretório (todos os processos), em ordem de chegada."""
+    registros = []
+    for nome in sorted(os.listdir(diretorio)):
+        if nome.endswith(".jsonl.gz"):
+            registros.extend(_ler_arquivo(os.path.join(diretorio, nome)))
+    registros.sort(key=lambda r: r["t"])
+    return registros
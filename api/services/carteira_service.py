@@ -1,23 +1,51 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 from decimal import Decimal
+import asyncio
 import os
 import hashlib
 
-from api.services.coinbase_service import get_cotacao
+from api.services.provedores_cotacao import get_cotacao, obter_cotacao
 from api.persistence.repositories.carteira_repository import CarteiraRepository
-from api.models.carteira_models import Carteira, CarteiraCriada, SaldoItem, ConversaoInput, MovimentoHistorico, TransferenciaInput
+from api.persistence.shards import ShardEmMigracaoError
+from api.models.dinheiro import ARREDONDAMENTO_AVALIACAO, ZERO, Dinheiro
+from api.models.carteira_models import MOEDAS_OBRIGATORIAS, Carteira, CarteiraCriada, SaldoItem, ConversaoInput, MovimentoHistorico, TransferenciaInput
 from api.services.key_service import gerar_chave
+from api.services.eventos_service import publicar_movimento
+from api.services.cotacao_service import ArmazemCotacoes, armazem_cotacoes, calcular_conversao
+from api.services.limites_service import LimitesService
 
 TAXA_SAQUE_PERCENTUAL = Decimal(os.getenv("TAXA_SAQUE_PERCENTUAL", "0.01"))
 TAXA_CONVERSAO_PERCENTUAL = Decimal(os.getenv("TAXA_CONVERSAO_PERCENTUAL", "0.02"))
 TAXA_TRANSFERENCIA_PERCENTUAL = Decimal(os.getenv("TAXA_TRANSFERENCIA_PERCENTUAL", "0.01"))
+
+# Máximo de endereços por consulta de saldos em lote
+MAXIMO_CARTEIRAS_LOTE = int(os.getenv("SALDOS_LOTE_MAXIMO", "1000"))
+
+
+def gerar_etag(*partes) -> str:
+    """ETag forte derivada das partes que definem a versão do recurso."""
+    base = "|".join("" if p is None else str(p) for p in partes)
+    return '"' + hashlib.sha256(base.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    """Avalia o cabeçalho If-None-Match (lista de ETags ou '*')."""
+    if not if_none_match:
+        return False
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or etag in candidatos
+
+
 class CarteiraService:
     
-    MOEDAS_OBRIGATORIAS = ['BTC', 'ETH', 'SOL', 'USD', 'BRL']
+    MOEDAS_OBRIGATORIAS = list(MOEDAS_OBRIGATORIAS)
     
-    def __init__(self, carteira_repo: CarteiraRepository):
+    def __init__(self, carteira_repo: CarteiraRepository, cotacoes: ArmazemCotacoes = armazem_cotacoes,
+                 limites: Optional[LimitesService] = None):
         self.carteira_repo = carteira_repo
+        self.cotacoes = cotacoes
+        self.limites = limites or LimitesService(carteira_repo)
 
     def criar_carteira(self) -> CarteiraCriada:
         
@@ -45,12 +73,14 @@ class CarteiraService:
             )
             
             saldos_iniciais = [
-                SaldoItem(codigo_moeda=moeda, saldo=Decimal("0.00"))
+                SaldoItem(codigo_moeda=moeda, saldo=ZERO)
                 for moeda in self.MOEDAS_OBRIGATORIAS
             ]
             
             self.carteira_repo.inicializar_saldos(endereco, saldos_iniciais)
             
+        except ShardEmMigracaoError:
+            raise
         except Exception as e:
             print(f"Erro ao persistir a carteira: {e}")
             raise Exception("Erro ao criar a carteira no banco de dados.")
@@ -73,6 +103,25 @@ class CarteiraService:
             status=row["status"],
         )
 
+    def buscar_por_endereco_condicional(self, endereco_carteira: str, if_none_match: Optional[str]) -> Tuple[str, Optional[Carteira]]:
+        """
+        Retorna (etag, carteira). Se o ETag do cliente ainda for válido,
+        a carteira retornada é None e o modelo nem chega a ser montado.
+        """
+        row = self.carteira_repo.buscar_por_endereco(endereco_carteira)
+        if not row:
+            raise ValueError("Carteira não encontrada")
+
+        etag = gerar_etag(row["endereco_carteira"], row["data_criacao"], row["status"])
+        if etag_confere(if_none_match, etag):
+            return etag, None
+
+        return etag, Carteira(
+            endereco_carteira=row["endereco_carteira"],
+            data_criacao=row["data_criacao"],
+            status=row["status"],
+        )
+
     def listar(self) -> List[Carteira]:
         rows = self.carteira_repo.listar()
         return [
@@ -84,6 +133,21 @@ class CarteiraService:
             for r in rows
         ]
 
+    def listar_rapido(self) -> List[dict]:
+        """
+        Mesmo conteúdo de listar(), mas como dicts prontos para serialização,
+        sem montar modelos Pydantic.
+        """
+        rows = self.carteira_repo.listar()
+        return [
+            {
+                "endereco_carteira": r["endereco_carteira"],
+                "data_criacao": r["data_criacao"],
+                "status": r["status"],
+            }
+            for r in rows
+        ]
+
     def bloquear(self, endereco_carteira: str) -> Carteira:
         row = self.carteira_repo.atualizar_status(endereco_carteira, "BLOQUEADA")
         if not row:
@@ -111,21 +175,110 @@ class CarteiraService:
             for r in rows
         ]
         
-    def depositar(self, endereco_carteira: str, codigo_moeda: str, valor: Decimal) -> MovimentoHistorico:
-        if valor <= 0:
+    def buscar_saldos_rapido(self, endereco_carteira: str) -> List[dict]:
+        """
+        Mesmo conteúdo de buscar_saldos(), direto das linhas do repositório
+        (que já têm exatamente os campos de SaldoItem).
+        """
+        return self.carteira_repo.buscar_saldos(endereco_carteira)
+
+    def versao_saldos(self, endereco_carteira: str) -> Optional[str]:
+        """
+        ETag dos saldos da carteira, calculada a partir do status da carteira e de
+        um resumo agregado dos saldos (sem ler o conjunto completo).
+        Retorna None se a carteira não existir.
+        """
+        versao = self.carteira_repo.buscar_versao_saldos(endereco_carteira)
+        if not versao:
+            return None
+
+        return gerar_etag(
+            endereco_carteira,
+            versao["status"],
+            versao["total_moedas"],
+            versao["ultima_atualizacao"],
+            versao["checksum"],
+        )
+
+    def buscar_saldos_lote(self, enderecos: List[str], incluir_status: bool = False) -> Dict[str, Any]:
+        """
+        Saldos de várias carteiras com uma única consulta ao banco, na ordem
+        dos endereços pedidos (repetidos são ignorados). Endereços que não
+        existem são listados em 'nao_encontradas'.
+        """
+        enderecos = list(dict.fromkeys(e.strip() for e in enderecos if e and e.strip()))
+        if not enderecos:
+            raise ValueError("Informe ao menos um endereço de carteira.")
+        if len(enderecos) > MAXIMO_CARTEIRAS_LOTE:
+            raise ValueError(f"No máximo {MAXIMO_CARTEIRAS_LOTE} carteiras por consulta.")
+
+        encontradas = self.carteira_repo.buscar_saldos_carteiras(enderecos)
+
+        carteiras = []
+        for endereco in enderecos:
+            dados = encontradas.get(endereco)
+            if dados is None:
+                continue
+            carteira = {"endereco_carteira": endereco}
+            if incluir_status:
+                carteira["status"] = dados["status"]
+            carteira["saldos"] = dados["saldos"]
+            carteiras.append(carteira)
+
+        return {
+            "nao_encontradas": [e for e in enderecos if e not in encontradas],
+            "carteiras": carteiras,
+        }
+
+    async def avaliar_saldos_lote(self, resultado: Dict[str, Any], moeda_avaliacao: str) -> Dict[str, Any]:
+        """
+        Acrescenta ao resultado de buscar_saldos_lote o valor de cada saldo e o
+        total de cada carteira na moeda de avaliação. Busca uma cotação por
+        moeda presente no lote, em paralelo, sem fallback para cotação antiga.
+        """
+        moeda_avaliacao = moeda_avaliacao.upper()
+        # Fora do catálogo em memória, existe_moeda vai ao banco: não no event loop
+        if not await asyncio.to_thread(self.carteira_repo.existe_moeda, moeda_avaliacao):
+            raise ValueError(f"Moeda de avaliação {moeda_avaliacao} não encontrada.")
+
+        codigos = sorted({
+            s["codigo_moeda"] for c in resultado["carteiras"] for s in c["saldos"]
+        } - {moeda_avaliacao})
+        valores = await asyncio.gather(*(get_cotacao(c, moeda_avaliacao) for c in codigos))
+        cotacoes = dict(zip(codigos, valores))
+        cotacoes[moeda_avaliacao] = Decimal("1")
+
+        for carteira in resultado["carteiras"]:
+            total = ZERO
+            for saldo in carteira["saldos"]:
+                saldo["valor_avaliado"] = saldo["saldo"].multiplicar(cotacoes[saldo["codigo_moeda"]], ARREDONDAMENTO_AVALIACAO)
+                total += saldo["valor_avaliado"]
+            carteira["valor_total"] = total
+
+        # Campos novos antes da lista de carteiras (a última a ser serializada)
+        return {"moeda_avaliacao": moeda_avaliacao, "cotacoes": cotacoes, **resultado}
+
+    def depositar(self, endereco_carteira: str, codigo_moeda: str, valor: Dinheiro) -> MovimentoHistorico:
+        if valor <= ZERO:
             raise ValueError("O valor do depósito deve ser positivo.")
 
+        self.limites.verificar_requisicao(endereco_carteira)
+
         try:
             movimento = self.carteira_repo.registrar_deposito(endereco_carteira, codigo_moeda, valor)
-            return movimento
+        except (ValueError, ShardEmMigracaoError):
+            raise
         except Exception as e:
             raise Exception(f"Falha ao processar depósito: {e}")
+
+        publicar_movimento(endereco_carteira, "DEPOSITO", movimento, {codigo_moeda: valor})
+        return movimento
         
-    def sacar(self, endereco_carteira: str, codigo_moeda: str, valor_saque: Decimal, chave_privada: str) -> MovimentoHistorico:
+    def sacar(self, endereco_carteira: str, codigo_moeda: str, valor_saque: Dinheiro, chave_privada: str) -> MovimentoHistorico:
         """
         Registra um saque, debita valor + taxa e valida a chave privada.
         """
-        if valor_saque <= 0:
+        if valor_saque <= ZERO:
             raise ValueError("O valor do saque deve ser positivo.")
 
         if not chave_privada or not chave_privada.strip():
@@ -137,61 +290,98 @@ class CarteiraService:
         if not is_valid:
             raise ValueError("Chave privada inválida ou carteira não encontrada.")
 
-        taxa = valor_saque * TAXA_SAQUE_PERCENTUAL
+        self.limites.verificar_requisicao(endereco_carteira)
+
+        taxa = valor_saque.percentual(TAXA_SAQUE_PERCENTUAL)
         valor_total_debito = valor_saque + taxa
-        
-        saldo_atual = self.carteira_repo.buscar_saldo_por_moeda(endereco_carteira, codigo_moeda)
-        if saldo_atual is None or saldo_atual < valor_total_debito:
-            raise ValueError("Saldo insuficiente para cobrir o valor e a taxa.")
 
+        # O saldo e o limite da janela são conferidos dentro da transação do
+        # repositório (SELECT ... FOR UPDATE), então não há leitura prévia aqui.
         try:
             movimento = self.carteira_repo.registrar_saque(
                 endereco_carteira=endereco_carteira,
                 codigo_moeda=codigo_moeda,
                 valor=valor_saque,
                 taxa=taxa,
-                valor_total_debito=valor_total_debito
+                valor_total_debito=valor_total_debito,
+                limite=self.limites.limite(endereco_carteira, "SAQUE", codigo_moeda)
             )
-            return movimento
+        except (ValueError, ShardEmMigracaoError):
+            raise
         except Exception as e:
             raise Exception(f"Falha ao processar saque: {e}")
+
+        publicar_movimento(endereco_carteira, "SAQUE", movimento, {codigo_moeda: -valor_total_debito})
+        return movimento
         
     async def converter_moedas(self, endereco_carteira: str, conversao_data: ConversaoInput):
     
         if not conversao_data.chave_privada or not conversao_data.chave_privada.strip():
             raise ValueError("Chave privada é obrigatória para conversão.")
     
-        # Limpa a chave privada antes de validar
+        if conversao_data.codigo_origem == conversao_data.codigo_destino:
+            raise ValueError("Moedas de origem e destino devem ser diferentes.")
+        valor_origem = conversao_data.valor_origem
+        if valor_origem <= ZERO:
+            raise ValueError("O valor de origem deve ser positivo.")
+
+        # Tudo que vai ao banco roda em thread: uma espera de lock não pode
+        # parar o event loop (streams SSE, agendador, outras requisições)
         chave_privada_limpa = conversao_data.chave_privada.strip()
-        if not self.carteira_repo.validar_chave_privada(endereco_carteira, chave_privada_limpa):
+        if not await asyncio.to_thread(self.carteira_repo.validar_chave_privada, endereco_carteira, chave_privada_limpa):
             raise ValueError("Chave privada inválida ou carteira não encontrada.")
 
-        cotacao = await get_cotacao(conversao_data.codigo_origem, conversao_data.codigo_destino)
-        
-        valor_origem = conversao_data.valor_origem
-        taxa_percentual = TAXA_CONVERSAO_PERCENTUAL
-        
-        valor_bruto_destino = valor_origem * cotacao
-        
-        taxa_valor = valor_bruto_destino * taxa_percentual
-        
-        valor_destino_liquido = valor_bruto_destino - taxa_valor
-        
-        saldo_origem = self.carteira_repo.buscar_saldo_por_moeda(endereco_carteira, conversao_data.codigo_origem)
-        if saldo_origem is None or saldo_origem < valor_origem:
-            raise ValueError("Saldo insuficiente na moeda de origem para conversão.")
-
-        movimento = self.carteira_repo.registrar_conversao(
-            endereco_carteira=endereco_carteira,
-            codigo_origem=conversao_data.codigo_origem,
-            codigo_destino=conversao_data.codigo_destino,
-            valor_origem=valor_origem,
-            valor_destino=valor_destino_liquido,
-            taxa_percentual=taxa_percentual,
-            taxa_valor=taxa_valor,
-            cotacao_utilizada=cotacao
-        )
-        
+        await asyncio.to_thread(self.limites.verificar_requisicao, endereco_carteira)
+
+        cotacao_firme = None
+        if conversao_data.id_cotacao:
+            # Cotação firme: executa com a taxa congelada, sem chamada externa
+            cotacao_firme = self.cotacoes.consumir(conversao_data.id_cotacao)
+            if (cotacao_firme.codigo_origem, cotacao_firme.codigo_destino) != (conversao_data.codigo_origem, conversao_data.codigo_destino):
+                self.cotacoes.devolver(cotacao_firme)
+                raise ValueError("A cotação informada é de outro par de moedas.")
+            # A taxa só fica congelada para o valor cotado: sem isso, uma cotação
+            # favorável serviria para converter qualquer quantia
+            if cotacao_firme.valor_origem is None or cotacao_firme.valor_origem != valor_origem:
+                self.cotacoes.devolver(cotacao_firme)
+                raise ValueError("A cotação firme deve ter sido criada com o mesmo valor de origem da conversão.")
+            cotacao = cotacao_firme.cotacao
+            taxa_percentual = cotacao_firme.taxa_percentual
+            fonte_cotacao, cotacao_obtida_em = cotacao_firme.fonte_cotacao, cotacao_firme.cotacao_obtida_em
+        else:
+            # Com o provedor indisponível pode vir a última cotação conhecida (sinalizada na resposta)
+            obtida = await obter_cotacao(conversao_data.codigo_origem, conversao_data.codigo_destino)
+            cotacao = obtida.valor
+            taxa_percentual = TAXA_CONVERSAO_PERCENTUAL
+            fonte_cotacao, cotacao_obtida_em = obtida.fonte, obtida.obtida_em
+
+        valor_destino_liquido, taxa_valor = calcular_conversao(valor_origem, cotacao, taxa_percentual)
+
+        try:
+            movimento = await asyncio.to_thread(
+                self.carteira_repo.registrar_conversao,
+                endereco_carteira=endereco_carteira,
+                codigo_origem=conversao_data.codigo_origem,
+                codigo_destino=conversao_data.codigo_destino,
+                valor_origem=valor_origem,
+                valor_destino=valor_destino_liquido,
+                taxa_percentual=taxa_percentual,
+                taxa_valor=taxa_valor,
+                cotacao_utilizada=cotacao
+            )
+        except Exception:
+            if cotacao_firme is not None:
+                self.cotacoes.devolver(cotacao_firme)
+            raise
+
+        movimento["fonte_cotacao"] = fonte_cotacao
+        movimento["cotacao_obtida_em"] = cotacao_obtida_em
+
+        # Com assinantes, a publicação lê os saldos no banco: fora do event loop
+        await asyncio.to_thread(publicar_movimento, endereco_carteira, "CONVERSAO", movimento, {
+            conversao_data.codigo_origem: -valor_origem,
+            conversao_data.codigo_destino: valor_destino_liquido,
+        })
         return movimento 
             
     def transferir_fundos(self, endereco_origem: str, transferencia_data: TransferenciaInput):
@@ -204,19 +394,17 @@ class CarteiraService:
         if not self.carteira_repo.validar_chave_privada(endereco_origem, chave_privada_limpa):
             raise ValueError("Chave privada de origem inválida.")
 
+        self.limites.verificar_requisicao(endereco_origem)
+
         if not self.carteira_repo.buscar_por_endereco(transferencia_data.endereco_destino):
             raise ValueError("Carteira de destino não encontrada.")
         
         valor_liquido = transferencia_data.valor
         taxa_percentual = TAXA_TRANSFERENCIA_PERCENTUAL
         
-        taxa_valor = valor_liquido * taxa_percentual
+        taxa_valor = valor_liquido.percentual(taxa_percentual)
         
         valor_total_debito = valor_liquido + taxa_valor
-        
-        saldo_origem = self.carteira_repo.buscar_saldo_por_moeda(endereco_origem, transferencia_data.codigo_moeda)
-        if saldo_origem is None or saldo_origem < valor_total_debito:
-            raise ValueError("Saldo insuficiente na carteira de origem para cobrir o valor e a taxa.")
 
         movimento = self.carteira_repo.registrar_transferencia(
             endereco_origem=endereco_origem,
@@ -224,7 +412,11 @@ class CarteiraService:
             codigo_moeda=transferencia_data.codigo_moeda,
             valor_liquido=valor_liquido,
             valor_total_debito=valor_total_debito,
-            taxa_valor=taxa_valor
+            taxa_valor=taxa_valor,
+            limite=self.limites.limite(endereco_origem, "TRANSFERENCIA", transferencia_data.codigo_moeda)
         )
-        
+
+        codigo_moeda = transferencia_data.codigo_moeda
+        publicar_movimento(endereco_origem, "TRANSFERENCIA", movimento, {codigo_moeda: -valor_total_debito})
+        publicar_movimento(transferencia_data.endereco_destino, "TRANSFERENCIA", movimento, {codigo_moeda: valor_liquido})
         return movimento 
\ No newline at end of file
@@ -0,0 +1,106 @@
+import os
+import secrets
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from api.models.carteira_models import CotacaoFirme
+from api.models.dinheiro import ARREDONDAMENTO_CONVERSAO, ZERO, Dinheiro
+from api.persistence.cache_compartilhado import NS_COTACOES_FIRMES, obter_cache
+from api.services.provedores_cotacao import obter_cotacao
+
+VALIDADE_COTACAO_SEGUNDOS = int(os.getenv("COTACAO_VALIDADE_SEGUNDOS", "30"))
+
+
+def calcular_conversao(valor_origem: Dinheiro, cotacao: Decimal, taxa_percentual: Decimal) -> Tuple[Dinheiro, Dinheiro]:
+    """
+    Retorna (valor líquido no destino, taxa). O bruto é truncado na 8ª casa e
+    a taxa arredondada pela regra das taxas, então líquido + taxa = bruto.
+    """
+    valor_bruto = valor_origem.multiplicar(cotacao, ARREDONDAMENTO_CONVERSAO)
+    taxa = valor_bruto.percentual(taxa_percentual)
+    return valor_bruto - taxa, taxa
+
+
+class ArmazemCotacoes:
+    """
+    Cotações firmes com expiração (TTL), no cache compartilhado do host: uma
+    cotação criada num worker pode ser usada numa conversão atendida por
+    outro, e o consumo (uso único) é atômico entre todos os processos.
+    """
+
+    def __init__(self, validade_segundos: int = VALIDADE_COTACAO_SEGUNDOS, cache=None):
+        self.validade_segundos = validade_segundos
+        self._cache = cache
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = obter_cache()
+        return self._cache
+
+    def guardar(self, cotacao: CotacaoFirme):
+        restante = (cotacao.expira_em - datetime.now()).total_seconds()
+        if restante <= 0:
+            return
+        # Só os valores, na ordem dos campos: cabe com folga num slot do cache
+        valores = list(cotacao.model_dump().values())
+        if self.cache.gravar(NS_COTACOES_FIRMES, cotacao.id_cotacao, valores, restante) is None:
+            raise RuntimeError("Cotação firme grande demais para o cache de cotações.")
+
+    def consumir(self, id_cotacao: str) -> CotacaoFirme:
+        """
+        Retira a cotação do armazém (uso único). Lança ValueError se não
+        existir ou já tiver expirado.
+        """
+        item = self.cache.tomar(NS_COTACOES_FIRMES, id_cotacao)
+        if item is None:
+            raise ValueError("Cotação não encontrada ou expirada.")
+        return CotacaoFirme(**dict(zip(CotacaoFirme.model_fields, item)))
+
+    def devolver(self, cotacao: CotacaoFirme):
+        """Recoloca uma cotação consumida cuja conversão falhou (se ainda válida)."""
+        self.guardar(cotacao)
+
+
+armazem_cotacoes = ArmazemCotacoes()
+
+
+class CotacaoService:
+
+    def __init__(self, armazem: ArmazemCotacoes, taxa_percentual: Decimal):
+        self.armazem = armazem
+        self.taxa_percentual = taxa_percentual
+
+    async def criar_cotacao(self, codigo_origem: str, codigo_destino: str,
+                            valor_origem: Optional[Dinheiro] = None) -> CotacaoFirme:
+        """
+        Busca a cotação no provedor e a congela por alguns segundos.
+        A conversão que usar o id_cotacao executa com esta taxa, sem nova consulta externa.
+        """
+        if codigo_origem == codigo_destino:
+            raise ValueError("Moedas de origem e destino devem ser diferentes.")
+        if valor_origem is not None and valor_origem <= ZERO:
+            raise ValueError("O valor de origem deve ser positivo.")
+
+        obtida = await obter_cotacao(codigo_origem, codigo_destino)
+        cotacao = obtida.valor
+
+        valor_destino = None
+        if valor_origem is not None:
+            valor_destino, _ = calcular_conversao(valor_origem, cotacao, self.taxa_percentual)
+
+        firme = CotacaoFirme(
+            id_cotacao=secrets.token_urlsafe(16),
+            codigo_origem=codigo_origem,
+            codigo_destino=codigo_destino,
+            cotacao=cotacao,
+            taxa_percentual=self.taxa_percentual,
+            valor_origem=valor_origem,
+            valor_destino_estimado=valor_destino,
+            fonte_cotacao=obtida.fonte,
+            cotacao_obtida_em=obtida.obtida_em,
+            expira_em=datetime.now() + timedelta(seconds=self.armazem.validade_segundos),
+        )
+        self.armazem.guardar(firme)
+        return firme
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Set
+
+from api.models.dinheiro import Dinheiro
+from api.persistence.repositories.resumo_carteira_repository import ResumoCarteiraRepository
+
+TAMANHO_FILA_ASSINANTE = int(os.getenv("EVENTOS_TAMANHO_FILA", "100"))
+
+# Marca posta na fila de um assinante lento no lugar dos eventos descartados:
+# o stream responde com saldos novos
+RESSINCRONIZAR = {"evento": "ressincronizar"}
+
+
+def _serializar(obj: Any):
+    if isinstance(obj, (Decimal, Dinheiro)):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+
+def formatar_sse(evento: Dict[str, Any]) -> str:
+    """
+    Formata um evento no padrão Server-Sent Events.
+    """
+    dados = json.dumps(evento, default=_serializar, ensure_ascii=False)
+    return f"event: {evento['evento']}\ndata: {dados}\n\n"
+
+
+class BarramentoEventos:
+    """
+    Barramento de eventos em memória, por carteira.
+
+    Cada assinante recebe uma asyncio.Queue limitada. A publicação pode ser feita
+    de qualquer thread (os endpoints síncronos rodam no threadpool), pois a
+    entrega é agendada no event loop com call_soon_threadsafe. Carteiras sem
+    assinantes não têm custo algum além de uma consulta ao dicionário.
+    """
+
+    def __init__(self, tamanho_fila: int = TAMANHO_FILA_ASSINANTE):
+        self._tamanho_fila = tamanho_fila
+        self._assinantes: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def assinar(self, endereco_carteira: str) -> asyncio.Queue:
+        """Deve ser chamado de dentro do event loop."""
+        self._loop = asyncio.get_running_loop()
+        fila: asyncio.Queue = asyncio.Queue(maxsize=self._tamanho_fila)
+        with self._lock:
+            self._assinantes[endereco_carteira].add(fila)
+        return fila
+
+    def cancelar(self, endereco_carteira: str, fila: asyncio.Queue):
+        with self._lock:
+            filas = self._assinantes.get(endereco_carteira)
+            if not filas:
+                return
+            filas.discard(fila)
+            if not filas:
+                del self._assinantes[endereco_carteira]
+
+    def tem_assinantes(self, endereco_carteira: str) -> bool:
+        with self._lock:
+            return endereco_carteira in self._assinantes
+
+    def total_assinantes(self) -> int:
+        with self._lock:
+            return sum(len(f) for f in self._assinantes.values())
+
+    def publicar(self, endereco_carteira: str, evento: Dict[str, Any]):
+        """
+        Publica um evento para os assinantes da carteira.
+        Deve ser chamado somente após o commit da transação.
+        """
+        with self._lock:
+            if endereco_carteira not in self._assinantes:
+                return
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._entregar, endereco_carteira, evento)
+
+    def _entregar(self, endereco_carteira: str, evento: Dict[str, Any]):
+        with self._lock:
+            filas = list(self._assinantes.get(endereco_carteira, ()))
+
+        for fila in filas:
+            if fila.full():
+                # Cliente lento: os eventos na fila são substituídos por uma
+                # marca; o stream envia saldos novos ao encontrá-la.
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait(RESSINCRONIZAR)
+            else:
+                fila.put_nowait(evento)
+
+
+barramento = BarramentoEventos()
+
+
+def saldos_versionados(endereco_carteira: str) -> Optional[Dict[str, Any]]:
+    """Saldos absolutos e versão da carteira (projeção RESUMO_CARTEIRA)."""
+    return ResumoCarteiraRepository().buscar_saldos(endereco_carteira)
+
+
+def publicar_movimento(endereco_carteira: str, tipo: str, movimento: Dict[str, Any], variacoes: Dict[str, Dinheiro]):
+    """
+    Publica o movimento e os saldos absolutos da carteira, lidos depois do
+    commit junto com a versão da projeção. Como cada evento de saldo traz o
+    estado completo e a versão, eventos repetidos, fora de ordem ou já
+    contidos nos saldos iniciais do stream são descartados pela versão, sem
+    somar nada duas vezes. Sem assinantes neste processo não lê nada.
+
+    Roda no threadpool (faz uma consulta quando há assinantes).
+    """
+    if not barramento.tem_assinantes(endereco_carteira):
+        return
+
+    barramento.publicar(endereco_carteira, {
+        "evento": "movimento",
+        "tipo": tipo,
+        "dados": movimento,
+        "variacoes": variacoes,
+    })
+    try:
+        saldos = saldos_versionados(endereco_carteira)
+    except Exception as e:
+        # O movimento já foi confirmado: o stream recarrega os saldos depois
+        print(f"Aviso: saldos de {endereco_carteira} não lidos para o evento: {e}")
+        saldos = None
+    if saldos is None:
+        barramento.publicar(endereco_carteira, RESSINCRONIZAR)
+        return
+    barramento.publicar(endereco_carteira, {
+        "evento": "saldos",
+        "endereco_carteira": endereco_carteira,
+        "data_atualizacao": movimento.get("data_hora"),
+        **saldos,
+    })
@@ -0,0 +1,369 @@
+import base64
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from api.persistence.arquivo_movimentos import (
+    PYARROW_DISPONIVEL,
+    ArquivoMovimentos,
+    arquivo_do_shard,
+    arquivo_movimentos,
+    exigir_pyarrow,
+)
+from api.persistence.db import total_shards
+from api.persistence.repositories.arquivo_repository import ArquivoRepository
+from api.persistence.repositories.relatorio_repository import RelatorioRepository
+from api.persistence.shards import shard_da_carteira
+from api.services.arquivamento_service import corte_arquivado
+
+try:
+    import zstandard
+except ImportError:  # opcional: só necessário para compressao=zstd
+    zstandard = None
+
+FORMATOS = ("csv", "parquet")
+COMPRESSOES = ("nenhuma", "gzip", "zstd")
+TAMANHO_PAGINA_EXTRATO = 10_000
+
+DATA_MINIMA = datetime(1000, 1, 1)
+DATA_MAXIMA = datetime(9999, 12, 31)
+ID_MAXIMO = 2 ** 63 - 1
+# (data_hora, ordem, id_movimento, shard); o shard só desempata o extrato
+# geral com vários shards (os ids se repetem entre eles)
+CURSOR_INICIAL: Tuple[datetime, int, int, int] = (DATA_MINIMA, 0, 0, 0)
+
+COLUNAS_EXTRATO = [
+    "data_hora",
+    "tipo",
+    "id_movimento",
+    "endereco_carteira",
+    "endereco_contraparte",
+    "codigo_moeda",
+    "valor",
+    "codigo_moeda_destino",
+    "valor_destino",
+    "taxa_valor",
+    "cotacao_utilizada",
+    "cursor",
+]
+
+
+def codificar_cursor(data_hora: datetime, ordem: int, id_movimento: int, shard: int = 0) -> str:
+    """Token opaco para retomar o extrato logo após esta movimentação."""
+    posicao = [data_hora.isoformat(), ordem, id_movimento]
+    if shard:
+        posicao.append(shard)
+    bruto = json.dumps(posicao, separators=(",", ":"))
+    return base64.urlsafe_b64encode(bruto.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(token: Optional[str]) -> Tuple[datetime, int, int, int]:
+    if not token:
+        return CURSOR_INICIAL
+    try:
+        preenchido = token + "=" * (-len(token) % 4)
+        data_hora, ordem, id_movimento, *shard = json.loads(base64.urlsafe_b64decode(preenchido))
+        return datetime.fromisoformat(data_hora), int(ordem), int(id_movimento), int(shard[0]) if shard else 0
+    except Exception:
+        raise ValueError("Cursor de extrato inválido.")
+
+
+def cursor_no_shard(cursor: Tuple[datetime, int, int, int], shard: int) -> Tuple[datetime, int, int]:
+    """
+    Posição equivalente dentro de um shard, na ordem (data_hora, ordem, shard,
+    id_movimento) do extrato geral: shards anteriores ao do cursor já passaram
+    da movimentação (data_hora, ordem) inteira; os seguintes ainda não.
+    """
+    data_hora, ordem, id_movimento, shard_cursor = cursor
+    if shard < shard_cursor:
+        return data_hora, ordem, ID_MAXIMO
+    if shard > shard_cursor:
+        return data_hora, ordem, 0
+    return data_hora, ordem, id_movimento
+
+
+# ---------------------------------------------------------
+#  Compressão incremental
+# ---------------------------------------------------------
+
+class _SemCompressao:
+    def comprimir(self, dados: bytes) -> bytes:
+        return dados
+
+    def finalizar(self) -> bytes:
+        return b""
+
+
+class _CompressaoZlib:
+    def __init__(self):
+        # wbits=31 gera o formato gzip
+        self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def comprimir(self, dados: bytes) -> bytes:
+        return self._obj.compress(dados)
+
+    def finalizar(self) -> bytes:
+        return self._obj.flush()
+
+
+class _CompressaoZstd:
+    def __init__(self):
+        self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def comprimir(self, dados: bytes) -> bytes:
+        return self._obj.compress(dados)
+
+    def finalizar(self) -> bytes:
+        return self._obj.flush()
+
+
+# ---------------------------------------------------------
+#  Formatos
+# ---------------------------------------------------------
+
+class _CodificadorCSV:
+    def __init__(self):
+        self._com_cabecalho = True
+
+    def codificar(self, linhas: List[Dict[str, Any]]) -> bytes:
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, lineterminator="\n")
+        if self._com_cabecalho:
+            escritor.writerow(COLUNAS_EXTRATO)
+            self._com_cabecalho = False
+        for linha in linhas:
+            escritor.writerow([
+                linha["data_hora"].isoformat() if linha["data_hora"] else "",
+                *("" if linha[c] is None else linha[c] for c in COLUNAS_EXTRATO[1:]),
+            ])
+        return buffer.getvalue().encode("utf-8")
+
+    def finalizar(self) -> bytes:
+        return b""
+
+
+class _BufferSaida(io.RawIOBase):
+    """Destino em memória que é esvaziado a cada lote escrito."""
+
+    def __init__(self):
+        self._dados = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._dados.extend(b)
+        return len(b)
+
+    def esvaziar(self) -> bytes:
+        dados = bytes(self._dados)
+        self._dados.clear()
+        return dados
+
+
+class _CodificadorParquet:
+    def __init__(self, compressao: str):
+        pyarrow = exigir_pyarrow()
+        decimal = pyarrow.decimal128(18, 8)
+        self._schema = pyarrow.schema([
+            ("data_hora", pyarrow.timestamp("s")),
+            ("tipo", pyarrow.string()),
+            ("id_movimento", pyarrow.int64()),
+            ("endereco_carteira", pyarrow.string()),
+            ("endereco_contraparte", pyarrow.string()),
+            ("codigo_moeda", pyarrow.string()),
+            ("valor", decimal),
+            ("codigo_moeda_destino", pyarrow.string()),
+            ("valor_destino", decimal),
+            ("taxa_valor", decimal),
+            ("cotacao_utilizada", decimal),
+            ("cursor", pyarrow.string()),
+        ])
+        self._saida = _BufferSaida()
+        self._escritor = pyarrow.parquet.ParquetWriter(
+            self._saida,
+            self._schema,
+            compression="none" if compressao == "nenhuma" else compressao,
+        )
+
+    def codificar(self, linhas: List[Dict[str, Any]]) -> bytes:
+        colunas = {c: [l[c] for l in linhas] for c in COLUNAS_EXTRATO}
+        # Cada página vira um row group
+        self._escritor.write_table(exigir_pyarrow().table(colunas, schema=self._schema))
+        return self._saida.esvaziar()
+
+    def finalizar(self) -> bytes:
+        self._escritor.close()
+        return self._saida.esvaziar()
+
+
+class ExtratoService:
+
+    def __init__(self, relatorio_repo: RelatorioRepository, arquivo_repo: Optional[ArquivoRepository] = None,
+                 arquivo: ArquivoMovimentos = arquivo_movimentos):
+        self.relatorio_repo = relatorio_repo
+        self.arquivo_repo = arquivo_repo
+        self.arquivo = arquivo
+
+    @staticmethod
+    def tipo_conteudo(formato: str, compressao: str) -> Tuple[str, str]:
+        """Retorna (media type, extensão do arquivo)."""
+        if formato == "parquet":
+            return "application/vnd.apache.parquet", "parquet"
+        if compressao == "gzip":
+            return "application/gzip", "csv.gz"
+        if compressao == "zstd":
+            return "application/zstd", "csv.zst"
+        return "text/csv; charset=utf-8", "csv"
+
+    def iterar_paginas(self, endereco_carteira: Optional[str], inicio: datetime, fim: datetime,
+                       cursor: Tuple[datetime, int, int, int], tamanho_pagina: int = TAMANHO_PAGINA_EXTRATO,
+                       maximo_linhas: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Percorre o extrato página a página (paginação por chave, uma transação curta
+        por página). Cada linha recebe o token 'cursor' para retomada.
+        O extrato de uma carteira vem do shard dela; o geral, com vários shards,
+        intercala os shards pela ordem do extrato.
+        """
+        if maximo_linhas is not None:
+            tamanho_pagina = min(tamanho_pagina, maximo_linhas)
+
+        if endereco_carteira or total_shards() == 1:
+            shard = shard_da_carteira(endereco_carteira) if endereco_carteira else 0
+            linhas = ((linha, 0) for linha in self._linhas_do_shard(
+                shard, endereco_carteira, inicio, fim, cursor[:3], tamanho_pagina))
+        else:
+            linhas = self._linhas_intercaladas(inicio, fim, cursor, tamanho_pagina)
+
+        pagina: List[Dict[str, Any]] = []
+        restante = maximo_linhas
+        for linha, shard in linhas:
+            linha["cursor"] = codificar_cursor(linha["data_hora"], linha["ordem"], linha["id_movimento"], shard)
+            pagina.append(linha)
+            if restante is not None:
+                restante -= 1
+            if len(pagina) == tamanho_pagina or restante == 0:
+                yield pagina
+                pagina = []
+                if restante == 0:
+                    return
+        if pagina:
+            yield pagina
+
+    def _linhas_intercaladas(self, inicio: datetime, fim: datetime, cursor: Tuple[datetime, int, int, int],
+                             tamanho_pagina: int) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """(linha, shard) do extrato geral de todos os shards, na ordem (data_hora, ordem, shard, id)."""
+        def do_shard(shard: int):
+            for linha in self._linhas_do_shard(shard, None, inicio, fim, cursor_no_shard(cursor, shard), tamanho_pagina):
+                # Transferência entre shards está nos dois: vale a linha do shard da origem
+                if linha["ordem"] == 3 and shard_da_carteira(linha["endereco_carteira"]) != shard:
+                    continue
+                yield (linha["data_hora"], linha["ordem"], shard, linha["id_movimento"]), linha
+
+        for (_, _, shard, _), linha in heapq.merge(*(do_shard(s) for s in range(total_shards()))):
+            yield linha, shard
+
+    def _linhas_do_shard(self, shard: int, endereco_carteira: Optional[str], inicio: datetime, fim: datetime,
+                         cursor: Tuple[datetime, int, int], tamanho_pagina: int) -> Iterator[Dict[str, Any]]:
+        """
+        Linhas de um shard em ordem, buscadas em páginas. Antes do corte do
+        arquivamento do shard as linhas vêm dos segmentos arquivados; a partir
+        dele, das tabelas quentes.
+        """
+        arquivo_repo = self._arquivo_repo(shard)
+        segmentos = arquivo_repo.listar_segmentos() if arquivo_repo else []
+        corte = corte_arquivado(segmentos)
+        arquivo = self.arquivo if shard == 0 else arquivo_do_shard(shard)
+
+        while True:
+            pagina = self._buscar_pagina(shard, arquivo, segmentos, corte, endereco_carteira,
+                                         inicio, fim, cursor, tamanho_pagina)
+            yield from pagina
+            if len(pagina) < tamanho_pagina:
+                return
+            ultima = pagina[-1]
+            cursor = (ultima["data_hora"], ultima["ordem"], ultima["id_movimento"])
+
+    def _arquivo_repo(self, shard: int) -> Optional[ArquivoRepository]:
+        if self.arquivo_repo is None or self.arquivo_repo.shard == shard:
+            return self.arquivo_repo
+        return ArquivoRepository(shard)
+
+    def _buscar_pagina(self, shard: int, arquivo: ArquivoMovimentos, segmentos: List[Dict[str, Any]],
+                       corte: Optional[datetime], endereco_carteira: Optional[str], inicio: datetime,
+                       fim: datetime, cursor: Tuple[datetime, int, int], limite: int) -> List[Dict[str, Any]]:
+        if corte is None:
+            return self.relatorio_repo.buscar_pagina_extrato(endereco_carteira, inicio, fim, cursor, limite, shard)
+
+        pagina: List[Dict[str, Any]] = []
+        if inicio < corte and cursor[0] < corte:
+            pagina = arquivo.buscar_pagina(segmentos, endereco_carteira, inicio, min(fim, corte), cursor, limite)
+        if len(pagina) < limite and fim > corte:
+            pagina += self.relatorio_repo.buscar_pagina_extrato(
+                endereco_carteira, max(inicio, corte), fim, cursor, limite - len(pagina), shard
+            )
+        return pagina
+
+    def exportar(self, endereco_carteira: Optional[str], formato: str = "csv", compressao: str = "nenhuma",
+                 inicio: Optional[datetime] = None, fim: Optional[datetime] = None, cursor: Optional[str] = None,
+                 tamanho_pagina: int = TAMANHO_PAGINA_EXTRATO,
+                 maximo_linhas: Optional[int] = None) -> "ExportacaoExtrato":
+        """
+        Valida os parâmetros e retorna um iterador de blocos de bytes do arquivo.
+        A memória usada depende só do tamanho da página, não do extrato inteiro.
+        """
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato inválido: {formato}. Use {', '.join(FORMATOS)}.")
+        if compressao not in COMPRESSOES:
+            raise ValueError(f"Compressão inválida: {compressao}. Use {', '.join(COMPRESSOES)}.")
+        if formato == "parquet" and not PYARROW_DISPONIVEL:
+            raise ValueError("Formato parquet requer o pacote pyarrow.")
+        if formato == "csv" and compressao == "zstd" and zstandard is None:
+            raise ValueError("Compressão zstd requer o pacote zstandard.")
+
+        inicio = inicio or DATA_MINIMA
+        fim = fim or DATA_MAXIMA
+        if inicio >= fim:
+            raise ValueError("A data inicial deve ser anterior à data final.")
+        posicao = decodificar_cursor(cursor)
+
+        if formato == "parquet":
+            # Parquet comprime internamente por coluna
+            codificador = _CodificadorParquet(compressao)
+            compressor = _SemCompressao()
+        else:
+            codificador = _CodificadorCSV()
+            compressor = {"gzip": _CompressaoZlib, "zstd": _CompressaoZstd}.get(compressao, _SemCompressao)()
+
+        paginas = self.iterar_paginas(endereco_carteira, inicio, fim, posicao, tamanho_pagina, maximo_linhas)
+        return ExportacaoExtrato(paginas, codificador, compressor)
+
+
+class ExportacaoExtrato:
+    """
+    Iterador de blocos de bytes de uma exportação. Guarda o cursor da última
+    linha gerada e a quantidade de linhas, para quem precisar retomar depois.
+    """
+
+    def __init__(self, paginas: Iterator[List[Dict[str, Any]]], codificador, compressor):
+        self._paginas = paginas
+        self._codificador = codificador
+        self._compressor = compressor
+        self.ultimo_cursor: Optional[str] = None
+        self.linhas = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        for pagina in self._paginas:
+            self.linhas += len(pagina)
+            self.ultimo_cursor = pagina[-1]["cursor"]
+            bloco = self._compressor.comprimir(self._codificador.codificar(pagina))
+            if bloco:
+                yield bloco
+
+        final = self._compressor.comprimir(self._codificador.finalizar()) + self._compressor.finalizar()
+        if final:
+            yield final
@@ -0,0 +1,208 @@
+"""
+Políticas de limites por nível de carteira (CARTEIRA.nivel_limite).
+
+Cada nível define:
+- limites de valor por moeda e de quantidade de operações para saques e
+  transferências numa janela móvel (verificados pelo CarteiraRepository na
+  transação do débito, ver api.models.limites);
+- taxa de requisições por carteira (token bucket em memória do processo: com
+  N workers, cada um aplica o limite sozinho) para depósitos, saques,
+  conversões e transferências.
+
+As políticas padrão podem ser substituídas por um arquivo JSON em
+LIMITES_POLITICAS_ARQUIVO, no mesmo formato de POLITICAS_PADRAO (valores como
+string, moedas sem limite omitidas; "operacoes_maximas" e
+"requisicoes_por_minuto" nulos desligam o respectivo limite).
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from api.models.dinheiro import Dinheiro
+from api.models.limites import OPERACOES_LIMITADAS, LimiteExcedidoError, LimiteJanela, inicio_da_janela
+from api.persistence.repositories.carteira_repository import CarteiraRepository
+
+NIVEL_PADRAO = "PADRAO"
+ARQUIVO_POLITICAS = os.getenv("LIMITES_POLITICAS_ARQUIVO")
+# Carteiras com balde de requisições em memória (as menos usadas são descartadas)
+MAXIMO_CARTEIRAS_LIMITADOR = int(os.getenv("LIMITES_MAXIMO_CARTEIRAS_EM_MEMORIA", "100000"))
+
+_VALORES_PADRAO = {"BRL": "20000", "USD": "5000", "BTC": "0.1", "ETH": "2", "SOL": "50"}
+_VALORES_PREMIUM = {"BRL": "200000", "USD": "50000", "BTC": "1", "ETH": "20", "SOL": "500"}
+
+POLITICAS_PADRAO: Dict[str, Dict[str, Any]] = {
+    "PADRAO": {
+        "janela_horas": 24,
+        "operacoes_maximas": 20,
+        "requisicoes_por_minuto": 60,
+        "rajada": 20,
+        "SAQUE": _VALORES_PADRAO,
+        "TRANSFERENCIA": _VALORES_PADRAO,
+    },
+    "PREMIUM": {
+        "janela_horas": 24,
+        "operacoes_maximas": 200,
+        "requisicoes_por_minuto": 300,
+        "rajada": 60,
+        "SAQUE": _VALORES_PREMIUM,
+        "TRANSFERENCIA": _VALORES_PREMIUM,
+    },
+}
+
+
+class PoliticaLimites(NamedTuple):
+    nivel: str
+    janela: timedelta
+    operacoes_maximas: Optional[int]
+    requisicoes_por_minuto: Optional[float]
+    rajada: int
+    # operacao -> codigo_moeda -> valor máximo na janela
+    valores: Dict[str, Dict[str, Dinheiro]]
+
+    def limite(self, operacao: str, codigo_moeda: str) -> Optional[LimiteJanela]:
+        valor = self.valores.get(operacao, {}).get(codigo_moeda)
+        if valor is None and self.operacoes_maximas is None:
+            return None
+        return LimiteJanela(self.janela, valor, self.operacoes_maximas)
+
+
+def carregar_politicas(arquivo: Optional[str] = ARQUIVO_POLITICAS) -> Dict[str, PoliticaLimites]:
+    configuracao = POLITICAS_PADRAO
+    if arquivo:
+        with open(arquivo, encoding="utf-8") as f:
+            configuracao = json.load(f)
+    if NIVEL_PADRAO not in configuracao:
+        raise RuntimeError(f"As políticas de limites precisam do nível {NIVEL_PADRAO}.")
+
+    politicas = {}
+    for nivel, c in configuracao.items():
+        politicas[nivel] = PoliticaLimites(
+            nivel=nivel,
+            janela=timedelta(hours=float(c.get("janela_horas", 24))),
+            operacoes_maximas=c.get("operacoes_maximas"),
+            requisicoes_por_minuto=c.get("requisicoes_por_minuto"),
+            rajada=int(c.get("rajada") or 1),
+            valores={
+                operacao: {codigo.upper(): Dinheiro.de_valor(v) for codigo, v in c.get(operacao, {}).items()}
+                for operacao in OPERACOES_LIMITADAS
+            },
+        )
+    return politicas
+
+
+class LimitadorRequisicoes:
+    """
+    Token bucket por carteira: 'rajada' requisições seguidas e reposição
+    contínua de requisicoes_por_minuto. O(1) por verificação.
+    """
+
+    def __init__(self, maximo_carteiras: int = MAXIMO_CARTEIRAS_LIMITADOR):
+        self.maximo_carteiras = maximo_carteiras
+        # carteira -> (fichas, instante da última atualização), na ordem de uso
+        self._baldes: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, chave: str, capacidade: int, por_segundo: float):
+        agora = time.monotonic()
+        with self._lock:
+            fichas, atualizado_em = self._baldes.pop(chave, (float(capacidade), agora))
+            fichas = min(float(capacidade), fichas + (agora - atualizado_em) * por_segundo)
+            if fichas < 1:
+                self._baldes[chave] = (fichas, agora)
+                raise LimiteExcedidoError(
+                    "Muitas requisições para esta carteira; tente novamente em instantes.",
+                    math.ceil((1 - fichas) / por_segundo),
+                )
+            self._baldes[chave] = (fichas - 1, agora)
+            while len(self._baldes) > self.maximo_carteiras:
+                self._baldes.popitem(last=False)
+
+
+limitador_requisicoes = LimitadorRequisicoes()
+_politicas: Optional[Dict[str, PoliticaLimites]] = None
+
+
+def obter_politicas() -> Dict[str, PoliticaLimites]:
+    global _politicas
+    if _politicas is None:
+        _politicas = carregar_politicas()
+    return _politicas
+
+
+class LimitesService:
+
+    def __init__(self, carteira_repo: CarteiraRepository, politicas: Optional[Dict[str, PoliticaLimites]] = None,
+                 limitador: LimitadorRequisicoes = limitador_requisicoes):
+        self.carteira_repo = carteira_repo
+        self._politicas = politicas
+        self.limitador = limitador
+
+    @property
+    def politicas(self) -> Dict[str, PoliticaLimites]:
+        return self._politicas if self._politicas is not None else obter_politicas()
+
+    def politica(self, endereco_carteira: str) -> PoliticaLimites:
+        # Dados da carteira vêm do cache compartilhado (mesma leitura da validação da chave)
+        carteira = self.carteira_repo.buscar_por_endereco(endereco_carteira) or {}
+        nivel = carteira.get("nivel_limite") or NIVEL_PADRAO
+        return self.politicas.get(nivel) or self.politicas[NIVEL_PADRAO]
+
+    def verificar_requisicao(self, endereco_carteira: str):
+        """Consome uma ficha do balde da carteira; LimiteExcedidoError se estiver vazio."""
+        politica = self.politica(endereco_carteira)
+        if politica.requisicoes_por_minuto:
+            self.limitador.consumir(endereco_carteira, politica.rajada, politica.requisicoes_por_minuto / 60)
+
+    def limite(self, endereco_carteira: str, operacao: str, codigo_moeda: str) -> Optional[LimiteJanela]:
+        return self.politica(endereco_carteira).limite(operacao, codigo_moeda)
+
+    def resumo(self, endereco_carteira: str) -> Dict[str, Any]:
+        """Nível, limites e uso atual da janela por operação e moeda."""
+        if not self.carteira_repo.buscar_por_endereco(endereco_carteira):
+            raise ValueError("Carteira não encontrada")
+
+        politica = self.politica(endereco_carteira)
+        agora = datetime.now().replace(microsecond=0)
+        uso = {
+            (r["operacao"], r["codigo_moeda"]): r
+            for r in self.carteira_repo.buscar_uso_limites(endereco_carteira, inicio_da_janela(agora, politica.janela))
+        }
+
+        operacoes = {}
+        for operacao in OPERACOES_LIMITADAS:
+            codigos = sorted(set(politica.valores.get(operacao, {})) | {c for o, c in uso if o == operacao})
+            moedas = {}
+            for codigo in codigos:
+                linha = uso.get((operacao, codigo))
+                usado = Dinheiro.de_decimal(linha["valor"]) if linha else Dinheiro(0)
+                maximo = politica.valores.get(operacao, {}).get(codigo)
+                moedas[codigo] = {
+                    "valor_maximo": maximo,
+                    "valor_usado": usado,
+                    "valor_disponivel": max(maximo - usado, Dinheiro(0)) if maximo is not None else None,
+                    "operacoes": int(linha["quantidade"]) if linha else 0,
+                }
+            operacoes[operacao] = moedas
+
+        return {
+            "endereco_carteira": endereco_carteira,
+            "nivel": politica.nivel,
+            "janela_horas": politica.janela.total_seconds() / 3600,
+            "operacoes_maximas": politica.operacoes_maximas,
+            "requisicoes_por_minuto": politica.requisicoes_por_minuto,
+            "operacoes": operacoes,
+        }
+
+    def definir_nivel(self, endereco_carteira: str, nivel: str) -> Dict[str, Any]:
+        nivel = nivel.upper()
+        if nivel not in self.politicas:
+            raise ValueError(f"Nível de limites desconhecido: {nivel} (há {', '.join(sorted(self.politicas))}).")
+        carteira = self.carteira_repo.atualizar_nivel_limite(endereco_carteira, nivel)
+        if not carteira:
+            raise ValueError("Carteira não encontrada")
+        return carteira
@@ -0,0 +1,363 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from typing import Deque, Dict, NamedTuple, Optional, Tuple
+
+import httpx
+
+from api.persistence.cache_compartilhado import NS_COTACOES, obter_cache
+
+BASE_URL = "https://api.coinbase.com/v2/prices"
+
+PROVEDOR_COTACAO = os.getenv("COTACAO_PROVEDOR", "coinbase")
+TIMEOUT_COTACAO_SEGUNDOS = float(os.getenv("COTACAO_TIMEOUT_SEGUNDOS", "5"))
+
+# Disjuntor: abre quando, entre as últimas chamadas, a proporção de falhas ou
+# respostas lentas passa do limite; depois de um tempo deixa passar uma sonda.
+LIMITE_LENTA_SEGUNDOS = float(os.getenv("COTACAO_LIMITE_LENTA_SEGUNDOS", "1.0"))
+JANELA_DISJUNTOR = int(os.getenv("COTACAO_DISJUNTOR_JANELA", "20"))
+MINIMO_CHAMADAS_DISJUNTOR = int(os.getenv("COTACAO_DISJUNTOR_MINIMO", "5"))
+PROPORCAO_RUINS_DISJUNTOR = float(os.getenv("COTACAO_DISJUNTOR_PROPORCAO", "0.5"))
+TEMPO_ABERTO_SEGUNDOS = float(os.getenv("COTACAO_DISJUNTOR_ABERTO_SEGUNDOS", "30"))
+
+# Idade máxima da última cotação conhecida usada enquanto o provedor está
+# indisponível (0 desativa o fallback e falha rápido).
+IDADE_MAXIMA_ULTIMA_SEGUNDOS = float(os.getenv("COTACAO_IDADE_MAXIMA_SEGUNDOS", "60"))
+
+# Por quanto tempo uma cotação recém-obtida por qualquer worker do host é
+# reaproveitada pelos outros sem nova chamada ao provedor (0 desativa).
+VALIDADE_INSTANTANEO_SEGUNDOS = float(os.getenv("COTACAO_INSTANTANEO_SEGUNDOS", "2"))
+
+FONTE_PROVEDOR = "provedor"
+FONTE_ULTIMA_CONHECIDA = "ultima_conhecida"
+
+
+class CotacaoIndisponivelError(Exception):
+    """Provedor de cotação indisponível e sem última cotação recente para usar."""
+
+
+class CotacaoObtida(NamedTuple):
+    valor: Decimal
+    fonte: str
+    obtida_em: datetime
+
+
+# ---------------------------------------------------------
+#  Provedores
+# ---------------------------------------------------------
+
+class ProvedorCotacao:
+    """Interface dos provedores: unidades de DESTINO por 1 unidade de ORIGEM."""
+
+    nome = "abstrato"
+
+    async def iniciar(self):
+        """Abre recursos de longa duração (chamado no startup da API)."""
+
+    async def encerrar(self):
+        """Libera os recursos abertos em iniciar()."""
+
+    async def buscar(self, moeda_origem: str, moeda_destino: str) -> Decimal:
+        raise NotImplementedError
+
+
+class ProvedorCoinbase(ProvedorCotacao):
+    """Cotação spot na API pública da Coinbase."""
+
+    nome = "coinbase"
+
+    def __init__(self, timeout: float = TIMEOUT_COTACAO_SEGUNDOS):
+        self.timeout = timeout
+        self._cliente: Optional[httpx.AsyncClient] = None
+
+    async def iniciar(self):
+        # Cliente compartilhado: reaproveita conexões TLS entre requisições
+        if self._cliente is None:
+            self._cliente = httpx.AsyncClient(timeout=self.timeout)
+
+    async def encerrar(self):
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+    async def buscar(self, moeda_origem: str, moeda_destino: str) -> Decimal:
+        pair = f"{moeda_origem}-{moeda_destino}"
+        url = f"{BASE_URL}/{pair}/spot"
+
+        if self._cliente is not None:
+            response = await self._cliente.get(url)
+        else:
+            # Fora da API (jobs) não há startup: cliente de uso único
+            async with httpx.AsyncClient() as client:
+                response = await client.get(url, timeout=self.timeout)
+
+        response.raise_for_status()
+        data = response.json()
+        return Decimal(data["data"]["amount"])
+
+
+class ProvedorFixo(ProvedorCotacao):
+    """
+    Cotações fixas em memória, para testes, benchmarks e ambiente local.
+    Pares ausentes são derivados do par inverso. 'latencia' simula um provedor
+    lento (segundos por chamada).
+    """
+
+    nome = "fixo"
+
+    def __init__(self, cotacoes: Dict[str, Decimal], latencia: float = 0.0):
+        self.cotacoes = {par.upper(): Decimal(valor) for par, valor in cotacoes.items()}
+        self.latencia = latencia
+
+    @classmethod
+    def de_texto(cls, texto: str) -> "ProvedorFixo":
+        """Lê pares no formato 'BTC-USD=65000,USD-BRL=5.10'."""
+        cotacoes = {}
+        for item in filter(None, (p.strip() for p in texto.split(","))):
+            par, valor = item.split("=")
+            cotacoes[par.strip()] = Decimal(valor.strip())
+        return cls(cotacoes)
+
+    async def buscar(self, moeda_origem: str, moeda_destino: str) -> Decimal:
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+
+        if moeda_origem == moeda_destino:
+            return Decimal("1")
+        direto = self.cotacoes.get(f"{moeda_origem}-{moeda_destino}")
+        if direto is not None:
+            return direto
+        inverso = self.cotacoes.get(f"{moeda_destino}-{moeda_origem}")
+        if inverso:
+            return Decimal("1") / inverso
+        raise LookupError(f"Cotação {moeda_origem}-{moeda_destino} não cadastrada no provedor fixo.")
+
+
+def criar_provedor(nome: str = PROVEDOR_COTACAO) -> ProvedorCotacao:
+    if nome == "coinbase":
+        return ProvedorCoinbase()
+    if nome == "fixo":
+        return ProvedorFixo.de_texto(os.getenv("COTACAO_FIXAS", ""))
+    raise ValueError(f"Provedor de cotação desconhecido: {nome}.")
+
+
+# ---------------------------------------------------------
+#  Disjuntor
+# ---------------------------------------------------------
+
+class DisjuntorCotacao:
+    """
+    Circuit breaker com três estados:
+
+    - FECHADO: chamadas passam; cada uma é registrada como boa ou ruim
+      (erro, timeout ou mais lenta que limite_lenta);
+    - ABERTO: nenhuma chamada passa até tempo_aberto expirar;
+    - MEIO_ABERTO: uma única sonda passa; se for boa o disjuntor fecha,
+      se for ruim volta a abrir.
+    """
+
+    FECHADO = "FECHADO"
+    ABERTO = "ABERTO"
+    MEIO_ABERTO = "MEIO_ABERTO"
+
+    def __init__(self, limite_lenta: float = LIMITE_LENTA_SEGUNDOS, janela: int = JANELA_DISJUNTOR,
+                 minimo_chamadas: int = MINIMO_CHAMADAS_DISJUNTOR,
+                 proporcao_ruins: float = PROPORCAO_RUINS_DISJUNTOR,
+                 tempo_aberto: float = TEMPO_ABERTO_SEGUNDOS):
+        self.limite_lenta = limite_lenta
+        self.minimo_chamadas = minimo_chamadas
+        self.proporcao_ruins = proporcao_ruins
+        self.tempo_aberto = tempo_aberto
+
+        self.estado = self.FECHADO
+        self._resultados: Deque[bool] = deque(maxlen=janela)
+        self._aberto_em = 0.0
+        self._sonda_em_andamento = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        """Diz se a chamada pode ir ao provedor (reserva a sonda no meio-aberto)."""
+        with self._lock:
+            if self.estado == self.ABERTO:
+                if time.monotonic() - self._aberto_em < self.tempo_aberto:
+                    return False
+                self.estado = self.MEIO_ABERTO
+                self._sonda_em_andamento = False
+
+            if self.estado == self.MEIO_ABERTO:
+                if self._sonda_em_andamento:
+                    return False
+                self._sonda_em_andamento = True
+
+            return True
+
+    def liberar_sonda(self):
+        """Chamada que passou por permitir() e terminou sem resultado (cancelada)."""
+        with self._lock:
+            self._sonda_em_andamento = False
+
+    def registrar(self, sucesso: bool, duracao: float):
+        ruim = not sucesso or duracao > self.limite_lenta
+        with self._lock:
+            if self.estado == self.MEIO_ABERTO:
+                self._sonda_em_andamento = False
+                if ruim:
+                    self._abrir()
+                else:
+                    self.estado = self.FECHADO
+                    self._resultados.clear()
+                return
+
+            self._resultados.append(ruim)
+            if len(self._resultados) >= self.minimo_chamadas:
+                ruins = sum(self._resultados)
+                if ruins / len(self._resultados) >= self.proporcao_ruins:
+                    self._abrir()
+
+    def _abrir(self):
+        self.estado = self.ABERTO
+        self._aberto_em = time.monotonic()
+        self._resultados.clear()
+
+
+# ---------------------------------------------------------
+#  Fonte de cotações (provedor + disjuntor + última conhecida)
+# ---------------------------------------------------------
+
+class FonteCotacoes:
+
+    """
+    Provedor + disjuntor + cotações recentes. As cotações obtidas ficam no
+    cache compartilhado do host (ver api.persistence.cache_compartilhado):
+    servem de instantâneo para os outros workers por validade_instantaneo
+    segundos e de última cotação conhecida enquanto o provedor estiver fora.
+    """
+
+    def __init__(self, provedor: ProvedorCotacao, disjuntor: Optional[DisjuntorCotacao] = None,
+                 timeout: float = TIMEOUT_COTACAO_SEGUNDOS,
+                 idade_maxima_ultima: float = IDADE_MAXIMA_ULTIMA_SEGUNDOS,
+                 validade_instantaneo: float = VALIDADE_INSTANTANEO_SEGUNDOS,
+                 cache=None):
+        self.provedor = provedor
+        self.disjuntor = disjuntor or DisjuntorCotacao()
+        self.timeout = timeout
+        self.idade_maxima_ultima = idade_maxima_ultima
+        self.validade_instantaneo = validade_instantaneo
+        self._cache = cache
+
+    @property
+    def cache(self):
+        # Resolvido no primeiro uso: importar o módulo não abre o arquivo do cache
+        if self._cache is None:
+            self._cache = obter_cache()
+        return self._cache
+
+    def _chave(self, par: Tuple[str, str]) -> str:
+        return f"{self.provedor.nome}:{par[0]}-{par[1]}"
+
+    def _recente(self, par: Tuple[str, str], idade_maxima: float) -> Optional[CotacaoObtida]:
+        """Cotação do par obtida do provedor (por qualquer worker) há no máximo idade_maxima segundos."""
+        if idade_maxima <= 0:
+            return None
+        item = self.cache.obter(NS_COTACOES, self._chave(par))
+        if item is None or time.time() - item[0]["instante"] > idade_maxima:
+            return None
+        return CotacaoObtida(item[0]["valor"], FONTE_PROVEDOR, item[0]["obtida_em"])
+
+    async def iniciar(self):
+        await self.provedor.iniciar()
+
+    async def encerrar(self):
+        await self.provedor.encerrar()
+
+    async def obter(self, moeda_origem: str, moeda_destino: str,
+                    aceitar_ultima_conhecida: bool = True) -> CotacaoObtida:
+        """
+        Consulta o provedor através do disjuntor. Se ele estiver aberto ou a
+        chamada falhar, usa a última cotação conhecida do par (fonte
+        'ultima_conhecida') quando permitido e dentro da idade máxima; senão
+        lança CotacaoIndisponivelError.
+        """
+        par = (moeda_origem, moeda_destino)
+
+        instantaneo = self._recente(par, self.validade_instantaneo)
+        if instantaneo is not None:
+            return instantaneo
+
+        if not self.disjuntor.permitir():
+            return self._ultima_conhecida(par, aceitar_ultima_conhecida, "circuito aberto")
+
+        inicio = time.monotonic()
+        registrada = False
+        try:
+            # O timeout vale para qualquer provedor, não só para o HTTP
+            valor = await asyncio.wait_for(self.provedor.buscar(moeda_origem, moeda_destino), self.timeout)
+        except httpx.HTTPStatusError as e:
+            codigo = e.response.status_code
+            erro_do_pedido = codigo < 500
+            self.disjuntor.registrar(erro_do_pedido, time.monotonic() - inicio)
+            registrada = True
+            if erro_do_pedido:
+                # 4xx (ex.: par inexistente): erro do pedido, não indisponibilidade
+                raise
+            # 5xx: o provedor está fora, como num timeout
+            return self._ultima_conhecida(par, aceitar_ultima_conhecida, f"HTTP {codigo}")
+        except Exception as e:
+            self.disjuntor.registrar(False, time.monotonic() - inicio)
+            registrada = True
+            motivo = "tempo esgotado" if isinstance(e, asyncio.TimeoutError) else str(e)
+            return self._ultima_conhecida(par, aceitar_ultima_conhecida, motivo)
+        else:
+            self.disjuntor.registrar(True, time.monotonic() - inicio)
+            registrada = True
+        finally:
+            # Chamada cancelada (ex.: cliente desconectou) não tem resultado, mas
+            # precisa liberar a sonda do meio-aberto, senão o disjuntor trava
+            if not registrada:
+                self.disjuntor.liberar_sonda()
+
+        cotacao = CotacaoObtida(valor, FONTE_PROVEDOR, datetime.now().replace(microsecond=0))
+        ttl = max(self.idade_maxima_ultima, self.validade_instantaneo)
+        if ttl > 0:
+            self.cache.gravar(NS_COTACOES, self._chave(par),
+                              {"valor": valor, "obtida_em": cotacao.obtida_em, "instante": time.time()}, ttl)
+        return cotacao
+
+    def _ultima_conhecida(self, par: Tuple[str, str], aceitar: bool, motivo: str) -> CotacaoObtida:
+        ultima = self._recente(par, self.idade_maxima_ultima) if aceitar else None
+        if ultima is not None:
+            return ultima._replace(fonte=FONTE_ULTIMA_CONHECIDA)
+        raise CotacaoIndisponivelError(
+            f"Cotação {par[0]}-{par[1]} indisponível no provedor {self.provedor.nome} ({motivo})."
+        )
+
+
+fonte_cotacoes = FonteCotacoes(criar_provedor())
+
+
+def obter_fonte() -> FonteCotacoes:
+    return fonte_cotacoes
+
+
+def definir_provedor(provedor: ProvedorCotacao):
+    """Troca o provedor em uso (ex.: ProvedorFixo em testes e benchmarks)."""
+    global fonte_cotacoes
+    fonte_cotacoes = FonteCotacoes(provedor)
+
+
+async def obter_cotacao(moeda_origem: str, moeda_destino: str,
+                        aceitar_ultima_conhecida: bool = True) -> CotacaoObtida:
+    return await fonte_cotacoes.obter(moeda_origem, moeda_destino, aceitar_ultima_conhecida)
+
+
+async def get_cotacao(moeda_origem: str, moeda_destino: str) -> Decimal:
+    """
+    Cotação atual (unidades de DESTINO por 1 unidade de ORIGEM), sem fallback:
+    com o provedor indisponível falha rápido com CotacaoIndisponivelError.
+    """
+    cotacao = await fonte_cotacoes.obter(moeda_origem, moeda_destino, aceitar_ultima_conhecida=False)
+    return cotacao.valor
@@ -0,0 +1,148 @@
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from api.persistence.db import total_shards
+from api.persistence.repositories.arquivo_repository import ArquivoRepository
+from api.persistence.repositories.shard_repository import ShardRepository
+from api.persistence.shards import (
+    ESTADO_ATIVO,
+    TOTAL_BUCKETS,
+    TTL_MAPA_SEGUNDOS,
+    bucket_da_carteira,
+    mapa_shards,
+    shard_da_carteira,
+)
+
+TAMANHO_LOTE_REBALANCEAMENTO = 200
+# Folga além do TTL do mapa para as transações que já tinham passado pela
+# verificação de migração terminarem antes da cópia.
+MARGEM_ESPERA_SEGUNDOS = 2.0
+
+
+class RebalanceamentoService:
+    """
+    Move buckets de carteiras de um shard para outro com a API no ar:
+
+    1. marca os buckets como MIGRANDO (escritas dessas carteiras passam a
+       ser recusadas com 503) e espera todos os processos relerem o mapa;
+    2. copia as carteiras em lotes para o destino (repetível: cada lote
+       apaga no destino o que uma cópia anterior tenha deixado);
+    3. confere quantidade de carteiras, de saldos e a soma dos saldos nos
+       dois shards;
+    4. aponta os buckets para o destino no mapa e espera o TTL de novo;
+    5. apaga as linhas do shard de origem. Transferências com a outra ponta
+       ainda na origem ficam lá (a linha é das duas carteiras).
+
+    Qualquer falha antes do passo 4 devolve os buckets a ATIVO na origem; as
+    cópias parciais no destino são sobrescritas numa nova tentativa. Os ids
+    do histórico são gerados de novo no destino (só a referencia das
+    transferências é preservada).
+
+    Buckets com histórico arquivado não são movidos: os segmentos Parquet são
+    por shard e o extrato arquivado ficaria para trás.
+    """
+
+    def __init__(self, shard_repo: ShardRepository, espera: float = TTL_MAPA_SEGUNDOS + MARGEM_ESPERA_SEGUNDOS):
+        self.shard_repo = shard_repo
+        self.espera = espera
+
+    def inicializar_mapa(self) -> int:
+        return self.shard_repo.inicializar_mapa(total_shards())
+
+    def distribuicao(self) -> Dict[int, Dict[str, int]]:
+        """Buckets por shard (ativos e em migração)."""
+        resumo: Dict[int, Dict[str, int]] = {s: {"ativos": 0, "migrando": 0} for s in range(total_shards())}
+        for r in self.shard_repo.listar_mapa():
+            contagem = resumo.setdefault(r["shard"], {"ativos": 0, "migrando": 0})
+            contagem["ativos" if r["estado"] == ESTADO_ATIVO else "migrando"] += 1
+        return resumo
+
+    def mover(self, buckets: List[int], destino: int, tamanho_lote: int = TAMANHO_LOTE_REBALANCEAMENTO,
+              ao_progredir: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        avisar = ao_progredir or (lambda mensagem: None)
+        buckets = sorted(set(buckets))
+        origem = self._validar(buckets, destino)
+
+        if self.shard_repo.marcar_migrando(buckets, origem) != len(buckets):
+            self.shard_repo.cancelar_migracao(buckets, origem)
+            raise ValueError("O mapa mudou durante o rebalanceamento (outro processo movendo os mesmos buckets?).")
+        mapa_shards.invalidar()
+        avisar(f"Buckets marcados como MIGRANDO; aguardando {self.espera:.0f}s")
+
+        try:
+            time.sleep(self.espera)
+            carteiras = self._copiar(buckets, origem, destino, tamanho_lote, avisar)
+            conferencia = self._conferir(buckets, origem, destino)
+        except BaseException:
+            self.shard_repo.cancelar_migracao(buckets, origem)
+            mapa_shards.invalidar()
+            raise
+
+        self.shard_repo.concluir_migracao(buckets, origem, destino)
+        mapa_shards.invalidar()
+        avisar(f"Mapa atualizado; aguardando {self.espera:.0f}s antes de limpar o shard {origem}")
+        time.sleep(self.espera)
+
+        self._limpar_origem(buckets, origem, tamanho_lote, avisar)
+        return {"buckets": buckets, "origem": origem, "destino": destino, "carteiras": carteiras, **conferencia}
+
+    def _validar(self, buckets: List[int], destino: int) -> int:
+        if not buckets:
+            raise ValueError("Informe ao menos um bucket.")
+        if any(not 0 <= b < TOTAL_BUCKETS for b in buckets):
+            raise ValueError(f"Buckets vão de 0 a {TOTAL_BUCKETS - 1}.")
+        if not 0 <= destino < total_shards():
+            raise ValueError(f"Shard de destino inválido: {destino} (DB_SHARDS tem {total_shards()}).")
+
+        mapa = {r["bucket"]: r for r in self.shard_repo.listar_mapa()}
+        if len(mapa) != TOTAL_BUCKETS:
+            raise ValueError("Mapa de shards incompleto: rode o subcomando 'inicializar' antes.")
+        if any(mapa[b]["estado"] != ESTADO_ATIVO for b in buckets):
+            raise ValueError("Há buckets em migração; conclua ou cancele o rebalanceamento anterior.")
+        origens = {mapa[b]["shard"] for b in buckets}
+        if len(origens) != 1:
+            raise ValueError("Os buckets devem estar todos no mesmo shard de origem.")
+        origem = origens.pop()
+        if origem == destino:
+            raise ValueError(f"Os buckets já estão no shard {destino}.")
+
+        for shard in (origem, destino):
+            if ArquivoRepository(shard).listar_segmentos():
+                raise ValueError(f"O shard {shard} tem histórico arquivado; buckets com arquivo não podem ser movidos.")
+        return origem
+
+    def _copiar(self, buckets: List[int], origem: int, destino: int, tamanho_lote: int, avisar) -> int:
+        total, ultimo = 0, ""
+        while True:
+            enderecos = self.shard_repo.enderecos_pagina(origem, buckets, ultimo, tamanho_lote)
+            if not enderecos:
+                return total
+            self.shard_repo.copiar_carteiras(origem, destino, enderecos)
+            total += len(enderecos)
+            ultimo = enderecos[-1]
+            avisar(f"{total} carteiras copiadas")
+
+    def _conferir(self, buckets: List[int], origem: int, destino: int) -> Dict[str, Any]:
+        na_origem = self.shard_repo.conferir(origem, buckets)
+        no_destino = self.shard_repo.conferir(destino, buckets)
+        if na_origem != no_destino:
+            raise RuntimeError(f"Cópia divergente: origem {na_origem}, destino {no_destino}.")
+        return na_origem
+
+    def _limpar_origem(self, buckets: List[int], origem: int, tamanho_lote: int, avisar):
+        movidos = set(buckets)
+        total = 0
+        while True:
+            # Sempre do começo: as páginas anteriores já foram apagadas
+            enderecos = self.shard_repo.enderecos_pagina(origem, buckets, "", tamanho_lote)
+            if not enderecos:
+                return
+            do_lote = set(enderecos)
+            apagar = set()
+            for t in self.shard_repo.ler_transferencias(origem, enderecos):
+                outra = t["endereco_destino"] if t["endereco_origem"] in do_lote else t["endereco_origem"]
+                if bucket_da_carteira(outra) in movidos or shard_da_carteira(outra) != origem:
+                    apagar.add(t["id_transferencia"])
+            self.shard_repo.apagar_carteiras(origem, enderecos, apagar)
+            total += len(enderecos)
+            avisar(f"{total} carteiras removidas do shard {origem}")
@@ -0,0 +1,159 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.persistence.db import descartar_conexoes_herdadas, total_shards
+from api.persistence.repositories.reconciliacao_repository import ReconciliacaoRepository
+
+TOLERANCIA_PADRAO = Decimal("0.00000010")
+LIMITE_MOVIMENTOS_PADRAO = 50
+TAMANHO_LOTE_CARTEIRAS = 500
+
+# Transações ainda em andamento na hora da marca podem ter data_hora anterior
+# a ela; a próxima execução incremental recomeça um pouco antes.
+MARGEM_MARCA = timedelta(minutes=5)
+
+
+def planejar_particoes(digitos_prefixo: int = 1) -> List[Tuple[str, str, str]]:
+    """
+    Divide o espaço de endereços (hexadecimais) em faixas por prefixo.
+    Retorna (nome, de, ate) com intervalo [de, ate).
+    """
+    total = 16 ** digitos_prefixo
+    particoes = []
+    for i in range(total):
+        nome = f"{i:0{digitos_prefixo}x}"
+        de = "" if i == 0 else nome
+        ate = f"{i + 1:0{digitos_prefixo}x}" if i + 1 < total else "zzzz"
+        particoes.append((nome, de, ate))
+    return particoes
+
+
+def _serializar(obj: Any):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+
+class CheckpointReconciliacao:
+    """
+    Estado persistido da reconciliação (arquivo JSON, gravado de forma atômica).
+
+    - marca: instante até o qual tudo já foi reconciliado (base da próxima
+      execução incremental);
+    - execucao: execução em andamento, com as partições já concluídas, para
+      continuar de onde parou se o processo for interrompido.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.estado: Dict[str, Any] = {"marca": None, "execucao": None}
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as f:
+                self.estado = json.load(f)
+
+    def salvar(self):
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self.estado, f, default=_serializar, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+
+
+def _inicializar_processo():
+    # Conexões herdadas do processo pai (fork) não podem ser reutilizadas
+    descartar_conexoes_herdadas()
+
+
+def reconciliar_particao(nome: str, de: str, ate: str, desde: Optional[str],
+                         tolerancia: str, limite_movimentos: int) -> Dict[str, Any]:
+    """
+    Reconcilia uma faixa de endereços em todos os shards. Roda num processo
+    do pool, por isso recebe e devolve apenas tipos simples.
+    """
+    tolerancia_dec = Decimal(tolerancia)
+    verificadas = None if desde is None else 0
+    divergencias = []
+
+    for shard in range(total_shards()):
+        repo = ReconciliacaoRepository(shard)
+        if desde is None:
+            do_shard = repo.divergencias_faixa(de, ate, tolerancia_dec)
+        else:
+            enderecos = repo.carteiras_alteradas(de, ate, datetime.fromisoformat(desde))
+            verificadas += len(enderecos)
+            do_shard = []
+            for i in range(0, len(enderecos), TAMANHO_LOTE_CARTEIRAS):
+                do_shard.extend(repo.divergencias_carteiras(enderecos[i:i + TAMANHO_LOTE_CARTEIRAS], tolerancia_dec))
+
+        for d in do_shard:
+            d["diferenca"] = d["saldo"] - d["esperado"]
+            d["movimentos"] = repo.movimentos(d["endereco_carteira"], d["id_moeda"], limite_movimentos)
+        divergencias.extend(do_shard)
+
+    # Ida e volta via JSON para entregar só tipos simples ao processo principal
+    return json.loads(json.dumps({
+        "particao": nome,
+        "carteiras_verificadas": verificadas,
+        "divergencias": divergencias,
+    }, default=_serializar))
+
+
+class ReconciliacaoService:
+
+    def __init__(self, checkpoint: CheckpointReconciliacao):
+        self.checkpoint = checkpoint
+
+    def executar(self, processos: int = os.cpu_count() or 2, digitos_prefixo: int = 1, completa: bool = False,
+                 tolerancia: Decimal = TOLERANCIA_PADRAO,
+                 limite_movimentos: int = LIMITE_MOVIMENTOS_PADRAO) -> Dict[str, Any]:
+        """
+        Executa (ou continua) uma reconciliação. Incremental a partir da última
+        marca, a menos que completa=True ou não exista marca anterior.
+        """
+        estado = self.checkpoint.estado
+
+        if estado.get("execucao") is None:
+            desde = None if completa else estado.get("marca")
+            estado["execucao"] = {
+                "marca": (datetime.now() - MARGEM_MARCA).isoformat(),
+                "desde": desde,
+                "digitos_prefixo": digitos_prefixo,
+                "iniciada_em": datetime.now().isoformat(),
+                "concluidas": [],
+                "carteiras_verificadas": 0,
+                "divergencias": [],
+            }
+            self.checkpoint.salvar()
+
+        execucao = estado["execucao"]
+        particoes = [
+            p for p in planejar_particoes(execucao["digitos_prefixo"])
+            if p[0] not in execucao["concluidas"]
+        ]
+
+        with ProcessPoolExecutor(max_workers=processos, initializer=_inicializar_processo) as pool:
+            futuros = [
+                pool.submit(reconciliar_particao, nome, de, ate, execucao["desde"], str(tolerancia), limite_movimentos)
+                for nome, de, ate in particoes
+            ]
+            for futuro in as_completed(futuros):
+                resultado = futuro.result()
+                execucao["concluidas"].append(resultado["particao"])
+                execucao["divergencias"].extend(resultado["divergencias"])
+                if resultado["carteiras_verificadas"] is not None:
+                    execucao["carteiras_verificadas"] += resultado["carteiras_verificadas"]
+                self.checkpoint.salvar()
+
+        execucao["concluida_em"] = datetime.now().isoformat()
+        estado["marca"] = execucao["marca"]
+        estado["execucao"] = None
+        self.checkpoint.salvar()
+
+        return execucao
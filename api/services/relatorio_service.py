@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from api.persistence.repositories.relatorio_repository import RelatorioRepository
+
+GRANULARIDADES = ("hora", "dia")
+
+
+class RelatorioService:
+
+    def __init__(self, relatorio_repo: RelatorioRepository):
+        self.relatorio_repo = relatorio_repo
+
+    def resumo_taxas(self, inicio: Optional[datetime], fim: Optional[datetime], granularidade: str = "dia") -> List[Dict[str, Any]]:
+        """
+        Receita de taxas e volume por período, moeda e tipo de operação.
+        O custo depende apenas da quantidade de buckets no intervalo.
+        Padrão: últimos 30 dias.
+        """
+        if granularidade not in GRANULARIDADES:
+            raise ValueError(f"Granularidade inválida: {granularidade}. Use 'hora' ou 'dia'.")
+
+        fim = fim or datetime.now()
+        inicio = inicio or fim - timedelta(days=30)
+        if inicio >= fim:
+            raise ValueError("A data inicial deve ser anterior à data final.")
+
+        return self.relatorio_repo.resumo_taxas(inicio, fim, granularidade)
@@ -0,0 +1,309 @@
+"""
+Reprodução do tráfego capturado (api.services.captura_service) contra uma
+versão da API, para comparar latência e vazão entre versões com a mistura
+real de operações.
+
+- preparar: cria, num banco novo e migrado, as carteiras com o estado gravado
+  na captura (mesmo endereço, status, nível de limites e saldos) e uma chave
+  privada nova para cada uma.
+- reproduzir: envia as requisições no ritmo original (ou acelerado). As de
+  uma mesma carteira saem na ordem original, uma depois da outra; carteiras
+  diferentes rodam em paralelo. Tokens de chave privada viram a chave da
+  carteira (ou uma inválida, se a original recebeu 401) e endereços/ids
+  criados na captura viram os criados na reprodução. Com cotações fixas
+  (ProvedorFixo com as cotações da captura), o resultado de cada requisição
+  é determinístico; status diferentes do original são contados como
+  divergências.
+- comparar: diferença de percentis por rota e de vazão entre dois resultados.
+"""
+import asyncio
+import json
+import re
+import secrets
+import time
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+
+from api.models.carteira_models import SaldoItem
+from api.models.dinheiro import ZERO, Dinheiro
+from api.persistence.repositories.carteira_repository import CarteiraRepository
+from api.services.captura_service import CABECALHO_CHAVE_PRIVADA, PREFIXO_TOKEN
+from api.services.key_service import gerar_chave
+from api.services.limites_service import NIVEL_PADRAO
+
+MAXIMO_SIMULTANEAS = 200
+EXEMPLOS_DIVERGENCIAS = 20
+
+_ID_NO_CAMINHO = re.compile(r"/([0-9a-fA-F]{32})(?=/|$)")
+_CARTEIRA_NO_CAMINHO = re.compile(r"^/carteiras/([0-9a-fA-F]{32})(?:/|$)")
+
+
+def rota(metodo: str, caminho: str) -> str:
+    """'POST /carteiras/<endereco>/saques' -> 'POST /carteiras/{id}/saques'"""
+    return f"{metodo} {_ID_NO_CAMINHO.sub('/{id}', caminho)}"
+
+
+def percentil(ordenados: List[float], p: float) -> float:
+    """Percentil pelo posto mais próximo (lista já ordenada)."""
+    if not ordenados:
+        return 0.0
+    posto = max(1, -(-len(ordenados) * p // 100))
+    return round(ordenados[int(posto) - 1], 3)
+
+
+def cotacoes_da_captura(registros: List[Dict[str, Any]]) -> Dict[str, Decimal]:
+    """Última cotação usada por par nas conversões capturadas."""
+    return {r["cotacao"]["par"]: Decimal(r["cotacao"]["valor"]) for r in registros if r.get("cotacao")}
+
+
+def _carteiras_envolvidas(requisicao: Dict[str, Any]) -> Set[str]:
+    """Carteiras (e ids criados) que ordenam a requisição em relação às outras."""
+    envolvidas = set()
+    encontrado = _CARTEIRA_NO_CAMINHO.match(requisicao["caminho"])
+    if encontrado:
+        envolvidas.add(encontrado.group(1))
+    corpo = requisicao.get("corpo")
+    if isinstance(corpo, dict) and isinstance(corpo.get("endereco_destino"), str):
+        envolvidas.add(corpo["endereco_destino"])
+    if requisicao.get("criado"):
+        envolvidas.add(requisicao["criado"])
+    return envolvidas
+
+
+class ReplayService:
+
+    def __init__(self, carteira_repo: CarteiraRepository):
+        self.carteira_repo = carteira_repo
+
+    def preparar(self, registros: List[Dict[str, Any]], ao_progredir=None) -> Dict[str, Any]:
+        """
+        Recria as carteiras pelo primeiro estado gravado de cada uma. Devolve as
+        chaves privadas novas e as cotações a usar no provedor fixo.
+        """
+        estados: Dict[str, Dict[str, Any]] = {}
+        for r in registros:
+            if r.get("tipo") == "estado" and r["existe"]:
+                estados.setdefault(r["endereco"], r)
+
+        chaves = {}
+        for i, (endereco, estado) in enumerate(estados.items(), start=1):
+            _, chave, hash_chave = gerar_chave()
+            self.carteira_repo.criar_nova_carteira(
+                endereco=endereco,
+                hash_chave_privada=hash_chave,
+                data_criacao=datetime.fromisoformat(estado["data_criacao"]),
+                status="ATIVA",
+            )
+            self.carteira_repo.inicializar_saldos(
+                endereco, [SaldoItem(codigo_moeda=codigo, saldo=ZERO) for codigo in estado["saldos"]]
+            )
+            # Depósitos (e não saldo direto) mantêm a projeção RESUMO_CARTEIRA coerente
+            for codigo, saldo in estado["saldos"].items():
+                valor = Dinheiro.de_valor(saldo)
+                if valor > ZERO:
+                    self.carteira_repo.registrar_deposito(endereco, codigo, valor)
+            if estado["status"] != "ATIVA":
+                self.carteira_repo.atualizar_status(endereco, estado["status"])
+            if (estado.get("nivel_limite") or NIVEL_PADRAO) != NIVEL_PADRAO:
+                self.carteira_repo.atualizar_nivel_limite(endereco, estado["nivel_limite"])
+            chaves[endereco] = chave
+
+            if ao_progredir and i % 1000 == 0:
+                ao_progredir(f"{i} de {len(estados)} carteiras preparadas")
+
+        return {
+            "chaves": chaves,
+            "cotacoes": {par: str(valor) for par, valor in cotacoes_da_captura(registros).items()},
+        }
+
+
+class ReproducaoTrafego:
+    """Uma execução da captura contra um cliente HTTP (servidor remoto ou app em processo)."""
+
+    def __init__(self, registros: List[Dict[str, Any]], estado: Dict[str, Any], cliente: httpx.AsyncClient,
+                 velocidade: float = 1.0, maximo_simultaneas: int = MAXIMO_SIMULTANEAS):
+        self.requisicoes = [r for r in registros if r.get("tipo") == "requisicao"]
+        self.cliente = cliente
+        self.velocidade = velocidade
+        self.maximo_simultaneas = maximo_simultaneas
+        # endereço -> chave privada na reprodução (preparadas + criadas agora)
+        self.chaves: Dict[str, str] = dict(estado["chaves"])
+        # endereço/id da captura -> criado na reprodução
+        self.traducoes: Dict[str, str] = {}
+
+    async def executar(self) -> Dict[str, Any]:
+        vagas = asyncio.Semaphore(self.maximo_simultaneas)
+        ultima: Dict[str, asyncio.Task] = {}
+        tarefas = []
+        inicio = time.perf_counter()
+        t0 = self.requisicoes[0]["t"] if self.requisicoes else 0
+
+        for indice, requisicao in enumerate(self.requisicoes):
+            agendada = inicio + (requisicao["t"] - t0) / self.velocidade if self.velocidade > 0 else inicio
+            espera = agendada - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            # Com todas as vagas ocupadas o despacho atrasa; o atraso entra no resultado
+            await vagas.acquire()
+
+            envolvidas = _carteiras_envolvidas(requisicao)
+            anteriores = [ultima[c] for c in envolvidas if c in ultima]
+            tarefa = asyncio.create_task(self._executar(indice, requisicao, anteriores, agendada, vagas))
+            for c in envolvidas:
+                ultima[c] = tarefa
+            tarefas.append(tarefa)
+
+        resultados = await asyncio.gather(*tarefas)
+        return resumir(resultados, time.perf_counter() - inicio, self.velocidade)
+
+    async def _executar(self, indice: int, requisicao: Dict[str, Any], anteriores: List[asyncio.Task],
+                        agendada: float, vagas: asyncio.Semaphore) -> Dict[str, Any]:
+        try:
+            if anteriores:
+                await asyncio.wait(anteriores)
+            atraso_ms = max(0.0, time.perf_counter() - agendada) * 1000
+
+            caminho, cabecalhos, corpo = self._traduzir(requisicao)
+            inicio = time.perf_counter()
+            try:
+                resposta = await self.cliente.request(
+                    requisicao["metodo"], caminho, params=requisicao.get("consulta") or None,
+                    headers=cabecalhos, content=corpo,
+                )
+                status = resposta.status_code
+            except httpx.HTTPError:
+                resposta, status = None, 0
+            latencia_ms = (time.perf_counter() - inicio) * 1000
+
+            if requisicao.get("criado") and resposta is not None and status < 300:
+                self._registrar_criado(requisicao["criado"], resposta)
+
+            return {
+                "indice": indice,
+                "rota": rota(requisicao["metodo"], requisicao["caminho"]),
+                "status_original": requisicao["status"],
+                "status": status,
+                "latencia_ms": latencia_ms,
+                "latencia_original_ms": requisicao["duracao_ms"],
+                "atraso_ms": atraso_ms,
+            }
+        finally:
+            vagas.release()
+
+    def _registrar_criado(self, original: str, resposta: httpx.Response):
+        try:
+            dados = resposta.json()
+        except ValueError:
+            return
+        # Agendamentos também trazem o endereço da carteira: o id vem primeiro
+        novo = dados.get("id_agendamento") or dados.get("endereco_carteira")
+        if not novo:
+            return
+        self.traducoes[original] = novo
+        if dados.get("chave_privada"):
+            self.chaves[novo] = dados["chave_privada"]
+
+    def _traduzir(self, requisicao: Dict[str, Any]):
+        caminho = _ID_NO_CAMINHO.sub(lambda m: "/" + self.traducoes.get(m.group(1), m.group(1)), requisicao["caminho"])
+        encontrado = _CARTEIRA_NO_CAMINHO.match(caminho)
+        chave = self.chaves.get(encontrado.group(1)) if encontrado else None
+        if requisicao["status"] == 401 or chave is None:
+            chave = secrets.token_hex(32)  # a original foi recusada: manda uma chave inválida
+
+        def traduzir(valor):
+            if isinstance(valor, str):
+                return chave if valor.startswith(PREFIXO_TOKEN) else self.traducoes.get(valor, valor)
+            if isinstance(valor, dict):
+                # Cotações firmes não são capturadas: a conversão usa o provedor fixo
+                return {k: traduzir(v) for k, v in valor.items() if k != "id_cotacao"}
+            if isinstance(valor, list):
+                return [traduzir(v) for v in valor]
+            return valor
+
+        cabecalhos = dict(requisicao.get("cabecalhos") or {})
+        if CABECALHO_CHAVE_PRIVADA in cabecalhos:
+            cabecalhos[CABECALHO_CHAVE_PRIVADA] = traduzir(cabecalhos[CABECALHO_CHAVE_PRIVADA])
+        corpo = requisicao.get("corpo")
+        conteudo = json.dumps(traduzir(corpo)).encode("utf-8") if corpo is not None else b""
+        return caminho, cabecalhos, conteudo
+
+
+def resumir(resultados: List[Dict[str, Any]], duracao_s: float, velocidade: float) -> Dict[str, Any]:
+    por_rota: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for r in resultados:
+        por_rota[r["rota"]].append(r)
+
+    rotas = {}
+    for nome, lista in sorted(por_rota.items()):
+        latencias = sorted(r["latencia_ms"] for r in lista)
+        originais = sorted(r["latencia_original_ms"] for r in lista)
+        rotas[nome] = {
+            "requisicoes": len(lista),
+            "p50_ms": percentil(latencias, 50),
+            "p95_ms": percentil(latencias, 95),
+            "p99_ms": percentil(latencias, 99),
+            "media_ms": round(sum(latencias) / len(latencias), 3),
+            "p50_original_ms": percentil(originais, 50),
+            "divergencias": sum(1 for r in lista if r["status"] != r["status_original"]),
+            "erros": sum(1 for r in lista if r["status"] == 0 or r["status"] >= 500),
+        }
+
+    divergentes = [r for r in resultados if r["status"] != r["status_original"]]
+    return {
+        "requisicoes": len(resultados),
+        "velocidade": velocidade,
+        "duracao_s": round(duracao_s, 3),
+        "vazao_rps": round(len(resultados) / duracao_s, 2) if duracao_s > 0 else 0.0,
+        "atraso_p95_ms": percentil(sorted(r["atraso_ms"] for r in resultados), 95),
+        "divergencias": len(divergentes),
+        "erros": sum(r["erros"] for r in rotas.values()),
+        "exemplos_divergencias": [
+            {k: r[k] for k in ("indice", "rota", "status_original", "status")}
+            for r in divergentes[:EXEMPLOS_DIVERGENCIAS]
+        ],
+        "rotas": rotas,
+    }
+
+
+def comparar(base: Dict[str, Any], nova: Dict[str, Any], tolerancia_percentual: float = 10.0,
+             minimo_requisicoes: int = 20) -> List[Dict[str, Any]]:
+    """
+    Variação de cada métrica da versão nova em relação à base. 'regressao'
+    marca latência acima da tolerância, vazão abaixo dela ou mais
+    divergências; rotas com poucas requisições não são marcadas (ruído).
+    """
+    def linha(nome: str, metrica: str, a: float, b: float, pior_se_maior: bool, avaliar: bool = True):
+        variacao = (b - a) / a * 100 if a else 0.0
+        piora = variacao if pior_se_maior else -variacao
+        return {
+            "rota": nome,
+            "metrica": metrica,
+            "base": a,
+            "nova": b,
+            "variacao_percentual": round(variacao, 1),
+            "regressao": avaliar and piora > tolerancia_percentual,
+        }
+
+    linhas = [
+        linha("(total)", "vazao_rps", base["vazao_rps"], nova["vazao_rps"], pior_se_maior=False),
+        {
+            "rota": "(total)",
+            "metrica": "divergencias",
+            "base": base["divergencias"],
+            "nova": nova["divergencias"],
+            "variacao_percentual": None,
+            "regressao": nova["divergencias"] > base["divergencias"],
+        },
+    ]
+    for nome in sorted(set(base["rotas"]) | set(nova["rotas"])):
+        a, b = base["rotas"].get(nome), nova["rotas"].get(nome)
+        if a is None or b is None:
+            continue
+        avaliar = min(a["requisicoes"], b["requisicoes"]) >= minimo_requisicoes
+        for metrica in ("p50_ms", "p95_ms", "p99_ms"):
+            linhas.append(linha(nome, metrica, a[metrica], b[metrica], pior_se_maior=True, avaliar=avaliar))
+    return linhas
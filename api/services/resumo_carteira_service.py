@@ -0,0 +1,102 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+
+from api.models.carteira_models import MOEDAS_OBRIGATORIAS
+from api.persistence.db import total_shards
+from api.persistence.repositories.resumo_carteira_repository import ORDENACOES_RESUMO, ResumoCarteiraRepository
+
+LIMITE_PADRAO_RESUMO = 100
+LIMITE_MAXIMO_RESUMO = 1000
+TAMANHO_LOTE_RECONSTRUCAO = 500
+
+
+def codificar_cursor_resumo(valor: datetime, endereco: str) -> str:
+    bruto = json.dumps([valor.isoformat(), endereco], separators=(",", ":"))
+    return base64.urlsafe_b64encode(bruto.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor_resumo(token: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    if not token:
+        return None
+    try:
+        preenchido = token + "=" * (-len(token) % 4)
+        valor, endereco = json.loads(base64.urlsafe_b64decode(preenchido))
+        return datetime.fromisoformat(valor), str(endereco)
+    except Exception:
+        raise ValueError("Cursor de listagem inválido.")
+
+
+class ResumoCarteiraService:
+    """
+    Listagem e busca de carteiras lidas só da projeção RESUMO_CARTEIRA (uma
+    linha por carteira), sem junções com saldos e histórico.
+    """
+
+    def __init__(self, resumo_repo: ResumoCarteiraRepository):
+        self.resumo_repo = resumo_repo
+
+    def buscar(self, status: Optional[str] = None, codigo_moeda: Optional[str] = None,
+               saldo_minimo: Optional[Decimal] = None, ativa_desde: Optional[datetime] = None,
+               ordenar_por: str = "data_criacao", cursor: Optional[str] = None,
+               limite: int = LIMITE_PADRAO_RESUMO) -> Dict[str, Any]:
+        """
+        Página de carteiras mais recentes primeiro (por criação ou última
+        atividade). 'proximo_cursor' continua a listagem; None na última página.
+        """
+        if ordenar_por not in ORDENACOES_RESUMO:
+            raise ValueError(f"Ordenação inválida: {ordenar_por}. Use 'data_criacao' ou 'ultima_atividade'.")
+        if not 1 <= limite <= LIMITE_MAXIMO_RESUMO:
+            raise ValueError(f"O limite deve estar entre 1 e {LIMITE_MAXIMO_RESUMO}.")
+
+        if codigo_moeda is not None:
+            codigo_moeda = codigo_moeda.upper()
+            if codigo_moeda not in MOEDAS_OBRIGATORIAS:
+                raise ValueError(f"Filtro de saldo disponível apenas para {', '.join(MOEDAS_OBRIGATORIAS)}.")
+        elif saldo_minimo is not None:
+            raise ValueError("Informe a moeda do saldo mínimo.")
+
+        rows = self.resumo_repo.buscar(
+            ordenar_por, status.upper() if status else None, codigo_moeda, saldo_minimo, ativa_desde,
+            decodificar_cursor_resumo(cursor), limite,
+        )
+
+        proximo = None
+        if len(rows) == limite:
+            ultima = rows[-1]
+            proximo = codificar_cursor_resumo(ultima[ordenar_por], ultima["endereco_carteira"])
+
+        return {"carteiras": [self._formatar(r) for r in rows], "proximo_cursor": proximo}
+
+    @staticmethod
+    def _formatar(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "endereco_carteira": row["endereco_carteira"],
+            "data_criacao": row["data_criacao"],
+            "status": row["status"],
+            "saldos": {c: row[f"saldo_{c.lower()}"] for c in MOEDAS_OBRIGATORIAS},
+            "taxas_pagas": {c: row[f"taxa_{c.lower()}"] for c in MOEDAS_OBRIGATORIAS},
+            "total_movimentacoes": row["total_movimentacoes"],
+            "ultima_atividade": row["ultima_atividade"],
+            "versao": row["versao"],
+        }
+
+    def reconstruir(self, tamanho_lote: int = TAMANHO_LOTE_RECONSTRUCAO, ao_progredir=None) -> int:
+        """
+        Recalcula a projeção de todas as carteiras, shard a shard, em lotes por
+        endereço (uma transação curta por lote). Pode rodar com a API no ar.
+        """
+        total = 0
+        for shard in range(total_shards()):
+            ultimo = ""
+            while True:
+                enderecos = self.resumo_repo.enderecos_pagina(ultimo, tamanho_lote, shard)
+                if not enderecos:
+                    break
+                total += self.resumo_repo.reconstruir(enderecos, shard)
+                ultimo = enderecos[-1]
+                if ao_progredir:
+                    ao_progredir(total)
+        return total
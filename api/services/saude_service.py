@@ -0,0 +1,84 @@
+import asyncio
+import os
+from typing import Any, Dict, Tuple
+
+from api.persistence.cache_compartilhado import erro_cache, obter_cache
+from api.persistence.db import aquecer_pool, encerrar_banco, verificar_banco
+from api.persistence.repositories.carteira_repository import CarteiraRepository
+from api.services.provedores_cotacao import obter_fonte
+
+CONEXOES_AQUECIDAS = int(os.getenv("DB_POOL_AQUECER", "2"))
+TIMEOUT_VERIFICACAO_SEGUNDOS = float(os.getenv("HEALTH_TIMEOUT_SEGUNDOS", "2"))
+
+
+class EstadoAplicacao:
+    """Resultado do startup, consultado pela verificação de prontidão."""
+
+    def __init__(self):
+        self.iniciada = False
+        self.conexoes_aquecidas = 0
+        self.erros_inicializacao: Dict[str, str] = {}
+
+
+async def iniciar_recursos(estado: EstadoAplicacao, conexoes: int = CONEXOES_AQUECIDAS):
+    """
+    Startup da API: abre o cache compartilhado do host, cria a engine e
+    aquece o pool, carrega o catálogo de moedas (do cache, se outro worker já
+    o carregou) e abre o cliente HTTP do provedor de cotações.
+
+    Falhas não derrubam o processo: ficam registradas e /health/ready responde
+    503 até o banco responder.
+    """
+    obter_cache()
+
+    try:
+        estado.conexoes_aquecidas = await asyncio.to_thread(aquecer_pool, conexoes)
+    except Exception as e:
+        estado.erros_inicializacao["banco"] = str(e)
+
+    if "banco" not in estado.erros_inicializacao:
+        try:
+            await asyncio.to_thread(CarteiraRepository().aquecer_catalogo)
+        except Exception as e:
+            estado.erros_inicializacao["catalogo_moedas"] = str(e)
+
+    await obter_fonte().iniciar()
+    estado.iniciada = True
+
+
+async def encerrar_recursos():
+    await obter_fonte().encerrar()
+    await asyncio.to_thread(encerrar_banco)
+
+
+async def verificar_prontidao(estado: EstadoAplicacao) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Pronto = startup concluído, banco respondendo e catálogo de moedas em
+    memória (carregado agora se o banco estava fora no startup). O estado do
+    disjuntor de cotações é informativo: sem cotação só as conversões degradam.
+    """
+    verificacoes: Dict[str, Any] = {"startup": "ok" if estado.iniciada else "em andamento"}
+
+    try:
+        await asyncio.wait_for(asyncio.to_thread(verificar_banco), TIMEOUT_VERIFICACAO_SEGUNDOS)
+        verificacoes["banco"] = "ok"
+    except asyncio.TimeoutError:
+        verificacoes["banco"] = "tempo esgotado"
+    except Exception as e:
+        verificacoes["banco"] = f"erro: {e}"
+
+    if not CarteiraRepository.catalogo_carregado() and verificacoes["banco"] == "ok":
+        try:
+            await asyncio.to_thread(CarteiraRepository().aquecer_catalogo)
+        except Exception as e:
+            verificacoes["catalogo_moedas"] = f"erro: {e}"
+    verificacoes.setdefault("catalogo_moedas", "ok" if CarteiraRepository.catalogo_carregado() else "não carregado")
+
+    # Informativo: sem o arquivo compartilhado cada worker usa o próprio cache
+    verificacoes["cache"] = "compartilhado" if obter_cache().compartilhado else f"local ({erro_cache() or 'desabilitado'})"
+
+    fonte = obter_fonte()
+    verificacoes["cotacoes"] = {"provedor": fonte.provedor.nome, "disjuntor": fonte.disjuntor.estado}
+
+    pronto = estado.iniciada and verificacoes["banco"] == "ok" and verificacoes["catalogo_moedas"] == "ok"
+    return pronto, verificacoes
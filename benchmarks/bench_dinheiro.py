@@ -0,0 +1,139 @@
+"""
+Benchmark do Dinheiro (inteiro escalado por 10^8) contra o caminho com Decimal.
+
+Compara as operações que os serviços e jobs fazem com valores monetários:
+cálculo de taxa, conversão com cotação, soma de saldos, leitura da API e ida e
+volta com as colunas DECIMAL(18,8). O caminho "Decimal + quantize" é o que o
+Decimal precisaria para ter o mesmo resultado (8 casas, arredondamento
+explícito); "Decimal (sem quantize)" é o cálculo antigo, que gerava valores
+com mais casas do que a coluna guarda.
+
+Também confere, para todos os valores gerados, que Dinheiro e Decimal +
+quantize dão exatamente o mesmo resultado e que a ida e volta com o banco é
+exata.
+
+Numa operação isolada o Dinheiro (Python puro) não ganha do Decimal, que é
+implementado em C: lá o que ele traz é o arredondamento explícito. O ganho de
+CPU está nos caminhos em lote, que trabalham direto com as unidades inteiras
+(int do Python ou arrays int64), como a soma de saldos e a exposição da
+avaliação.
+
+Não acessa o banco: os valores são gerados em memória.
+
+Uso:
+    python -m benchmarks.bench_dinheiro
+"""
+import random
+import time
+from decimal import ROUND_DOWN, ROUND_HALF_EVEN, Decimal
+from typing import List
+
+import numpy as np
+
+from api.models.dinheiro import ARREDONDAMENTO_CONVERSAO, FATOR, Dinheiro
+
+QUANTIDADE = 100_000
+TAXA = Decimal("0.01")
+COTACAO = Decimal("0.12345678")
+OITO_CASAS = Decimal("0.00000001")
+
+
+def gerar_valores(quantidade: int) -> List[Decimal]:
+    # Mesma forma que o driver devolve uma coluna DECIMAL(18,8)
+    gerador = random.Random(42)
+    return [Decimal(gerador.randrange(1, 10 ** 14)).scaleb(-8) for _ in range(quantidade)]
+
+
+def medir(nome: str, funcao, quantidade: int) -> float:
+    inicio = time.process_time()
+    funcao()
+    por_operacao = (time.process_time() - inicio) / quantidade * 1_000_000_000
+    print(f"  {nome:<40} {por_operacao:10.1f} ns/valor")
+    return por_operacao
+
+
+def comparar(titulo: str, decimal_quantize, dinheiro, quantidade: int, decimal_antigo=None):
+    print(titulo)
+    if decimal_antigo is not None:
+        medir("Decimal (sem quantize)", decimal_antigo, quantidade)
+    a = medir("Decimal + quantize", decimal_quantize, quantidade)
+    b = medir("Dinheiro", dinheiro, quantidade)
+    print(f"  Dinheiro / Decimal + quantize: {b / a:.2f}x o tempo\n")
+
+
+def bench_taxas(valores: List[Decimal], montantes: List[Dinheiro]):
+    esperado = [(v * TAXA).quantize(OITO_CASAS, ROUND_HALF_EVEN) for v in valores]
+    assert [t.para_decimal() for t in (m.percentual(TAXA) for m in montantes)] == esperado
+
+    comparar(
+        f"taxa de {TAXA} ({len(valores)} valores)",
+        lambda: [(v * TAXA).quantize(OITO_CASAS, ROUND_HALF_EVEN) for v in valores],
+        lambda: [m.percentual(TAXA) for m in montantes],
+        len(valores),
+        decimal_antigo=lambda: [v * TAXA for v in valores],
+    )
+
+
+def bench_conversao(valores: List[Decimal], montantes: List[Dinheiro]):
+    esperado = [(v * COTACAO).quantize(OITO_CASAS, ROUND_DOWN) for v in valores]
+    assert [m.multiplicar(COTACAO, ARREDONDAMENTO_CONVERSAO).para_decimal() for m in montantes] == esperado
+
+    comparar(
+        f"conversão pela cotação {COTACAO}",
+        lambda: [(v * COTACAO).quantize(OITO_CASAS, ROUND_DOWN) for v in valores],
+        lambda: [m.multiplicar(COTACAO, ARREDONDAMENTO_CONVERSAO) for m in montantes],
+        len(valores),
+        decimal_antigo=lambda: [v * COTACAO for v in valores],
+    )
+
+
+def bench_soma(valores: List[Decimal], montantes: List[Dinheiro]):
+    assert sum(montantes).para_decimal() == sum(valores)
+
+    unidades = [m.unidades for m in montantes]
+    print("soma de saldos")
+    medir("Decimal", lambda: sum(valores), len(valores))
+    medir("Dinheiro", lambda: sum(montantes), len(valores))
+    medir("unidades (int)", lambda: sum(unidades), len(valores))
+    print()
+
+
+def bench_ida_e_volta(valores: List[Decimal]):
+    textos = [str(v) for v in valores]
+    assert all(Dinheiro.de_decimal(v).para_decimal() == v for v in valores)
+    assert all(Decimal(str(Dinheiro.de_valor(t))) == Decimal(t) for t in textos)
+
+    print("banco e API")
+    medir("Decimal da coluna -> Dinheiro", lambda: [Dinheiro.de_decimal(v) for v in valores], len(valores))
+    montantes = [Dinheiro.de_decimal(v) for v in valores]
+    medir("Dinheiro -> Decimal do parâmetro", lambda: [m.para_decimal() for m in montantes], len(valores))
+    medir("string da API -> Decimal", lambda: [Decimal(t) for t in textos], len(valores))
+    medir("string da API -> Dinheiro", lambda: [Dinheiro.de_valor(t) for t in textos], len(valores))
+    medir("Decimal -> string", lambda: [str(v) for v in valores], len(valores))
+    medir("Dinheiro -> string", lambda: [str(m) for m in montantes], len(valores))
+    print()
+
+
+def bench_exposicao(valores: List[Decimal]):
+    # Caminho em lote da avaliação: saldos como float (CAST AS DOUBLE) ou int64 escalado
+    exato = sum(valores)
+    como_float = np.array([float(v) for v in valores], dtype=np.float64)
+    como_unidades = np.array([Dinheiro.de_decimal(v).unidades for v in valores], dtype=np.int64)
+
+    print("exposição agregada (avaliação em lote)")
+    medir("float64", lambda: como_float.sum(), len(valores))
+    medir("int64 (unidades)", lambda: como_unidades.sum(), len(valores))
+    erro = abs(Decimal(repr(float(como_float.sum()))) - exato)
+    print(f"  erro do float64: {erro}  |  int64: {Dinheiro(int(como_unidades.sum())).para_decimal() - exato}")
+    print(f"  (int64 cabe até {np.iinfo(np.int64).max // FATOR:,} por lote)\n")
+
+
+if __name__ == "__main__":
+    valores = gerar_valores(QUANTIDADE)
+    montantes = [Dinheiro.de_decimal(v) for v in valores]
+
+    bench_taxas(valores, montantes)
+    bench_conversao(valores, montantes)
+    bench_soma(valores, montantes)
+    bench_ida_e_volta(valores)
+    bench_exposicao(valores)
@@ -0,0 +1,120 @@
+"""
+Benchmark da serialização das respostas de listar_carteiras e buscar_saldos.
+
+Compara o caminho original (modelos Pydantic no serviço + revalidação pelo
+response_model + json da stdlib, como o FastAPI faz) com o caminho rápido
+(dicts do repositório serializados direto por RespostaJSONRapida).
+
+Não acessa o banco: as linhas são geradas em memória.
+
+Uso:
+    python -m benchmarks.bench_serializacao
+"""
+import json
+import secrets
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+from pydantic import TypeAdapter
+
+from api.models.carteira_models import Carteira, SaldoItem
+from api.routers.respostas import orjson, serializar_json
+
+REPETICOES = 2000
+
+
+def gerar_linhas_carteiras(quantidade: int) -> List[dict]:
+    base = datetime(2024, 1, 1)
+    return [
+        {
+            "endereco_carteira": secrets.token_hex(16),
+            "hash_chave_privada": secrets.token_hex(32),
+            "data_criacao": base + timedelta(minutes=i),
+            "status": "ATIVA",
+        }
+        for i in range(quantidade)
+    ]
+
+
+def gerar_linhas_saldos() -> List[dict]:
+    agora = datetime(2024, 1, 1, 12, 30)
+    return [
+        {
+            "id_moeda": i,
+            "codigo_moeda": codigo,
+            "nome_moeda": codigo,
+            "saldo": Decimal("12345.67890123"),
+            "data_atualizacao": agora,
+        }
+        for i, codigo in enumerate(["BRL", "BTC", "ETH", "SOL", "USD"], start=1)
+    ]
+
+
+def caminho_pydantic(modelos, adapter: TypeAdapter) -> bytes:
+    # Equivale ao serialize_response do FastAPI: valida contra o response_model,
+    # converte para tipos JSON e codifica com json.dumps.
+    validado = adapter.validate_python(modelos, from_attributes=True)
+    conteudo = adapter.dump_python(validado, mode="json")
+    return json.dumps(conteudo, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def medir(nome: str, funcao, repeticoes: int = REPETICOES) -> float:
+    inicio = time.process_time()
+    for _ in range(repeticoes):
+        funcao()
+    por_requisicao = (time.process_time() - inicio) / repeticoes * 1_000_000
+    print(f"  {nome:<40} {por_requisicao:10.1f} µs/requisição")
+    return por_requisicao
+
+
+def bench_listar(quantidade: int):
+    linhas = gerar_linhas_carteiras(quantidade)
+    adapter = TypeAdapter(List[Carteira])
+
+    def original():
+        modelos = [
+            Carteira(endereco_carteira=r["endereco_carteira"], data_criacao=r["data_criacao"], status=r["status"])
+            for r in linhas
+        ]
+        return caminho_pydantic(modelos, adapter)
+
+    def rapido():
+        return serializar_json([
+            {"endereco_carteira": r["endereco_carteira"], "data_criacao": r["data_criacao"], "status": r["status"]}
+            for r in linhas
+        ])
+
+    assert json.loads(original()) == json.loads(rapido())
+
+    print(f"listar_carteiras ({quantidade} carteiras)")
+    repeticoes = max(10, REPETICOES * 5 // quantidade)
+    a = medir("pydantic + response_model + json", original, repeticoes)
+    b = medir("RespostaJSONRapida", rapido, repeticoes)
+    print(f"  economia: {a - b:.1f} µs ({a / b:.1f}x)\n")
+
+
+def bench_saldos():
+    linhas = gerar_linhas_saldos()
+    adapter = TypeAdapter(List[SaldoItem])
+
+    def original():
+        return caminho_pydantic([SaldoItem(**r) for r in linhas], adapter)
+
+    def rapido():
+        return serializar_json(linhas)
+
+    assert json.loads(original()) == json.loads(rapido())
+
+    print("buscar_saldos (5 moedas)")
+    a = medir("pydantic + response_model + json", original)
+    b = medir("RespostaJSONRapida", rapido)
+    print(f"  economia: {a - b:.1f} µs ({a / b:.1f}x)\n")
+
+
+if __name__ == "__main__":
+    print(f"encoder: {'orjson' if orjson is not None else 'json (stdlib)'}\n")
+    bench_saldos()
+    bench_listar(100)
+    bench_listar(10_000)
@@ -0,0 +1,104 @@
+-- =========================================================
+--  V001 - Esquema base
+--  Tabelas do script original (DDL_Carteira_Digital.sql).
+--  Usa IF NOT EXISTS, então pode ser aplicada sobre uma base
+--  já criada pelo script antigo.
+-- =========================================================
+
+Create Table IF NOT EXISTS MOEDA(
+    id_moeda SMALLINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    codigo varchar(5) UNIQUE NOT NULL,
+    nome varchar(50) NOT NULL,
+    tipo varchar(50) NOT NULL
+);
+
+INSERT INTO MOEDA(codigo, nome, tipo) VALUES
+('USD', 'Dólar Americano', 'FIAT'),
+('BRL', 'Real (Brasil)', 'FIAT'),
+('SOL', 'Solana', 'CRYPTO'),
+('BTC', 'Bitcoin', 'CRYPTO'),
+('ETH', 'Ethereum', 'CRYPTO')
+ON DUPLICATE KEY UPDATE codigo=codigo;
+
+Create Table IF NOT EXISTS CARTEIRA(
+    endereco_carteira CHAR(32) NOT NULL PRIMARY KEY,
+    hash_chave_privada VARCHAR(64) NOT NULL,
+    data_criacao DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    status_ativo varchar(10) NOT NULL DEFAULT 'ATIVO'
+);
+
+Create Table IF NOT EXISTS SALDO_CARTEIRA(
+    endereco_carteira CHAR(32) NOT NULL,
+    id_moeda SMALLINT NOT NULL,
+    saldo DECIMAL(18,8) NOT NULL DEFAULT 0.00,
+    data_atualizacao DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY(endereco_carteira, id_moeda),
+    FOREIGN KEY(endereco_carteira) REFERENCES CARTEIRA(endereco_carteira),
+    FOREIGN KEY(id_moeda) REFERENCES MOEDA(id_moeda)
+);
+
+Create Table IF NOT EXISTS DEPOSITO_SAQUE(
+    id_movimento BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    endereco_carteira CHAR(32) NOT NULL,
+    id_moeda SMALLINT NOT NULL,
+    tipo VARCHAR(10) NOT NULL,
+    valor DECIMAL(18,8) NOT NULL,
+    taxa_valor DECIMAL(18,8) NOT NULL DEFAULT 0.00,
+    data_hora DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY(endereco_carteira) REFERENCES CARTEIRA(endereco_carteira),
+    FOREIGN KEY(id_moeda) REFERENCES MOEDA(id_moeda)
+);
+
+Create Table IF NOT EXISTS CONVERSAO(
+    id_conversao BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    endereco_carteira CHAR(32) NOT NULL,
+    id_moeda_origem SMALLINT NOT NULL,
+    id_moeda_destino SMALLINT NOT NULL,
+    valor_origem DECIMAL(18,8) NOT NULL,
+    valor_destino DECIMAL(18,8) NOT NULL,
+    taxa_percentual DECIMAL(18,8) NOT NULL,
+    taxa_valor DECIMAL(18,8) NOT NULL,
+    cotacao_utilizada DECIMAL(18,8) NOT NULL,
+    data_hora DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY(endereco_carteira) REFERENCES CARTEIRA(endereco_carteira),
+    FOREIGN KEY(id_moeda_origem) REFERENCES MOEDA(id_moeda),
+    FOREIGN KEY(id_moeda_destino) REFERENCES MOEDA(id_moeda)
+);
+
+Create Table IF NOT EXISTS TRANSFERENCIA(
+    id_transferencia BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    endereco_origem CHAR(32) NOT NULL,
+    endereco_destino CHAR(32) NOT NULL,
+    id_moeda SMALLINT NOT NULL,
+    valor DECIMAL(18,8) NOT NULL,
+    taxa_valor DECIMAL(18,8) NOT NULL,
+    data_hora DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY(endereco_origem) REFERENCES CARTEIRA(endereco_carteira),
+    FOREIGN KEY(endereco_destino) REFERENCES CARTEIRA(endereco_carteira),
+    FOREIGN KEY(id_moeda) REFERENCES MOEDA(id_moeda)
+);
+
+-- =========================================================
+--  Resumo de taxas e volume (rollup por hora)
+--  Atualizado na mesma transação de cada movimentação.
+--  "particao" espalha as atualizações de um mesmo bucket em
+--  várias linhas para evitar disputa de lock numa linha só;
+--  os relatórios somam todas as partições.
+-- =========================================================
+
+Create Table IF NOT EXISTS RESUMO_TAXAS(
+    bucket_hora DATETIME NOT NULL,
+    id_moeda SMALLINT NOT NULL,
+    tipo_operacao VARCHAR(15) NOT NULL,
+    particao TINYINT NOT NULL DEFAULT 0,
+    quantidade BIGINT NOT NULL DEFAULT 0,
+    volume DECIMAL(28,8) NOT NULL DEFAULT 0.00,
+    taxa_total DECIMAL(28,8) NOT NULL DEFAULT 0.00,
+
+    PRIMARY KEY(bucket_hora, id_moeda, tipo_operacao, particao),
+    FOREIGN KEY(id_moeda) REFERENCES MOEDA(id_moeda)
+);
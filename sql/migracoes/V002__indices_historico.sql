@@ -0,0 +1,28 @@
+-- =========================================================
+--  V002 - Índices compostos nos caminhos de acesso reais
+--
+--  Extrato por carteira: filtra pela carteira e pagina por
+--  (data_hora, id). O InnoDB acrescenta a chave primária ao
+--  fim de cada índice secundário, então (carteira, data_hora)
+--  já entrega as linhas na ordem da paginação.
+--  Extrato por período e reconstrução do resumo de taxas:
+--  faixa de data_hora.
+--  Os índices das chaves estrangeiras de endereço ficam
+--  redundantes e o MySQL os descarta sozinho.
+-- =========================================================
+
+CREATE INDEX idx_deposito_saque_carteira_data ON DEPOSITO_SAQUE (endereco_carteira, data_hora);
+CREATE INDEX idx_deposito_saque_data ON DEPOSITO_SAQUE (data_hora);
+
+CREATE INDEX idx_conversao_carteira_data ON CONVERSAO (endereco_carteira, data_hora);
+CREATE INDEX idx_conversao_data ON CONVERSAO (data_hora);
+
+CREATE INDEX idx_transferencia_origem_data ON TRANSFERENCIA (endereco_origem, data_hora);
+CREATE INDEX idx_transferencia_destino_data ON TRANSFERENCIA (endereco_destino, data_hora);
+CREATE INDEX idx_transferencia_data ON TRANSFERENCIA (data_hora);
+
+-- listar carteiras (ORDER BY data_criacao DESC)
+CREATE INDEX idx_carteira_data_criacao ON CARTEIRA (data_criacao);
+
+-- reconciliação incremental (saldos alterados desde a última marca)
+CREATE INDEX idx_saldo_carteira_atualizacao ON SALDO_CARTEIRA (data_atualizacao, endereco_carteira);
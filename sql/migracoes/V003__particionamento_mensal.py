@@ -0,0 +1,60 @@
+"""
+V003 - Particionamento mensal das tabelas de histórico.
+
+DEPOSITO_SAQUE, CONVERSAO e TRANSFERENCIA passam a ser particionadas por
+RANGE COLUMNS(data_hora), uma partição por mês, mais:
+- p_anterior: tudo antes do primeiro mês com dados;
+- pmax: MAXVALUE, mantida vazia por api.jobs.manter_particoes.
+
+Restrições do MySQL para tabelas particionadas:
+- toda chave única precisa conter a coluna de partição, então a chave
+  primária vira (id, data_hora) (o id continua AUTO_INCREMENT e único);
+- tabelas particionadas não têm chaves estrangeiras. A integridade com
+  CARTEIRA e MOEDA já é garantida pelo repositório, que bloqueia a carteira e
+  resolve a moeda pelo catálogo antes de gravar o histórico.
+"""
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from api.persistence.migracoes import (
+    MESES_A_FRENTE_PADRAO,
+    TABELAS_PARTICIONADAS,
+    definicao_particao,
+    inicio_do_mes,
+    meses_entre,
+    somar_meses,
+)
+
+
+def aplicar(conn: Connection):
+    hoje = inicio_do_mes(date.today())
+    ultimo = somar_meses(hoje, MESES_A_FRENTE_PADRAO)
+
+    for tabela, coluna_id in TABELAS_PARTICIONADAS.items():
+        chaves = conn.execute(text("""
+            SELECT constraint_name
+              FROM information_schema.table_constraints
+             WHERE table_schema = DATABASE()
+               AND LOWER(table_name) = :tabela
+               AND constraint_type = 'FOREIGN KEY'
+        """), {"tabela": tabela}).scalars().all()
+        if chaves:
+            conn.exec_driver_sql(
+                f"ALTER TABLE {tabela} " + ", ".join(f"DROP FOREIGN KEY `{c}`" for c in chaves)
+            )
+
+        conn.exec_driver_sql(f"ALTER TABLE {tabela} DROP PRIMARY KEY, ADD PRIMARY KEY ({coluna_id}, data_hora)")
+
+        mais_antigo = conn.execute(text(f"SELECT MIN(data_hora) FROM {tabela}")).scalar()
+        primeiro = inicio_do_mes(mais_antigo.date()) if mais_antigo else hoje
+
+        definicoes = (
+            [f"PARTITION p_anterior VALUES LESS THAN ('{primeiro.isoformat()}')"]
+            + [definicao_particao(m) for m in meses_entre(primeiro, ultimo)]
+            + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"]
+        )
+        conn.exec_driver_sql(
+            f"ALTER TABLE {tabela} PARTITION BY RANGE COLUMNS(data_hora) ({', '.join(definicoes)})"
+        )
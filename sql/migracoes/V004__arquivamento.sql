@@ -0,0 +1,37 @@
+-- =========================================================
+--  V004 - Arquivamento de movimentações antigas
+--
+--  ARQUIVO_SEGMENTO: um arquivo Parquet (imutável) por mês
+--  arquivado, com o índice por carteira ao lado. status
+--  COPIADO = arquivo gravado, linhas ainda sendo removidas
+--  das tabelas quentes; CONCLUIDO = remoção terminada.
+--  As leituras usam o arquivo para data_hora < MAX(fim).
+--
+--  SALDO_ARQUIVADO: soma das variações já removidas das
+--  tabelas quentes, por carteira e moeda, atualizada na
+--  mesma transação de cada remoção. A reconciliação soma
+--  esse valor ao histórico quente.
+-- =========================================================
+
+Create Table IF NOT EXISTS ARQUIVO_SEGMENTO(
+    id_segmento INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    inicio DATETIME NOT NULL,
+    fim DATETIME NOT NULL,
+    arquivo VARCHAR(255) NOT NULL,
+    indice VARCHAR(255) NOT NULL,
+    linhas BIGINT NOT NULL,
+    checksum CHAR(64) NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'COPIADO',
+    criado_em DATETIME NOT NULL,
+    concluido_em DATETIME NULL,
+
+    UNIQUE KEY uk_arquivo_segmento_inicio (inicio)
+);
+
+Create Table IF NOT EXISTS SALDO_ARQUIVADO(
+    endereco_carteira CHAR(32) NOT NULL,
+    id_moeda SMALLINT NOT NULL,
+    saldo DECIMAL(28,8) NOT NULL DEFAULT 0.00,
+
+    PRIMARY KEY(endereco_carteira, id_moeda)
+);
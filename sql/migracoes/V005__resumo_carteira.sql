@@ -0,0 +1,118 @@
+-- =========================================================
+--  V005 - Projeção de leitura RESUMO_CARTEIRA
+--
+--  Uma linha por carteira com status, saldo e taxas pagas
+--  em colunas fixas por moeda obrigatória (BTC, ETH, SOL,
+--  USD, BRL), quantidade de movimentações e última
+--  atividade. Mantida na mesma transação de cada operação
+--  (CarteiraRepository) e lida pelas listagens/buscas, sem
+--  junções com saldos e histórico.
+--
+--  As carteiras existentes são carregadas aqui mesmo (mesmo
+--  cálculo de api.jobs.reconstruir_resumo_carteiras), para
+--  as listagens não ficarem vazias até uma carga manual.
+--  Não aplique com um arquivamento em andamento (segmentos
+--  COPIADO). Movimentos feitos pela versão anterior da API
+--  entre a migração e o deploy não entram na projeção: rode
+--      python -m api.jobs.reconstruir_resumo_carteiras
+--  depois do deploy se a API ficou no ar nesse intervalo.
+--
+--  SALDO_ARQUIVADO passa a guardar também taxas, quantidade
+--  de movimentações e última data das linhas arquivadas,
+--  para a reconstrução não perder o histórico já removido
+--  das tabelas quentes (segmentos arquivados antes desta
+--  versão contribuem só com o saldo).
+-- =========================================================
+
+ALTER TABLE SALDO_ARQUIVADO
+    ADD COLUMN taxas DECIMAL(28,8) NOT NULL DEFAULT 0,
+    ADD COLUMN movimentacoes BIGINT NOT NULL DEFAULT 0,
+    ADD COLUMN ultima_data_hora DATETIME NULL;
+
+Create Table IF NOT EXISTS RESUMO_CARTEIRA(
+    endereco_carteira CHAR(32) NOT NULL PRIMARY KEY,
+    data_criacao DATETIME NOT NULL,
+    status VARCHAR(10) NOT NULL,
+
+    saldo_btc DECIMAL(18,8) NOT NULL DEFAULT 0,
+    saldo_eth DECIMAL(18,8) NOT NULL DEFAULT 0,
+    saldo_sol DECIMAL(18,8) NOT NULL DEFAULT 0,
+    saldo_usd DECIMAL(18,8) NOT NULL DEFAULT 0,
+    saldo_brl DECIMAL(18,8) NOT NULL DEFAULT 0,
+
+    taxa_btc DECIMAL(28,8) NOT NULL DEFAULT 0,
+    taxa_eth DECIMAL(28,8) NOT NULL DEFAULT 0,
+    taxa_sol DECIMAL(28,8) NOT NULL DEFAULT 0,
+    taxa_usd DECIMAL(28,8) NOT NULL DEFAULT 0,
+    taxa_brl DECIMAL(28,8) NOT NULL DEFAULT 0,
+
+    total_movimentacoes BIGINT NOT NULL DEFAULT 0,
+    -- data de criação enquanto a carteira não tem movimentações
+    ultima_atividade DATETIME NOT NULL,
+    versao BIGINT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY(endereco_carteira) REFERENCES CARTEIRA(endereco_carteira)
+);
+
+-- listagens paginadas por chave (mais recentes primeiro), com ou sem filtro de status
+CREATE INDEX idx_resumo_carteira_criacao ON RESUMO_CARTEIRA (data_criacao, endereco_carteira);
+CREATE INDEX idx_resumo_carteira_atividade ON RESUMO_CARTEIRA (ultima_atividade, endereco_carteira);
+CREATE INDEX idx_resumo_carteira_status_criacao ON RESUMO_CARTEIRA (status, data_criacao, endereco_carteira);
+CREATE INDEX idx_resumo_carteira_status_atividade ON RESUMO_CARTEIRA (status, ultima_atividade, endereco_carteira);
+
+-- carga inicial: uma linha por carteira existente
+INSERT INTO RESUMO_CARTEIRA (
+       endereco_carteira, data_criacao, status,
+       saldo_btc, saldo_eth, saldo_sol, saldo_usd, saldo_brl,
+       taxa_btc, taxa_eth, taxa_sol, taxa_usd, taxa_brl,
+       total_movimentacoes, ultima_atividade, versao)
+SELECT c.endereco_carteira,
+       c.data_criacao,
+       c.status_ativo,
+       COALESCE(s.saldo_btc, 0), COALESCE(s.saldo_eth, 0), COALESCE(s.saldo_sol, 0),
+       COALESCE(s.saldo_usd, 0), COALESCE(s.saldo_brl, 0),
+       COALESCE(h.taxa_btc, 0), COALESCE(h.taxa_eth, 0), COALESCE(h.taxa_sol, 0),
+       COALESCE(h.taxa_usd, 0), COALESCE(h.taxa_brl, 0),
+       COALESCE(h.movimentacoes, 0),
+       GREATEST(c.data_criacao, COALESCE(h.ultima_data_hora, c.data_criacao)),
+       0
+  FROM CARTEIRA c
+  LEFT JOIN (
+        SELECT sc.endereco_carteira,
+               SUM(CASE WHEN m.codigo = 'BTC' THEN sc.saldo ELSE 0 END) AS saldo_btc,
+               SUM(CASE WHEN m.codigo = 'ETH' THEN sc.saldo ELSE 0 END) AS saldo_eth,
+               SUM(CASE WHEN m.codigo = 'SOL' THEN sc.saldo ELSE 0 END) AS saldo_sol,
+               SUM(CASE WHEN m.codigo = 'USD' THEN sc.saldo ELSE 0 END) AS saldo_usd,
+               SUM(CASE WHEN m.codigo = 'BRL' THEN sc.saldo ELSE 0 END) AS saldo_brl
+          FROM SALDO_CARTEIRA sc
+          JOIN MOEDA m ON m.id_moeda = sc.id_moeda
+         GROUP BY sc.endereco_carteira
+       ) s ON s.endereco_carteira = c.endereco_carteira
+  LEFT JOIN (
+        SELECT hist.endereco_carteira,
+               SUM(CASE WHEN m.codigo = 'BTC' THEN hist.taxa ELSE 0 END) AS taxa_btc,
+               SUM(CASE WHEN m.codigo = 'ETH' THEN hist.taxa ELSE 0 END) AS taxa_eth,
+               SUM(CASE WHEN m.codigo = 'SOL' THEN hist.taxa ELSE 0 END) AS taxa_sol,
+               SUM(CASE WHEN m.codigo = 'USD' THEN hist.taxa ELSE 0 END) AS taxa_usd,
+               SUM(CASE WHEN m.codigo = 'BRL' THEN hist.taxa ELSE 0 END) AS taxa_brl,
+               SUM(hist.movimentacoes) AS movimentacoes,
+               MAX(hist.data_hora) AS ultima_data_hora
+          FROM (
+                SELECT endereco_carteira, id_moeda, taxa_valor AS taxa, 1 AS movimentacoes, data_hora
+                  FROM DEPOSITO_SAQUE
+                UNION ALL
+                SELECT endereco_carteira, id_moeda_destino, taxa_valor, 1, data_hora
+                  FROM CONVERSAO
+                UNION ALL
+                SELECT endereco_origem, id_moeda, taxa_valor, 1, data_hora
+                  FROM TRANSFERENCIA
+                UNION ALL
+                SELECT endereco_destino, id_moeda, 0, 1, data_hora
+                  FROM TRANSFERENCIA
+                UNION ALL
+                SELECT endereco_carteira, id_moeda, taxas, movimentacoes, ultima_data_hora
+                  FROM SALDO_ARQUIVADO
+               ) hist
+          JOIN MOEDA m ON m.id_moeda = hist.id_moeda
+         GROUP BY hist.endereco_carteira
+       ) h ON h.endereco_carteira = c.endereco_carteira;
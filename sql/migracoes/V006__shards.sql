@@ -0,0 +1,50 @@
+-- =========================================================
+--  V006 - Shards (carteiras distribuídas entre bancos)
+--
+--  Aplicada em todos os shards (api.jobs.migrar percorre
+--  DB_SHARDS); MAPA_SHARDS e TRANSACAO_DISTRIBUIDA só são
+--  usadas no shard 0 (diretório).
+--
+--  MAPA_SHARDS: bucket (CRC32(endereco) % 1024) -> shard.
+--  estado MIGRANDO = bucket sendo copiado para outro shard
+--  (escritas recusadas). Preencha com
+--      python -m api.jobs.rebalancear_shards inicializar
+--
+--  TRANSACAO_DISTRIBUIDA: log do coordenador das transações
+--  XA entre shards. CONFIRMADA é o ponto de decisão; as
+--  transações preparadas que sobrarem de uma queda são
+--  concluídas por api.jobs.recuperar_transacoes_shards.
+--
+--  TRANSFERENCIA.referencia: identifica a transferência nos
+--  dois shards quando origem e destino estão em shards
+--  diferentes (a mesma linha é gravada em cada um) e evita
+--  cópias duplicadas no rebalanceamento. A chave única
+--  inclui data_hora por causa do particionamento.
+-- =========================================================
+
+Create Table IF NOT EXISTS MAPA_SHARDS(
+    bucket SMALLINT NOT NULL PRIMARY KEY,
+    shard SMALLINT NOT NULL,
+    estado VARCHAR(10) NOT NULL DEFAULT 'ATIVO',
+    versao BIGINT NOT NULL DEFAULT 0,
+    atualizado_em DATETIME NOT NULL
+);
+
+Create Table IF NOT EXISTS TRANSACAO_DISTRIBUIDA(
+    xid VARCHAR(64) NOT NULL PRIMARY KEY,
+    shards VARCHAR(100) NOT NULL,
+    estado VARCHAR(12) NOT NULL,
+    criada_em DATETIME NOT NULL,
+    atualizada_em DATETIME NOT NULL
+);
+
+CREATE INDEX idx_transacao_distribuida_estado ON TRANSACAO_DISTRIBUIDA (estado, criada_em);
+
+ALTER TABLE TRANSFERENCIA ADD COLUMN referencia CHAR(32) NULL;
+
+-- Linhas anteriores: o id já é único dentro da base de origem
+UPDATE TRANSFERENCIA SET referencia = LPAD(HEX(id_transferencia), 32, '0') WHERE referencia IS NULL;
+
+ALTER TABLE TRANSFERENCIA
+    MODIFY referencia CHAR(32) NOT NULL,
+    ADD UNIQUE KEY uk_transferencia_referencia (referencia, data_hora);
@@ -0,0 +1,62 @@
+-- =========================================================
+--  V007 - Agendamentos (ordens permanentes)
+--
+--  AGENDAMENTO: transferências e conversões agendadas, únicas
+--  ou recorrentes (DIARIA, SEMANAL, MENSAL). Fica no shard da
+--  carteira de origem e é movida junto com ela pelo
+--  rebalanceamento; o id é gerado na aplicação (único entre
+--  shards). A k-ésima ocorrência é calculada a partir de
+--  'inicio' (sem acumular desvio nos meses curtos);
+--  'ocorrencia' é o k da próxima execução.
+--
+--  O agendador (api.services.agendador_service) reivindica as
+--  vencidas com SELECT ... FOR UPDATE SKIP LOCKED, então
+--  vários processos podem rodá-lo ao mesmo tempo.
+--
+--  EXECUCAO_AGENDADOR (shard 0): métricas de cada ciclo do
+--  agendador.
+-- =========================================================
+
+Create Table IF NOT EXISTS AGENDAMENTO(
+    id_agendamento CHAR(32) NOT NULL PRIMARY KEY,
+    endereco_carteira CHAR(32) NOT NULL,
+    tipo VARCHAR(13) NOT NULL,
+    codigo_moeda VARCHAR(5) NOT NULL,
+    -- TRANSFERENCIA: carteira de destino; CONVERSAO: moeda de destino
+    endereco_destino CHAR(32) NULL,
+    codigo_destino VARCHAR(5) NULL,
+    valor DECIMAL(18,8) NOT NULL,
+    periodicidade VARCHAR(7) NOT NULL,
+    -- UMA: depois de uma parada, executa uma vez e pula para a próxima
+    -- ocorrência futura; TODAS: executa cada ocorrência perdida
+    execucoes_atrasadas VARCHAR(5) NOT NULL DEFAULT 'UMA',
+    inicio DATETIME NOT NULL,
+    fim DATETIME NULL,
+    ocorrencia INT NOT NULL DEFAULT 0,
+    proxima_execucao DATETIME NOT NULL,
+    status VARCHAR(9) NOT NULL DEFAULT 'ATIVO',
+    execucoes INT NOT NULL DEFAULT 0,
+    falhas_consecutivas INT NOT NULL DEFAULT 0,
+    ultima_execucao DATETIME NULL,
+    ultimo_erro VARCHAR(255) NULL,
+    criado_em DATETIME NOT NULL,
+
+    FOREIGN KEY(endereco_carteira) REFERENCES CARTEIRA(endereco_carteira)
+);
+
+-- vencidos (agendador) e agendamentos de uma carteira
+CREATE INDEX idx_agendamento_vencidos ON AGENDAMENTO (status, proxima_execucao);
+CREATE INDEX idx_agendamento_carteira ON AGENDAMENTO (endereco_carteira, status, proxima_execucao);
+
+Create Table IF NOT EXISTS EXECUCAO_AGENDADOR(
+    id_execucao BIGINT AUTO_INCREMENT PRIMARY KEY,
+    inicio DATETIME NOT NULL,
+    duracao_ms INT NOT NULL,
+    carteiras INT NOT NULL,
+    executados INT NOT NULL,
+    falhas INT NOT NULL,
+    adiados INT NOT NULL,
+    atraso_maximo_segundos INT NOT NULL
+);
+
+CREATE INDEX idx_execucao_agendador_inicio ON EXECUCAO_AGENDADOR (inicio);
@@ -0,0 +1,29 @@
+-- =========================================================
+--  V008 - Limites de uso por carteira
+--
+--  CARTEIRA.nivel_limite: política de limites da carteira
+--  (ver api.services.limites_service; PADRAO, PREMIUM, ...).
+--
+--  USO_LIMITE: quanto cada carteira sacou/transferiu por moeda
+--  em intervalos fixos (USO_LIMITE_BUCKET_MINUTOS), somado na
+--  mesma transação do débito. A verificação da janela móvel
+--  (24 h) soma só os intervalos dela, sem varrer o histórico.
+--  Intervalos mais antigos que a maior janela podem ser
+--  apagados com python -m api.jobs.limites_carteiras limpar.
+-- =========================================================
+
+ALTER TABLE CARTEIRA ADD COLUMN nivel_limite VARCHAR(10) NOT NULL DEFAULT 'PADRAO';
+
+Create Table IF NOT EXISTS USO_LIMITE(
+    endereco_carteira CHAR(32) NOT NULL,
+    id_moeda SMALLINT NOT NULL,
+    operacao VARCHAR(13) NOT NULL,
+    bucket_inicio DATETIME NOT NULL,
+    valor DECIMAL(28,8) NOT NULL DEFAULT 0,
+    quantidade INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (endereco_carteira, id_moeda, operacao, bucket_inicio),
+    FOREIGN KEY(endereco_carteira) REFERENCES CARTEIRA(endereco_carteira),
+    FOREIGN KEY(id_moeda) REFERENCES MOEDA(id_moeda)
+);
+
+CREATE INDEX idx_uso_limite_bucket ON USO_LIMITE (bucket_inicio);
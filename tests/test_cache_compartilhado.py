@@ -0,0 +1,203 @@
+"""
+Testes do cache compartilhado (api.persistence.cache_compartilhado) sobre um
+arquivo temporário, com processos filhos (fork) mapeando o mesmo arquivo.
+
+Uso:
+    python -m pytest tests
+"""
+import multiprocessing
+import time
+from decimal import Decimal
+
+import pytest
+
+from api.models.dinheiro import Dinheiro
+from api.persistence.cache_compartilhado import (
+    NS_CARTEIRAS,
+    NS_COTACOES,
+    NS_MOEDAS,
+    SONDAGENS,
+    CacheCompartilhado,
+)
+
+pytestmark = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="cache compartilhado requer POSIX"
+)
+
+CHAVES_CONCORRENTES = 32
+
+
+@pytest.fixture
+def caminho(tmp_path):
+    return str(tmp_path / "cache.bin")
+
+
+@pytest.fixture
+def cache(caminho):
+    return CacheCompartilhado(caminho, slots=1024, tamanho_slot=256)
+
+
+def _disputar(caminho, operacao, barreira, fila):
+    """Processo filho: abre o próprio mapeamento e aplica a operação a todas as chaves."""
+    cache = CacheCompartilhado(caminho, slots=1024, tamanho_slot=256)
+    barreira.wait()
+    ganhas = []
+    for i in range(CHAVES_CONCORRENTES):
+        chave = f"chave-{i}"
+        if operacao == "tomar":
+            if cache.tomar(NS_COTACOES, chave) is not None:
+                ganhas.append(chave)
+        elif cache.gravar(NS_COTACOES, chave, {"pid": multiprocessing.current_process().name}, se_ausente=True):
+            ganhas.append(chave)
+    fila.put(ganhas)
+
+
+def disputar_em_dois_processos(caminho, operacao):
+    contexto = multiprocessing.get_context("fork")
+    barreira = contexto.Barrier(2)
+    fila = contexto.Queue()
+    processos = [contexto.Process(target=_disputar, args=(caminho, operacao, barreira, fila)) for _ in range(2)]
+    for processo in processos:
+        processo.start()
+    resultados = [fila.get(timeout=30) for _ in processos]
+    for processo in processos:
+        processo.join(timeout=30)
+        assert processo.exitcode == 0
+    return resultados
+
+
+# --- gravar e obter -------------------------------------------------------
+
+def test_gravar_e_obter(cache):
+    versao = cache.gravar(NS_MOEDAS, "BRL", {"id": 3, "taxa": Decimal("0.015"), "saldo": Dinheiro(150)})
+
+    valor, versao_lida = cache.obter(NS_MOEDAS, "BRL")
+    assert valor == {"id": 3, "taxa": Decimal("0.015"), "saldo": Dinheiro(150)}
+    assert versao_lida == versao
+    assert cache.obter(NS_MOEDAS, "USD") is None
+    assert cache.obter(NS_COTACOES, "BRL") is None
+
+
+def test_regravar_substitui_com_versao_maior(cache):
+    primeira = cache.gravar(NS_MOEDAS, "BRL", 1)
+    segunda = cache.gravar(NS_MOEDAS, "BRL", 2)
+
+    assert segunda > primeira
+    assert cache.obter(NS_MOEDAS, "BRL") == (2, segunda)
+
+
+def test_outro_processo_le_o_mesmo_arquivo(cache, caminho):
+    cache.gravar(NS_MOEDAS, "BRL", "real")
+    assert CacheCompartilhado(caminho, slots=1024, tamanho_slot=256).obter(NS_MOEDAS, "BRL")[0] == "real"
+
+
+def test_layout_diferente_e_recusado(cache, caminho):
+    with pytest.raises(ValueError, match="layout diferente"):
+        CacheCompartilhado(caminho, slots=512, tamanho_slot=256)
+
+
+# --- validade -------------------------------------------------------------
+
+def test_ttl_expira(cache):
+    cache.gravar(NS_COTACOES, "BTC-USD", "100", ttl=0.05)
+    assert cache.obter(NS_COTACOES, "BTC-USD")[0] == "100"
+
+    time.sleep(0.1)
+    assert cache.obter(NS_COTACOES, "BTC-USD") is None
+    assert cache.tomar(NS_COTACOES, "BTC-USD") is None
+
+
+def test_invalidar_namespace_vale_para_todos_os_processos(cache, caminho):
+    outro = CacheCompartilhado(caminho, slots=1024, tamanho_slot=256)
+    cache.gravar(NS_CARTEIRAS, "abc", 1)
+    cache.gravar(NS_MOEDAS, "BRL", 2)
+
+    assert outro.invalidar_namespace(NS_CARTEIRAS) == 1
+    assert cache.geracao(NS_CARTEIRAS) == 1
+    assert cache.obter(NS_CARTEIRAS, "abc") is None
+    assert cache.obter(NS_MOEDAS, "BRL")[0] == 2
+
+    cache.gravar(NS_CARTEIRAS, "abc", 3)
+    assert outro.obter(NS_CARTEIRAS, "abc")[0] == 3
+
+
+# --- se_ausente e tomar ---------------------------------------------------
+
+def test_se_ausente_nao_substitui_entrada_vigente(cache):
+    assert cache.gravar(NS_COTACOES, "id", "primeira", se_ausente=True) is not None
+    assert cache.gravar(NS_COTACOES, "id", "segunda", se_ausente=True) is None
+    assert cache.obter(NS_COTACOES, "id")[0] == "primeira"
+
+
+def test_se_ausente_grava_sobre_entrada_expirada(cache):
+    cache.gravar(NS_COTACOES, "id", "primeira", ttl=0.05)
+    time.sleep(0.1)
+    assert cache.gravar(NS_COTACOES, "id", "segunda", se_ausente=True) is not None
+    assert cache.obter(NS_COTACOES, "id")[0] == "segunda"
+
+
+def test_se_ausente_e_atomico_entre_processos(cache, caminho):
+    ganhas_a, ganhas_b = disputar_em_dois_processos(caminho, "gravar")
+
+    assert not set(ganhas_a) & set(ganhas_b)
+    assert len(ganhas_a) + len(ganhas_b) == CHAVES_CONCORRENTES
+
+
+def test_tomar_entrega_uma_unica_vez(cache):
+    cache.gravar(NS_COTACOES, "id", "firme")
+    assert cache.tomar(NS_COTACOES, "id") == "firme"
+    assert cache.tomar(NS_COTACOES, "id") is None
+    assert cache.obter(NS_COTACOES, "id") is None
+
+
+def test_tomar_entrega_uma_unica_vez_entre_processos(cache, caminho):
+    for i in range(CHAVES_CONCORRENTES):
+        assert cache.gravar(NS_COTACOES, f"chave-{i}", i) is not None
+
+    ganhas_a, ganhas_b = disputar_em_dois_processos(caminho, "tomar")
+
+    assert not set(ganhas_a) & set(ganhas_b)
+    assert len(ganhas_a) + len(ganhas_b) == CHAVES_CONCORRENTES
+
+
+# --- capacidade -----------------------------------------------------------
+
+def test_janela_cheia_substitui_a_entrada_mais_antiga(caminho):
+    # Com tantos slots quanto sondagens, toda chave disputa a mesma janela
+    cache = CacheCompartilhado(caminho, slots=SONDAGENS, tamanho_slot=128)
+    for i in range(SONDAGENS):
+        assert cache.gravar(NS_MOEDAS, f"m{i}", i) is not None
+
+    cache.gravar(NS_MOEDAS, "nova", "x")
+
+    assert cache.obter(NS_MOEDAS, "m0") is None
+    assert cache.obter(NS_MOEDAS, "nova")[0] == "x"
+    for i in range(1, SONDAGENS):
+        assert cache.obter(NS_MOEDAS, f"m{i}")[0] == i
+
+
+def test_janela_cheia_reaproveita_entrada_expirada(caminho):
+    cache = CacheCompartilhado(caminho, slots=SONDAGENS, tamanho_slot=128)
+    for i in range(SONDAGENS):
+        cache.gravar(NS_MOEDAS, f"m{i}", i, ttl=0.05 if i == 3 else None)
+    time.sleep(0.1)
+
+    cache.gravar(NS_MOEDAS, "nova", "x")
+
+    assert cache.obter(NS_MOEDAS, "m0")[0] == 0
+    assert cache.obter(NS_MOEDAS, "nova")[0] == "x"
+
+
+def test_valor_maior_que_o_slot_nao_e_guardado(caminho):
+    cache = CacheCompartilhado(caminho, slots=64, tamanho_slot=128)
+    cache.gravar(NS_MOEDAS, "grande", "pequeno")
+
+    assert cache.gravar(NS_MOEDAS, "grande", "x" * 128) is None
+    assert cache.obter(NS_MOEDAS, "grande")[0] == "pequeno"
+
+
+def test_tamanho_de_slot_invalido(caminho):
+    with pytest.raises(ValueError):
+        CacheCompartilhado(caminho, slots=8, tamanho_slot=48)
+    with pytest.raises(ValueError):
+        CacheCompartilhado(caminho, slots=8, tamanho_slot=100)
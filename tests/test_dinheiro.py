@@ -0,0 +1,180 @@
+"""
+Testes do Dinheiro (api.models.dinheiro): leitura de valores, limites de 64
+bits e regras de arredondamento.
+
+Uso:
+    python -m pytest tests
+"""
+from decimal import ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP, Decimal
+
+import pytest
+from pydantic import BaseModel
+
+from api.models.dinheiro import (
+    ARREDONDAMENTO_CONVERSAO,
+    MAXIMO_UNIDADES,
+    MINIMO_UNIDADES,
+    ZERO,
+    Dinheiro,
+    formatar_unidades,
+)
+
+
+class Entrada(BaseModel):
+    valor: Dinheiro
+
+
+# --- leitura --------------------------------------------------------------
+
+@pytest.mark.parametrize("entrada, unidades", [
+    ("10.5", 1_050_000_000),
+    ("  0.00000001 ", 1),
+    ("-3", -300_000_000),
+    ("1E+2", 10_000_000_000),
+    ("1.50000000000", 150_000_000),
+    (7, 700_000_000),
+    (0.1, 10_000_000),
+    (Decimal("0E+50"), 0),
+    (Decimal("92233720368.54775807"), MAXIMO_UNIDADES),
+    (Decimal("-92233720368.54775808"), MINIMO_UNIDADES),
+])
+def test_de_valor_aceita(entrada, unidades):
+    assert Dinheiro.de_valor(entrada).unidades == unidades
+
+
+@pytest.mark.parametrize("entrada", [
+    "0.000000001",
+    "1.00000000000000000000000000000001",
+    Decimal("1E-999999999"),
+    "abc",
+    "",
+    "NaN",
+    "Infinity",
+    True,
+    None,
+    [1],
+])
+def test_de_valor_rejeita(entrada):
+    with pytest.raises(ValueError):
+        Dinheiro.de_valor(entrada)
+
+
+def test_de_valor_devolve_o_proprio_dinheiro():
+    valor = Dinheiro(123)
+    assert Dinheiro.de_valor(valor) is valor
+
+
+def test_mais_de_oito_casas_nao_e_arredondado():
+    with pytest.raises(ValueError, match="mais de 8 casas"):
+        Dinheiro.de_decimal(Decimal("0.123456789"))
+
+
+@pytest.mark.parametrize("modo, esperado", [
+    (ROUND_HALF_EVEN, 12),
+    (ROUND_HALF_UP, 13),
+    (ROUND_DOWN, 12),
+    (ROUND_UP, 13),
+])
+def test_de_decimal_com_arredondamento(modo, esperado):
+    assert Dinheiro.de_decimal(Decimal("0.000000125"), modo).unidades == esperado
+
+
+def test_pydantic_le_e_serializa_com_oito_casas():
+    assert Entrada(valor="1.5").model_dump_json() == '{"valor":"1.50000000"}'
+    with pytest.raises(ValueError):
+        Entrada(valor="1.000000001")
+
+
+# --- limites --------------------------------------------------------------
+
+@pytest.mark.parametrize("entrada", [
+    Decimal("92233720368.54775808"),
+    Decimal("-92233720368.54775809"),
+    Decimal("1E+11"),
+    Decimal("1E+999999999"),
+])
+def test_fora_do_intervalo(entrada):
+    with pytest.raises(ValueError, match="fora do intervalo"):
+        Dinheiro.de_decimal(entrada)
+
+
+def test_aritmetica_nao_passa_de_64_bits():
+    maximo = Dinheiro(MAXIMO_UNIDADES)
+    with pytest.raises(ValueError):
+        maximo + Dinheiro(1)
+    with pytest.raises(ValueError):
+        -Dinheiro(MINIMO_UNIDADES)
+    with pytest.raises(ValueError):
+        maximo * 2
+
+
+# --- arredondamento -------------------------------------------------------
+
+@pytest.mark.parametrize("unidades, esperado", [
+    (50, 0),      # 1% = 0.5 unidade: meio para o par (0)
+    (150, 2),     # 1.5 -> 2
+    (250, 2),     # 2.5 -> 2
+    (251, 3),
+    (-150, -2),
+    (-250, -2),
+])
+def test_percentual_arredonda_meio_para_o_par(unidades, esperado):
+    assert Dinheiro(unidades).percentual(Decimal("0.01")).unidades == esperado
+
+
+@pytest.mark.parametrize("modo, esperado", [
+    (ROUND_DOWN, -1),
+    (ROUND_UP, -2),
+    (ROUND_FLOOR, -2),
+    (ROUND_CEILING, -1),
+    (ROUND_HALF_UP, -2),
+    (ROUND_HALF_EVEN, -2),
+])
+def test_multiplicar_com_negativos(modo, esperado):
+    # -3 x 0.5 = -1.5 unidade
+    assert Dinheiro(-3).multiplicar(Decimal("0.5"), modo).unidades == esperado
+
+
+def test_conversao_trunca():
+    valor = Dinheiro.de_valor("1")
+    assert valor.multiplicar(Decimal("0.123456789"), ARREDONDAMENTO_CONVERSAO) == Dinheiro.de_valor("0.12345678")
+
+
+def test_liquido_mais_taxa_fecha_com_o_bruto():
+    bruto = Dinheiro.de_valor("123.45678901")
+    taxa = bruto.percentual(Decimal("0.015"))
+    assert (bruto - taxa) + taxa == bruto
+    assert taxa.para_decimal() == (bruto.para_decimal() * Decimal("0.015")).quantize(Decimal("1E-8"), ROUND_HALF_EVEN)
+
+
+def test_modo_de_arredondamento_invalido():
+    with pytest.raises(ValueError):
+        Dinheiro(1).multiplicar(Decimal("0.3"), "ARREDONDA_COMO_QUISER")
+    with pytest.raises(ValueError):
+        Dinheiro.de_decimal(Decimal("0.000000001"), "ARREDONDA_COMO_QUISER")
+
+
+# --- saída ----------------------------------------------------------------
+
+@pytest.mark.parametrize("unidades, texto", [
+    (0, "0.00000000"),
+    (1, "0.00000001"),
+    (-1, "-0.00000001"),
+    (1_050_000_000, "10.50000000"),
+    (MINIMO_UNIDADES, "-92233720368.54775808"),
+    (10 ** 30, "10000000000000000000000.00000000"),
+])
+def test_formatar_unidades(unidades, texto):
+    assert formatar_unidades(unidades) == texto
+
+
+def test_ida_e_volta_com_a_coluna():
+    for texto in ("0.00000001", "12345.6789", "-0.5", "92233720368.54775807"):
+        valor = Dinheiro.de_valor(texto)
+        assert valor.para_decimal() == Decimal(texto)
+        assert Dinheiro.de_decimal(valor.para_decimal()) == valor
+
+
+def test_soma_comeca_em_zero():
+    assert sum([Dinheiro(1), Dinheiro(2)]) == Dinheiro(3)
+    assert sum([], ZERO) == ZERO
@@ -0,0 +1,218 @@
+"""
+Testes do disjuntor e da fonte de cotações (api.services.provedores_cotacao),
+com o ProvedorFixo no lugar da Coinbase e um CacheLocal no lugar do cache
+compartilhado.
+
+Uso:
+    python -m pytest tests
+"""
+import asyncio
+import time
+from decimal import Decimal
+
+import httpx
+import pytest
+
+from api.persistence.cache_compartilhado import CacheLocal
+from api.services.provedores_cotacao import (
+    FONTE_PROVEDOR,
+    FONTE_ULTIMA_CONHECIDA,
+    CotacaoIndisponivelError,
+    DisjuntorCotacao,
+    FonteCotacoes,
+    ProvedorCotacao,
+    ProvedorFixo,
+)
+
+TEMPO_ABERTO = 0.05
+
+
+class ProvedorComErro(ProvedorCotacao):
+    """Responde com o status HTTP informado (ou com a cotação, se status for None)."""
+
+    nome = "com_erro"
+
+    def __init__(self, status=None, valor=Decimal("5")):
+        self.status = status
+        self.valor = valor
+
+    async def buscar(self, moeda_origem, moeda_destino):
+        if self.status is None:
+            return self.valor
+        requisicao = httpx.Request("GET", f"https://provedor/{moeda_origem}-{moeda_destino}")
+        resposta = httpx.Response(self.status, request=requisicao)
+        raise httpx.HTTPStatusError(f"HTTP {self.status}", request=requisicao, response=resposta)
+
+
+def criar_disjuntor(**kwargs) -> DisjuntorCotacao:
+    opcoes = dict(limite_lenta=0.01, janela=4, minimo_chamadas=4, proporcao_ruins=0.5, tempo_aberto=TEMPO_ABERTO)
+    opcoes.update(kwargs)
+    return DisjuntorCotacao(**opcoes)
+
+
+def criar_fonte(provedor, disjuntor=None, idade_maxima_ultima=60.0) -> FonteCotacoes:
+    return FonteCotacoes(provedor, disjuntor or criar_disjuntor(limite_lenta=1.0), timeout=1.0,
+                         idade_maxima_ultima=idade_maxima_ultima, validade_instantaneo=0, cache=CacheLocal())
+
+
+def abrir_e_esperar(disjuntor: DisjuntorCotacao):
+    disjuntor._abrir()
+    time.sleep(TEMPO_ABERTO * 1.5)
+
+
+# --- disjuntor ------------------------------------------------------------
+
+def test_abre_com_proporcao_de_chamadas_lentas():
+    disjuntor = criar_disjuntor()
+    fonte = criar_fonte(ProvedorFixo({"BTC-USD": "100"}, latencia=0.02), disjuntor)
+
+    async def cenario():
+        for _ in range(4):
+            assert (await fonte.obter("BTC", "USD")).fonte == FONTE_PROVEDOR
+
+    asyncio.run(cenario())
+    assert disjuntor.estado == DisjuntorCotacao.ABERTO
+    assert not disjuntor.permitir()
+
+
+def test_fica_fechado_abaixo_da_proporcao():
+    disjuntor = criar_disjuntor()
+    for ruim in (True, False, False, False, False):
+        assert disjuntor.permitir()
+        disjuntor.registrar(not ruim, 0.0)
+    assert disjuntor.estado == DisjuntorCotacao.FECHADO
+
+
+def test_meio_aberto_depois_do_tempo_aberto():
+    disjuntor = criar_disjuntor()
+    disjuntor._abrir()
+    assert not disjuntor.permitir()
+
+    time.sleep(TEMPO_ABERTO * 1.5)
+    assert disjuntor.permitir()
+    assert disjuntor.estado == DisjuntorCotacao.MEIO_ABERTO
+
+
+def test_meio_aberto_deixa_passar_uma_unica_sonda():
+    disjuntor = criar_disjuntor()
+    abrir_e_esperar(disjuntor)
+
+    assert disjuntor.permitir()
+    assert not disjuntor.permitir()
+    disjuntor.registrar(True, 0.0)
+    assert disjuntor.estado == DisjuntorCotacao.FECHADO
+    assert disjuntor.permitir()
+
+
+def test_sonda_ruim_abre_de_novo():
+    disjuntor = criar_disjuntor()
+    abrir_e_esperar(disjuntor)
+
+    assert disjuntor.permitir()
+    disjuntor.registrar(False, 0.0)
+    assert disjuntor.estado == DisjuntorCotacao.ABERTO
+    assert not disjuntor.permitir()
+
+
+def test_sonda_cancelada_e_liberada():
+    disjuntor = criar_disjuntor(limite_lenta=1.0)
+    provedor = ProvedorFixo({"BTC-USD": "100"}, latencia=5.0)
+    fonte = criar_fonte(provedor, disjuntor)
+    abrir_e_esperar(disjuntor)
+
+    async def cenario():
+        sonda = asyncio.create_task(fonte.obter("BTC", "USD", aceitar_ultima_conhecida=False))
+        await asyncio.sleep(0.02)
+        assert disjuntor._sonda_em_andamento
+        sonda.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await sonda
+
+        assert not disjuntor._sonda_em_andamento
+        provedor.latencia = 0.0
+        return await fonte.obter("BTC", "USD", aceitar_ultima_conhecida=False)
+
+    assert asyncio.run(cenario()).valor == Decimal("100")
+    assert disjuntor.estado == DisjuntorCotacao.FECHADO
+
+
+# --- última cotação conhecida ---------------------------------------------
+
+def test_circuito_aberto_usa_ultima_conhecida():
+    disjuntor = criar_disjuntor(limite_lenta=1.0)
+    fonte = criar_fonte(ProvedorFixo({"BTC-USD": "100"}), disjuntor)
+
+    async def cenario():
+        await fonte.obter("BTC", "USD")
+        disjuntor._abrir()
+        return await fonte.obter("BTC", "USD")
+
+    cotacao = asyncio.run(cenario())
+    assert cotacao.fonte == FONTE_ULTIMA_CONHECIDA
+    assert cotacao.valor == Decimal("100")
+
+
+def test_ultima_conhecida_respeita_a_idade_maxima():
+    disjuntor = criar_disjuntor(limite_lenta=1.0, tempo_aberto=60)
+    fonte = criar_fonte(ProvedorFixo({"BTC-USD": "100"}), disjuntor, idade_maxima_ultima=0.05)
+
+    async def cenario():
+        await fonte.obter("BTC", "USD")
+        disjuntor._abrir()
+        await asyncio.sleep(0.1)
+        await fonte.obter("BTC", "USD")
+
+    with pytest.raises(CotacaoIndisponivelError, match="circuito aberto"):
+        asyncio.run(cenario())
+
+
+def test_sem_fallback_falha_rapido():
+    disjuntor = criar_disjuntor(limite_lenta=1.0)
+    fonte = criar_fonte(ProvedorFixo({"BTC-USD": "100"}), disjuntor)
+
+    async def cenario():
+        await fonte.obter("BTC", "USD")
+        disjuntor._abrir()
+        await fonte.obter("BTC", "USD", aceitar_ultima_conhecida=False)
+
+    with pytest.raises(CotacaoIndisponivelError):
+        asyncio.run(cenario())
+
+
+def test_5xx_usa_ultima_conhecida_e_conta_como_falha():
+    disjuntor = criar_disjuntor(limite_lenta=1.0)
+    provedor = ProvedorComErro()
+    fonte = criar_fonte(provedor, disjuntor)
+
+    async def cenario():
+        await fonte.obter("BTC", "USD")
+        provedor.status = 503
+        return await fonte.obter("BTC", "USD")
+
+    cotacao = asyncio.run(cenario())
+    assert cotacao.fonte == FONTE_ULTIMA_CONHECIDA
+    assert cotacao.valor == Decimal("5")
+    assert list(disjuntor._resultados) == [False, True]
+
+
+def test_5xx_sem_ultima_conhecida():
+    fonte = criar_fonte(ProvedorComErro(status=502))
+    with pytest.raises(CotacaoIndisponivelError, match="HTTP 502"):
+        asyncio.run(fonte.obter("BTC", "USD"))
+
+
+def test_4xx_e_propagado_sem_contar_como_falha():
+    disjuntor = criar_disjuntor(limite_lenta=1.0)
+    fonte = criar_fonte(ProvedorComErro(status=404), disjuntor)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(fonte.obter("BTC", "USD"))
+    assert list(disjuntor._resultados) == [False]
+
+
+def test_provedor_fixo_deriva_o_par_inverso():
+    provedor = ProvedorFixo.de_texto("USD-BRL=5, BTC-USD=100")
+    assert asyncio.run(provedor.buscar("BRL", "USD")) == Decimal("0.2")
+    assert asyncio.run(provedor.buscar("BTC", "BTC")) == Decimal("1")
+    with pytest.raises(LookupError):
+        asyncio.run(provedor.buscar("ETH", "USD"))